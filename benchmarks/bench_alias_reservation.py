@@ -0,0 +1,93 @@
+'''
+Time to Permitted and idle CPU of the I/O loop, fixed sleeps vs
+waiting for the next deadline or data.
+
+A CanLink reserves its alias over a socketpair (no other nodes, so no
+collisions), then the loop idles. "fixed sleep" is the previous
+OpenLCBNetwork._listen pattern (receive, sendAll, sleep 10 ms). "wait"
+blocks in waitReadable until data or the scheduler's next deadline
+(capped at maxWait as in OpenLCBNetwork). Reports time from
+physicalLayerUp to Permitted, loop iterations (wakeups) per idle
+second, and CPU seconds used per idle second.
+
+Usage:
+python3 bench_alias_reservation.py [idle_seconds]
+'''
+import os
+import socket
+import sys
+import time
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb import precise_sleep  # noqa: E402
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.nodeid import NodeID  # noqa: E402
+from openlcb.openlcbnetwork import OpenLCBNetwork  # noqa: E402
+from openlcb.tcplink.tcpsocket import TcpSocket  # noqa: E402
+
+
+def wait(mode: str, physicalLayer, canLink, port):
+    if mode == "fixed sleep":
+        precise_sleep(.01)
+        return
+    if physicalLayer.hasFrame():
+        return
+    timeout = canLink.scheduler.timeUntilNext()
+    if (timeout is None) or (timeout > OpenLCBNetwork.maxWait):
+        timeout = OpenLCBNetwork.maxWait
+    port.waitReadable(timeout)
+
+
+def bench(mode: str, idleSeconds: float):
+    near, far = socket.socketpair()
+    near.setblocking(False)
+    far.setblocking(False)
+    port = TcpSocket()
+    port._device = near
+    physicalLayer = CanPhysicalLayerGridConnect()
+    canLink = CanLink(physicalLayer, NodeID("05.01.01.01.03.01"))
+    start = default_timer()
+    physicalLayer.physicalLayerUp()
+    while True:
+        physicalLayer.receiveAll(port)
+        physicalLayer.sendAll(port)
+        if canLink._state == CanLink.State.Permitted:
+            break
+        wait(mode, physicalLayer, canLink, port)
+    toPermitted = default_timer() - start
+    wakeups = 0
+    cpuStart = time.process_time()
+    idleStart = default_timer()
+    while default_timer() - idleStart < idleSeconds:
+        physicalLayer.receiveAll(port)
+        physicalLayer.sendAll(port)
+        wait(mode, physicalLayer, canLink, port)
+        wakeups += 1
+    idle = default_timer() - idleStart
+    cpu = time.process_time() - cpuStart
+    physicalLayer.physicalLayerDown()
+    near.close()
+    far.close()
+    return toPermitted, wakeups / idle, cpu / idle
+
+
+def main():
+    idleSeconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    print("{:<12} {:>14} {:>12} {:>14}".format(
+        "loop", "to Permitted", "wakeups/s", "idle CPU s/s"))
+    for mode in ("fixed sleep", "wait"):
+        toPermitted, wakeups, cpu = bench(mode, idleSeconds)
+        print("{:<12} {:>12.1f}ms {:>12.1f} {:>14.5f}".format(
+            mode, toPermitted * 1000, wakeups, cpu))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+'''
+OpenLCBNetwork driven by the listen thread vs asyncio run.
+
+Connects each over a socketpair (the far end plays the GridConnect
+hub), waits for the alias reservation, then measures:
+- idle wakeups per second (sendAll calls while nothing happens),
+- latency from another thread queuing an event report (sendMessage)
+  until the far end receives it.
+
+Usage:
+python3 bench_asyncio_run.py [samples]
+'''
+import asyncio
+import os
+import socket
+import sys
+import time
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.message import Message  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.openlcbnetwork import OpenLCBNetwork  # noqa: E402
+from openlcb.tcplink.tcpsocket import TcpSocket  # noqa: E402
+
+LOCAL_NODE_ID = "05.01.01.01.03.01"
+IDLE_SECONDS = 1.0
+
+
+def makeNetwork():
+    near, far = socket.socketpair()
+    near.setblocking(False)
+    port = TcpSocket()
+    port._device = near
+    port._open = True
+    network = OpenLCBNetwork(LOCAL_NODE_ID)
+    counts = {"sendAll": 0}
+    sendAll = network.physicalLayer.sendAll
+
+    def countingSendAll(*args, **kwargs):
+        counts["sendAll"] += 1
+        return sendAll(*args, **kwargs)
+    network.physicalLayer.sendAll = countingSendAll
+    return network, port, far, counts
+
+
+def waitPermitted(network):
+    start = default_timer()
+    while network.canLink.getState() != CanLink.State.Permitted:
+        if default_timer() - start > 5:
+            raise TimeoutError("Alias reservation did not finish")
+        time.sleep(.01)
+
+
+def measure(network, far, counts, samples: int):
+    """Call from a thread other than the loop's."""
+    waitPermitted(network)
+    far.settimeout(.2)
+    try:
+        while far.recv(4096):
+            pass  # discard the reservation frames
+    except socket.timeout:
+        pass
+    before = counts["sendAll"]
+    time.sleep(IDLE_SECONDS)
+    wakeups = (counts["sendAll"] - before) / IDLE_SECONDS
+    far.settimeout(2.0)
+    latencies = []
+    message = Message(MTI.Producer_Consumer_Event_Report,
+                      network.canLink.localNodeID, None, bytearray(8))
+    for _ in range(samples):
+        time.sleep(.013)  # land at a random point of any poll interval
+        start = default_timer()
+        network.canLink.sendMessage(message)
+        received = b""
+        while b";" not in received:
+            received += far.recv(4096)
+        latencies.append(default_timer() - start)
+    latencies.sort()
+    return wakeups, latencies
+
+
+def runThread(samples: int):
+    network, port, far, counts = makeNetwork()
+    network.startListening(port)
+    try:
+        return measure(network, far, counts, samples)
+    finally:
+        far.close()
+
+
+def runAsyncio(samples: int):
+    network, port, far, counts = makeNetwork()
+
+    async def main():
+        task = asyncio.ensure_future(network.run(port))
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, measure, network, far, counts, samples)
+        far.close()
+        try:
+            await task
+        except RuntimeError:
+            pass  # socket connection broken
+        return result
+    return asyncio.run(main())
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    results = (("thread", runThread(samples)),
+               ("asyncio", runAsyncio(samples)))
+    print()
+    print("{:<8} {:>12} {:>14} {:>14}".format(
+        "driver", "idle wake/s", "median send", "p99 send"))
+    for name, (wakeups, latencies) in results:
+        print("{:<8} {:>12.0f} {:>12.3f}ms {:>12.3f}ms".format(
+            name, wakeups, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * .99)] * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+'''
+Frames/sec through CanLink.handleFrameReceived and
+canHeaderToFullFormat, comparing the previous if/elif dispatch and
+MTI(value) lookup (LegacyCanLink, copied here) with the dispatch
+tables.
+
+The traffic mix is PCER events, Verified Node IDs, single-frame
+datagrams to the local node, AMD frames from a remote node and frames
+with unknown CAN MTIs.
+
+Usage:
+python3 bench_canlink_dispatch.py [repeat]
+'''
+import logging
+import os
+import sys
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canframe import CanFrame  # noqa: E402
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.canbus.controlframe import ControlFrame  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.nodeid import NodeID  # noqa: E402
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+FAR_NODE_ID = NodeID("09.00.99.03.00.35")
+FAR_ALIAS = 0x123
+FRAME_COUNT = 100000
+
+logger = logging.getLogger(__name__)
+
+
+class LegacyCanLink(CanLink):
+    """The previous handleFrameReceived and canHeaderToFullFormat."""
+    def handleFrameReceived(self, frame):
+        handled = True
+        control_frame = CanFrame.decodeControlFrameFormat(frame)
+        if not ControlFrame.isInternal(control_frame):
+            self._frameCount += 1
+        else:
+            print("[CanLink handleFrameReceived] control_frame={}"
+                  .format(control_frame))
+        if control_frame == ControlFrame.LinkUp:
+            self.handleReceivedLinkUp(frame)
+        elif control_frame == ControlFrame.LinkRestarted:
+            self.handleReceivedLinkRestarted(frame)
+        elif control_frame in (ControlFrame.LinkCollision,
+                               ControlFrame.LinkError):
+            self.handleReceivedLinkError(frame)
+        elif control_frame == ControlFrame.LinkDown:
+            self.handleReceivedLinkDown(frame)
+        elif control_frame == ControlFrame.CID:
+            self.handleReceivedCID(frame)
+        elif control_frame == ControlFrame.RID:
+            self.handleReceivedRID(frame)
+        elif control_frame == ControlFrame.AMD:
+            self.handleReceivedAMD(frame)
+        elif control_frame == ControlFrame.AME:
+            self.handleReceivedAME(frame)
+        elif control_frame == ControlFrame.AMR:
+            self.handleReceivedAMR(frame)
+        elif control_frame in (ControlFrame.EIR0,
+                               ControlFrame.EIR1,
+                               ControlFrame.EIR2,
+                               ControlFrame.EIR3):
+            self.handleReceivedEIR(frame)
+        elif control_frame == ControlFrame.Data:
+            self.handleReceivedData(frame)
+        else:
+            handled = False
+        if handled:
+            self.pollState()
+
+    def canHeaderToFullFormat(self, frame):
+        frameType = (frame.header >> 24) & 0x7
+        canMTI = ((frame.header >> 12) & 0xFFF)
+        if frameType == 1:
+            try:
+                okMTI = MTI(canMTI)
+            except ValueError:
+                logger.warning(
+                    "unhandled canMTI: {}, marked Unknown"
+                    .format(frame))
+                return MTI.Unknown
+            return okMTI
+        if (frameType >= 2 and 5 >= frameType):
+            return MTI.Datagram
+        logger.warning(
+            "unhandled canMTI: {}, marked Unknown"
+            .format(frame))
+        return MTI.Unknown
+
+
+def makeLink(cls):
+    physicalLayer = CanPhysicalLayerGridConnect()
+    canLink = cls(physicalLayer, LOCAL_NODE_ID)
+    canLink._state = CanLink.State.Permitted  # skip alias reservation
+    canLink.nodeIdToAlias[LOCAL_NODE_ID] = canLink._localAlias
+    canLink.aliasToNodeID[canLink._localAlias] = LOCAL_NODE_ID
+    canLink.nodeIdToAlias[FAR_NODE_ID] = FAR_ALIAS
+    canLink.aliasToNodeID[FAR_ALIAS] = FAR_NODE_ID
+    return physicalLayer, canLink
+
+
+def makeFrames(localAlias):
+    kinds = (
+        CanFrame(0x195B4000 | FAR_ALIAS, bytearray(8)),  # PCER
+        CanFrame(0x19170000 | FAR_ALIAS,
+                 bytearray(FAR_NODE_ID.toArray())),  # Verified Node ID
+        CanFrame(0x1A000000 | (localAlias << 12) | FAR_ALIAS,
+                 bytearray([0x20, 0x53, 0, 0, 0, 0, 1, 2])),  # datagram
+        CanFrame(ControlFrame.AMD.value, FAR_ALIAS,
+                 bytearray(FAR_NODE_ID.toArray())),
+        CanFrame(0x19FFF000 | FAR_ALIAS, bytearray()),  # unknown MTI
+    )
+    return [kinds[i % len(kinds)] for i in range(FRAME_COUNT)]
+
+
+def bench(cls, method_name, repeat):
+    physicalLayer, canLink = makeLink(cls)
+    frames = makeFrames(canLink._localAlias)
+    method = getattr(canLink, method_name)
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        for frame in frames:
+            method(frame)
+        elapsed = default_timer() - start
+        physicalLayer._send_frames.clear()  # replies to datagrams etc.
+        if best is None or elapsed < best:
+            best = elapsed
+    return len(frames) / best
+
+
+def main():
+    logging.disable(logging.WARNING)  # unknown MTI warnings
+    repeat = 3
+    if len(sys.argv) > 1:
+        repeat = int(sys.argv[1])
+    for method_name in ("canHeaderToFullFormat", "handleFrameReceived"):
+        for cls in (LegacyCanLink, CanLink):
+            rate = bench(cls, method_name, repeat)
+            print("{:<14} {:<22} {:>12,.0f} frames/sec"
+                  .format(cls.__name__, method_name, rate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
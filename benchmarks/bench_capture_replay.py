@@ -0,0 +1,105 @@
+'''
+Capture file write/read throughput and CanLink throughput on replayed
+traffic.
+
+Writes a synthetic capture (events, Verified Node IDs and single-frame
+datagrams addressed to the local node), then reports records/sec for
+CaptureWriter, CaptureReader.records and CaptureReader.frames, and
+frames/sec for replaying it as fast as possible into
+CanPhysicalLayerGridConnect + CanLink. Pass a capture file recorded
+with CaptureWriter to replay real traffic instead.
+
+Usage:
+python3 bench_capture_replay.py [capture_file]
+'''
+import os
+import sys
+import tempfile
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.canbus.capture import (  # noqa: E402
+    CaptureReader,
+    CaptureReplay,
+    CaptureWriter,
+)
+from openlcb.nodeid import NodeID  # noqa: E402
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+FAR_NODE_ID = NodeID("09.00.99.03.00.35")
+FAR_ALIAS = 0x123
+RECORD_COUNT = 200000
+
+
+def writeCapture(path: str, localAlias: int) -> float:
+    event = bytes([5, 1, 1, 1, 3, 1, 0, 0])
+    kinds = (
+        (0x195B4000 | FAR_ALIAS, event),  # PCER
+        (0x19170000 | FAR_ALIAS, FAR_NODE_ID.toArray()),  # Verified
+        (0x1A000000 | (localAlias << 12) | FAR_ALIAS,
+         bytes([0x20, 0x53, 0, 0, 0, 0, 1, 2])),  # datagram to us
+    )
+    start = default_timer()
+    with CaptureWriter(path) as writer:
+        for i in range(RECORD_COUNT):
+            header, data = kinds[i % len(kinds)]
+            writer.writeRecord(1000.0 + i * .0005, header, data)
+    return RECORD_COUNT / (default_timer() - start)
+
+
+def makeStack():
+    physicalLayer = CanPhysicalLayerGridConnect()
+    canLink = CanLink(physicalLayer, LOCAL_NODE_ID)
+    canLink._state = CanLink.State.Permitted  # skip alias reservation
+    canLink.nodeIdToAlias[LOCAL_NODE_ID] = canLink._localAlias
+    canLink.aliasToNodeID[canLink._localAlias] = LOCAL_NODE_ID
+    canLink.nodeIdToAlias[FAR_NODE_ID] = FAR_ALIAS
+    canLink.aliasToNodeID[FAR_ALIAS] = FAR_NODE_ID
+    return physicalLayer, canLink
+
+
+def main():
+    physicalLayer, canLink = makeStack()
+    tempDir = None
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        tempDir = tempfile.mkdtemp()
+        path = os.path.join(tempDir, "bench.olcbcap")
+        rate = writeCapture(path, canLink._localAlias)
+        print("{:<16} {:>12,.0f} records/sec".format("CaptureWriter", rate))
+    try:
+        with CaptureReader(path) as reader:
+            count = len(reader)
+            start = default_timer()
+            for _ in reader.records():
+                pass
+            print("{:<16} {:>12,.0f} records/sec".format(
+                "records()", count / (default_timer() - start)))
+            start = default_timer()
+            for _ in reader.frames():
+                pass
+            print("{:<16} {:>12,.0f} records/sec".format(
+                "frames()", count / (default_timer() - start)))
+            replay = CaptureReplay(reader, physicalLayer, speed=0)
+            start = default_timer()
+            fired = replay.run()
+            print("{:<16} {:>12,.0f} frames/sec ({:,} frames into CanLink)"
+                  .format("replay", fired / (default_timer() - start),
+                          fired))
+    finally:
+        if tempDir is not None:
+            os.remove(path)
+            os.rmdir(tempDir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+'''
+Read configuration memory from many simulated nodes at once through
+DatagramService, with one datagram in flight for the whole network
+(maxInFlight=1, as before) vs one per destination.
+
+The nodes and a shared link are simulated in virtual time (no
+sleeping): every 8-byte frame occupies the link for the scenario's
+frame time, each node takes ACK_SECONDS to accept a datagram
+(Datagram_Received_OK) and TURNAROUND_SECONDS to answer a read. Each
+node is read READ_BYTES in 64-byte memory configuration reads (the next
+read to a node is sent once its previous read reply arrives).
+
+On a 125 kbit/s CAN bus the bus itself is the bottleneck, so the gain
+is small there; it grows as the link gets faster.
+
+Usage:
+python3 bench_datagram_pipeline.py [nodes]
+'''
+import os
+import sys
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.datagramservice import (  # noqa: E402
+    DatagramService,
+    DatagramWriteMemo,
+)
+from openlcb.linklayer import LinkLayer  # noqa: E402
+from openlcb.message import Message  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.nodeid import NodeID  # noqa: E402
+from openlcb.physicallayer import PhysicalLayer  # noqa: E402
+from openlcb.scheduler import Scheduler  # noqa: E402
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+FIRST_NODE_ID = 0x09_00_99_03_00_00
+READ_BYTES = 512
+ACK_SECONDS = .002
+TURNAROUND_SECONDS = .005
+SCENARIOS = (  # (name, seconds per 8-byte frame)
+    ("CAN 125k", .001),
+    ("CAN 1M", .000125),
+    ("TCP", .00001),
+)
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SimulatedBus(LinkLayer):
+    """Delivers each Datagram to a simulated node, which replies with
+    Datagram_Received_OK then a read reply datagram.
+    """
+    class State:
+        Initial = 0
+        Disconnected = 1
+        Permitted = 2
+
+    DisconnectedState = State.Disconnected
+
+    def __init__(self, scheduler: Scheduler, frameSeconds: float):
+        super(SimulatedBus, self).__init__(PhysicalLayer(), LOCAL_NODE_ID)
+        self.scheduler = scheduler
+        self.frameSeconds = frameSeconds
+        self.service = None  # type: DatagramService
+        self.busFreeAt = 0.0
+
+    def _onStateChanged(self, oldState, newState):
+        pass
+
+    def transmit(self, dataLength: int) -> float:
+        """Occupy the bus (from now, or once free) for the frames of a
+        message (returns when the last frame arrives).
+        """
+        frames = max(1, (dataLength + 7) // 8)
+        start = max(self.scheduler.clock(), self.busFreeAt)
+        self.busFreeAt = start + frames * self.frameSeconds
+        return self.busFreeAt
+
+    def sendLater(self, delay: float, message: Message):
+        """Have a simulated node start sending message after delay."""
+        def send():
+            arrived = self.transmit(len(message.data))
+            self.scheduler.callAt(arrived,
+                                  lambda: self.service.process(message))
+        self.scheduler.callLater(delay, send)
+
+    def sendMessage(self, msg: Message, verbose=False):
+        arrived = self.transmit(len(msg.data))
+        if msg.mti != MTI.Datagram:
+            return  # (our Datagram_Received_OK for a read reply)
+        node = msg.destination
+        delay = arrived - self.scheduler.clock()
+        self.sendLater(delay + ACK_SECONDS, Message(
+            MTI.Datagram_Received_OK, node, LOCAL_NODE_ID))
+        data = bytearray([0x20, 0x51]) + msg.data[2:6] + bytearray(64)
+        self.sendLater(delay + TURNAROUND_SECONDS, Message(
+            MTI.Datagram, node, LOCAL_NODE_ID, data))
+
+
+def readRequest(nodeID: NodeID, address: int) -> DatagramWriteMemo:
+    return DatagramWriteMemo(nodeID, bytearray([
+        0x20, 0x41,
+        (address >> 24) & 0xFF, (address >> 16) & 0xFF,
+        (address >> 8) & 0xFF, address & 0xFF, 64]))
+
+
+def run(nodeCount: int, maxInFlight: int, frameSeconds: float):
+    clock = VirtualClock()
+    scheduler = Scheduler(clock=clock)
+    bus = SimulatedBus(scheduler, frameSeconds)
+    service = DatagramService(bus)
+    service.maxInFlight = maxInFlight
+    bus.service = service
+    received = {}
+
+    def onDatagram(dmemo):
+        service.positiveReplyToDatagram(dmemo)
+        count = received.get(dmemo.srcID, 0) + len(dmemo.data) - 6
+        received[dmemo.srcID] = count
+        if count < READ_BYTES:
+            service.sendDatagram(readRequest(dmemo.srcID, count))
+        return True
+    service.registerDatagramReceivedListener(onDatagram)
+
+    start = default_timer()
+    for index in range(nodeCount):
+        service.sendDatagram(readRequest(NodeID(FIRST_NODE_ID + index), 0))
+    while True:
+        deadline = scheduler.nextDeadline()
+        if deadline is None:
+            break
+        clock.now = deadline
+        scheduler.runDue()
+    cpu = default_timer() - start
+    assert all(count >= READ_BYTES for count in received.values())
+    assert len(received) == nodeCount
+    return clock.now, cpu
+
+
+def main():
+    nodeCount = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print()
+    print("{} nodes x {} bytes".format(nodeCount, READ_BYTES))
+    print("{:<10} {:<12} {:>12} {:>12}".format(
+        "link", "maxInFlight", "total time", "CPU time"))
+    for name, frameSeconds in SCENARIOS:
+        for maxInFlight in (1, 4, 16, nodeCount):
+            busTime, cpu = run(nodeCount, maxInFlight, frameSeconds)
+            print("{:<10} {:<12} {:>11.3f}s {:>10.1f}ms".format(
+                name, maxInFlight, busTime, cpu * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+'''
+Cost of CanPhysicalLayerGridConnect frame encoding.
+
+Compares the previous per-byte str.format encoder (kept here as
+legacyEncode) with encodeFrameAsData and with encodeFrameInto writing
+into a reused buffer (as sendAll does), for frames with 0 to 8 data
+bytes, and reports frames/sec.
+
+Usage:
+python3 bench_gridconnect_encode.py [repeat]
+'''
+import os
+import sys
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canframe import CanFrame  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    GC_FRAME_MAX_LEN,
+    CanPhysicalLayerGridConnect,
+)
+
+FRAME_COUNT = 100000
+
+
+def legacyEncode(frame: CanFrame) -> bytes:
+    output = ":X{:08X}N".format(frame.header)
+    for byte in frame.data:
+        output += "{:02X}".format(byte)
+    output += ";\n"
+    return output.encode("utf-8")
+
+
+def makeFrames():
+    return [CanFrame(0x19170365, bytearray(range(i % 9)))
+            for i in range(FRAME_COUNT)]
+
+
+def bench(name: str, frames: list, repeat: int) -> float:
+    physicalLayer = CanPhysicalLayerGridConnect()
+    buffer = bytearray(GC_FRAME_MAX_LEN * len(frames))
+    if name == "legacy":
+        def run():
+            for frame in frames:
+                legacyEncode(frame)
+    elif name == "encodeFrameAsData":
+        encode = physicalLayer.encodeFrameAsData
+
+        def run():
+            for frame in frames:
+                encode(frame)
+    else:
+        encodeInto = physicalLayer.encodeFrameInto
+
+        def run():
+            end = 0
+            for frame in frames:
+                end = encodeInto(frame, buffer, end)
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        run()
+        elapsed = default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return len(frames) / best
+
+
+def main():
+    repeat = 3
+    if len(sys.argv) > 1:
+        repeat = int(sys.argv[1])
+    frames = makeFrames()
+    for name in ("legacy", "encodeFrameAsData", "encodeFrameInto"):
+        rate = bench(name, frames, repeat)
+        print("{:<17} {:>12,.0f} frames/sec".format(name, rate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+'''
+Throughput of CanPhysicalLayerGridConnect receive parsing.
+
+Feeds buffers holding 1, 100 and 10,000 GridConnect frames to handleData,
+handleDataStrict and decodeBatch (columnar FrameBatch, reused between
+calls) and reports frames/sec.
+
+Usage:
+python3 bench_gridconnect_parse.py [repeat]
+'''
+import os
+import sys
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.canbus.framebatch import FrameBatch  # noqa: E402
+
+PACKETS = (
+    b":X19170365N020112FE056C;\n",
+    b":X19490365N;\n",
+    b":X1A123456N2043000000004040;\n",
+)
+
+
+def makeBuffer(frameCount: int) -> bytes:
+    return b"".join(PACKETS[i % len(PACKETS)] for i in range(frameCount))
+
+
+def ignoreFrame(frame):
+    pass
+
+
+def bench(method_name: str, frameCount: int, repeat: int) -> float:
+    buf = makeBuffer(frameCount)
+    physicalLayer = CanPhysicalLayerGridConnect()
+    physicalLayer.onFrameReceived = ignoreFrame
+    if method_name == "decodeBatch":
+        batch = FrameBatch(timestamps=True)
+
+        def method(data):
+            batch.clear()
+            return len(physicalLayer.decodeBatch(data, batch=batch))
+    else:
+        method = getattr(physicalLayer, method_name)
+    iterations = max(1, 100000 // frameCount)
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        for _ in range(iterations):
+            assert method(buf) == frameCount
+        elapsed = default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return frameCount * iterations / best
+
+
+def main():
+    repeat = 3
+    if len(sys.argv) > 1:
+        repeat = int(sys.argv[1])
+    for method_name in ("handleData", "handleDataStrict", "decodeBatch"):
+        for frameCount in (1, 100, 10000):
+            rate = bench(method_name, frameCount, repeat)
+            print("{:<17} {:>6} frames/buffer: {:>12,.0f} frames/sec"
+                  .format(method_name, frameCount, rate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+'''
+Request-to-wire latency of the OpenLCBNetwork listen thread: frames
+queued by another thread (sendMessage) wake the loop (Waker) vs being
+picked up when the loop's wait ends (maxWait poll, as before).
+
+Connects over a socketpair (the far end plays the GridConnect hub),
+waits for the alias reservation, then measures the time from
+sendMessage on the main thread until the far end receives the frame.
+
+Usage:
+python3 bench_listen_wakeup.py [samples]
+'''
+import os
+import socket
+import sys
+import threading
+import time
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.message import Message  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.openlcbnetwork import OpenLCBNetwork  # noqa: E402
+from openlcb.tcplink.tcpsocket import TcpSocket  # noqa: E402
+
+LOCAL_NODE_ID = "05.01.01.01.03.01"
+
+
+def listen(network):
+    try:
+        network._listen()
+    except (RuntimeError, OSError):
+        pass  # socket connection broken (the far end closed)
+
+
+def measure(wakeup: bool, samples: int):
+    near, far = socket.socketpair()
+    near.setblocking(False)
+    port = TcpSocket()
+    port._device = near
+    port._open = True
+    network = OpenLCBNetwork(LOCAL_NODE_ID)
+    network._port = port
+    thread = threading.Thread(target=listen, args=(network,), daemon=True)
+    thread.start()
+    start = default_timer()
+    while network.canLink.getState() != CanLink.State.Permitted:
+        if default_timer() - start > 5:
+            raise TimeoutError("Alias reservation did not finish")
+        time.sleep(.01)
+    if not wakeup:
+        network.physicalLayer.onQueuedFrame = None  # poll only
+    far.settimeout(.2)
+    try:
+        while far.recv(4096):
+            pass  # discard the reservation frames
+    except socket.timeout:
+        pass
+    far.settimeout(2.0)
+    latencies = []
+    message = Message(MTI.Producer_Consumer_Event_Report,
+                      network.canLink.localNodeID, None, bytearray(8))
+    for _ in range(samples):
+        time.sleep(.013)  # land at a random point of any poll interval
+        start = default_timer()
+        network.canLink.sendMessage(message)
+        received = b""
+        while b";" not in received:
+            received += far.recv(4096)
+        latencies.append(default_timer() - start)
+    far.close()
+    thread.join(2.0)
+    port.close()
+    latencies.sort()
+    return latencies
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    results = (("poll", measure(False, samples)),
+               ("wakeup", measure(True, samples)))
+    print()
+    print("{:<8} {:>14} {:>14} {:>14}".format(
+        "mode", "median send", "p99 send", "max send"))
+    for name, latencies in results:
+        print("{:<8} {:>12.3f}ms {:>12.3f}ms {:>12.3f}ms".format(
+            name, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * .99)] * 1000,
+            latencies[-1] * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+'''
+End-to-end time to read a config space from many simulated nodes
+through MemoryService.read: one read at a time for the whole network
+(as before) vs reads to every node at once, with one or two reads in
+flight per node (MemoryService.readWindow).
+
+The nodes and a shared link are simulated in virtual time (no
+sleeping): every 8-byte frame occupies the link for the scenario's
+frame time, each node takes ACK_SECONDS to accept a datagram
+(Datagram_Received_OK) and TURNAROUND_SECONDS to answer a read (echoing
+the space and address, as the Memory Configuration Standard requires).
+
+Usage:
+python3 bench_memory_read_nodes.py [nodes]
+'''
+import os
+import sys
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.datagramservice import DatagramService  # noqa: E402
+from openlcb.linklayer import LinkLayer  # noqa: E402
+from openlcb.memoryservice import MemoryService  # noqa: E402
+from openlcb.message import Message  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.nodeid import NodeID  # noqa: E402
+from openlcb.physicallayer import PhysicalLayer  # noqa: E402
+from openlcb.scheduler import Scheduler  # noqa: E402
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+FIRST_NODE_ID = 0x09_00_99_03_00_00
+SPACE_BYTES = 4096
+READ_SIZE = 64
+ACK_SECONDS = .002
+TURNAROUND_SECONDS = .005
+SCENARIOS = (  # (name, seconds per 8-byte frame)
+    ("CAN 125k", .001),
+    ("CAN 1M", .000125),
+    ("TCP", .00001),
+)
+MODES = (  # (name, all nodes at once, readWindow)
+    ("serial", False, 1),
+    ("window 1", True, 1),
+    ("window 2", True, 2),
+)
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SimulatedBus(LinkLayer):
+    """Delivers each Datagram to a simulated node, which replies with
+    Datagram_Received_OK then a read reply datagram.
+    """
+    class State:
+        Initial = 0
+        Disconnected = 1
+        Permitted = 2
+
+    DisconnectedState = State.Disconnected
+
+    def __init__(self, scheduler: Scheduler, frameSeconds: float):
+        super(SimulatedBus, self).__init__(PhysicalLayer(), LOCAL_NODE_ID)
+        self.scheduler = scheduler
+        self.frameSeconds = frameSeconds
+        self.service = None  # type: DatagramService
+        self.busFreeAt = 0.0
+
+    def _onStateChanged(self, oldState, newState):
+        pass
+
+    def transmit(self, dataLength: int) -> float:
+        """Occupy the bus (from now, or once free) for the frames of a
+        message (returns when the last frame arrives).
+        """
+        frames = max(1, (dataLength + 7) // 8)
+        start = max(self.scheduler.clock(), self.busFreeAt)
+        self.busFreeAt = start + frames * self.frameSeconds
+        return self.busFreeAt
+
+    def sendLater(self, delay: float, message: Message):
+        """Have a simulated node start sending message after delay."""
+        def send():
+            arrived = self.transmit(len(message.data))
+            self.scheduler.callAt(arrived,
+                                  lambda: self.service.process(message))
+        self.scheduler.callLater(delay, send)
+
+    def sendMessage(self, msg: Message, verbose=False):
+        arrived = self.transmit(len(msg.data))
+        if msg.mti != MTI.Datagram:
+            return  # (our Datagram_Received_OK for a read reply)
+        node = msg.destination
+        delay = arrived - self.scheduler.clock()
+        self.sendLater(delay + ACK_SECONDS, Message(
+            MTI.Datagram_Received_OK, node, LOCAL_NODE_ID))
+        request = msg.data
+        data = (bytearray([0x20, request[1] | 0x10]) + request[2:-1]
+                + bytearray(request[-1]))
+        self.sendLater(delay + TURNAROUND_SECONDS, Message(
+            MTI.Datagram, node, LOCAL_NODE_ID, data))
+
+
+def run(nodeCount: int, concurrent: bool, window: int,
+        frameSeconds: float):
+    clock = VirtualClock()
+    scheduler = Scheduler(clock=clock)
+    bus = SimulatedBus(scheduler, frameSeconds)
+    datagramService = DatagramService(bus)
+    bus.service = datagramService
+    memoryService = MemoryService(datagramService)
+    memoryService.readWindow = window
+    reads = [(NodeID(FIRST_NODE_ID + index), address)
+             for index in range(nodeCount)
+             for address in range(0, SPACE_BYTES, READ_SIZE)]
+    futures = []
+
+    def read(index: int):
+        nodeID, address = reads[index]
+        future = memoryService.read(nodeID, 0xFD, address, READ_SIZE)
+        futures.append(future)
+        if (not concurrent) and (index + 1 < len(reads)):
+            future.add_done_callback(lambda _: read(index + 1))
+
+    start = default_timer()
+    if concurrent:
+        for index in range(len(reads)):
+            read(index)
+    else:
+        read(0)
+    while True:
+        deadline = scheduler.nextDeadline()
+        if deadline is None:
+            break
+        clock.now = deadline
+        scheduler.runDue()
+    cpu = default_timer() - start
+    assert len(futures) == len(reads)
+    assert all(len(future.result(0)) == READ_SIZE for future in futures)
+    return clock.now, cpu
+
+
+def main():
+    nodeCount = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print()
+    print("{} nodes x {} bytes ({}-byte reads)".format(
+        nodeCount, SPACE_BYTES, READ_SIZE))
+    print("{:<10} {:<10} {:>12} {:>12}".format(
+        "link", "reads", "total time", "CPU time"))
+    for name, frameSeconds in SCENARIOS:
+        for mode, concurrent, window in MODES:
+            busTime, cpu = run(nodeCount, concurrent, window, frameSeconds)
+            print("{:<10} {:<10} {:>11.3f}s {:>10.1f}ms".format(
+                name, mode, busTime, cpu * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
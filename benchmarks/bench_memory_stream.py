@@ -0,0 +1,183 @@
+'''
+Download a 30 KB CDI from a node through MemoryService: 64-byte
+datagram reads (one at a time, as OpenLCBNetwork does) vs one stream
+read (MemoryService.read with stream=True).
+
+A client and a server stack (each a DatagramService, StreamService and
+MemoryService) share a link simulated in virtual time (no sleeping):
+each message occupies the link for the scenario's frame time per CAN
+frame it would take (8 bytes of a datagram, 7 bytes of stream data
+after the stream ID, or 6 bytes of another addressed message after the
+destination alias), then the receiving node takes NODE_SECONDS
+(DATAGRAM_SECONDS for a datagram) to act on it.
+
+Usage:
+python3 bench_memory_stream.py [kilobytes]
+'''
+import os
+import sys
+from logging import ERROR, getLogger
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.datagramservice import DatagramService  # noqa: E402
+from openlcb.linklayer import LinkLayer  # noqa: E402
+from openlcb.memoryservice import MemoryService  # noqa: E402
+from openlcb.message import Message  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.nodeid import NodeID  # noqa: E402
+from openlcb.physicallayer import PhysicalLayer  # noqa: E402
+from openlcb.scheduler import Scheduler  # noqa: E402
+from openlcb.streamservice import StreamService  # noqa: E402
+
+CLIENT_ID = NodeID("05.01.01.01.03.01")
+SERVER_ID = NodeID("09.00.99.03.00.01")
+CDI_SPACE = 0xFF
+READ_SIZE = 64
+NODE_SECONDS = .0005
+DATAGRAM_SECONDS = .005
+SCENARIOS = (  # (name, seconds per 8-byte frame)
+    ("CAN 125k", .001),
+    ("CAN 1M", .000125),
+    ("TCP", .00001),
+)
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def frameCount(message: Message) -> int:
+    size = len(message.data)
+    if message.mti == MTI.Datagram:
+        return max(1, (size + 7) // 8)
+    if message.mti == MTI.Stream_Data_Send:
+        return max(1, (size - 1 + 6) // 7)
+    return max(1, (size + 5) // 6)
+
+
+class SimulatedLink(LinkLayer):
+    """One node's end of a link shared by every SimulatedLink of the
+    same bus (each message is delivered to the stack of its
+    destination).
+    """
+    class State:
+        Initial = 0
+        Disconnected = 1
+        Permitted = 2
+
+    DisconnectedState = State.Disconnected
+
+    def __init__(self, bus: 'Bus', localNodeID: NodeID):
+        super(SimulatedLink, self).__init__(PhysicalLayer(), localNodeID)
+        self.bus = bus
+        self.scheduler = bus.scheduler
+
+    def _onStateChanged(self, oldState, newState):
+        pass
+
+    def sendMessage(self, msg: Message, verbose=False):
+        self.bus.transmit(msg)
+
+
+class Bus:
+    def __init__(self, scheduler: Scheduler, frameSeconds: float):
+        self.scheduler = scheduler
+        self.frameSeconds = frameSeconds
+        self.busFreeAt = 0.0
+        self.stacks = {}  # type: dict[NodeID, MemoryService]
+        self.messages = 0
+        self.frames = 0
+
+    def addStack(self, nodeID: NodeID) -> MemoryService:
+        link = SimulatedLink(self, nodeID)
+        stack = MemoryService(DatagramService(link), StreamService(link))
+        self.stacks[nodeID] = stack
+        return stack
+
+    def transmit(self, message: Message):
+        frames = frameCount(message)
+        self.messages += 1
+        self.frames += frames
+        start = max(self.scheduler.clock(), self.busFreeAt)
+        self.busFreeAt = start + frames * self.frameSeconds
+        delay = (DATAGRAM_SECONDS if message.mti == MTI.Datagram
+                 else NODE_SECONDS)
+        stack = self.stacks[message.destination]
+        self.scheduler.callAt(self.busFreeAt + delay,
+                              lambda: self.deliver(stack, message))
+
+    @staticmethod
+    def deliver(stack: MemoryService, message: Message):
+        stack.service.process(message)
+        stack.streamService.process(message)
+
+
+def run(cdi: bytearray, stream: bool, frameSeconds: float):
+    clock = VirtualClock()
+    scheduler = Scheduler(clock=clock)
+    bus = Bus(scheduler, frameSeconds)
+    client = bus.addStack(CLIENT_ID)
+    server = bus.addStack(SERVER_ID)
+    server.memory.setSlice(CDI_SPACE, 0, cdi)
+    data = bytearray()
+    finished = []
+    requests = [0]
+
+    def read(address: int):
+        size = len(cdi) if stream else min(READ_SIZE, len(cdi) - address)
+        requests[0] += 1
+        future = client.read(SERVER_ID, CDI_SPACE, address, size,
+                             stream=stream)
+        future.add_done_callback(lambda future: received(future.result(0)))
+
+    def received(chunk: bytearray):
+        data.extend(chunk)
+        if len(data) < len(cdi):
+            read(len(data))
+        else:
+            finished.append(clock.now)
+
+    start = default_timer()
+    read(0)
+    while not finished:
+        deadline = scheduler.nextDeadline()
+        if deadline is None:
+            break
+        clock.now = deadline
+        scheduler.runDue()
+    cpu = default_timer() - start
+    assert data == cdi
+    return requests[0], bus.messages, bus.frames, finished[0], cpu
+
+
+def main():
+    kilobytes = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    getLogger("openlcb").setLevel(ERROR)  # (setSlice warns as CDI grows)
+    size = kilobytes * 1024
+    cdi = bytearray(b"<cdi>" * (size // 5 + 1))[:size]
+    print()
+    print("{} KB CDI ({}-byte datagram reads vs one stream read)".format(
+        kilobytes, READ_SIZE))
+    print("{:<10} {:<9} {:>9} {:>9} {:>8} {:>11} {:>10}".format(
+        "link", "reads", "requests", "messages", "frames", "total time",
+        "CPU time"))
+    for name, frameSeconds in SCENARIOS:
+        for mode, stream in (("datagram", False), ("stream", True)):
+            requests, messages, frames, busTime, cpu = \
+                run(cdi, stream, frameSeconds)
+            print("{:<10} {:<9} {:>9} {:>9} {:>8} {:>10.3f}s {:>8.1f}ms"
+                  .format(name, mode, requests, messages, frames, busTime,
+                          cpu * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
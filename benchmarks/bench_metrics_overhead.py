@@ -0,0 +1,91 @@
+'''
+Receive cost per frame with metrics off and on.
+
+Feeds a GridConnect capture (event reports and 9-frame datagrams) to
+CanPhysicalLayerGridConnect.handleData with a CanLink in Permitted
+state, once with metrics disabled (the default: each instrumented path
+only checks that its metrics attribute is None) and once enabled, and
+prints the time per frame and the exported metrics of the enabled run.
+
+Usage:
+python3 bench_metrics_overhead.py [repeat]
+'''
+import os
+import sys
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb import metrics  # noqa: E402
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.nodeid import NodeID  # noqa: E402
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+FAR_NODE_ID = NodeID("09.00.99.03.00.35")
+FAR_ALIAS = 0x123
+
+
+def capture() -> bytes:
+    lines = []
+    for index in range(100):
+        lines.append(":X195B4{:03X}N01020304050607{:02X};".format(
+            FAR_ALIAS, index))
+    datagram = ["1B", "1C", "1C", "1C", "1C", "1C", "1C", "1C", "1D"]
+    for _ in range(10):
+        for frameType in datagram:
+            lines.append(":X{}{:03X}{:03X}N2053000000000000;".format(
+                frameType, 0x365, FAR_ALIAS))
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+def run(enabled: bool, data: bytes, repeat: int):
+    if enabled:
+        registry = metrics.enableMetrics(metrics.MetricsRegistry())
+    else:
+        registry = None
+        metrics.disableMetrics()
+    physicalLayer = CanPhysicalLayerGridConnect()
+    canLink = CanLink(physicalLayer, LOCAL_NODE_ID)
+    canLink._state = CanLink.State.Permitted  # skip alias reservation
+    canLink._localAlias = 0x365
+    canLink.nodeIdToAlias[LOCAL_NODE_ID] = 0x365
+    canLink.aliasToNodeID[0x365] = LOCAL_NODE_ID
+    canLink.aliasToNodeID[FAR_ALIAS] = FAR_NODE_ID
+    canLink.nodeIdToAlias[FAR_NODE_ID] = FAR_ALIAS
+    frames = 0
+    start = default_timer()
+    for _ in range(repeat):
+        frames += physicalLayer.handleData(data)
+    elapsed = default_timer() - start
+    metrics.disableMetrics()
+    return elapsed / frames, registry
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    data = capture()
+    run(False, data, 1)  # warm up
+    results = {}
+    registry = None
+    for name, enabled in (("disabled", False), ("enabled", True),
+                          ("disabled", False), ("enabled", True)):
+        perFrame, usedRegistry = run(enabled, data, repeat)
+        results[name] = min(results.get(name, perFrame), perFrame)
+        if usedRegistry is not None:
+            registry = usedRegistry
+    for name in ("disabled", "enabled"):
+        print("{:<10} {:>8.2f} us/frame".format(name, results[name] * 1e6))
+    print("{:<10} {:>+8.1f}%".format(
+        "overhead", (results["enabled"] / results["disabled"] - 1) * 100))
+    print()
+    print(registry.exportText())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+'''
+Many CAN segments driven by one OpenLCBNetwork listen thread each vs
+one Reactor thread.
+
+Connects each segment over a socketpair (the far end plays the
+GridConnect hub), waits for every alias reservation, then measures:
+- CPU time per second while all segments are idle,
+- latency from the far end sending a global AME on one segment until
+  the AMD reply arrives.
+
+Usage:
+python3 bench_reactor_segments.py [segments] [samples]
+'''
+import os
+import socket
+import sys
+import threading
+import time
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.nodeid import NodeID  # noqa: E402
+from openlcb.openlcbnetwork import OpenLCBNetwork  # noqa: E402
+from openlcb.reactor import Reactor  # noqa: E402
+from openlcb.tcplink.tcpsocket import TcpSocket  # noqa: E402
+
+FIRST_NODE_ID = 0x05_01_01_01_03_00
+IDLE_SECONDS = 1.0
+
+
+def makePort():
+    near, far = socket.socketpair()
+    near.setblocking(False)
+    port = TcpSocket()
+    port._device = near
+    port._open = True
+    return port, far
+
+
+def waitPermitted(canLinks):
+    start = default_timer()
+    while any(canLink.getState() != CanLink.State.Permitted
+              for canLink in canLinks):
+        if default_timer() - start > 10:
+            raise TimeoutError("Alias reservation did not finish")
+        time.sleep(.01)
+
+
+def discard(fars):
+    for far in fars:
+        far.settimeout(.05)
+        try:
+            while far.recv(4096):
+                pass  # discard the reservation frames
+        except socket.timeout:
+            pass
+
+
+def measure(canLinks, fars, samples: int):
+    """Call from a thread other than the one(s) driving the ports."""
+    waitPermitted(canLinks)
+    discard(fars)
+    before = time.process_time()
+    time.sleep(IDLE_SECONDS)
+    cpu = (time.process_time() - before) / IDLE_SECONDS
+    latencies = []
+    for index in range(samples):
+        far = fars[index % len(fars)]
+        far.settimeout(2.0)
+        time.sleep(.013)  # land at a random point of any poll interval
+        start = default_timer()
+        far.sendall(b":X10702123N;")  # global AME
+        received = b""
+        while b":X10701" not in received:  # AMD
+            received += far.recv(4096)
+        latencies.append(default_timer() - start)
+    latencies.sort()
+    return cpu, latencies
+
+
+def runThreads(segments: int, samples: int):
+    networks = []
+    fars = []
+    for index in range(segments):
+        port, far = makePort()
+        network = OpenLCBNetwork(NodeID(FIRST_NODE_ID + index))
+        network.startListening(port)
+        networks.append(network)
+        fars.append(far)
+    try:
+        return measure([network.canLink for network in networks], fars,
+                       samples)
+    finally:
+        for far in fars:
+            far.close()  # each listen thread stops on the broken socket
+
+
+def runReactor(segments: int, samples: int):
+    reactor = Reactor()
+    canLinks = []
+    fars = []
+    for index in range(segments):
+        port, far = makePort()
+        physicalLayer = CanPhysicalLayerGridConnect()
+        canLinks.append(CanLink(physicalLayer,
+                                NodeID(FIRST_NODE_ID + index),
+                                scheduler=reactor.scheduler))
+        reactor.addPort(port, physicalLayer)
+        fars.append(far)
+    thread = threading.Thread(target=reactor.run, daemon=True)
+    thread.start()
+    try:
+        return measure(canLinks, fars, samples)
+    finally:
+        reactor.stop()
+        thread.join(2.0)
+        reactor.close()
+        for far in fars:
+            far.close()
+
+
+def main():
+    segments = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    results = (("threads", runThreads(segments, samples)),
+               ("reactor", runReactor(segments, samples)))
+    print()
+    print("{} segments".format(segments))
+    print("{:<8} {:>10} {:>14} {:>14}".format(
+        "driver", "idle CPU", "median AMD", "p99 AMD"))
+    for name, (cpu, latencies) in results:
+        print("{:<8} {:>9.1f}% {:>12.3f}ms {:>12.3f}ms".format(
+            name, cpu * 100, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * .99)] * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
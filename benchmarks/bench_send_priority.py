@@ -0,0 +1,109 @@
+'''
+Event report latency behind bulk traffic, FIFO vs priority send queue.
+
+A 1 KB bulk memory write (16 write datagrams of 64 bytes, 9 frames
+each) is queued, then a Producer/Consumer Event Report. Reports how
+many frames are sent before the event and the resulting wire latency
+on a 125 kbit/s CAN bus, with the previous single FIFO (a one-level
+FrameQueue) and with CanPhysicalLayer's priority levels, and the queue
+overhead per frame (append and pop) of each compared to a deque.
+
+Usage:
+python3 bench_send_priority.py [repeat]
+'''
+import os
+import sys
+from collections import deque
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canframe import CanFrame  # noqa: E402
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.framequeue import FrameQueue  # noqa: E402
+from openlcb.message import Message  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.nodeid import NodeID  # noqa: E402
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+FAR_NODE_ID = NodeID("09.00.99.03.00.35")
+BITRATE = 125000
+
+
+def frameBits(frame: CanFrame) -> int:
+    """Approximate bits on the wire of an extended CAN frame
+    (67 bits of overhead plus data, without stuff bits).
+    """
+    return 67 + 8 * len(frame.data)
+
+
+def makeStack(fifo: bool):
+    physicalLayer = CanPhysicalLayerGridConnect()
+    if fifo:
+        physicalLayer._send_frames = FrameQueue()
+    canLink = CanLink(physicalLayer, LOCAL_NODE_ID)
+    canLink._state = CanLink.State.Permitted  # skip alias reservation
+    canLink.nodeIdToAlias[LOCAL_NODE_ID] = canLink._localAlias
+    canLink.nodeIdToAlias[FAR_NODE_ID] = 0x123
+    return physicalLayer, canLink
+
+
+def latency(fifo: bool):
+    physicalLayer, canLink = makeStack(fifo)
+    for index in range(16):
+        data = bytearray([0x20, 0x00, 0, 0, (index * 64) >> 8,
+                          (index * 64) & 0xFF]) + bytearray(64)
+        canLink.sendMessage(Message(MTI.Datagram, LOCAL_NODE_ID,
+                                    FAR_NODE_ID, data))
+    canLink.sendMessage(Message(MTI.Producer_Consumer_Event_Report,
+                                LOCAL_NODE_ID, None, bytearray(8)))
+    ahead = 0
+    bits = 0
+    while True:
+        frame = physicalLayer.pollFrame()
+        bits += frameBits(frame)
+        if (frame.header >> 12) & 0xFFF == 0x5B4:
+            return ahead, bits / BITRATE
+        ahead += 1
+
+
+def overhead(queue, frames, repeat: int) -> float:
+    start = default_timer()
+    for _ in range(repeat):
+        for frame in frames:
+            queue.append(frame)
+        while queue:
+            queue.popleft()
+    return (default_timer() - start) / (repeat * len(frames))
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("{:<10} {:>14} {:>14}".format(
+        "queue", "frames ahead", "event latency"))
+    for name, fifo in (("FIFO", True), ("priority", False)):
+        ahead, seconds = latency(fifo)
+        print("{:<10} {:>14} {:>12.2f}ms".format(name, ahead,
+                                                 seconds * 1000))
+    frames = [CanFrame(0x1B12_3365, bytearray(8))] * 140
+    frames += [CanFrame(0x195B_4365, bytearray(8))] * 4
+    queues = (
+        ("deque", deque()),
+        ("FIFO", FrameQueue()),
+        ("priority", FrameQueue(CanPhysicalLayerGridConnect.SEND_LEVELS,
+                                CanPhysicalLayerGridConnect.framePriority)),
+    )
+    print()
+    for name, queue in queues:
+        print("{:<10} {:>8.0f} ns/frame (append + pop)".format(
+            name, overhead(queue, frames, repeat) * 1e9))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
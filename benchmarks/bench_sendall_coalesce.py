@@ -0,0 +1,110 @@
+'''
+Syscalls and wall time of CanPhysicalLayerGridConnect.sendAll for a bulk
+CDI write (1 KB as 16 Memory Configuration write datagrams of 64 bytes,
+9 frames each) with coalesced writes on (default maxSendBatch) and off
+(maxSendBatch = 1), over a local socket pair.
+
+Usage:
+python3 bench_sendall_coalesce.py [repeat]
+'''
+import os
+import socket
+import sys
+import threading
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.message import Message  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.nodeid import NodeID  # noqa: E402
+from openlcb.tcplink.tcpsocket import TcpSocket  # noqa: E402
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+FAR_NODE_ID = NodeID("09.00.99.03.00.35")
+CDI_SIZE = 1024
+CHUNK = 64
+
+
+class CountingSocket(TcpSocket):
+    """TcpSocket around an already-connected socket that counts sends."""
+    def __init__(self, sock):
+        TcpSocket.__init__(self)
+        self._device = sock
+        self.sendCount = 0
+
+    def _send(self, data):
+        self.sendCount += 1
+        TcpSocket._send(self, data)
+
+
+def drain(sock):
+    while True:
+        if not sock.recv(65536):
+            return
+
+
+def makeStack():
+    physicalLayer = CanPhysicalLayerGridConnect()
+    canLink = CanLink(physicalLayer, LOCAL_NODE_ID)
+    canLink._state = CanLink.State.Permitted  # skip alias reservation
+    canLink.nodeIdToAlias[LOCAL_NODE_ID] = canLink._localAlias
+    canLink.nodeIdToAlias[FAR_NODE_ID] = 0x123
+    return physicalLayer, canLink
+
+
+def enqueueCDIWrite(canLink):
+    for address in range(0, CDI_SIZE, CHUNK):
+        data = bytearray([0x20, 0x03])  # Write_Command, CDI space
+        data += address.to_bytes(4, "big")
+        data += bytes(CHUNK)
+        canLink.sendMessage(Message(MTI.Datagram, LOCAL_NODE_ID,
+                                    FAR_NODE_ID, data))
+
+
+def bench(maxSendBatch, repeat, iterations=200):
+    a, b = socket.socketpair()
+    reader = threading.Thread(target=drain, args=(b,), daemon=True)
+    reader.start()
+    port = CountingSocket(a)
+    physicalLayer, canLink = makeStack()
+    physicalLayer.maxSendBatch = maxSendBatch
+    best = None
+    frames = 0
+    for _ in range(repeat):
+        port.sendCount = 0
+        elapsed = 0.0
+        for _ in range(iterations):
+            enqueueCDIWrite(canLink)
+            start = default_timer()
+            frames = physicalLayer.sendAll(port)
+            elapsed += default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    a.close()
+    reader.join()
+    b.close()
+    return frames, port.sendCount / iterations, best / iterations
+
+
+def main():
+    repeat = 3
+    if len(sys.argv) > 1:
+        repeat = int(sys.argv[1])
+    for label, maxSendBatch in (
+            ("per-frame", 1),
+            ("coalesced", CanPhysicalLayerGridConnect().maxSendBatch)):
+        frames, sends, seconds = bench(maxSendBatch, repeat)
+        print("{:<10} {} frames: {:>6.1f} send calls, {:>8.1f} us per 1 KB"
+              " CDI write".format(label, frames, sends, seconds * 1e6))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
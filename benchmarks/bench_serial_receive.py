@@ -0,0 +1,112 @@
+'''
+SerialLink receive throughput over a pty pair (Linux/macOS).
+
+A writer thread sends GridConnect frames to the pty master while the
+SerialLink on the slave side feeds CanPhysicalLayerGridConnect. Compares
+the previous byte-at-a-time read(1) loop (LegacySerialLink) with bulk
+reads (receiveAll) and with the reader thread, and reports frames/sec
+and port reads per frame.
+
+Usage:
+python3 bench_serial_receive.py [frame_count]
+'''
+import os
+import sys
+import threading
+from timeit import default_timer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    GC_END_BYTE,
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.canbus.seriallink import MSGLEN, SerialLink  # noqa: E402
+
+PACKET = b":X19170365N020112FE056C;\n"
+
+
+class LegacySerialLink(SerialLink):
+    """The previous implementation of _receive (one read per byte)."""
+    def _receive(self):
+        data = bytearray()
+        bytes_recd = 0
+        while bytes_recd < MSGLEN:
+            chunk = self._device.read(1)
+            self.reads += 1
+            if chunk == b'':
+                raise RuntimeError("serial connection broken")
+            data.extend(chunk)
+            bytes_recd = bytes_recd + len(chunk)
+            if GC_END_BYTE in chunk:
+                break
+        return data
+
+
+class CountingSerialLink(SerialLink):
+    def _readAvailable(self):
+        self.reads += 1
+        return SerialLink._readAvailable(self)
+
+    def _receiveInto(self, buffer):
+        if self._reader is None:
+            self.reads += 1
+        return SerialLink._receiveInto(self, buffer)
+
+
+def writeAll(fd: int, data: bytes):
+    with memoryview(data) as view:
+        sent = 0
+        while sent < len(view):
+            sent += os.write(fd, view[sent:sent+4096])
+
+
+def bench(name: str, frameCount: int):
+    master, slave = os.openpty()
+    link = LegacySerialLink() if name == "read(1)" else CountingSerialLink()
+    link.reads = 0
+    link.connectLocal(os.ttyname(slave))
+    os.close(slave)
+    physicalLayer = CanPhysicalLayerGridConnect()
+    frames = [0]
+
+    def onFrame(frame):
+        frames[0] += 1
+    physicalLayer.onFrameReceived = onFrame
+    if name == "reader thread":
+        link.startReader()
+    writer = threading.Thread(target=writeAll,
+                              args=(master, PACKET * frameCount),
+                              daemon=True)
+    start = default_timer()
+    writer.start()
+    while frames[0] < frameCount:
+        if name == "read(1)":
+            physicalLayer.handleData(link.receive())
+        else:
+            physicalLayer.receiveAll(link)
+    elapsed = default_timer() - start
+    writer.join()
+    link.close()
+    os.close(master)
+    return frameCount / elapsed, link.reads / frameCount
+
+
+def main():
+    if not hasattr(os, "openpty"):
+        print("This benchmark requires a pty (Linux/macOS).")
+        return 1
+    frameCount = 20000
+    if len(sys.argv) > 1:
+        frameCount = int(sys.argv[1])
+    for name in ("read(1)", "bulk", "reader thread"):
+        rate, readsPerFrame = bench(name, frameCount)
+        print("{:<14} {:>10,.0f} frames/sec {:>8.2f} reads/frame"
+              .format(name, rate, readsPerFrame))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+'''
+Sustained CDI download throughput through a lossy adapter, with the
+transmit shaper off, fixed, and adaptive.
+
+Simulated in virtual time (so results do not depend on this machine):
+several configuration tools each read the CDI of the local node 64
+bytes at a time (8 concurrent downloads), so each reply is a 9-frame
+datagram queued by CanLink. The adapter is a cheap one: an 8-frame
+transmit buffer drained at 125 kbit/s, dropping frames written while
+the buffer is full. A tool that receives an incomplete datagram replies
+Datagram Rejected (temporary error, "out of order") and reads the chunk
+again; one that receives nothing times out after TIMEOUT. The fixed
+shaper is set to the bus bitrate, and the adaptive one starts at 4
+times that (such as configured for a 500 kbit/s bus) and backs off on
+the rejections.
+
+Usage:
+python3 bench_shaper_cdi.py [seconds]
+'''
+import os
+import sys
+from collections import deque
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if os.path.isfile(os.path.join(REPO_DIR, "openlcb", "__init__.py")):
+    sys.path.insert(0, REPO_DIR)
+
+from openlcb.canbus.canframe import CanFrame  # noqa: E402
+from openlcb.canbus.canlink import CanLink  # noqa: E402
+from openlcb.canbus.canphysicallayergridconnect import (  # noqa: E402
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.canbus.shaper import (  # noqa: E402
+    TokenBucketShaper,
+    canFrameBits,
+)
+from openlcb.message import Message  # noqa: E402
+from openlcb.mti import MTI  # noqa: E402
+from openlcb.nodeid import NodeID  # noqa: E402
+from openlcb.portinterface import PortInterface  # noqa: E402
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+BITRATE = 125000
+ADAPTER_FRAMES = 8
+TOOLS = 8
+CHUNK = 64
+STEP = .0005  # seconds per loop iteration (sendAll, then bus)
+TOOL_DELAY = .002  # tool's ack and next request (round trip)
+TIMEOUT = .5
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LossyAdapter(PortInterface):
+    """Transmit buffer of ADAPTER_FRAMES drained at BITRATE."""
+    def __init__(self, clock, deliver):
+        PortInterface.__init__(self)
+        self.clock = clock
+        self.deliver = deliver
+        self.buffer = deque()
+        self.dropped = 0
+        self._credit = 0.0
+        self._last = 0.0
+        self._decoder = CanPhysicalLayerGridConnect()
+        self._decoder.onFrameReceived = self._accept
+
+    def _send(self, data):
+        self._decoder.handleData(bytes(data))
+
+    def _accept(self, frame: CanFrame):
+        if len(self.buffer) >= ADAPTER_FRAMES:
+            self.dropped += 1
+        else:
+            self.buffer.append(frame)
+
+    def drain(self):
+        now = self.clock()
+        self._credit += (now - self._last) * BITRATE
+        self._last = now
+        while self.buffer:
+            bits = canFrameBits(len(self.buffer[0].data))
+            if self._credit < bits:
+                return
+            self._credit -= bits
+            self.deliver(self.buffer.popleft())
+        self._credit = 0.0  # an idle bus can't save time for later
+
+
+class Tool:
+    """A configuration tool reading the CDI of the local node."""
+    def __init__(self, index: int):
+        self.alias = 0x100 + index
+        self.nodeID = NodeID(0x09_00_00_00_01_00 + index)
+        self.frames = None  # frames of the reply so far, or None
+        self.requestAt = 0.0  # when the local node sends the next reply
+        self.sentAt = None  # when the current reply was requested
+        self.bytesRead = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+
+def run(shaper, seconds: float):
+    clock = VirtualClock()
+    physicalLayer = CanPhysicalLayerGridConnect()
+    canLink = CanLink(physicalLayer, LOCAL_NODE_ID)
+    canLink._state = CanLink.State.Permitted  # skip alias reservation
+    canLink.nodeIdToAlias[LOCAL_NODE_ID] = canLink._localAlias
+    canLink.aliasToNodeID[canLink._localAlias] = LOCAL_NODE_ID
+    tools = {}
+    for index in range(TOOLS):
+        tool = Tool(index)
+        tools[tool.alias] = tool
+        canLink.nodeIdToAlias[tool.nodeID] = tool.alias
+        canLink.aliasToNodeID[tool.alias] = tool.nodeID
+    if shaper is not None:
+        shaper.clock = clock
+        shaper._last = 0.0
+    physicalLayer.shaper = shaper
+    reply = bytearray([0x20, 0x53, 0, 0, 0, 0]) + bytearray(CHUNK)
+    replyFrames = (len(reply) + 7) // 8
+
+    def retry(tool: Tool, reject: bool):
+        tool.frames = None
+        tool.sentAt = None
+        tool.requestAt = clock.now + TOOL_DELAY
+        if reject:
+            tool.rejected += 1
+            code = 0x2040  # temporary error: out of order
+            physicalLayer.fireFrameReceived(CanFrame(
+                0x19A4_8000 | tool.alias,
+                bytearray([canLink._localAlias >> 8,
+                           canLink._localAlias & 0xFF,
+                           code >> 8, code & 0xFF])))
+
+    def deliver(frame: CanFrame):
+        tool = tools.get((frame.header >> 12) & 0xFFF)
+        if tool is None:
+            return
+        frameType = (frame.header >> 24) & 0x1F
+        if frameType == 0x1B:  # first
+            if tool.frames is not None:
+                retry(tool, True)
+                return
+            tool.frames = 1
+        elif tool.frames is None:
+            retry(tool, True)  # middle or last without first
+            return
+        else:
+            tool.frames += 1
+        if frameType == 0x1D:  # last
+            if tool.frames != replyFrames:
+                retry(tool, True)
+                return
+            tool.bytesRead += CHUNK
+            retry(tool, False)
+
+    adapter = LossyAdapter(clock, deliver)
+    while clock.now < seconds:
+        for tool in tools.values():
+            if tool.sentAt is None:
+                if clock.now >= tool.requestAt:
+                    tool.sentAt = clock.now
+                    canLink.sendMessage(Message(MTI.Datagram, LOCAL_NODE_ID,
+                                                tool.nodeID, reply))
+            elif clock.now - tool.sentAt > TIMEOUT:
+                tool.timeouts += 1
+                retry(tool, False)
+        physicalLayer.sendAll(adapter)
+        clock.now += STEP
+        adapter.drain()
+    total = sum(tool.bytesRead for tool in tools.values())
+    rejected = sum(tool.rejected for tool in tools.values())
+    timeouts = sum(tool.timeouts for tool in tools.values())
+    return total / seconds, adapter.dropped, rejected, timeouts
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 20.0
+    configs = (
+        ("off", lambda: None),
+        ("fixed", lambda: TokenBucketShaper(
+            BITRATE, unit=TokenBucketShaper.BITS)),
+        ("adaptive", lambda: TokenBucketShaper(
+            BITRATE * 4, unit=TokenBucketShaper.BITS, adaptive=True)),
+    )
+    print("{:<10} {:>10} {:>9} {:>9} {:>9}".format(
+        "shaper", "CDI B/s", "dropped", "rejected", "timeouts"))
+    for name, makeShaper in configs:
+        rate, dropped, rejected, timeouts = run(makeShaper(), seconds)
+        print("{:<10} {:>10.0f} {:>9} {:>9} {:>9}".format(
+            name, rate, dropped, rejected, timeouts))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+'''
+asyncio support for PortInterface implementations.
+
+AsyncPort wraps a connected port (such as TcpSocket, or SerialLink) so
+that a coroutine can await incoming data instead of polling: the port's
+file descriptor (See PortInterface.fileno) is watched with the event
+loop's add_reader. Ports without one (SerialLink with its reader
+thread, or any port on an event loop without add_reader, such as the
+Windows proactor loop) are waited on using the port's waitReadable in
+the loop's default executor instead.
+
+Send and receive are delegated to the wrapped port and stay
+non-blocking, so an AsyncPort can be passed to a physical layer's
+sendAll and receiveAll like the port itself (See OpenLCBNetwork.run).
+'''
+import asyncio
+
+from logging import getLogger
+from typing import Union
+
+from openlcb.portinterface import PortInterface
+from openlcb.waker import Waker
+
+logger = getLogger(__name__)
+
+
+class AsyncPort(PortInterface):
+    """Await data from a PortInterface in an asyncio event loop.
+
+    Args:
+        port (PortInterface): A connected port in non-blocking mode
+            (such as TcpSocket after connect, or SerialLink after
+            startReader).
+
+    Attributes:
+        port (PortInterface): The wrapped port.
+        threadWait (float): Longest a waitReadable call in the executor
+            blocks (seconds), so executor threads end promptly on
+            detach (only used if the port has no file descriptor).
+    """
+    threadWait = .25
+
+    def __init__(self, port: PortInterface):
+        PortInterface.__init__(self)
+        self.port = port
+        self._device = port._device
+        self._open = port._open
+        self._loop = None  # type: Union[asyncio.AbstractEventLoop, None]
+        self._event = None  # type: Union[asyncio.Event, None]
+        # ^ set when data may be available or on wakeup
+        self._fd = None  # watched using add_reader (See attach)
+        self._woken = False  # wakeup already scheduled
+        self._portWait = None  # type: Union[asyncio.Future, None]
+
+    def attach(self, loop: Union[asyncio.AbstractEventLoop, None] = None):
+        """Start watching the port in loop (Call from the loop's thread).
+
+        Args:
+            loop (asyncio.AbstractEventLoop, optional): Defaults to the
+                running loop.
+        """
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        self.detach()
+        self._loop = loop
+        self._event = asyncio.Event()
+        fd = self.port.fileno()
+        if fd is None:
+            return
+        try:
+            loop.add_reader(fd, self._event.set)
+        except (NotImplementedError, ValueError, OSError) as ex:
+            logger.info("Waiting for {} data using a thread ({})"
+                        .format(type(self.port).__name__, ex))
+            return
+        self._fd = fd
+
+    def detach(self):
+        """Stop watching the port (Call from the loop's thread)."""
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self._loop = None
+        self._portWait = None
+
+    def wakeup(self):
+        """End the current (or next) waitReadableAsync early, such as
+        when a frame is queued to send. Safe to call from any thread.
+        """
+        loop = self._loop
+        if (loop is None) or self._woken:
+            return
+        self._woken = True
+        try:
+            loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass  # loop closed
+
+    async def waitReadableAsync(self, timeout: Union[float, None] = None
+                                ) -> bool:
+        """Wait until data may be available, wakeup is called, or
+        timeout seconds pass (Call attach first).
+
+        Args:
+            timeout (Union[float, None]): Maximum seconds to wait (None
+                waits until data or wakeup).
+
+        Returns:
+            bool: False on timeout.
+        """
+        event = self._event
+        if self._fd is None:
+            self._startPortWait(timeout)
+        if not event.is_set():
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        event.clear()
+        self._woken = False
+        return True
+
+    def _startPortWait(self, timeout: Union[float, None]):
+        """Wait using the port's waitReadable in the default executor
+        (at most threadWait, so the thread can't outlive the loop).
+        """
+        if self._portWait is not None:
+            return  # a previous wait is still running
+        if (timeout is None) or (timeout > self.threadWait):
+            timeout = self.threadWait
+        future = self._loop.run_in_executor(None, self.port.waitReadable,
+                                            timeout)
+        self._portWait = future
+        future.add_done_callback(self._onPortWaitDone)
+
+    def _onPortWaitDone(self, future: asyncio.Future):
+        if future is not self._portWait:
+            return  # detached since
+        self._portWait = None
+        if future.cancelled() or (future.exception() is not None):
+            self._event.set()  # receive will raise the error if any
+        elif future.result():
+            self._event.set()
+
+    def _settimeout(self, seconds):
+        return self.port.settimeout(seconds)
+
+    def _connect(self, host, port, device=None):
+        result = self.port.connect(host, port, device=device)
+        self._device = self.port._device
+        return result
+
+    def _send(self, data: Union[bytes, bytearray]) -> None:
+        self.port.send(data)
+
+    def _receive(self) -> Union[bytearray, bytes, None]:
+        return self.port.receive()
+
+    def _receiveInto(self, buffer: memoryview) -> Union[int, None]:
+        return self.port.receiveInto(buffer)
+
+    def _waitReadable(self, timeout: Union[float, None],
+                      waker: Union[Waker, None] = None) -> bool:
+        return self.port.waitReadable(timeout, waker)
+
+    def _fileno(self) -> Union[int, None]:
+        return self.port.fileno()
+
+    def _close(self) -> None:
+        if self._loop is not None:
+            self.detach()
+        return self.port.close()
@@ -0,0 +1,166 @@
+'''
+Aliases for virtual nodes that share one CanLink.
+
+CanLink reserves the alias of its own localNodeID with its state
+machine. Each NodeID added to an AliasPool gets an alias reserved the
+same way (CID 7 to 4, wait for collisions, RID, AMD), but entries do
+not wait for each other: every entry whose CID 4 frame has been sent is
+queued with the time it was sent, and all of them become ready at once
+after CanLink.ALIAS_RESPONSE_DELAY, so hundreds of aliases are reserved
+in the same 200 ms window (CanLink schedules one timer for the oldest
+waiting entry; See nextReadyTime).
+'''
+from collections import deque
+from enum import Enum
+from typing import Iterator, List, Union
+
+from openlcb.nodeid import NodeID
+
+
+class AliasState(Enum):
+    """Reservation progress of one AliasPool entry.
+
+    Attributes:
+        Pending: No CID frames enqueued yet (link not up, or restarted
+            after a collision).
+        CheckingID: CID 7 to 4 enqueued. Collisions are detected until
+            ALIAS_RESPONSE_DELAY after CID 4 was sent.
+        Reserving: RID and AMD enqueued.
+        Permitted: AMD sent; alias is mapped and may be used.
+    """
+    Pending = 1
+    CheckingID = 2
+    Reserving = 3
+    Permitted = 4
+
+
+class AliasEntry:
+    """The alias and reservation state for one virtual NodeID.
+
+    Attributes:
+        generation (int): Incremented whenever the alias changes, so
+            waiting records for an older alias are ignored.
+    """
+    __slots__ = ("nodeID", "seed", "alias", "state", "generation")
+
+    def __init__(self, nodeID: NodeID, seed: int, alias: int):
+        self.nodeID = nodeID
+        self.seed = seed
+        self.alias = alias
+        self.state = AliasState.Pending
+        self.generation = 0
+
+    def __repr__(self):
+        return "AliasEntry({}, 0x{:03X}, {})".format(
+            self.nodeID, self.alias, self.state.name)
+
+
+class AliasPool:
+    """Virtual node aliases by NodeID and by alias.
+
+    Lookup by either key is one dict access, and the entries waiting for
+    the collision window are kept in a FIFO (they all wait the same
+    delay) so only the oldest ones are examined on each poll.
+    """
+    def __init__(self):
+        self._byNodeID = {}  # type: dict[NodeID, AliasEntry]
+        self._byAlias = {}  # type: dict[int, AliasEntry]
+        self._waiting = deque()
+        # ^ (time CID 4 was sent, entry, entry.generation), oldest first
+
+    def __len__(self) -> int:
+        return len(self._byNodeID)
+
+    def __contains__(self, nodeID: NodeID) -> bool:
+        return nodeID in self._byNodeID
+
+    def __iter__(self) -> Iterator[AliasEntry]:
+        return iter(list(self._byNodeID.values()))
+
+    def add(self, nodeID: NodeID, seed: int, alias: int) -> AliasEntry:
+        """Add a NodeID in the Pending state.
+
+        Raises:
+            ValueError: If nodeID or alias is already in the pool.
+        """
+        if nodeID in self._byNodeID:
+            raise ValueError("{} is already in the alias pool"
+                             .format(nodeID))
+        if alias in self._byAlias:
+            raise ValueError("Alias 0x{:03X} is already in the alias pool"
+                             .format(alias))
+        entry = AliasEntry(nodeID, seed, alias)
+        self._byNodeID[nodeID] = entry
+        self._byAlias[alias] = entry
+        return entry
+
+    def remove(self, nodeID: NodeID) -> Union[AliasEntry, None]:
+        """Remove the entry for nodeID (None if not present)."""
+        entry = self._byNodeID.pop(nodeID, None)
+        if entry is not None:
+            del self._byAlias[entry.alias]
+            entry.generation += 1  # drop any waiting record
+        return entry
+
+    def get(self, nodeID: NodeID) -> Union[AliasEntry, None]:
+        return self._byNodeID.get(nodeID)
+
+    def byAlias(self, alias: int) -> Union[AliasEntry, None]:
+        return self._byAlias.get(alias)
+
+    def setAlias(self, entry: AliasEntry, seed: int, alias: int):
+        """Give entry a new alias (after a collision) and set it back to
+        Pending.
+        """
+        del self._byAlias[entry.alias]
+        entry.seed = seed
+        entry.alias = alias
+        entry.state = AliasState.Pending
+        entry.generation += 1
+        self._byAlias[alias] = entry
+
+    def pending(self) -> List[AliasEntry]:
+        """Entries that need a CID sequence."""
+        return [entry for entry in self._byNodeID.values()
+                if entry.state is AliasState.Pending]
+
+    def markCIDSent(self, entry: AliasEntry, now: float):
+        """Start the collision window of entry (CID 4 was sent)."""
+        self._waiting.append((now, entry, entry.generation))
+
+    def popReady(self, now: float, delay: float) -> List[AliasEntry]:
+        """Remove and return entries still checking their alias whose
+        collision window (delay seconds since CID 4 was sent) is over.
+        """
+        ready = []
+        waiting = self._waiting
+        while waiting:
+            sentAt, entry, generation = waiting[0]
+            if entry.generation != generation:
+                waiting.popleft()  # alias changed or entry removed
+                continue
+            if sentAt + delay > now:  # same sum as nextReadyTime
+                break
+            waiting.popleft()
+            if entry.state is AliasState.CheckingID:
+                ready.append(entry)
+        return ready
+
+    def nextReadyTime(self, delay: float) -> Union[float, None]:
+        """Get when the oldest waiting entry's collision window ends
+        (None if no entry is waiting).
+        """
+        waiting = self._waiting
+        while waiting:
+            sentAt, entry, generation = waiting[0]
+            if entry.generation == generation:
+                return sentAt + delay
+            waiting.popleft()
+        return None
+
+    def reset(self):
+        """Set every entry back to Pending (link went down)."""
+        self._waiting.clear()
+        for entry in self._byNodeID.values():
+            entry.state = AliasState.Pending
+            entry.generation += 1
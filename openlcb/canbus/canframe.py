@@ -24,6 +24,13 @@ class NoEncoder:
             " frame.encoder = self).")
 
 
+_noEncoder = NoEncoder()  # shared, since it has no state
+
+_controlFrameByValue = {entry.value: entry for entry in ControlFrame}
+# ^ (for decodeControlFrameFormat) faster than ControlFrame(value),
+#   which raises ValueError for unknown values
+
+
 class CanFrame:
     """OpenLCB-CAN frame
     Use CAN extended format (29-bit header)
@@ -39,6 +46,10 @@ class CanFrame:
     - header, data: If 2nd arg is list.
     - control, alias, data: If 2nd arg is int.
 
+    Each form also has a non-overloaded classmethod (cid, fromHeaderData,
+    control) that skips argument type detection and logging, for use on
+    the send and receive paths.
+
     Attributes:
         encoder (object): A required (in non-test scenarios) encoder
             object (set to a PhysicalLayer subclass, since that layer
@@ -72,6 +83,17 @@ class CanFrame:
             _send_frames).
     """
 
+    __slots__ = (
+        "header",
+        "data",
+        "_alias",
+        "afterSendState",
+        "encoder",
+        "reservation",
+        "minimumState",
+        "direction",
+    )
+
     ARG_LISTS = [
         OrderedDict(N_cid=int, nodeID=NodeID, alias=int),
         OrderedDict(header=int, data=bytearray),
@@ -100,16 +122,14 @@ class CanFrame:
             # NOTE: handleReceivedCID can get all header bits via frame
             return ControlFrame.CID
 
-        try:
-            retval = ControlFrame((frame.header >> 12) & 0x2_FF_FF)
-            return retval  # top 1 bit for out-of-band messages
-        except KeyboardInterrupt:
-            raise
-        except:
+        retval = _controlFrameByValue.get((frame.header >> 12) & 0x2_FF_FF)
+        # ^ top 1 bit for out-of-band messages
+        if retval is None:
             logger.warning(
                 "Could not decode header 0x{:08X}"
                 .format(frame.header))
             return ControlFrame.UnknownFormat
+        return retval
 
     def __str__(self):
         return "CanFrame header: 0x{:08X} {}".format(
@@ -127,10 +147,96 @@ class CanFrame:
     def alias(self) -> int:
         return self._alias
 
+    @classmethod
+    def fromHeaderData(cls, header: int, data: bytearray,
+                       afterSendState=None, reservation=None,
+                       minimumState=None):
+        """Create a frame from an assembled header and payload.
+        Same as CanFrame(header, data) but without argument checks or
+        the alias 0 warning (The caller ensures header is int and data
+        is bytearray).
+
+        Args:
+            header (int): The entire 29-bit header.
+            data (bytearray): Payload (not copied).
+
+        Returns:
+            CanFrame: The new frame.
+        """
+        frame = object.__new__(cls)
+        frame.header = header
+        frame.data = data
+        frame._alias = header & 0xFFF
+        frame.afterSendState = afterSendState
+        frame.encoder = _noEncoder
+        frame.reservation = reservation
+        frame.minimumState = minimumState
+        frame.direction = None
+        return frame
+
+    @classmethod
+    def cid(cls, N_cid: int, nodeID: NodeID, alias: int,
+            afterSendState=None, reservation=None, minimumState=None):
+        """Create a Check ID (CID) frame.
+        Same as CanFrame(N_cid, nodeID, alias).
+
+        Args:
+            N_cid (int): Frame sequence number, 4 to 7 inclusive (See
+                N_cid in CanFrame).
+            nodeID (NodeID): Node ID (12 bits of which are sent,
+                depending on N_cid).
+            alias (int): Source NID Alias.
+
+        Raises:
+            ValueError: If alias is more than 12 bits.
+
+        Returns:
+            CanFrame: The new frame (with empty data).
+        """
+        if alias & 0xFFF != alias:
+            raise ValueError("Alias overflow: {} > 0xFFF".format(alias))
+        nodeCode = (nodeID.value >> ((N_cid - 4) * 12)) & 0xFFF
+        return cls.fromHeaderData(
+            ((N_cid << 12) | nodeCode) << 12 | alias | 0x10_00_00_00,
+            bytearray(),
+            afterSendState=afterSendState,
+            reservation=reservation,
+            minimumState=minimumState,
+        )
+
+    @classmethod
+    def control(cls, control: int, alias: int,
+                data: Union[bytearray, None] = None, afterSendState=None,
+                reservation=None, minimumState=None):
+        """Create a frame from control bits and alias.
+        Same as CanFrame(control, alias, data).
+
+        Args:
+            control (int): Frame type and content field (See control in
+                CanFrame), such as ControlFrame.AMD.value.
+            alias (int): Source NID Alias.
+            data (bytearray, optional): Payload. Defaults to empty.
+
+        Raises:
+            ValueError: If alias is more than 12 bits.
+
+        Returns:
+            CanFrame: The new frame.
+        """
+        if alias & 0xFFF != alias:
+            raise ValueError("Alias overflow: {} > 0xFFF".format(alias))
+        return cls.fromHeaderData(
+            (control << 12) | alias | 0x10_00_00_00,
+            bytearray() if data is None else data,
+            afterSendState=afterSendState,
+            reservation=reservation,
+            minimumState=minimumState,
+        )
+
     def __init__(self, *args, afterSendState=None, reservation=None,
                  minimumState=None):
         self.afterSendState = afterSendState
-        self.encoder = NoEncoder()  # type: Any
+        self.encoder = _noEncoder  # type: Any
         self.reservation = reservation
         self.minimumState = minimumState
         arg1 = None
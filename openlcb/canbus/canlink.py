@@ -15,35 +15,65 @@ Remote Nodes.
 
 - Aliases are tracked for the Remote Nodes, but not allocated here
 
+- Virtual nodes added with addVirtualNode share the connection. Each
+  gets its own alias from an AliasPool, reserved in parallel with the
+  others (See aliaspool.py).
+
 Multi-frame addressed messages are accumulated in parallel
 '''
 
 from enum import Enum
 from logging import getLogger
-from timeit import default_timer
 from typing import (
-    # Iterable,
+    Callable,
+    Iterable,
     List,  # in case list doesn't support `[` in this Python version
     Union,  # in case `|` doesn't support 'type' in this Python version
 )
 
 from openlcb import (
-    precise_sleep,
     emit_cast,
     formatted_ex,
 )
+from openlcb.canbus.aliaspool import AliasEntry, AliasPool, AliasState
 from openlcb.canbus.canframe import CanFrame
 from openlcb.canbus.canphysicallayer import CanPhysicalLayer
 from openlcb.canbus.controlframe import ControlFrame
+from openlcb.canbus.messageaccumulator import MessageAccumulator
 from openlcb.linklayer import LinkLayer
 from openlcb.message import Message
 from openlcb.mti import MTI
 from openlcb.nodeid import NodeID
 from openlcb.physicallayer import PhysicalLayer
 from openlcb.portinterface import PortInterface
+from openlcb.scheduler import Scheduler
 
 logger = getLogger(__name__)
 
+_mtiByCanMTI = [None] * 0x1000  # type: List[Union[MTI, None]]
+# ^ 12-bit CAN MTI (frame type 1) to MTI (None if unknown, for
+#   canHeaderToFullFormat) so lookup doesn't use MTI(value), which
+#   raises ValueError for unknown values
+for _mti in MTI:
+    if _mti.value <= 0xFFF:
+        _mtiByCanMTI[_mti.value] = _mti
+del _mti
+
+_controlFrameNames = {entry.value: entry.name for entry in ControlFrame}
+# ^ label of each control frame code for metrics (See _frameTypeName)
+
+
+def _frameTypeName(header: int) -> str:
+    """Get the ControlFrame name of a CAN header (Data, CID, AMD...)
+    without creating a ControlFrame.
+    """
+    if header & 0x0800_0000:
+        return "Data"
+    if header & 0x0400_0000:
+        return "CID"
+    return _controlFrameNames.get((header >> 12) & 0x2_FF_FF,
+                                  "UnknownFormat")
+
 
 class CanLink(LinkLayer):
     """CAN link layer (manage stack's link state).
@@ -74,6 +104,12 @@ class CanLink(LinkLayer):
               ranges.
         physicalLayer (PhysicalLayer): The PhysicalLayer/subclass to
           use for sending frames (enqueue them via sendFrameAfter).
+        scheduler (Scheduler, optional): Runs the alias reservation
+            delay (and other timeouts) as timers. Pass one to share it
+            with other layers. Defaults to a new Scheduler. Timers run
+            during pollState (or when the I/O loop calls
+            scheduler.runDue), so the loop can wait for data until
+            scheduler.timeUntilNext() instead of polling.
     """
 
     # MIN_STATE_VALUE & MAX_STATE_VALUE are set statically below the
@@ -129,7 +165,8 @@ class CanLink(LinkLayer):
     MIN_STATE_VALUE = min(entry.value for entry in State)
     MAX_STATE_VALUE = max(entry.value for entry in State)
 
-    def __init__(self, physicalLayer: PhysicalLayer, localNodeID: NodeID):
+    def __init__(self, physicalLayer: PhysicalLayer, localNodeID: NodeID,
+                 scheduler: Union[Scheduler, None] = None):
         # See class docstring for args
         self.physicalLayer: CanPhysicalLayer = None  # set by super() below
         # ^ typically CanPhysicalLayerGridConnect
@@ -146,11 +183,25 @@ class CanLink(LinkLayer):
         self._previousFrameCount = None
         self.aliasToNodeID = {}
         self.nodeIdToAlias = {}
-        self.accumulator = {}
+        self.accumulator = MessageAccumulator()
+        # ^ partial multi-frame messages by AccumKey (bounded; See
+        #   accumulatorEvictedCount and accumulatorOverflowCount)
         self.duplicateAliases = []
         self.nextInternallyAssignedNodeID = 1
         self._state = CanLink.State.Initial
         self._reservation = -1  # incremented on use.
+        self._controlFrameHandlers = self._makeControlFrameHandlers()
+        self.aliasPool = AliasPool()
+        # ^ aliases of virtual nodes (See addVirtualNode)
+        self._virtualNodeStateListeners = []
+        if scheduler is None:
+            scheduler = Scheduler()
+        self.scheduler = scheduler
+        self._aliasTimer = None  # ends WaitForAliases (See _startAliasWait)
+        self._aliasPoolTimer = None  # See _scheduleAliasPool
+        if self.metrics is not None:  # set by LinkLayer (See openlcb.metrics)
+            self.metrics.accumulatorBytes.addMethodSource(
+                self, "_accumulatorBytes")
 
     # This method may never actually be necessary, as
     # sendMessage uses nodeIdToAlias (which has localNodeID
@@ -198,6 +249,95 @@ class CanLink(LinkLayer):
     #     assert isinstance(self._state, CanLink.State)
     #     return self._state == CanLink.State.Permitted
 
+    @property
+    def accumulatorEvictedCount(self) -> int:
+        """Partial multi-frame messages discarded since they timed out
+        or to stay within the accumulator's entry or byte limits.
+        """
+        return self.accumulator.expiredCount + self.accumulator.evictedCount
+
+    @property
+    def accumulatorOverflowCount(self) -> int:
+        """Partial multi-frame messages discarded for exceeding the
+        accumulator's maxMessageBytes.
+        """
+        return self.accumulator.overflowCount
+
+    def _accumulatorBytes(self) -> int:
+        return self.accumulator.totalBytes
+
+    def isLocalNodeID(self, nodeID: NodeID) -> bool:
+        """Check if nodeID is localNodeID or a virtual node's NodeID."""
+        return (nodeID == self.localNodeID) or (nodeID in self.aliasPool)
+
+    def addVirtualNode(self, nodeID: NodeID) -> AliasEntry:
+        """Reserve an alias for another NodeID on this connection.
+
+        If the link is up, the CID sequence is enqueued now, otherwise
+        it is enqueued along with localNodeID's when the link comes up.
+        Either way the alias is mapped (and virtual node state listeners
+        are notified) once RID and AMD are sent, ALIAS_RESPONSE_DELAY
+        after CID 4 if there was no collision.
+
+        Args:
+            nodeID (NodeID): The virtual node's NodeID.
+
+        Raises:
+            ValueError: If nodeID is localNodeID or already added.
+
+        Returns:
+            AliasEntry: The alias and reservation state for nodeID.
+        """
+        if nodeID == self.localNodeID:
+            raise ValueError("{} is the localNodeID of this CanLink"
+                             .format(nodeID))
+        seed, alias = self._nextFreeAlias(nodeID.value)
+        entry = self.aliasPool.add(nodeID, seed, alias)
+        if self._isLinkActive():
+            self._enqueueVirtualCIDSequence(entry)
+        return entry
+
+    def addVirtualNodes(self, nodeIDs: Iterable[NodeID]) -> List[AliasEntry]:
+        """Call addVirtualNode for each NodeID (The CID sequences are
+        all enqueued before any is sent, so the aliases are reserved in
+        the same collision window).
+        """
+        return [self.addVirtualNode(nodeID) for nodeID in nodeIDs]
+
+    def removeVirtualNode(self, nodeID: NodeID) -> bool:
+        """Stop using a virtual node's alias
+        (sends AMR if the alias was in use).
+
+        Returns:
+            bool: False if nodeID was not added by addVirtualNode.
+        """
+        entry = self.aliasPool.remove(nodeID)
+        if entry is None:
+            return False
+        if entry.state is AliasState.Permitted:
+            self._unmapVirtualAlias(entry)
+            if self._state == CanLink.State.Permitted:
+                self.physicalLayer.sendFrameAfter(CanFrame.control(
+                    ControlFrame.AMR.value, entry.alias,
+                    entry.nodeID.toArray()))
+            self.fireVirtualNodeStateChanged(entry.nodeID, False)
+        return True
+
+    def registerVirtualNodeStateListener(
+            self, listener: Callable[[NodeID, bool], None]):
+        """Register a listener called with (nodeID, True) when a virtual
+        node's alias is reserved and (nodeID, False) when it stops
+        being usable (collision or removal). Link_Layer_Up is not sent
+        per virtual node, since it is global and other listeners would
+        take it as the link coming up again.
+        """
+        self._virtualNodeStateListeners.append(listener)
+
+    def fireVirtualNodeStateChanged(self, nodeID: NodeID, permitted: bool):
+        """Fire *virtual node state* listeners."""
+        for listener in self._virtualNodeStateListeners:
+            listener(nodeID, permitted)
+
     def isCanceled(self, frame: CanFrame) -> bool:
         if frame.reservation is None:
             return False
@@ -293,6 +433,9 @@ class CanLink(LinkLayer):
             # - then a packet sent sets state to WaitForAliases
             # - then if wait is over,
             #   pollState sets state to EnqueueAliasReservation
+        elif newState == CanLink.State.WaitForAliases:
+            if oldState != newState:
+                self._startAliasWait()
         elif newState == CanLink.State.EnqueueAliasReservation:
             self._enqueueReserveID()  # sets _state to
             # - BusyLocalReserveID
@@ -326,87 +469,122 @@ class CanLink(LinkLayer):
         #  pollState only should call this (via setState) when state
         #  actually changed.
 
+    def handleFrameSent(self, frame: CanFrame):
+        """Update state based on the frame having been sent
+        (Also advances virtual node reservations on CID 4 and AMD).
+        """
+        LinkLayer.handleFrameSent(self, frame)
+        if self.metrics is not None:
+            self.metrics.framesSent.inc(_frameTypeName(frame.header))
+        if not self.aliasPool:
+            return
+        header = frame.header
+        if header & 0x0800_0000:  # ControlFrame.Data
+            return
+        entry = self.aliasPool.byAlias(header & 0xFFF)
+        if entry is None:
+            return
+        if (header & 0x0700_0000) == 0x0400_0000:  # CID 4
+            if entry.state is AliasState.CheckingID:
+                self.aliasPool.markCIDSent(entry, self.scheduler.clock())
+                self._scheduleAliasPool()
+        elif ((header >> 12) & 0x2_FF_FF) == ControlFrame.AMD.value:
+            if entry.state is AliasState.Reserving:
+                entry.state = AliasState.Permitted
+                self.aliasToNodeID[entry.alias] = entry.nodeID
+                self.nodeIdToAlias[entry.nodeID] = entry.alias
+                self.fireVirtualNodeStateChanged(entry.nodeID, True)
+
     def handleFrameReceived(self, frame: CanFrame):
         """Call the correct handler if any for a received frame.
         Typically this is called by CanPhysicalLayer since the
         linkPhysicalLayer method in this class registers this method as
         a listener in the given CanPhysicalLayer instance.
 
+        Data and CID frames are recognized by header bits, and other
+        control frames by one lookup in _controlFrameHandlers (Same
+        result as decodeControlFrameFormat then an if/elif chain,
+        without creating a ControlFrame per frame).
+
         Args:
             frame (CanFrame): Any CanFrame, OpenLCB/LCC or not (if
                 not then ignored).
         """
-        handled = True  # True if state may change, otherwise set False
-        control_frame = CanFrame.decodeControlFrameFormat(frame)
-        if not ControlFrame.isInternal(control_frame):
+        header = frame.header
+        if self.metrics is not None:
+            self.metrics.framesReceived.inc(_frameTypeName(header))
+        if header & 0x0800_0000:  # ControlFrame.Data
             self._frameCount += 1
-        else:
-            print("[CanLink handleFrameReceived] control_frame={}"
-                  .format(control_frame))
-
-        if control_frame == ControlFrame.LinkUp:
-            self.handleReceivedLinkUp(frame)
-        elif control_frame == ControlFrame.LinkRestarted:  # noqa: E501
-            self.handleReceivedLinkRestarted(frame)
-        elif control_frame in (ControlFrame.LinkCollision,  # noqa: E501
-                               ControlFrame.LinkError):
-            logger.warning(
-                "Unexpected error report {:08X}"
-                .format(frame.header))
-            self._errorCount += 1
-            if self.isRunningAliasReservation():
-                print("Restarting alias reservation due to error ({})."
-                      .format(control_frame))
-                # Restart alias reservation process if an
-                #   error occurs during it, as per section
-                #   6.2.1 of CAN Frame Transfer - Standard.
-                self.defineAndReserveAlias()
-        elif control_frame == ControlFrame.LinkDown:
-            self.handleReceivedLinkDown(frame)
-        elif control_frame == ControlFrame.CID:
-            # NOTE: We may process other bits of frame.header
-            #   that were stripped from control_frame
-            self.handleReceivedCID(frame)
-        elif control_frame == ControlFrame.RID:
-            self.handleReceivedRID(frame)
-        elif control_frame == ControlFrame.AMD:
-            self.handleReceivedAMD(frame)
-        elif control_frame == ControlFrame.AME:
-            self.handleReceivedAME(frame)
-        elif control_frame == ControlFrame.AMR:
-            self.handleReceivedAMR(frame)
-        elif control_frame in (ControlFrame.EIR0,
-                               ControlFrame.EIR1,
-                               ControlFrame.EIR2,
-                               ControlFrame.EIR3):
-            self._errorCount += 1
-            if self.isRunningAliasReservation():
-                print("Restarting alias reservation due to error ({})."
-                      .format(control_frame))
-                # Restart alias reservation process if an
-                #   error occurs during it, as per section
-                #   6.2.1 of CAN Frame Transfer - Standard.
-                self.defineAndReserveAlias()
-        elif control_frame == ControlFrame.Data:
-            # NOTE: We may process other bits of frame.header
-            #   that were stripped from control_frame
+            # NOTE: The handler decodes the lower bits of frame.header
             self.handleReceivedData(frame)
-        elif (control_frame == ControlFrame.UnknownFormat):
-            logger.warning(
-                "Unexpected CAN header 0x{:08X}"
-                .format(frame.header))
-            handled = False
+        elif header & 0x0400_0000:  # ControlFrame.CID
+            self._frameCount += 1
+            # NOTE: The handler decodes the lower bits of frame.header
+            self.handleReceivedCID(frame)
         else:
-            handled = False
-            # This should never happen due to how
-            #   decodeControlFrameFormat works, but this is a "not
-            #   implemented" output for ensuring completeness (If this
-            #   case occurs, some code is missing above).
-            logger.warning(
-                "Invalid control frame format 0x{:08X}"
-                .format(control_frame))
-        if handled:
-            self.pollState()  # May enqueue frame(s) and/or change state.
+            code = (header >> 12) & 0x2_FF_FF
+            handler = self._controlFrameHandlers.get(code)
+            if handler is None:
+                print("[CanLink handleFrameReceived] control_frame={}"
+                      .format(ControlFrame.UnknownFormat))
+                logger.warning(
+                    "Unexpected CAN header 0x{:08X}"
+                    .format(frame.header))
+                return  # not handled, so state can't change
+            if code & 0x2_00_00:  # ControlFrame.isInternal
+                print("[CanLink handleFrameReceived] control_frame={}"
+                      .format(ControlFrame(code)))
+            else:
+                self._frameCount += 1
+            handler(frame)
+        self.pollState()  # May enqueue frame(s) and/or change state.
+
+    def _makeControlFrameHandlers(self) -> dict:
+        """Map each ControlFrame value (except Data and CID, which are
+        recognized by header bits) to a bound handler.
+        """
+        handlers = {
+            ControlFrame.LinkUp: self.handleReceivedLinkUp,
+            ControlFrame.LinkRestarted: self.handleReceivedLinkRestarted,
+            ControlFrame.LinkCollision: self.handleReceivedLinkError,
+            ControlFrame.LinkError: self.handleReceivedLinkError,
+            ControlFrame.LinkDown: self.handleReceivedLinkDown,
+            ControlFrame.RID: self.handleReceivedRID,
+            ControlFrame.AMD: self.handleReceivedAMD,
+            ControlFrame.AME: self.handleReceivedAME,
+            ControlFrame.AMR: self.handleReceivedAMR,
+            ControlFrame.EIR0: self.handleReceivedEIR,
+            ControlFrame.EIR1: self.handleReceivedEIR,
+            ControlFrame.EIR2: self.handleReceivedEIR,
+            ControlFrame.EIR3: self.handleReceivedEIR,
+        }
+        return {control_frame.value: handler
+                for control_frame, handler in handlers.items()}
+
+    def handleReceivedLinkError(self, frame: CanFrame):
+        """Handle an internal LinkCollision or LinkError frame."""
+        logger.warning(
+            "Unexpected error report {:08X}"
+            .format(frame.header))
+        self._errorCount += 1
+        if self.isRunningAliasReservation():
+            print("Restarting alias reservation due to error ({})."
+                  .format(CanFrame.decodeControlFrameFormat(frame)))
+            # Restart alias reservation process if an
+            #   error occurs during it, as per section
+            #   6.2.1 of CAN Frame Transfer - Standard.
+            self.defineAndReserveAlias()
+
+    def handleReceivedEIR(self, frame: CanFrame):
+        """Handle an Error Information Report (EIR0 to EIR3) frame."""
+        self._errorCount += 1
+        if self.isRunningAliasReservation():
+            print("Restarting alias reservation due to error ({})."
+                  .format(CanFrame.decodeControlFrameFormat(frame)))
+            # Restart alias reservation process if an
+            #   error occurs during it, as per section
+            #   6.2.1 of CAN Frame Transfer - Standard.
+            self.defineAndReserveAlias()
 
     def isRunningAliasReservation(self) -> bool:
         return self._state in (
@@ -453,10 +631,11 @@ class CanLink(LinkLayer):
         self.setState(CanLink.State.BusyLocalNotifyReservation)
         # send AMD frame, go to Permitted state
         self.physicalLayer.sendFrameAfter(
-            CanFrame(ControlFrame.AMD.value, self._localAlias,
-                     self.localNodeID.toArray(),
-                     afterSendState=CanLink.State.RecordAliasReservation,
-                     reservation=self._reservation)
+            CanFrame.control(
+                ControlFrame.AMD.value, self._localAlias,
+                self.localNodeID.toArray(),
+                afterSendState=CanLink.State.RecordAliasReservation,
+                reservation=self._reservation)
         )
         self.setState(CanLink.State.WaitingForLocalNotifyReservation)
         # self._state = CanLink.State.Permitted  # not really ready
@@ -488,7 +667,7 @@ class CanLink(LinkLayer):
 
         #    send AME with no NodeID to get full alias map
         self.physicalLayer.sendFrameAfter(
-            CanFrame(ControlFrame.AME.value, self._localAlias)
+            CanFrame.control(ControlFrame.AME.value, self._localAlias)
             # afterSendState=CanLink.State.Permitted)
         )
 
@@ -504,6 +683,10 @@ class CanLink(LinkLayer):
         """
         # NOTE: since no working link, not sending the AMR frame
         self._state = CanLink.State.Inhibited
+        for entry in self.aliasPool:
+            if entry.state is AliasState.Permitted:
+                self._unmapVirtualAlias(entry)
+        self.aliasPool.reset()  # reserve again when link is back up
 
         # print("***** received link down")
         # import traceback
@@ -538,10 +721,19 @@ class CanLink(LinkLayer):
         """
         #    Does this carry our alias?
         if (frame.header & 0xFFF) != self._localAlias:
-            return  # no match
+            entry = self.aliasPool.byAlias(frame.header & 0xFFF)
+            if entry is None:
+                return  # no match
+            if entry.state is AliasState.Permitted:
+                self.physicalLayer.sendFrameAfter(
+                    CanFrame.control(ControlFrame.RID.value, entry.alias))
+            else:
+                # Another node is checking the alias we are reserving
+                self.processVirtualCollision(entry, frame)
+            return
         #    send an RID in response
-        self.physicalLayer.sendFrameAfter(CanFrame(ControlFrame.RID.value,
-                                          self._localAlias))
+        self.physicalLayer.sendFrameAfter(
+            CanFrame.control(ControlFrame.RID.value, self._localAlias))
 
     def handleReceivedRID(self, frame: CanFrame):
         """Handle a Reserve ID (RID) frame
@@ -562,6 +754,13 @@ class CanLink(LinkLayer):
             print("Alias collision occurred. Restarting alias reservation...")
             self.processCollision(frame)
             return
+        entry = self.aliasPool.get(nodeID)
+        if entry is not None:
+            logger.warning(
+                "AMD from alias 0x{:03X} for virtual node {}"
+                .format(frame.header & 0xFFF, nodeID))
+            self.processVirtualCollision(entry, frame)
+            return
         #    This defines an alias, so store it
         alias = frame.header & 0xFFF
         self.aliasToNodeID[alias] = nodeID
@@ -579,7 +778,7 @@ class CanLink(LinkLayer):
         if frame.data:  # not global
             return
         for otherNodeID in list(self.nodeIdToAlias.keys()):
-            if otherNodeID == self.localNodeID:
+            if self.isLocalNodeID(otherNodeID):
                 continue
             del self.nodeIdToAlias[otherNodeID]
             # except KeyError:
@@ -588,7 +787,7 @@ class CanLink(LinkLayer):
             otherNodeID = self.aliasToNodeID[alias]
             # except KeyError:
             #     pass  # concurrent modification
-            if otherNodeID == self.localNodeID:
+            if self.isLocalNodeID(otherNodeID):
                 continue
             try:
                 del self.nodeIdToAlias[otherNodeID]
@@ -612,9 +811,20 @@ class CanLink(LinkLayer):
 
         if (self.localNodeID == destNodeID) or (destNodeID is None):
             #    matched/global (and Permitted if got this far), so send AMD
-            returnFrame = CanFrame(ControlFrame.AMD.value, self._localAlias,
-                                   self.localNodeID.toArray())
+            returnFrame = CanFrame.control(ControlFrame.AMD.value,
+                                           self._localAlias,
+                                           self.localNodeID.toArray())
             self.physicalLayer.sendFrameAfter(returnFrame)
+        if destNodeID is None:
+            entries = self.aliasPool
+        else:
+            entry = self.aliasPool.get(destNodeID)
+            entries = () if entry is None else (entry,)
+        for entry in entries:
+            if entry.state is AliasState.Permitted:
+                self.physicalLayer.sendFrameAfter(CanFrame.control(
+                    ControlFrame.AMD.value, entry.alias,
+                    entry.nodeID.toArray()))
         self.handleGlobalAME(frame)
 
     def handleReceivedAMR(self, frame: CanFrame):
@@ -750,36 +960,37 @@ class CanLink(LinkLayer):
                     self.nodeIdToAlias[destID] = destAlias
 
                 #    check for start and end bits
+                if dgCode in (0x0_0A_00_00_00, 0x0_0F_00_00_00):
+                    #    single frame (or stream data, where each frame
+                    #    stands alone), ship without accumulation
+                    msg = Message(mti, sourceID, destID,
+                                  bytearray(frame.data))
+                    self.fireMessageReceived(msg)
+                    return
                 key = CanLink.AccumKey(mti, sourceID, destID)
-                if dgCode == 0x0_0A_00_00_00 or dgCode == 0x0_0B_00_00_00:
+                now = self.accumulator.clock()
+                if dgCode == 0x0_0B_00_00_00:
                     #    start of message, create the entry in the accumulator
-                    self.accumulator[key] = bytearray()
-                else:
-                    # not start frame
-                    # check for never properly started, this is an error
-                    if key not in self.accumulator:
-                        #    have not-start frame, but never started
-                        logger.warning(
-                            "Dropping non-start datagram frame"
-                            " without accumulation started:"
-                            " {}".format(frame)
-                            # TODO: ^ more necessary to show same output
-                            #   as Swift? Formerly:
-                            #   " \(frame, privacy: .public)"
-                        )
-                        return  # early return to stop processing of this frame
-
-                # add this data
-                if len(frame.data) > 0:
-                    self.accumulator[key].extend(frame.data)
-
-                if dgCode == 0x0_0A_00_00_00 or dgCode == 0x0_0D_00_00_00:
+                    self.accumulator.start(key, now)
+                # add this data (False if never properly started, or
+                #   discarded since then; this is an error)
+                if not self.accumulator.extend(key, frame.data, now):
+                    #    have not-start frame, but never started
+                    logger.warning(
+                        "Dropping non-start datagram frame"
+                        " without accumulation started:"
+                        " {}".format(frame)
+                        # TODO: ^ more necessary to show same output
+                        #   as Swift? Formerly:
+                        #   " \(frame, privacy: .public)"
+                    )
+                    return  # early return to stop processing of this frame
+
+                if dgCode == 0x0_0D_00_00_00:
                     #    is end, ship and remove accumulation
-                    msg = Message(mti, sourceID, destID, self.accumulator[key])
+                    msg = Message(mti, sourceID, destID,
+                                  self.accumulator.pop(key))
                     self.fireMessageReceived(msg)
-
-                    #    remove accumulation
-                    self.accumulator[key] = None
             else:
                 #    addressed message case
                 destAlias = 0
@@ -809,37 +1020,29 @@ class CanLink(LinkLayer):
 
                 # check for start and end bits
                 key = CanLink.AccumKey(mti, sourceID, destID)
+                now = self.accumulator.clock()
                 if frame.data and (frame.data[0] & 0x20 == 0):
                     #    is start, create the entry in the accumulator
-                    self.accumulator[key] = bytearray()
-                else:
-                    # not start frame
-                    # check for first bit set never seen
-                    if key not in self.accumulator:
-                        #    have not-start frame, but never started
-                        logger.warning(
-                            "Dropping non-start frame without"
-                            " accumulation started: {}"
-                            .format(frame))
-                        return  # early return to stop processing of this gram
-
-                #    add this data
-                if len(frame.data) > 2:
-                    for byte in frame.data[2:]:  # through end of array
-                        self.accumulator[key].append(byte)
+                    self.accumulator.start(key, now)
+                #    add this data (False if not-start frame, but never
+                #    started, or discarded since then)
+                if not self.accumulator.extend(key, frame.data[2:], now):
+                    logger.warning(
+                        "Dropping non-start frame without"
+                        " accumulation started: {}"
+                        .format(frame))
+                    return  # early return to stop processing of this gram
 
                 if frame.data and (frame.data[0] & 0x10 == 0):
                     # is end, ship and remove accumulation
-                    msg = Message(mti, sourceID, destID, self.accumulator[key])
+                    msg = Message(mti, sourceID, destID,
+                                  self.accumulator.pop(key))
                     # This includes the special case of MTI.Unknown,
                     #   which needs to carry its original MTI value
                     if mti is MTI.Unknown :
                         msg.originalMTI = ((frame.header >> 12) & 0xFFF)
                     self.fireMessageReceived(msg)
 
-                    # remove accumulation
-                    del self.accumulator[key]
-
             # end addressed message case
 
         else:
@@ -868,14 +1071,17 @@ class CanLink(LinkLayer):
                 was entered incorrectly such as in a GUI.
         """
         error = None  # Leave/reset as None for fireMessageSent to run.
-        #    special case for datagram
-        if msg.mti == MTI.Datagram:
+        #    special case for datagram (and stream data, also addressed
+        #    in the header)
+        if msg.mti in (MTI.Datagram, MTI.Stream_Data_Send):
             header = 0x10_00_00_00
             #    datagram headers are
             #             1Adddsss - one frame
             #             1Bdddsss - first frame
             #             1Cdddsss - middle frame
             #             1Ddddsss - last frame
+            #    stream data headers are
+            #             1Fdddsss - any frame
             try:
                 sssAlias = self.nodeIdToAlias[msg.source]
                 header |= ((sssAlias) & 0xFFF)
@@ -908,27 +1114,33 @@ class CanLink(LinkLayer):
                 logger.error(error)
                 raise
 
-            if len(msg.data) <= 8:
+            if msg.mti == MTI.Stream_Data_Send:
+                header |= 0x0F_00_00_00
+                for content in self.segmentStreamDataArray(msg.data):
+                    frame = CanFrame.fromHeaderData(header, content)
+                    self.physicalLayer.sendFrameAfter(frame)
+            elif len(msg.data) <= 8:
                 #    single frame
                 header |= 0x0A_000_000
-                frame = CanFrame(header, msg.data)
+                frame = CanFrame.fromHeaderData(header, msg.data)
                 self.physicalLayer.sendFrameAfter(frame)
             else:
                 #    multi-frame datagram
                 dataSegments = self.segmentDatagramDataArray(msg.data)
                 #    send the first one
-                frame = CanFrame(header | 0x0B_00_00_00, dataSegments[0])
+                frame = CanFrame.fromHeaderData(header | 0x0B_00_00_00,
+                                                dataSegments[0])
                 self.physicalLayer.sendFrameAfter(frame)
                 #    send middles
                 if len(dataSegments) >= 3:
                     for index in range(1, len(dataSegments) - 2 + 1):
                         # upper limit leaves one
-                        frame = CanFrame(header | 0x0C_00_00_00,
-                                         dataSegments[index])
+                        frame = CanFrame.fromHeaderData(
+                            header | 0x0C_00_00_00, dataSegments[index])
                         self.physicalLayer.sendFrameAfter(frame)
 
                 # send last one
-                frame = CanFrame(
+                frame = CanFrame.fromHeaderData(
                     header | 0x0D_00_00_00,
                     dataSegments[len(dataSegments) - 1]
                 )
@@ -959,7 +1171,7 @@ class CanLink(LinkLayer):
                                                                   msg.data)
                     for content in dataSegments:
                         #    send the resulting frame
-                        frame = CanFrame(header, content)
+                        frame = CanFrame.fromHeaderData(header, content)
                         self.physicalLayer.sendFrameAfter(frame)
                         error = None
                 else:
@@ -970,7 +1182,7 @@ class CanLink(LinkLayer):
             else:
                 #    global still can hold data; assume length is correct by
                 #    protocol send the resulting frame
-                frame = CanFrame(header, msg.data)
+                frame = CanFrame.fromHeaderData(header, msg.data)
                 self.physicalLayer.sendFrameAfter(frame)
                 error = None  # clear non-fatal error to allow fireMessageSent
         if error is None:
@@ -1007,6 +1219,21 @@ class CanLink(LinkLayer):
 
         return segments
 
+    def segmentStreamDataArray(self, data: bytearray) -> List[bytearray]:
+        """Segment Stream_Data_Send data (the destination stream ID,
+        then the payload) into frames of no more than 8 bytes.
+
+        Returns:
+            list[bytearray]: One or more data segments. Each starts with
+                the destination stream ID followed by up to 7 bytes of
+                payload.
+        """
+        streamID = data[0:1]
+        payload = data[1:]
+        if not payload:
+            return [bytearray(streamID)]
+        return [streamID + payload[i:i+7] for i in range(0, len(payload), 7)]
+
     def segmentAddressedDataArray(self, alias: int,
                                   data: bytearray) -> List[bytearray]:
         '''Segment data into zero or more arrays
@@ -1048,9 +1275,16 @@ class CanLink(LinkLayer):
 
     #    MARK: common code
     def checkAndHandleAliasCollision(self, frame: CanFrame):
+        receivedAlias = frame.header & 0x0_00_0F_FF
+        if self.aliasPool:
+            # Virtual node aliases are checked whatever the state of
+            #   localNodeID's alias (each has its own reservation).
+            entry = self.aliasPool.byAlias(receivedAlias)
+            if entry is not None and entry.state is not AliasState.Pending:
+                self.processVirtualCollision(entry, frame)
+                return True
         if self._state != CanLink.State.Permitted:
             return False
-        receivedAlias = frame.header & 0x0_00_0F_FF
         abort = (receivedAlias == self._localAlias)
         if abort:
             self.processCollision(frame)
@@ -1069,6 +1303,8 @@ class CanLink(LinkLayer):
     def processCollision(self, frame: CanFrame):
         ''' Collision! '''
         self._aliasCollisionCount += 1
+        if self.metrics is not None:
+            self.metrics.aliasCollisions.inc()
         logger.warning(
             "alias collision in {}, we restart with AMR"
             " and attempt to get new alias".format(frame))
@@ -1080,7 +1316,7 @@ class CanLink(LinkLayer):
             #   - should only happen while already Permitted!
             # self.physicalLayer.clearSendQueue()  # probably not necessary using blockedReason later (should be isCanceled in this case)  # noqa: E501
             # Send AMR before inhibited (section 6.2.4):
-            self.physicalLayer.sendFrameAfter(CanFrame(
+            self.physicalLayer.sendFrameAfter(CanFrame.control(
                 ControlFrame.AMR.value,
                 self._localAlias,
                 self.localNodeID.toArray(),
@@ -1099,6 +1335,50 @@ class CanLink(LinkLayer):
         self._localAlias = self.createAlias12(self._localAliasSeed)
         self.defineAndReserveAlias()
 
+    def processVirtualCollision(self, entry: AliasEntry, frame: CanFrame):
+        """Collision with a virtual node's alias: Send AMR if it was in
+        use, then reserve the next alias for that node only.
+        """
+        self._aliasCollisionCount += 1
+        if self.metrics is not None:
+            self.metrics.aliasCollisions.inc()
+        logger.warning(
+            "alias collision for virtual node {} in {},"
+            " attempting to get new alias".format(entry.nodeID, frame))
+        if entry.state is AliasState.Permitted:
+            self._unmapVirtualAlias(entry)
+            self.markDuplicateAlias(entry.alias)
+            self.physicalLayer.sendFrameAfter(CanFrame.control(
+                ControlFrame.AMR.value, entry.alias, entry.nodeID.toArray()))
+            self.fireVirtualNodeStateChanged(entry.nodeID, False)
+        seed, alias = self._nextFreeAlias(self.incrementAlias48(entry.seed))
+        self.aliasPool.setAlias(entry, seed, alias)
+        if self._isLinkActive():
+            self._enqueueVirtualCIDSequence(entry)
+
+    def _nextFreeAlias(self, seed: int):
+        """Get the first (seed, alias) starting at seed (advanced by
+        incrementAlias48) whose alias is not already in use locally or
+        by a known remote node.
+        """
+        alias = self.createAlias12(seed)
+        while ((alias == self._localAlias)
+                or (self.aliasPool.byAlias(alias) is not None)
+                or (alias in self.aliasToNodeID)):
+            seed = self.incrementAlias48(seed)
+            alias = self.createAlias12(seed)
+        return seed, alias
+
+    def _unmapVirtualAlias(self, entry: AliasEntry):
+        if self.aliasToNodeID.get(entry.alias) == entry.nodeID:
+            del self.aliasToNodeID[entry.alias]
+        if self.nodeIdToAlias.get(entry.nodeID) == entry.alias:
+            del self.nodeIdToAlias[entry.nodeID]
+
+    def _isLinkActive(self) -> bool:
+        return self._state not in (CanLink.State.Initial,
+                                   CanLink.State.Inhibited)
+
     # def sendAliasAllocationSequence(self):
     #     # actually, call self._enqueueCIDSequence()  # set _state&send data
     #     raise DeprecationWarning("Use setState to BusyLocalCIDSequence")
@@ -1123,6 +1403,7 @@ class CanLink(LinkLayer):
         """
         assert isinstance(self._state, CanLink.State), \
             "Expected a CanLink.State, got {}".format(emit_cast(self._state))
+        self.scheduler.runDue()  # may change state (See _startAliasWait)
         if self._state in (CanLink.State.Inhibited, CanLink.State.Initial):
             # Do nothing. OpenLCBNetwork or application must first call
             # physicalLayerUp
@@ -1131,17 +1412,8 @@ class CanLink(LinkLayer):
             pass
         elif self._state == CanLink.State.WaitForAliases:
             if self._waitingForAliasStart is None:
-                self._waitingForAliasStart = default_timer()
-            else:
-                if ((default_timer() - self._waitingForAliasStart)
-                        > CanLink.ALIAS_RESPONSE_DELAY):
-                    # There were no alias collisions (any nodes with the
-                    #   same alias are required to respond within this
-                    #   time as per Section 6.2.5 of CAN Frame Transfer
-                    #   Standard) so finish the sends for the alias
-                    #   reservation:
-                    self._waitingForAliasStart = None
-                    self.setState(CanLink.State.EnqueueAliasReservation)
+                # state was set without setState (such as in a test)
+                self._startAliasWait()
         # NOTE: *All* other state processing is done in _onStateChange
         #   which is always called by setState, so avoid infinite
         #   recursion by only calling setState from here if state is
@@ -1151,6 +1423,62 @@ class CanLink(LinkLayer):
 
         return self.getState()
 
+    def _startAliasWait(self):
+        """Schedule the end of the alias collision window
+        (ALIAS_RESPONSE_DELAY after the CID sequence was sent).
+        """
+        if self._aliasTimer is not None:
+            self._aliasTimer.cancel()
+        self._waitingForAliasStart = self.scheduler.clock()
+        reservation = self._reservation
+        self._aliasTimer = self.scheduler.callLater(
+            CanLink.ALIAS_RESPONSE_DELAY,
+            lambda: self._onAliasWaitDone(reservation))
+
+    def _onAliasWaitDone(self, reservation: int):
+        self._aliasTimer = None
+        if reservation != self._reservation:
+            return  # reservation restarted since (collision or error)
+        if self._state != CanLink.State.WaitForAliases:
+            return
+        # There were no alias collisions (any nodes with the same alias
+        #   are required to respond within this time as per Section
+        #   6.2.5 of CAN Frame Transfer Standard) so finish the sends
+        #   for the alias reservation:
+        self._waitingForAliasStart = None
+        self.setState(CanLink.State.EnqueueAliasReservation)
+
+    def _scheduleAliasPool(self):
+        """Schedule _pollAliasPool for when the oldest virtual node
+        alias waiting for collisions is ready (one timer at a time).
+        """
+        if self._aliasPoolTimer is not None:
+            return
+        deadline = self.aliasPool.nextReadyTime(CanLink.ALIAS_RESPONSE_DELAY)
+        if deadline is None:
+            return
+        self._aliasPoolTimer = self.scheduler.callAt(deadline,
+                                                     self._onAliasPoolTimer)
+
+    def _onAliasPoolTimer(self):
+        self._aliasPoolTimer = None
+        if self._isLinkActive():
+            self._pollAliasPool()
+        self._scheduleAliasPool()
+
+    def _pollAliasPool(self):
+        """Send RID and AMD for each virtual node alias whose collision
+        window is over (the alias is mapped when AMD is sent).
+        """
+        ready = self.aliasPool.popReady(self.scheduler.clock(),
+                                        CanLink.ALIAS_RESPONSE_DELAY)
+        for entry in ready:
+            entry.state = AliasState.Reserving
+            self.physicalLayer.sendFrameAfter(
+                CanFrame.control(ControlFrame.RID.value, entry.alias))
+            self.physicalLayer.sendFrameAfter(CanFrame.control(
+                ControlFrame.AMD.value, entry.alias, entry.nodeID.toArray()))
+
     # May use self._enqueueCIDSequence() instead,
     # but actually trigger it in _onStateChanged
     # via setState(CanLink.State.EnqueueAliasAllocationRequest)
@@ -1166,6 +1494,9 @@ class CanLink(LinkLayer):
         Message instance. The application manages flow and the
         openlcb stack (this Python module) manages state.
         """
+        if self._aliasTimer is not None:
+            self._aliasTimer.cancel()
+            self._aliasTimer = None
         if self._reservation > -1:
             # If any reservation occurred before, clear it
             #   (prevent race condition, don't require pollFrame loop
@@ -1190,25 +1521,37 @@ class CanLink(LinkLayer):
         #   nodes will respond with their NodeIDs and aliases (populates
         #   NodeIdToAlias, permitting openlcb to send to those
         #   destinations)
-        self.physicalLayer.sendFrameAfter(CanFrame(7, self.localNodeID,
-                                          self._localAlias,
-                                          reservation=self._reservation))
-        self.physicalLayer.sendFrameAfter(CanFrame(6, self.localNodeID,
-                                          self._localAlias,
-                                          reservation=self._reservation))
-        self.physicalLayer.sendFrameAfter(CanFrame(5, self.localNodeID,
-                                          self._localAlias,
-                                          reservation=self._reservation))
         self.physicalLayer.sendFrameAfter(
-            CanFrame(4, self.localNodeID, self._localAlias,
-                     afterSendState=CanLink.State.WaitForAliases,
-                     reservation=self._reservation)
+            CanFrame.cid(7, self.localNodeID, self._localAlias,
+                         reservation=self._reservation))
+        self.physicalLayer.sendFrameAfter(
+            CanFrame.cid(6, self.localNodeID, self._localAlias,
+                         reservation=self._reservation))
+        self.physicalLayer.sendFrameAfter(
+            CanFrame.cid(5, self.localNodeID, self._localAlias,
+                         reservation=self._reservation))
+        self.physicalLayer.sendFrameAfter(
+            CanFrame.cid(4, self.localNodeID, self._localAlias,
+                         afterSendState=CanLink.State.WaitForAliases,
+                         reservation=self._reservation)
         )
+        for entry in self.aliasPool.pending():
+            # in the same collision window as localNodeID's alias
+            self._enqueueVirtualCIDSequence(entry)
         self._previousErrorCount = self._errorCount
         self._previousFrameCount = self._frameCount
         self._previousLocalAliasSeed = self._localAliasSeed
         self.setState(CanLink.State.WaitingForSendCIDSequence)
 
+    def _enqueueVirtualCIDSequence(self, entry: AliasEntry):
+        """Enqueue CID 7, 6, 5, 4 for a virtual node's alias (sending
+        CID 4 starts its collision window; See handleFrameSent).
+        """
+        entry.state = AliasState.CheckingID
+        for N_cid in (7, 6, 5, 4):
+            self.physicalLayer.sendFrameAfter(
+                CanFrame.cid(N_cid, entry.nodeID, entry.alias))
+
     def _enqueueReserveID(self):
         """Send Reserve ID (RID)
 
@@ -1240,9 +1583,10 @@ class CanLink(LinkLayer):
             self.defineAndReserveAlias()
 
         self.physicalLayer.sendFrameAfter(
-            CanFrame(ControlFrame.RID.value, self._localAlias,
-                     afterSendState=CanLink.State.NotifyAliasReservation,
-                     reservation=self._reservation)
+            CanFrame.control(
+                ControlFrame.RID.value, self._localAlias,
+                afterSendState=CanLink.State.NotifyAliasReservation,
+                reservation=self._reservation)
         )
         self.setState(CanLink.State.WaitingForSendReserveID)
 
@@ -1277,12 +1621,10 @@ class CanLink(LinkLayer):
     def canHeaderToFullFormat(self, frame: CanFrame) -> MTI:
         '''Returns a full 16-bit MTI from the full 29 bits of a CAN header'''
         frameType = (frame.header >> 24) & 0x7
-        canMTI = ((frame.header >> 12) & 0xFFF)
 
         if frameType == 1:
-            try :
-                okMTI = MTI(canMTI)
-            except ValueError:
+            okMTI = _mtiByCanMTI[(frame.header >> 12) & 0xFFF]
+            if okMTI is None:
                 logger.warning(
                     "unhandled canMTI: {}, marked Unknown"
                     .format(frame))
@@ -1293,7 +1635,10 @@ class CanLink(LinkLayer):
             #    datagram type - we don't address the subtypes here
             return MTI.Datagram
 
-        #    not handling reserver and stream type except to log
+        if frameType == 7:
+            return MTI.Stream_Data_Send
+
+        #    not handling reserved type except to log
         logger.warning(
             "unhandled canMTI: {}, marked Unknown"
             .format(frame))
@@ -1399,13 +1744,13 @@ class CanLink(LinkLayer):
             responseStart = self.getWaitForAliasResponseStart()
             assert responseStart is not None, \
                 "openlcb didn't send 7,6,5,4 CIDs (state={})".format(state)
-            if ((default_timer() - responseStart)
-                    > CanLink.ALIAS_RESPONSE_DELAY):
-                # 200ms = standard wait time for responses
-                pass  # no collisions (fail collision test if doing that)
-            precise_sleep(.02)  # must be *less than* 200ms (.2) to process
-            #   collisions (via handleData) if any during
-            #   CanLink.State.WaitForAliases.
+            # Wait for data (such as a collision reply, processed via
+            #   handleData on the next iteration) or for the next timer
+            #   (such as the end of WaitForAliases), whichever is first:
+            timeout = self.scheduler.timeUntilNext()
+            if (timeout is None) or (timeout > CanLink.ALIAS_RESPONSE_DELAY):
+                timeout = CanLink.ALIAS_RESPONSE_DELAY
+            device.waitReadable(timeout)
             state = self.pollState()
         if verbose:
             print(prefix+"waitForReady...done")
@@ -1430,6 +1775,10 @@ class CanLink(LinkLayer):
         def __hash__(self):
             return hash(self.mti)+hash(self.source)+hash(self.dest)
 
+        def __repr__(self):
+            return "AccumKey({}, {}, {})".format(self.mti, self.source,
+                                                 self.dest)
+
         def __eq__(self, other):
             if self.mti != other.mti:
                 return False
@@ -10,6 +10,9 @@ import warnings
 
 from openlcb.canbus.canframe import CanFrame
 from openlcb.canbus.controlframe import ControlFrame
+from openlcb.canbus.framebatch import FrameBatch
+from openlcb.framequeue import FrameQueue
+from openlcb.mti import MTI
 from openlcb.physicallayer import PhysicalLayer
 
 logger = getLogger(__name__)
@@ -19,18 +22,68 @@ class CanPhysicalLayer(PhysicalLayer):
     """Can implementation of PhysicalLayer, still partly abstract
     (No encodeFrameAsString, since this binary layer may be wrapped by
     the higher layer such as the text-based CanPhysicalLayerGridConnect)
+
+    Frames are sent in order of priority level (See framePriority), and
+    in the order queued within a level.
     """
+    # Send priority levels (lower is sent first):
+    PRIORITY_CONTROL = 0  # CAN control frames (CID, RID, AMD, AME...)
+    PRIORITY_MTI = 1  # 1 to 4: OpenLCB messages by MTI priority 0 to 3
+    PRIORITY_DATAGRAM = 5  # datagram frames (any frame of any datagram)
+    PRIORITY_BULK = 6  # streams and unknown frame types
+    SEND_LEVELS = 7
+    STREAM_FLOW_MTIS = frozenset((MTI.Stream_Data_Proceed.value,
+                                  MTI.Stream_Data_Complete.value))
+    # ^ sent at PRIORITY_BULK like stream data (See framePriority)
 
     def __init__(self,):
         PhysicalLayer.__init__(self)
+        self._send_frames = FrameQueue(CanPhysicalLayer.SEND_LEVELS,
+                                       self.framePriority)
         self._frameReceivedListeners: list[Callable[[CanFrame], None]] = []
 
+    @staticmethod
+    def framePriority(frame: CanFrame) -> int:
+        """Get the send priority level of a frame from its header.
+
+        The level depends only on the CAN frame type and the MTI, which
+        are the same in every frame of a multi-frame message (such as a
+        datagram or SNIP reply), so such a message is never reordered
+        or interleaved with another message of its level.
+        - CAN control frames come first (in the order queued, so CID,
+          RID and AMD of a reservation, or AMR then CID after a
+          collision, stay in order), since the alias reservation
+          sequence and replies to CID and AME are time-critical.
+        - OpenLCB messages (frame type 1) use the 2 priority bits of
+          the MTI (such as 0 for Initialization Complete, 1 for event
+          reports, 2 for Datagram Received OK).
+        - Datagram frames (frame types 2 to 5), then streams.
+          Stream_Data_Proceed and Stream_Data_Complete go with the
+          stream data (frame type 7) despite their MTI priority, so
+          Complete never overtakes the data it ends.
+
+        Returns:
+            int: 0 (sent first) to SEND_LEVELS-1.
+        """
+        header = frame.header
+        if not (header & 0x0800_0000):
+            return CanPhysicalLayer.PRIORITY_CONTROL
+        frameType = (header >> 24) & 0x7
+        if frameType == 1:
+            if ((header >> 12) & 0xFFF) in CanPhysicalLayer.STREAM_FLOW_MTIS:
+                return CanPhysicalLayer.PRIORITY_BULK
+            return CanPhysicalLayer.PRIORITY_MTI + ((header >> 22) & 0x3)
+            # ^ MTI priority (bits 10-11 of the 12-bit MTI at bit 12)
+        if 2 <= frameType <= 5:
+            return CanPhysicalLayer.PRIORITY_DATAGRAM
+        return CanPhysicalLayer.PRIORITY_BULK
+
     def sendFrameAfter(self, frame: CanFrame):
         """Enqueue: *IMPORTANT* Main/other thread may have
         called this. Any other thread sending other than the _listen
         thread is bad, since overlapping calls to socket cause undefined
-        behavior, so this just adds to a deque (double ended queue, used
-        as FIFO).
+        behavior, so this just adds to a queue (FIFO within each
+        priority level, See framePriority).
         - CanPhysicalLayerGridConnect formerly had canSendCallback
           but now it uses its own frame deque, and the socket code pops
           and sends the frames.
@@ -59,8 +112,10 @@ class CanPhysicalLayer(PhysicalLayer):
 
     def registerFrameReceivedListener(self,
                                       listener: Callable[[CanFrame], None],
-                                      enable_test=False):
+                                      enable_test=False, dispatcher=None):
         # ^ 2nd arg to Callable type is the return type.
+        # dispatcher (Dispatcher): See LinkLayer
+        #   registerMessageReceivedListener.
         assert listener is not None
         if not enable_test:
             warnings.warn(
@@ -70,7 +125,10 @@ class CanPhysicalLayer(PhysicalLayer):
                 " packets into frames (this layer communicates to upper layers"
                 " using physicalLayer.onFrameReceived set by"
                 " LinkLayer/subclass constructor).")
+        if dispatcher is not None:
+            listener = dispatcher.deferred(listener)
         self._frameReceivedListeners.append(listener)
+        return listener
 
     def fireFrameReceived(self, frame: CanFrame):
         """Fire *CanFrame received* listeners.
@@ -85,10 +143,23 @@ class CanPhysicalLayer(PhysicalLayer):
         #   the openlcb network stack (This Python module) to
         #   operate--See
         #   <https://github.com/bobjacobsen/python-openlcb/issues/62#issuecomment-2775668681>
+        if self.shaper is not None:
+            self.shaper.observeReceived(frame)  # adaptive back off
         self.onFrameReceived(frame)  # canLink.handleFrameReceived reference
         for listener in self._frameReceivedListeners:
             listener(frame)
 
+    def fireFrameBatch(self, batch: FrameBatch) -> int:
+        """Fire *CanFrame received* listeners for each frame in a batch
+        (such as from decodeBatch) in order.
+
+        Returns:
+            int: The number of frames fired.
+        """
+        for frame in batch:
+            self.fireFrameReceived(frame)
+        return len(batch)
+
     def physicalLayerUp(self):
         '''Invoked when the physical link implementation has initially come up
         '''
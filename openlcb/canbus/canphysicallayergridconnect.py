@@ -11,16 +11,23 @@ Works with frames like
 '''
 
 
+import binascii
 import struct
 import sys
+import time
 
+from array import array
+from binascii import hexlify, unhexlify
+from itertools import accumulate
 from logging import getLogger
-from typing import Tuple, Union
+from typing import Iterator, Tuple, Union
 
 from openlcb import from_hex_bytes, only_hex_pairs
 from openlcb.canbus.canphysicallayer import CanPhysicalLayer
 from openlcb.canbus.canframe import CanFrame
+from openlcb.canbus.framebatch import FrameBatch
 from openlcb.frameencoder import FrameEncoder
+from openlcb.metrics import stackMetrics
 from openlcb.portinterface import PortInterface
 
 logger = getLogger(__name__)
@@ -28,20 +35,36 @@ logger = getLogger(__name__)
 
 GC_START_BYTE = 0x3a  # :
 GC_END_BYTE = 0x3b  # ;
+GC_FRAME_OVERHEAD = 13  # len(":X") + 8 header + len("N") + len(";\n")
+GC_FRAME_MAX_LEN = GC_FRAME_OVERHEAD + 16  # 8 data bytes, 2 hex digits each
 
 
 class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
     """CAN physical layer subclass for GridConnect
 
     This acts as frame.encoder for canLink, and manages the packet
-    _send_frames queue (deque is used for speed; defined & managed in base
-    class: PhysicalLayer)
+    _send_frames queue (a FrameQueue ordered by framePriority; defined in base
+    classes: PhysicalLayer, CanPhysicalLayer)
 
     Attributes:
         assertValidData (bool): Raise assertion error if characters
             other than 0-F are in a GirdConnect packet (not including
             non-data tokens).
+        maxSendBatch (int): Maximum number of frames sendAll writes to
+            the device in one send call (1 sends each frame separately).
+        readSize (int): Maximum number of bytes receiveAll reads at
+            once (directly into inboundBuffer, using
+            device.receiveInto).
+        COMPACT_THRESHOLD (int): Number of consumed bytes at the
+            front of inboundBuffer before they are deleted (Until then
+            the read offset just moves forward, so a partial packet is
+            not copied on every call to handleData).
+
+    Only inboundBuffer[_inboundStart:_inboundEnd] is unparsed data.
+    Bytes after _inboundEnd are preallocated space for receiveAll.
     """
+    COMPACT_THRESHOLD = 4096
+
     # deprecated:
     # Args:
     #     callback (Callable): A string send method for the platform and
@@ -57,6 +80,11 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
         CanPhysicalLayer.__init__(self)  # creates self._send_frames
         FrameEncoder.__init__(self)
         self.assertValidData = False
+        self.maxSendBatch = 32
+        self.readSize = 16384
+        self._sendBuffer = bytearray(self.maxSendBatch * GC_FRAME_MAX_LEN)
+        # ^ preallocated, reused by sendAll (See
+        #   FrameEncoder.encodeFrameInto)
         # region moved to CanLink constructor
         # from canLink.linkPhysicalLayer(self)  # self.setCallBack(callback):
         # canLink.physicalLayer = self
@@ -64,6 +92,11 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
         # endregion moved to CanLink constructor
 
         self.inboundBuffer = bytearray()
+        self._inboundStart = 0  # read offset into inboundBuffer
+        self._inboundEnd = 0  # end of received data in inboundBuffer
+        self.metrics = stackMetrics()  # None unless metrics are enabled
+        if self.metrics is not None:
+            self.metrics.sendQueueDepth.addMethodSource(self, "queueDepth")
 
     # def setCallBack(self, callback):
     #     assert callable(callback)
@@ -71,16 +104,13 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
 
     def encodeFrameAsString(self, frame: CanFrame) -> str:
         '''Encode frame to string.'''
-        output = ":X{:08X}N".format(frame.header)  # at least 8 chars, hex
-        for byte in frame.data:
-            output += "{:02X}".format(byte)  # at least 2 chars, hex
-        output += ";\n"
-        return output
+        # at least 8 chars for header, 2 per data byte, hex
+        return ":X%08XN%s;\n" % (frame.header, frame.data.hex().upper())
 
     def encodeFrameAsData(self, frame: CanFrame) -> Union[bytearray, bytes]:
-        # TODO: Consider doing this manually (in Python 3,
-        #   bytes/bytearray has no attribute 'format')
-        return self.encodeFrameAsString(frame).encode("utf-8")
+        # Format bytes directly (hexlify is a C loop over data) rather
+        #   than formatting then encoding a str.
+        return b":X%08XN%s;\n" % (frame.header, hexlify(frame.data).upper())
 
     def receiveAll(self, device: PortInterface, verbose=False,
                    verbose_fn=None) -> int:
@@ -97,13 +127,31 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
         if verbose_fn is None:
             verbose_fn = print
         count = 0
+        buf = self.inboundBuffer
+        end = self._inboundEnd
+        if len(buf) - end < self.readSize:
+            start = self._inboundStart
+            if start:
+                # Move the unparsed data (typically a partial packet) to
+                #   the front instead of growing the buffer every read.
+                end -= start
+                buf[:end] = buf[start:start+end]
+                self._inboundStart = 0
+                self._inboundEnd = end
+            if len(buf) - end < self.readSize:
+                buf.extend(bytes(end + self.readSize - len(buf)))
+                # ^ only until it holds the unparsed data + readSize
         try:
-            data = device.receive()  # If timeout, set non-blocking
-            if data is None:
+            # Read directly after the unparsed data (no bytes object
+            #   per read, and nothing to append to inboundBuffer).
+            with memoryview(buf) as view:
+                with view[end:end+self.readSize] as target:
+                    received = device.receiveInto(target)
+            if not received:
                 return count
-            _ = self.handleData(data, verbose=verbose,
-                                verbose_fn=verbose_fn)
-            count += len(data)
+            self._inboundEnd = end + received
+            _ = self._handleInbound(verbose=verbose, verbose_fn=verbose_fn)
+            count += received
         except BlockingIOError:
             # raised by receive if no data (non-blocking is
             #   what we want, so fall through).
@@ -114,6 +162,22 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
                 verbose=False, verbose_fn=None) -> int:
         """Send all queued frames using the given device.
 
+        Queued frames are encoded into one buffer and written with a
+        single device.send (or sendString) per batch instead of one per
+        frame. A batch ends after maxSendBatch frames, or after a frame
+        with afterSendState (the state change must take effect before
+        later frames are sent, such as the 200 ms alias reservation
+        delay after CID 4). onFrameSent is called for each frame of a
+        batch in queue order after the batch is written. If a shaper is
+        set, sending stops at the first frame it does not allow yet
+        (that frame and later ones stay queued; See sendDelay).
+
+        In binary mode each frame is encoded (encodeFrameAsData) and
+        copied into a preallocated buffer (encodeFrameInto), rather than
+        joined into a new bytes object per batch, and device.send
+        receives a memoryview of it that is only valid during the call
+        (PortInterface implementations write it out before returning).
+
         Args:
             device (PortInterface): A Serial or Socket device
                 implementation of PortInterface so as to provide a send
@@ -129,7 +193,8 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
             int: The count of frames sent. If 0, None were queued by
                 sendFrameAfter (or internal python-openlcb methods which
                 call it) since the queue was created or since the last
-                time all frames were polled.
+                time all frames were polled (or the shaper did not
+                allow sending yet).
         """
         assert mode in ("binary", "text")
         if verbose_fn is None:
@@ -137,32 +202,65 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
         if self.linkLayer:
             self.linkLayer.pollState()  # Advance delayed state(s) if necessary
             #  (done first since may enqueue frames).
+        maxBatch = max(1, self.maxSendBatch)
         count = 0
-        try:
-            while True:
-                frame: CanFrame = self._send_frames.popleft()
-                # ^ exits loop with IndexError when done.
-                # (otherwise use pollFrame() and break if None)
-                if self.linkLayer:
-                    blockedMsg = self.linkLayer.blockedReason(frame)
-                    if blockedMsg:
-                        print("Skipping sending frame: {}".format(blockedMsg))
-                if mode == "binary":
-                    data = self.encodeFrameAsData(frame)
-                    device.send(data)
-                else:
-                    data = self.encodeFrameAsString(frame)
-                    device.sendString(data)
+        batch = []
+        while True:
+            self._popSendBatch(batch, maxBatch)
+            if not batch:
+                break
+            if mode == "binary":
+                end = 0
+                for frame in batch:
+                    if end + GC_FRAME_MAX_LEN > len(self._sendBuffer):
+                        self._growSendBuffer(end, frame)
+                    end = self.encodeFrameInto(frame, self._sendBuffer, end)
+                with memoryview(self._sendBuffer) as view:
+                    with view[:end] as data:
+                        device.send(data)
+            else:
+                device.sendString("".join([self.encodeFrameAsString(frame)
+                                           for frame in batch]))
+            for frame in batch:
                 self.onFrameSent(frame)  # Calls setState if necessary
                 #   (if frame.afterSendState is not None).
                 if verbose:
-                    verbose_fn("- SENT: {}".format(data))
-                count += 1
-        except IndexError:
-            # nothing more to do (queue is empty)
-            pass
+                    verbose_fn("- SENT: {}".format(
+                        self.encodeFrameAsData(frame)))
+            count += len(batch)
         return count
 
+    def _growSendBuffer(self, end: int, frame: CanFrame):
+        """Make room in _sendBuffer to encode frame at end
+        (Only happens if maxSendBatch was increased or a frame has more
+        than 8 data bytes, since the buffer is preallocated).
+        """
+        needed = end + max(GC_FRAME_MAX_LEN,
+                           GC_FRAME_OVERHEAD + 2 * len(frame.data))
+        if needed > len(self._sendBuffer):
+            self._sendBuffer.extend(bytes(needed - len(self._sendBuffer)))
+
+    def _popSendBatch(self, batch: list, maxBatch: int):
+        """Dequeue the next batch of frames for sendAll.
+
+        Args:
+            batch (list): Cleared, then filled with dequeued frames (in
+                queue order).
+            maxBatch (int): Maximum number of frames in the batch.
+        """
+        del batch[:]
+        while len(batch) < maxBatch:
+            frame: CanFrame = self._popSendable()
+            if frame is None:
+                break  # queue is empty (or shaper says wait)
+            if self.linkLayer:
+                blockedMsg = self.linkLayer.blockedReason(frame)
+                if blockedMsg:
+                    print("Skipping sending frame: {}".format(blockedMsg))
+            batch.append(frame)
+            if frame.afterSendState is not None:
+                break  # state must change before later frames are sent
+
     def handleDataString(self, string: str) -> int:
         '''Provide string from the outside link to be parsed
 
@@ -224,13 +322,88 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
             v = (v << 4) + (data[i] & 15) + ((data[i] >> 6) & 1) * 9
         return v
 
-    def handleData(self, data: Union[bytes, bytearray],
+    def _scanPackets(self) -> Iterator[Tuple[int, int, int]]:
+        """Find each complete packet in inboundBuffer exactly once.
+
+        Scanning starts at the read offset (_inboundStart) left by the
+        previous call, so bytes before it are never examined again and
+        the buffer is not resliced per packet (A burst of N frames costs
+        O(N) rather than O(N²)). The buffer is compacted by
+        _compactInbound after the last packet.
+
+        Yields:
+            tuple(int, int, int): Position of ':', position of ';', and
+                position *after* ';' or ';\\n' (same range as
+                nextPacketRange).
+        """
+        buf = self.inboundBuffer
+        find = buf.find
+        start = self._inboundStart
+        stop = self._inboundEnd
+        while True:
+            first = find(GC_START_BYTE, start, stop)
+            if first < 0:
+                # No packet start, so nothing before end is worth keeping.
+                start = stop
+                break
+            semi = find(GC_END_BYTE, first + 1, stop)
+            if semi < 0:
+                # Keep the partial packet for the next call.
+                start = first
+                break
+            end = semi + 1
+            if (end < stop) and (buf[end] == 0x0a):
+                # Collect the newline as well
+                end += 1
+            self._inboundStart = end  # set 1st in case listener raises
+            yield first, semi, end
+            start = end
+        self._inboundStart = start
+        self._compactInbound()
+
+    def _compactInbound(self):
+        """Drop consumed bytes from the front of inboundBuffer.
+        This only happens when everything was consumed (cheap) or when
+        the consumed part exceeds COMPACT_THRESHOLD, so a partial packet
+        at the end is normally not copied on every call. The space
+        preallocated by receiveAll is kept unless the buffer grew past
+        twice readSize (such as if handleData got a large chunk).
+        """
+        start = self._inboundStart
+        if start == 0:
+            return
+        if start >= self._inboundEnd:
+            if len(self.inboundBuffer) > 2 * self.readSize:
+                self.inboundBuffer.clear()
+            self._inboundStart = 0
+            self._inboundEnd = 0
+        elif start >= self.COMPACT_THRESHOLD:
+            del self.inboundBuffer[:start]
+            self._inboundStart = 0
+            self._inboundEnd -= start
+
+    def _appendInbound(self, data: Union[bytes, bytearray, memoryview]):
+        """Add received data after the unparsed data in inboundBuffer
+        (into the preallocated space if any).
+        """
+        end = self._inboundEnd
+        self._inboundEnd = end + len(data)
+        self.inboundBuffer[end:self._inboundEnd] = data
+
+    def pendingInbound(self) -> int:
+        """Get the count of received bytes not yet parsed into frames
+        (typically a partial packet).
+        """
+        return self._inboundEnd - self._inboundStart
+
+    def handleData(self, data: Union[bytes, bytearray, memoryview],
                    test_output=None, verbose=False,
                    verbose_fn=None) -> int:
         """Provide characters from the outside link to be parsed
 
         Args:
-            data (Union[bytes,bytearray]): new data from outside link
+            data (Union[bytes,bytearray,memoryview]): new data from
+                outside link (copied, so a reused receive buffer is ok)
             test_output (list, optional): List-like object to hold
                 resulting frames--for testing only (In normal operation,
                 this method only uses self.fireFrameReceived(cf) to
@@ -241,70 +414,63 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
         Returns:
             int: The number of frames completed by inboundBuffer+data.
         """
-        # This is the original handleData method (without specific
-        #   integrity checks & messages).
-        frameCount = 0
-        self.inboundBuffer += data
-        lastByte = 0  # last index is at ';'
+        self._appendInbound(data)
+        return self._handleInbound(test_output=test_output, verbose=verbose,
+                                   verbose_fn=verbose_fn)
+
+    def _handleInbound(self, test_output=None, verbose=False,
+                       verbose_fn=None) -> int:
+        """Parse the unparsed data in inboundBuffer (See handleData)."""
+        # This is the lenient parser (no integrity checks & messages,
+        #   See handleDataStrict for those). Packets shorter than
+        #   ":X" + 8 header characters + "N" can't carry a header and are
+        #   skipped. Invalid hex characters are decoded using the
+        #   branchless nibble math of readInt32 and from_hex_bytes as
+        #   in the original implementation.
         if verbose_fn is None:
             verbose_fn = print
+        frameCount = 0
+        buf = self.inboundBuffer
+        for first, semi, end in self._scanPackets():
+            if semi - first < 11:  # len(":X") + 8 header + len("N")
+                self._countParseError()
+                continue
+            try:
+                header = int.from_bytes(unhexlify(buf[first+2:first+10]),
+                                        "big")
+                # ^ not int(_, 16), which accepts " ", "_", "+" and "-"
+            except binascii.Error:
+                self._countParseError()
+                header = self.readInt32(buf, first+2)
+            dataI = first + 11  # skip ":X", 8 header characters, and "N"
+            pairs = (semi - dataI) // 2
+            if pairs > 8:
+                pairs = 8  # CAN frame payload is at most 8 bytes
+            dataEnd = dataI + pairs * 2
+            if pairs:
+                try:
+                    outData = bytearray(unhexlify(buf[dataI:dataEnd]))
+                except binascii.Error:
+                    self._countParseError()
+                    outData = from_hex_bytes(buf, dataI, dataEnd,
+                                             assertValid=False)
+            else:
+                outData = bytearray()
 
-        if GC_END_BYTE in self.inboundBuffer:
-            #  ^ ';' ends message so we have at least one (CR/LF not required)
-            # found end, now find start of that same message, earlier in buffer
-            for index in range(0, len(self.inboundBuffer)):
-                if GC_END_BYTE not in self.inboundBuffer[index:]:
-                    break
-                if self.inboundBuffer[index] == 0x3A:  # ':' starts message
-                    # now start to accumulate data from entire message
-                    outData = bytearray()
-                    header = 0
-                    for offset in range(2, 9+1):  # skip first 2 bytes (":X")
-                        nextChar = (self.inboundBuffer[index+offset])
-                        nextByte = (nextChar & 0xF)+9 if nextChar > 0x39 else nextChar & 0xF  # noqa: E501
-                        header = (header << 4)+nextByte
-                    # offset 10 is N
-                    # offset 11 might be data, might be ;
-                    lastByte = index+11
-                    for dataItem in range(0, 8):
-                        if self.inboundBuffer[index+11+2*dataItem] == GC_END_BYTE:  # noqa: E501
-                            break
-                        # two characters are data
-                        byte1 = self.inboundBuffer[index+11+2*dataItem]
-                        # Convert from UTF-8 to ordinal (0x39 is
-                        #   "9", so assume UTF-8 code higher than 39 is
-                        #   "A"-"F" [NOTE: "a"="f" would also work due
-                        #   to `& 0xF` but are N/A in GridConnect]):
-                        #   - 0x30-0x39 & 0xF yields 0-9
-                        #   - 0x41-0x46 or 0x61-0x66 & 0xF + 9 yields 10-15
-                        part1 = (byte1 & 0xF)+9 if byte1 > 0x39 else byte1 & 0xF  # noqa: E501
-                        byte2 = self.inboundBuffer[index+11+2*dataItem+1]
-                        part2 = (byte2 & 0xF)+9 if byte2 > 0x39 else byte2 & 0xF  # noqa: E501
-                        high_nibble = part1 << 4
-                        # if part1 > 0xF:  # can't fit > 0b1111 in nibble
-                        #     # possible overflow caused by +9 above
-                        #     #   (but should only happen on bad packet)?
-                        #     #   Commented since not sure if ok
-                        #     raise ValueError(
-                        #         "Got {} for high nibble (part1 << 4 == {})."
-                        #         .format(part1, high_nibble))
-                        outData += bytearray([high_nibble | part2])
-                        lastByte += 2
-                    # lastByte is index of ; in this message
-
-                    cf = CanFrame(header, outData)
-                    if test_output is not None:
-                        test_output.add(cf)
-                    frameCount += 1
-                    self.fireFrameReceived(cf)
-                    if verbose:
-                        verbose_fn("- RECV {}".format(
-                            self.inboundBuffer[index:lastByte+1].strip()))
-
-            # shorten buffer by removing the processed message
-            self.inboundBuffer = self.inboundBuffer[lastByte:]
+            cf = CanFrame.fromHeaderData(header, outData)
+            if test_output is not None:
+                test_output.add(cf)
+            frameCount += 1
+            self.fireFrameReceived(cf)
+            if verbose:
+                verbose_fn("- RECV {}".format(buf[first:end].strip()))
         return frameCount
 
+    def _countParseError(self):
+        """Count a malformed packet (See openlcb.metrics)."""
+        if self.metrics is not None:
+            self.metrics.parseErrors.inc("gridconnect")
+
     def handleDataStrict(self, data: Union[bytes, bytearray],
                          test_output=None, verbose=False,
                          verbose_fn=None) -> int:
@@ -326,66 +492,58 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
         # (Should be) same as the original handleData (but more explicit
         #   with messages and error checking (effectively noise
         #   rejection).
-        cls = type(self)
         if verbose_fn is None:
             verbose_fn = print
         frameCount = 0
-        self.inboundBuffer += data
-        # lastByte = 0  # last index is at ';'
-        start = 0
-        while True:
-            first, end = cls.nextPacketRange(self.inboundBuffer, start=start)
-            if first is None:
-                break
-            # else last is not None guaranteed
-            semi = (end - 2) if (self.inboundBuffer[end-1] == 0x0a) else (end - 1)  # noqa: E501
+        self._appendInbound(data)
+        buf = self.inboundBuffer
+        for first, semi, end in self._scanPackets():
             if semi - first < 11:  # len(":X") + 8 data + len("N")
                 logger.warning(
                     "[handleData] Skipped malformed {} "
                     " (< 8 pairs in range {},{}) in packet {}"
-                    .format(repr(self.inboundBuffer[first+1:semi]),
+                    .format(repr(buf[first+1:semi]),
                             first+1, end,
-                            repr(self.inboundBuffer[first:end])))
-                start = end
+                            repr(buf[first:end])))
+                self._countParseError()
                 continue
-            if self.inboundBuffer[first+1] != ord(b'X'):  # 0x58 (88)
+            if buf[first+1] != ord(b'X'):  # 0x58 (88)
                 logger.warning(
                     "[handleData] Skipped malformed packet"
                     " (No 'X' in {})"
-                    .format(repr(self.inboundBuffer[first:end])))
-                start = end
+                    .format(repr(buf[first:end])))
+                self._countParseError()
                 continue
             headerI = first + 2  # skip 2 chars: ":X"
             headerEnd = headerI + 8
-            if (self.inboundBuffer[headerEnd] != ord(b'N')):  # 0x58 (88)
+            if (buf[headerEnd] != ord(b'N')):  # 0x58 (88)
                 logger.warning(
                     "[handleData] Skipped malformed packet"
                     " (header {} does not end with 'N' {} but {} in {})"
-                    .format(repr(self.inboundBuffer[first:end]),
-                            ord(b'N'), self.inboundBuffer[headerEnd],
-                            self.inboundBuffer[first:end]))
-                start = end
+                    .format(repr(buf[first:end]),
+                            ord(b'N'), buf[headerEnd],
+                            buf[first:end]))
+                self._countParseError()
                 continue
             dataI = headerEnd + 1  # header (8) + 1 (skip "N")
             dataEnd = semi
             if self.assertValidData and (dataEnd - dataI > 0):
-                assert only_hex_pairs(self.inboundBuffer[headerI:headerEnd]), \
-                    self.inboundBuffer[headerI:headerEnd]  # show non-hex data
-                assert only_hex_pairs(self.inboundBuffer[dataI:dataEnd]), \
-                    self.inboundBuffer[dataI:dataEnd]  # show the non-hex data
-            header_bytes = from_hex_bytes(self.inboundBuffer, headerI,
-                                          headerEnd,
+                assert only_hex_pairs(buf[headerI:headerEnd]), \
+                    buf[headerI:headerEnd]  # show non-hex data
+                assert only_hex_pairs(buf[dataI:dataEnd]), \
+                    buf[dataI:dataEnd]  # show the non-hex data
+            header_bytes = from_hex_bytes(buf, headerI, headerEnd,
                                           assertValid=self.assertValidData)
             if dataEnd - dataI > 0:
                 if (dataEnd - dataI) % 2 > 0:
                     logger.warning(
                         "[handleData] Skipped malformed packet"
                         " (Incomplete pair in {} (range {},{}) in {})"
-                        .format(repr(self.inboundBuffer[dataI:dataEnd]), dataI,
-                                dataEnd, repr(self.inboundBuffer[first:end])))
-                    start = end
+                        .format(repr(buf[dataI:dataEnd]), dataI,
+                                dataEnd, repr(buf[first:end])))
+                    self._countParseError()
                     continue
-                outData = from_hex_bytes(self.inboundBuffer, dataI, dataEnd,
+                outData = from_hex_bytes(buf, dataI, dataEnd,
                                          assertValid=self.assertValidData)
             else:
                 outData = bytearray()
@@ -393,20 +551,91 @@ class CanPhysicalLayerGridConnect(CanPhysicalLayer, FrameEncoder):
             # Convert 4-byte big-endian header to 29-bit integer
             header = struct.unpack('>I', header_bytes)[0]
 
-            cf = CanFrame(header, outData)
+            cf = CanFrame.fromHeaderData(header, outData)
             if test_output is not None:
                 test_output.add(cf)
             frameCount += 1
             self.fireFrameReceived(cf)
             if verbose:
-                verbose_fn("- RECV {}".format(
-                    self.inboundBuffer[first:end].strip()))
+                verbose_fn("- RECV {}".format(buf[first:end].strip()))
 
-            start = end  # proceed to next packet (keep going until no : or ;)
+        return frameCount
 
-        # if lastByte > 0:
-        #     del self.inboundBuffer[0:lastByte+1]
-        if start > 0:
-            del self.inboundBuffer[0:start]
+    def decodeBatch(self, data: Union[bytes, bytearray],
+                    batch: Union[FrameBatch, None] = None,
+                    timestamp: Union[float, None] = None) -> FrameBatch:
+        """Decode all complete packets into columns
+        (without creating a CanFrame per frame or firing listeners).
 
-        return frameCount
+        Parsing is lenient like handleData and shares inboundBuffer
+        with it, so a partial packet at the end is completed by the
+        next call to either method. Call fireFrameBatch afterward if
+        the link layer also needs the frames.
+
+        The hex of all headers is joined and converted in one unhexlify
+        call (likewise for all payloads) then headers are loaded into
+        the batch using array.frombytes, so per-frame Python work is
+        only slicing.
+
+        Args:
+            data (Union[bytes,bytearray]): new data from outside link
+            batch (FrameBatch, optional): Batch to append to (reuse one
+                to avoid allocating columns per call). Defaults to a
+                new FrameBatch (with timestamps if timestamp is set).
+            timestamp (float, optional): Receive time of data, stored
+                for each frame if batch has timestamps. Defaults to
+                time.time() in that case.
+
+        Returns:
+            FrameBatch: batch, with frames completed by
+                inboundBuffer+data appended.
+        """
+        if batch is None:
+            batch = FrameBatch(timestamps=(timestamp is not None))
+        self._appendInbound(data)
+        buf = self.inboundBuffer
+        headerHex = []
+        dataHex = []
+        lengths = []
+        for first, semi, _ in self._scanPackets():
+            if semi - first < 11:  # len(":X") + 8 header + len("N")
+                self._countParseError()
+                continue
+            dataI = first + 11
+            pairs = (semi - dataI) // 2
+            if pairs > 8:
+                pairs = 8  # CAN frame payload is at most 8 bytes
+            headerHex.append(buf[first+2:first+10])
+            dataHex.append(buf[dataI:dataI+pairs*2])
+            lengths.append(pairs)
+        if not lengths:
+            return batch
+        try:
+            headerBytes = unhexlify(b"".join(headerHex))
+            payload = unhexlify(b"".join(dataHex))
+        except binascii.Error:
+            self._countParseError()
+            # Invalid character(s): decode using nibble math like
+            #   handleData does (one frame at a time).
+            headerBytes = bytearray()
+            payload = bytearray()
+            for chunk in headerHex:
+                headerBytes += from_hex_bytes(chunk, 0, 8, assertValid=False)
+            for chunk in dataHex:
+                if chunk:
+                    payload += from_hex_bytes(chunk, 0, len(chunk),
+                                              assertValid=False)
+        headers = array('I')
+        headers.frombytes(headerBytes)
+        if sys.byteorder == "little":
+            headers.byteswap()  # GridConnect headers are big-endian
+        base = len(batch.payload)
+        batch.headers.extend(headers)
+        batch.offsets.extend(accumulate([base] + lengths[:-1]))
+        batch.lengths.extend(lengths)
+        batch.payload += payload
+        if batch.timestamps is not None:
+            if timestamp is None:
+                timestamp = time.time()
+            batch.timestamps.extend([timestamp] * len(lengths))
+        return batch
@@ -51,23 +51,19 @@ class CanPhysicalLayerSimulation(CanPhysicalLayer, FrameEncoder):
             self.linkLayer.pollState()  # Advance delayed state(s) if necessary
             #  (done first since may enqueue frames).
         count = 0
-        try:
-            while True:
-                frame = self._send_frames.popleft()
-                # ^ exits loop with IndexError when done.
-                # (otherwise use pollFrame() and break if None)
-                if self.linkLayer:
-                    blockedMsg = self.linkLayer.blockedReason(frame)
-                    if blockedMsg:
-                        if verbose:
-                            print(f"Skipping sending frame: {blockedMsg}")
-                        continue
-                # data = self.encodeFrameAsData(frame)
-                # device.send(data)  # commented since simulation
-                self.onFrameSent(frame)
-                self.sentFrames.append(frame)
-                count += 1
-        except IndexError:
-            # no more frames (no problem)
-            pass
+        while True:
+            frame = self._popSendable()
+            if frame is None:
+                break  # no more frames (or shaper says wait)
+            if self.linkLayer:
+                blockedMsg = self.linkLayer.blockedReason(frame)
+                if blockedMsg:
+                    if verbose:
+                        print(f"Skipping sending frame: {blockedMsg}")
+                    continue
+            # data = self.encodeFrameAsData(frame)
+            # device.send(data)  # commented since simulation
+            self.onFrameSent(frame)
+            self.sentFrames.append(frame)
+            count += 1
         return count
@@ -0,0 +1,356 @@
+'''
+Binary capture of CAN frames, for recording bus traffic and replaying
+it (regression tests, load tests and benchmarks).
+
+File layout (all integers little-endian):
+- File header (16 bytes): CAPTURE_MAGIC, version (uint16), record size
+  (uint16), index interval (uint32).
+- Records (RECORD_SIZE bytes each, in capture order): timestamp
+  (float64, seconds since the epoch), 29-bit header (uint32), dlc
+  (uint8), flags (uint8, RECORD_SENT if this node sent it), 2 bytes of
+  padding, 8 bytes of data (only dlc bytes are meaningful).
+- Index block (written by CaptureWriter.close): the timestamp (float64)
+  and record number (uint64) of every index interval-th record.
+- Trailer (24 bytes): INDEX_MAGIC, offset of the index block (uint64),
+  record count (uint64).
+
+Records have a fixed size so a reader can find any record without
+scanning. If the writer was not closed (no trailer), CaptureReader
+treats everything after the file header as records and has no index.
+'''
+import mmap
+import struct
+import time
+
+from bisect import bisect_left
+from logging import getLogger
+from typing import Iterator, Tuple, Union
+
+from openlcb.canbus.canframe import CanFrame
+from openlcb.canbus.canphysicallayer import CanPhysicalLayer
+
+logger = getLogger(__name__)
+
+CAPTURE_MAGIC = b"OLCBCAP1"
+INDEX_MAGIC = b"OLCBIDX1"
+CAPTURE_VERSION = 1
+RECORD_SENT = 0x01  # flags bit: frame was sent (not received)
+
+_fileHeader = struct.Struct("<8sHHI")
+_record = struct.Struct("<dIBB2x8s")
+_indexEntry = struct.Struct("<dQ")
+_trailer = struct.Struct("<8sQQ")
+
+RECORD_SIZE = _record.size  # 24
+
+
+class CaptureWriter:
+    """Write frames to a capture file.
+
+    Records are packed into a reused buffer and written in chunks, so
+    writing one costs about one struct.pack_into call.
+
+    Args:
+        path (str): File to create (overwritten if it exists).
+        indexInterval (int, optional): Records between index entries
+            (used by CaptureReader.indexOf). Defaults to 1024.
+        bufferRecords (int, optional): Records to buffer before each
+            write to the file. Defaults to 4096.
+    """
+    def __init__(self, path: str, indexInterval: int = 1024,
+                 bufferRecords: int = 4096):
+        if indexInterval < 1:
+            raise ValueError("indexInterval must be at least 1")
+        self.path = path
+        self.indexInterval = indexInterval
+        self.count = 0
+        self._index = []
+        self._buffer = bytearray(RECORD_SIZE * max(1, bufferRecords))
+        self._used = 0
+        self._file = open(path, "wb")
+        self._file.write(_fileHeader.pack(CAPTURE_MAGIC, CAPTURE_VERSION,
+                                          RECORD_SIZE, indexInterval))
+        self._physicalLayer = None
+        self._fireFrameReceived = None
+        self._onFrameSent = None
+
+    def writeRecord(self, timestamp: float, header: int,
+                    data: Union[bytes, bytearray], sent: bool = False):
+        """Add one record.
+
+        Args:
+            timestamp (float): Seconds since the epoch.
+            header (int): 29-bit CAN header.
+            data (Union[bytes, bytearray]): 0 to 8 bytes.
+            sent (bool, optional): True if this node sent the frame.
+        """
+        if len(data) > 8:
+            raise ValueError("CAN frame data is at most 8 bytes, got {}"
+                             .format(len(data)))
+        if self.count % self.indexInterval == 0:
+            self._index.append((timestamp, self.count))
+        _record.pack_into(self._buffer, self._used, timestamp, header,
+                          len(data), RECORD_SENT if sent else 0,
+                          bytes(data))
+        self._used += RECORD_SIZE
+        self.count += 1
+        if self._used == len(self._buffer):
+            self.flush()
+
+    def write(self, frame: CanFrame, timestamp: Union[float, None] = None,
+              sent: bool = False):
+        """Add a frame (See writeRecord).
+        timestamp defaults to time.time().
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.writeRecord(timestamp, frame.header, frame.data, sent=sent)
+
+    def flush(self):
+        """Write buffered records to the file."""
+        if self._used:
+            with memoryview(self._buffer) as view:
+                self._file.write(view[:self._used])
+            self._used = 0
+        self._file.flush()
+
+    def attach(self, physicalLayer: CanPhysicalLayer):
+        """Record every frame physicalLayer receives or sends.
+        Call this after the link layer is constructed (The link layer
+        sets physicalLayer.onFrameSent, which this wraps).
+
+        Args:
+            physicalLayer (CanPhysicalLayer): Layer whose
+                fireFrameReceived and onFrameSent are wrapped until
+                detach.
+        """
+        if self._physicalLayer is not None:
+            raise RuntimeError("Already attached to {}"
+                               .format(self._physicalLayer))
+        self._physicalLayer = physicalLayer
+        self._fireFrameReceived = physicalLayer.fireFrameReceived
+        self._onFrameSent = physicalLayer.onFrameSent
+        fireFrameReceived = self._fireFrameReceived
+        onFrameSent = self._onFrameSent
+        write = self.write
+
+        def recordReceived(frame: CanFrame):
+            write(frame)
+            fireFrameReceived(frame)
+
+        def recordSent(frame: CanFrame):
+            write(frame, sent=True)
+            onFrameSent(frame)
+
+        physicalLayer.fireFrameReceived = recordReceived
+        physicalLayer.onFrameSent = recordSent
+
+    def detach(self):
+        """Stop recording the layer set by attach (if any)."""
+        physicalLayer = self._physicalLayer
+        if physicalLayer is None:
+            return
+        physicalLayer.fireFrameReceived = self._fireFrameReceived
+        physicalLayer.onFrameSent = self._onFrameSent
+        self._physicalLayer = None
+        self._fireFrameReceived = None
+        self._onFrameSent = None
+
+    def close(self):
+        """Detach, then write remaining records, the index and the
+        trailer.
+        """
+        if self._file is None:
+            return
+        self.detach()
+        self.flush()
+        indexOffset = self._file.tell()
+        for entry in self._index:
+            self._file.write(_indexEntry.pack(*entry))
+        self._file.write(_trailer.pack(INDEX_MAGIC, indexOffset, self.count))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CaptureReader:
+    """Read a capture file through mmap (The file is not loaded into
+    memory, so it can be larger than RAM).
+
+    Args:
+        path (str): File written by CaptureWriter.
+
+    Raises:
+        ValueError: If the file is not a capture file (or is a newer
+            version).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:  # empty file can't be mapped
+            self._file.close()
+            raise ValueError("{} is not a capture file".format(path))
+        self._view = memoryview(self._map)
+        if len(self._map) < _fileHeader.size:
+            self.close()
+            raise ValueError("{} is not a capture file".format(path))
+        magic, version, recordSize, self.indexInterval = \
+            _fileHeader.unpack_from(self._map, 0)
+        if (magic != CAPTURE_MAGIC or version > CAPTURE_VERSION
+                or recordSize != RECORD_SIZE):
+            self.close()
+            raise ValueError(
+                "{} is not a version {} capture file"
+                " (magic={}, version={}, record size={})"
+                .format(path, CAPTURE_VERSION, magic, version, recordSize))
+        self._indexTimes = []
+        self._indexRecords = []
+        end = len(self._map)
+        if end >= _fileHeader.size + _trailer.size:
+            magic, indexOffset, count = \
+                _trailer.unpack_from(self._map, end - _trailer.size)
+            if magic == INDEX_MAGIC:
+                with self._view[indexOffset:end-_trailer.size] as index:
+                    for timestamp, record in _indexEntry.iter_unpack(index):
+                        self._indexTimes.append(timestamp)
+                        self._indexRecords.append(record)
+                end = indexOffset
+        if (end - _fileHeader.size) % RECORD_SIZE:
+            logger.warning("{} ends with a partial record (not closed?)"
+                           .format(path))
+        self.count = (end - _fileHeader.size) // RECORD_SIZE
+
+    def __len__(self):
+        return self.count
+
+    def records(self, start: int = 0, stop: Union[int, None] = None
+                ) -> Iterator[Tuple[float, int, int, int, bytes]]:
+        """Iterate raw records (without creating frames).
+        Exhaust or close the iterator before closing the reader (it
+        holds a view of the mapped file).
+
+        Args:
+            start (int, optional): First record number. Defaults to 0.
+            stop (int, optional): Record number to stop before.
+                Defaults to the record count.
+
+        Yields:
+            tuple(float, int, int, int, bytes): timestamp, header, dlc,
+                flags (See RECORD_SENT) and data (8 bytes, of which
+                only the first dlc are meaningful).
+        """
+        if stop is None or stop > self.count:
+            stop = self.count
+        if start >= stop:
+            return
+        offset = _fileHeader.size + start * RECORD_SIZE
+        with self._view[offset:offset + (stop - start) * RECORD_SIZE] \
+                as chunk:
+            yield from _record.iter_unpack(chunk)
+
+    def frames(self, start: int = 0, stop: Union[int, None] = None,
+               includeSent: bool = True) -> Iterator[Tuple[float, CanFrame]]:
+        """Iterate records as frames (See records for arguments).
+
+        Args:
+            includeSent (bool, optional): Also yield frames this node
+                sent. Defaults to True.
+
+        Yields:
+            tuple(float, CanFrame): timestamp and frame.
+        """
+        skip = 0 if includeSent else RECORD_SENT
+        fromHeaderData = CanFrame.fromHeaderData
+        for timestamp, header, dlc, flags, data in self.records(start, stop):
+            if flags & skip:
+                continue
+            yield timestamp, fromHeaderData(header, bytearray(data[:dlc]))
+
+    def indexOf(self, timestamp: float) -> int:
+        """Get the number of the first record at or after timestamp
+        (count if none). Uses the index block to skip to the nearest
+        index entry, then scans (so the file must be in time order).
+        """
+        start = 0
+        i = bisect_left(self._indexTimes, timestamp) - 1
+        if i >= 0:
+            start = self._indexRecords[i]  # last entry before timestamp
+        for number, record in enumerate(self.records(start), start):
+            if record[0] >= timestamp:
+                return number
+        return self.count
+
+    def close(self):
+        if self._map is None:
+            return
+        self._view.release()
+        self._map.close()
+        self._file.close()
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CaptureReplay:
+    """Feed captured frames into a CanPhysicalLayer as if received.
+
+    Args:
+        reader (CaptureReader): Source of frames.
+        physicalLayer (CanPhysicalLayer): Layer to call
+            fireFrameReceived on (its link layer handles each frame).
+        speed (float, optional): 1.0 replays at the original timing, 10
+            at 10x speed, and 0 (or None) as fast as possible. Defaults
+            to 1.0.
+        includeSent (bool, optional): Also replay frames the recording
+            node sent. Defaults to False (those were replies of the
+            recording node, not traffic it received).
+    """
+    def __init__(self, reader: CaptureReader,
+                 physicalLayer: CanPhysicalLayer,
+                 speed: Union[float, None] = 1.0,
+                 includeSent: bool = False):
+        self.reader = reader
+        self.physicalLayer = physicalLayer
+        self.speed = speed
+        self.includeSent = includeSent
+
+    def run(self, start: int = 0, stop: Union[int, None] = None) -> int:
+        """Replay records start to stop (blocks until done).
+
+        Returns:
+            int: The number of frames fired.
+        """
+        fire = self.physicalLayer.fireFrameReceived
+        count = 0
+        frames = self.reader.frames(start, stop,
+                                    includeSent=self.includeSent)
+        if not self.speed:
+            for _, frame in frames:
+                fire(frame)
+                count += 1
+            return count
+        firstTime = None
+        wallStart = None
+        for timestamp, frame in frames:
+            if firstTime is None:
+                firstTime = timestamp
+                wallStart = time.perf_counter()
+            delay = ((timestamp - firstTime) / self.speed
+                     - (time.perf_counter() - wallStart))
+            if delay > 0:
+                time.sleep(delay)
+            fire(frame)
+            count += 1
+        return count
@@ -0,0 +1,85 @@
+'''
+Columnar storage for many received CAN frames.
+
+A FrameBatch holds the frames decoded from one or more receive buffers
+without allocating a CanFrame and a bytearray per frame (See
+CanPhysicalLayerGridConnect.decodeBatch). Sniffers and loggers can read
+the columns directly, and fireFrameBatch passes the frames to CanLink
+when the stack also needs them.
+'''
+from array import array
+from typing import Iterator, Union
+
+from openlcb.canbus.canframe import CanFrame
+
+
+class FrameBatch:
+    """Frames stored as columns.
+
+    Frame i has header headers[i] and data
+    payload[offsets[i]:offsets[i]+lengths[i]].
+
+    Attributes:
+        headers (array): 29-bit CAN headers (typecode 'I').
+        payload (bytearray): The data of all frames, packed.
+        offsets (array): Start of each frame's data in payload
+            (typecode 'I').
+        lengths (array): Data length (0 to 8) of each frame (typecode
+            'B').
+        timestamps (Union[array, None]): Receive time of each frame
+            (typecode 'd', seconds), or None if the batch was created
+            without timestamps.
+
+    Args:
+        timestamps (bool, optional): Keep a receive time for each frame.
+            Defaults to False.
+    """
+    def __init__(self, timestamps: bool = False):
+        self.headers = array('I')
+        assert self.headers.itemsize == 4, "decodeBatch expects 32-bit 'I'"
+        self.payload = bytearray()
+        self.offsets = array('I')
+        self.lengths = array('B')
+        self.timestamps = array('d') if timestamps else None
+
+    def __len__(self) -> int:
+        return len(self.headers)
+
+    def clear(self):
+        """Remove all frames (keep the batch to reuse its columns)."""
+        del self.headers[:]
+        del self.payload[:]
+        del self.offsets[:]
+        del self.lengths[:]
+        if self.timestamps is not None:
+            del self.timestamps[:]
+
+    def append(self, header: int, data: Union[bytes, bytearray],
+               timestamp: float = 0.0):
+        """Add one frame.
+
+        Args:
+            header (int): 29-bit CAN header.
+            data (Union[bytes, bytearray]): 0 to 8 bytes of payload.
+            timestamp (float, optional): Receive time (ignored if the
+                batch has no timestamps). Defaults to 0.0.
+        """
+        self.headers.append(header)
+        self.offsets.append(len(self.payload))
+        self.lengths.append(len(data))
+        self.payload += data
+        if self.timestamps is not None:
+            self.timestamps.append(timestamp)
+
+    def data(self, index: int) -> bytearray:
+        """Get a copy of the data of one frame."""
+        offset = self.offsets[index]
+        return self.payload[offset:offset+self.lengths[index]]
+
+    def frame(self, index: int) -> CanFrame:
+        """Create a CanFrame for one frame (allocates, unlike columns)."""
+        return CanFrame.fromHeaderData(self.headers[index], self.data(index))
+
+    def __iter__(self) -> Iterator[CanFrame]:
+        for index in range(len(self.headers)):
+            yield self.frame(index)
@@ -0,0 +1,157 @@
+'''
+Bounded storage for partially received multi-frame messages.
+
+CanLink assembles datagrams and addressed messages from several frames.
+If the last frame never arrives (sender reset, lost frame, bus error)
+the partial message would otherwise be kept forever, so each partial
+message expires after a timeout (a receiver may discard stale partial
+datagrams) and the total number of entries and bytes is capped by
+evicting the least recently used entry.
+'''
+from collections import OrderedDict
+from logging import getLogger
+from timeit import default_timer
+from typing import Callable, Hashable, Union
+
+logger = getLogger(__name__)
+
+
+class MessageAccumulator:
+    """Partial messages by key, in least recently used order.
+
+    Attributes:
+        timeout (float): Seconds since the last frame after which a
+            partial message is discarded.
+        maxEntries (int): Maximum number of partial messages.
+        maxBytes (int): Maximum total bytes of all partial messages.
+        maxMessageBytes (int): Maximum bytes of one partial message (it
+            is discarded if it would grow past this).
+        totalBytes (int): Current total bytes of all partial messages.
+        expiredCount (int): Partial messages discarded by timeout.
+        evictedCount (int): Partial messages discarded to stay within
+            maxEntries or maxBytes.
+        overflowCount (int): Partial messages discarded for exceeding
+            maxMessageBytes.
+
+    Args:
+        timeout (float, optional): See timeout. Defaults to 3 seconds.
+        maxEntries (int, optional): See maxEntries. Defaults to 1024.
+        maxBytes (int, optional): See maxBytes. Defaults to 256 KiB.
+        maxMessageBytes (int, optional): See maxMessageBytes. Defaults
+            to 4096.
+        clock (Callable, optional): Returns the current time in seconds.
+            Defaults to timeit.default_timer.
+    """
+    def __init__(self, timeout: float = 3.0, maxEntries: int = 1024,
+                 maxBytes: int = 256 * 1024, maxMessageBytes: int = 4096,
+                 clock: Callable[[], float] = default_timer):
+        self.timeout = timeout
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.maxMessageBytes = maxMessageBytes
+        self.clock = clock
+        self.totalBytes = 0
+        self.expiredCount = 0
+        self.evictedCount = 0
+        self.overflowCount = 0
+        self._entries = OrderedDict()
+        # ^ key: [time of last frame, bytearray], oldest first
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def expire(self, now: Union[float, None] = None) -> int:
+        """Discard partial messages that timed out.
+        Only the oldest entries are examined, since entries are kept in
+        order of their last frame.
+
+        Returns:
+            int: The number of partial messages discarded.
+        """
+        if now is None:
+            now = self.clock()
+        count = 0
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if now - entry[0] < self.timeout:
+                break
+            self._discard(key)
+            count += 1
+        if count:
+            self.expiredCount += count
+            logger.warning("Discarded {} stale partial message(s)"
+                           .format(count))
+        return count
+
+    def start(self, key: Hashable, now: Union[float, None] = None):
+        """Begin a new partial message for key (replacing any partial
+        message already started for the same key).
+        """
+        if now is None:
+            now = self.clock()
+        self.expire(now)
+        if key in self._entries:
+            self._discard(key)
+        while len(self._entries) >= max(1, self.maxEntries):
+            self._evictOldest()
+        self._entries[key] = [now, bytearray()]
+
+    def extend(self, key: Hashable, data: Union[bytes, bytearray],
+               now: Union[float, None] = None) -> bool:
+        """Add data to the partial message for key.
+
+        Returns:
+            bool: False if there is no partial message for key (never
+                started, timed out, or evicted) or it was discarded
+                because it exceeded maxMessageBytes, otherwise True.
+        """
+        if now is None:
+            now = self.clock()
+        self.expire(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        message = entry[1]
+        if len(message) + len(data) > self.maxMessageBytes:
+            self._discard(key)
+            self.overflowCount += 1
+            logger.warning(
+                "Discarded partial message over {} bytes for {}"
+                .format(self.maxMessageBytes, key))
+            return False
+        entry[0] = now
+        self._entries.move_to_end(key)
+        message += data
+        self.totalBytes += len(data)
+        while self.totalBytes > self.maxBytes and len(self._entries) > 1:
+            self._evictOldest()
+        return True
+
+    def pop(self, key: Hashable) -> bytearray:
+        """Remove and return the message for key.
+
+        Raises:
+            KeyError: If there is no partial message for key.
+        """
+        message = self._entries.pop(key)[1]
+        self.totalBytes -= len(message)
+        return message
+
+    def clear(self):
+        """Discard all partial messages (not counted as evicted)."""
+        self._entries.clear()
+        self.totalBytes = 0
+
+    def _discard(self, key: Hashable):
+        self.totalBytes -= len(self._entries.pop(key)[1])
+
+    def _evictOldest(self):
+        key = next(iter(self._entries))
+        self._discard(key)
+        self.evictedCount += 1
+        logger.warning("Evicted partial message for {} (limit reached)"
+                       .format(key))
@@ -3,26 +3,45 @@ simple serial input for string send and receive
 expects prior setting of device name
 '''
 import serial
+import threading
 
 from logging import getLogger
 from typing import Union
 
-from openlcb.canbus.canphysicallayergridconnect import GC_END_BYTE
 from openlcb.portinterface import PortInterface
+from openlcb.waker import Waker
 
 logger = getLogger(__name__)
 
 MSGLEN = 35
-# TODO: use non-blocking mode and eliminate MSGLEN, since MSGLEN is only
-#   a convenience for CLI programs (PhysicalLayer is able to assemble
-#   packets from arbitrary chunks) and GridConnectObserver can replace
-#   that.
+# ^ No longer used by SerialLink (each read gets whatever is waiting
+#   instead of reading up to MSGLEN bytes one at a time, since
+#   PhysicalLayer assembles packets from arbitrary chunks).
 
 
 class SerialLink(PortInterface):
-    """simple serial input for string send and receive"""
+    """simple serial input for string send and receive
+
+    Attributes:
+        readSize (int): Maximum number of bytes per read. Each read
+            gets everything already waiting (in_waiting) in one call,
+            or blocks for at least one byte (or until the port's
+            timeout) if nothing is waiting.
+        readerTimeout (float): Port timeout in seconds used while the
+            reader thread is running (See startReader), which is also
+            the longest stopReader waits for a read to return.
+    """
     def __init__(self):
         super(SerialLink, self).__init__()
+        self.readSize = 4096
+        self.readerTimeout = .05
+        self._reader = None  # type: Union[threading.Thread, None]
+        self._readerStop = threading.Event()
+        self._readerLock = threading.Lock()
+        self._readerBuffer = bytearray()  # filled by _readLoop
+        self._readerData = threading.Event()  # set while buffer has data
+        self._readerError = None  # type: Union[Exception, None]
+        self._readerWaker = None  # type: Union[Waker, None]
 
     def _settimeout(self, seconds: float):
         logger.warning("settimeout is not implemented for SerialLink")
@@ -62,32 +81,168 @@ class SerialLink(PortInterface):
             RuntimeError: If the string couldn't be written to the port.
         """
         total_sent = 0
-        while total_sent < len(data[total_sent:]):
-            sent = self._device.write(data[total_sent:])
-            if sent == 0:
-                self.setOpen(False)
-                raise RuntimeError("socket connection broken")
-            total_sent = total_sent + sent
-
-    def _receive(self) -> bytearray:
+        with memoryview(data) as view:  # slice remainder without copying
+            while total_sent < len(view):
+                sent = self._device.write(view[total_sent:])
+                if sent == 0:
+                    self.setOpen(False)
+                    raise RuntimeError("socket connection broken")
+                total_sent = total_sent + sent
+
+    def _readAvailable(self) -> bytes:
+        """Read everything waiting, or block for at least one byte."""
+        return self._device.read(
+            min(self.readSize, max(1, self._device.in_waiting)))
+
+    def _receive(self) -> Union[bytes, bytearray, None]:
         '''Receive data
 
         Returns:
-            bytearray: A (usually partial) GridConnect frame
+            Union[bytes, bytearray, None]: All data waiting (usually one
+                or more partial GridConnect frames), or None if the
+                reader thread is running and has not received more.
         '''
-        data = bytearray()
-        bytes_recd = 0
-        while bytes_recd < MSGLEN:
-            chunk = self._device.read(1)
-            if chunk == b'':
-                self.setOpen(False)
-                raise RuntimeError("serial connection broken")
-            data.extend(chunk)
-            bytes_recd = bytes_recd + len(chunk)
-            if GC_END_BYTE in chunk:
-                break
+        if self._reader is not None:
+            with self._readerLock:
+                data = self._readerBuffer
+                if data:
+                    self._readerBuffer = bytearray()
+                    self._readerData.clear()
+                    return data
+            self._checkReaderError()
+            return None
+        data = self._readAvailable()
+        if data == b'':
+            self.setOpen(False)
+            raise RuntimeError("serial connection broken")
         return data
 
+    def _receiveInto(self, buffer: memoryview) -> Union[int, None]:
+        """Receive directly into buffer
+        (what is already waiting, or block for at least 1 byte).
+
+        Returns:
+            Union[int, None]: The number of bytes written at the start
+                of buffer, or None if the reader thread is running and
+                has not received more.
+        """
+        if self._reader is not None:
+            with self._readerLock:
+                count = min(len(buffer), len(self._readerBuffer))
+                if count:
+                    with memoryview(self._readerBuffer) as view:
+                        buffer[:count] = view[:count]
+                    del self._readerBuffer[:count]
+                    if not self._readerBuffer:
+                        self._readerData.clear()
+                    return count
+            self._checkReaderError()
+            return None
+        count = min(len(buffer), self.readSize,
+                    max(1, self._device.in_waiting))
+        with buffer[:count] as target:
+            count = self._device.readinto(target)
+        if not count:
+            self.setOpen(False)
+            raise RuntimeError("serial connection broken")
+        return count
+
+    def startReader(self):
+        """Read the port on a dedicated thread.
+        The thread appends everything it reads to a buffer, and receive
+        or receiveInto take from that buffer without blocking (None
+        means no data yet), so the port can be polled like a
+        non-blocking socket (such as by OpenLCBNetwork's _listen).
+        Call after connect. This sets the port timeout to readerTimeout.
+        """
+        if self._reader is not None:
+            return
+        self._device.timeout = self.readerTimeout
+        self._readerStop.clear()
+        self._readerError = None
+        self._reader = threading.Thread(target=self._readLoop,
+                                        name="SerialLink reader",
+                                        daemon=True)
+        self._reader.start()
+
+    def stopReader(self):
+        """Stop the reader thread (if started) and wait for it to end.
+        Data it read that was not received yet is discarded.
+        """
+        if self._reader is None:
+            return
+        self._readerStop.set()
+        self._reader.join()
+        self._reader = None
+        if self._readerBuffer:
+            logger.warning(
+                "{} bytes read by the reader thread were not received"
+                .format(len(self._readerBuffer)))
+            self._readerBuffer = bytearray()
+        self._readerData.clear()
+
+    def _readLoop(self):
+        try:
+            while not self._readerStop.is_set():
+                data = self._readAvailable()  # returns b'' on timeout
+                if data:
+                    with self._readerLock:
+                        self._readerBuffer += data
+                        self._readerData.set()
+                    self._wakeWaiter()
+        except Exception as ex:
+            # Raised by receive (See _checkReaderError) after the data
+            #   that was read before the error is received.
+            self._readerError = ex
+            self._readerData.set()  # wake waitReadable so receive raises
+            self._wakeWaiter()
+
+    def _wakeWaiter(self):
+        """Wake a waitReadable that waits on a Waker (See _waitReadable).
+        """
+        waker = self._readerWaker
+        if waker is not None:
+            waker.wakeup()
+
+    def _waitReadable(self, timeout: Union[float, None],
+                      waker: Union[Waker, None] = None) -> bool:
+        """Wait for the reader thread to buffer data, or (without the
+        reader thread) for data to be waiting on the port. If waker is
+        given, the reader thread wakes it too, so one wait covers both.
+        """
+        if self._reader is not None:
+            if waker is None:
+                return self._readerData.wait(timeout)
+            self._readerWaker = waker
+            try:
+                if not self._readerData.is_set():
+                    waker.wait(timeout)
+                return self._readerData.is_set() or waker.woken
+            finally:
+                self._readerWaker = None
+        if self._device.in_waiting:
+            return True
+        return super(SerialLink, self)._waitReadable(timeout, waker)
+
+    def _fileno(self) -> Union[int, None]:
+        """None while the reader thread is running (it reads the port,
+        so wait for its data using waitReadable instead).
+        """
+        if self._reader is not None:
+            return None
+        return super(SerialLink, self)._fileno()
+
+    def _checkReaderError(self):
+        """Raise (once) an error that ended the reader thread."""
+        error = self._readerError
+        if error is None:
+            return
+        self._readerError = None
+        self._reader = None
+        self.setOpen(False)
+        raise RuntimeError("serial connection broken") from error
+
     def _close(self):
+        self.stopReader()
         self._device.close()
         return
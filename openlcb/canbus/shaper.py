@@ -0,0 +1,211 @@
+'''
+Transmit rate limiting for a CAN physical layer.
+
+Inexpensive USB-CAN and GridConnect adapters have small transmit
+buffers, and drop frames when the host writes them faster than the CAN
+bus can carry them. Each lost frame of a datagram costs a rejection and
+a resend of the whole datagram (or a timeout), so sending slower than
+the bus is faster overall. Set physicalLayer.shaper to a
+TokenBucketShaper, and sendAll only sends the frames the shaper allows,
+leaving the rest queued (See PhysicalLayer.sendDelay for how long the
+I/O loop should wait before calling sendAll again).
+
+In adaptive mode the rate is also reduced whenever the link reports
+trouble (LinkError or EIR control frames, or Datagram Rejected with a
+temporary error, such as a receiver that lost a frame of a datagram),
+then slowly raised back to the configured rate.
+'''
+from logging import getLogger
+from timeit import default_timer
+from typing import Callable
+
+from openlcb.canbus.canframe import CanFrame
+from openlcb.canbus.controlframe import ControlFrame
+from openlcb.mti import MTI
+
+logger = getLogger(__name__)
+
+CAN_EXTENDED_OVERHEAD_BITS = 67
+# ^ SOF, 29-bit ID, SRR, IDE, RTR, r1, r0, DLC, CRC, delimiters, ACK,
+#   EOF and interframe space of an extended (29-bit) CAN frame.
+CAN_STUFFED_BITS = 54
+# ^ Bits before the data and CRC delimiter that are subject to bit
+#   stuffing (SOF through CRC, not counting data).
+
+_CONGESTION_CONTROL = frozenset([
+    ControlFrame.LinkError.value,
+    ControlFrame.EIR0.value,
+    ControlFrame.EIR1.value,
+    ControlFrame.EIR2.value,
+    ControlFrame.EIR3.value,
+])
+
+
+def canFrameBits(dataLength: int, stuffing: bool = True) -> int:
+    """Get the number of bits an extended CAN frame takes on the bus.
+
+    Args:
+        dataLength (int): Number of data bytes (0 to 8).
+        stuffing (bool, optional): Include the worst case number of
+            stuff bits (one per 4 bits after the first). Defaults to
+            True.
+    """
+    dataBits = 8 * dataLength
+    bits = CAN_EXTENDED_OVERHEAD_BITS + dataBits
+    if stuffing:
+        bits += (CAN_STUFFED_BITS + dataBits - 1) // 4
+    return bits
+
+
+def isCongestionFrame(frame: CanFrame) -> bool:
+    """Check if a received frame indicates that frames are being lost
+    (LinkError, EIR0 to EIR3, or Datagram Rejected with a temporary
+    error code such as "out of order" or "buffer unavailable").
+    """
+    header = frame.header
+    if not (header & 0x0800_0000):
+        if header & 0x0400_0000:
+            return False  # CID
+        return ((header >> 12) & 0x2_FF_FF) in _CONGESTION_CONTROL
+    if ((header >> 24) & 0x7) != 1:
+        return False  # not an OpenLCB message frame (such as a datagram)
+    if ((header >> 12) & 0xFFF) != MTI.Datagram_Rejected.value:
+        return False
+    data = frame.data
+    # data: destination alias (2 bytes), then error code (2 bytes)
+    return len(data) < 4 or bool(data[2] & 0x20)  # 0x2000: temporary
+
+
+class TokenBucketShaper:
+    """Limit transmit rate to a number of frames or bits per second.
+
+    Tokens accumulate at rate per second up to burst. Each frame costs
+    1 token (unit "frames") or its length on the bus (unit "bits", See
+    canFrameBits), and is only sent if enough tokens are available.
+
+    Args:
+        rate (float): Frames per second, or bits per second (such as
+            the CAN bitrate, or somewhat less to leave room for other
+            nodes).
+        unit (str, optional): "frames" or "bits". Defaults to "frames".
+        burst (float, optional): Maximum tokens (frames or bits) that
+            can be sent at once after idling. Defaults to the cost of
+            BURST_FRAMES 8-byte frames (the transmit buffer of a typical
+            adapter is larger).
+        adaptive (bool, optional): Reduce the rate when congestion is
+            observed (See observeReceived). Defaults to False.
+        minRate (float, optional): Lowest rate in adaptive mode.
+            Defaults to rate / 8.
+        clock (Callable, optional): Returns the current time in seconds.
+            Defaults to timeit.default_timer.
+
+    Attributes:
+        maxRate (float): The configured rate.
+        rate (float): The current rate (less than maxRate after a back
+            off in adaptive mode).
+        backoffFactor (float): rate is multiplied by this on
+            congestion (at most once per holdoff).
+        holdoff (float): Seconds after a back off during which further
+            congestion is only counted, and the rate does not recover.
+        recovery (float): Fraction of maxRate added to rate per second
+            without congestion.
+        congestionCount (int): Congestion frames observed.
+        deferredCount (int): Times a frame had to wait for tokens.
+    """
+    FRAMES = "frames"
+    BITS = "bits"
+    BURST_FRAMES = 4
+
+    def __init__(self, rate: float, unit: str = FRAMES, burst: float = None,
+                 adaptive: bool = False, minRate: float = None,
+                 clock: Callable[[], float] = default_timer):
+        if unit not in (TokenBucketShaper.FRAMES, TokenBucketShaper.BITS):
+            raise ValueError("unit must be {} or {}, got {}".format(
+                repr(TokenBucketShaper.FRAMES), repr(TokenBucketShaper.BITS),
+                repr(unit)))
+        if rate <= 0:
+            raise ValueError("rate must be positive, got {}".format(rate))
+        self.unit = unit
+        self.maxRate = rate
+        self.rate = rate
+        largest = self._costOfLength(8)
+        if burst is None:
+            burst = largest * TokenBucketShaper.BURST_FRAMES
+        self.burst = max(burst, largest)  # else an 8-byte frame never fits
+        self.adaptive = adaptive
+        self.minRate = rate / 8 if minRate is None else minRate
+        self.backoffFactor = .5
+        self.holdoff = .25
+        self.recovery = .05
+        self.clock = clock
+        self.congestionCount = 0
+        self.deferredCount = 0
+        self._tokens = self.burst
+        self._last = clock()
+        self._lastBackoff = None
+
+    def _costOfLength(self, dataLength: int) -> float:
+        if self.unit == TokenBucketShaper.FRAMES:
+            return 1
+        return canFrameBits(dataLength)
+
+    def cost(self, frame: CanFrame) -> float:
+        """Get the tokens frame takes (1, or its bits on the bus)."""
+        return self._costOfLength(len(frame.data))
+
+    def _refill(self, now: float):
+        elapsed = now - self._last
+        if elapsed <= 0:
+            return
+        self._last = now
+        if self.adaptive and self.rate < self.maxRate:
+            if ((self._lastBackoff is None)
+                    or (now - self._lastBackoff >= self.holdoff)):
+                self.rate = min(self.maxRate,
+                                self.rate
+                                + self.maxRate * self.recovery * elapsed)
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def tryConsume(self, frame: CanFrame) -> bool:
+        """Take the tokens for frame if available.
+
+        Returns:
+            bool: True if frame may be sent now, otherwise False (keep
+                it queued, and see delay).
+        """
+        self._refill(self.clock())
+        cost = self.cost(frame)
+        if self._tokens >= cost:
+            self._tokens -= cost
+            return True
+        self.deferredCount += 1
+        return False
+
+    def delay(self, frame: CanFrame) -> float:
+        """Get the seconds until frame can be sent (0 if now)."""
+        self._refill(self.clock())
+        missing = self.cost(frame) - self._tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate
+
+    def observeReceived(self, frame: CanFrame):
+        """Check a received frame for congestion (called by
+        CanPhysicalLayer.fireFrameReceived).
+        """
+        if isCongestionFrame(frame):
+            self.congestionCount += 1
+            if self.adaptive:
+                self.backOff()
+
+    def backOff(self):
+        """Reduce the rate (at most once per holdoff)."""
+        now = self.clock()
+        self._refill(now)
+        if ((self._lastBackoff is not None)
+                and (now - self._lastBackoff < self.holdoff)):
+            return
+        self._lastBackoff = now
+        self.rate = max(self.minRate, self.rate * self.backoffFactor)
+        logger.info("Transmit rate reduced to {:.0f} {}/s"
+                    .format(self.rate, self.unit))
@@ -8,6 +8,7 @@ Provide a service interface for reading and writing Datagrams.
 Writes to remote node:
 - Create a ``DatagramWriteMemo`` and submit via ``sendDatagram(_:)``
 - Get an OK or NotOK callback
+- Or call ``send`` (or await ``sendAsync``) to get a Future instead
 
 Reads from remote node:
 - One or more listeners register via ``registerDatagramReceivedListener(_:)``
@@ -20,19 +21,43 @@ Implements `Processor`, should be fed as part of common execution
 Handles link quiesce/restart so that higher level services don't have to.
 1) If there's an outstanding datagram reply with link restarts, resend it
 2) Once the link has been quiesced, datagrams are held until it's restarted
+
+Each destination may have one datagram awaiting its reply (as the
+Datagram Transport Standard requires per source/destination pair), so
+datagrams to different nodes are in flight at once, up to maxInFlight.
+
+With a scheduler (such as CanLink's), a datagram whose reply does not
+arrive within replyTimeout, or that is rejected with a temporary error
+(the "resend OK" bit 0x2000 in the error code), is resent after a
+jittered exponential backoff, up to maxRetries times. After that its
+rejectedReply is called (with timedOut set if no reply ever came), so
+later datagrams to that node are not stalled forever.
 '''
 
+import concurrent.futures
+import random
+
+from collections import deque
 from enum import Enum
 from logging import getLogger
 from typing import (
     Any,
     Callable,
+    Deque,
+    Dict,
     List,  # in case list doesn't support `[` in this Python version
     Union,  # in case `|` doesn't support 'type' in this Python version
 )
 
+from openlcb.futures import (
+    OperationError,
+    awaitFuture,
+    settle,
+    startTimeout,
+)
 from openlcb.linklayer import LinkLayer
 from openlcb.message import Message
+from openlcb.metrics import stackMetrics
 from openlcb.mti import MTI
 from openlcb.nodeid import NodeID
 
@@ -65,6 +90,12 @@ class DatagramWriteMemo:
         self.data: bytearray = data
         self.okReply: Callable[[Union[DatagramWriteMemo, None]], None] = okReply  # noqa: E501
         self.rejectedReply: Callable[[Union[DatagramWriteMemo, None]], None] = rejectedReply  # noqa: E501
+        self.errorCode = None  # type: int|None  # set if rejected
+        self.error = None  # type: str|None  # set if failed
+        self.timedOut = False  # True if failed for lack of a reply
+        self.flags = None  # type: int|None  # of Datagram_Received_OK
+        self.retries = 0  # resends (See DatagramService.maxRetries)
+        self._timer = None  # reply timeout or resend (See DatagramService)
 
     def __eq__(lhs, rhs):
         if lhs.destID != rhs.destID:
@@ -100,6 +131,27 @@ class DatagramService:
     Args:
         linkLayer (CanLink): Could actually be any link layer such as
             LinkMockLayer (for testing) or CanLink.
+        localNodeID (NodeID, optional): The node this service sends
+            from and accepts datagrams for. Defaults to
+            linkLayer.localNodeID (Set it to a virtual node's NodeID to
+            have one DatagramService per node; See LocalNodeRouter).
+
+    Attributes:
+        maxInFlight (int): Most datagrams awaiting a reply at once
+            (across all destinations; each destination has at most
+            one). Others wait in their destination's queue.
+        replyTimeout (float): Seconds to wait for Datagram_Received_OK
+            or Datagram_Rejected before resending (requires scheduler).
+        maxRetries (int): Resends (after a timeout or temporary error)
+            before the datagram fails.
+        backoffBase (float): Resend delay (seconds) before the first
+            retry. It doubles for each later retry (up to backoffMax),
+            and a random half of it is skipped so that nodes retrying
+            at once spread out.
+        scheduler (Scheduler): Runs request timeouts (See send).
+            Defaults to linkLayer.scheduler if the link layer has one
+            (such as CanLink), otherwise None (then timeouts are not
+            available).
     """
 
     class ProtocolID(Enum):
@@ -114,12 +166,30 @@ class DatagramService:
 
         Unrecognized    = 0xFF  # Not formally assigned
 
-    def __init__(self, linkLayer: LinkLayer):
+    ReplyPending = 0x80
+    # ^ Datagram_Received_OK flag: a reply datagram follows (within 2^N
+    #   seconds if the low 4 bits, N, are nonzero)
+
+    def __init__(self, linkLayer: LinkLayer,
+                 localNodeID: Union[NodeID, None] = None):
         self.linkLayer: LinkLayer = linkLayer
+        if localNodeID is None:
+            localNodeID = linkLayer.localNodeID
+        self.localNodeID: NodeID = localNodeID
         self.quiesced: bool = False
-        self.currentOutstandingMemo: Union[DatagramWriteMemo, None] = None  # noqa: E501
-        self.pendingWriteMemos: List[DatagramWriteMemo] = []
+        self.maxInFlight: int = 16
+        self.replyTimeout: float = 3.0
+        self.maxRetries: int = 3
+        self.backoffBase: float = .1
+        self.backoffMax: float = 2.0
+        self._queues: Dict[NodeID, Deque[DatagramWriteMemo]] = {}
+        # ^ unsent datagrams (after the one in flight) by destination
+        self._inFlight: Dict[NodeID, DatagramWriteMemo] = {}
+        self._waiting: Deque[NodeID] = deque()
+        # ^ destinations with queued datagrams, waiting for maxInFlight
         self._datagramReceivedListeners: List[Callable[[DatagramReadMemo], bool]] = []  # noqa: E501
+        self.metrics = stackMetrics()  # None unless metrics are enabled
+        self.scheduler = getattr(linkLayer, "scheduler", None)
 
     def datagramType(self, data: Union[bytearray, List[int]]):
         """Determine the protocol type of the content of the datagram.
@@ -154,24 +224,169 @@ class DatagramService:
         assert isinstance(nodeID, NodeID)
         return message.destination == nodeID
 
+    @property
+    def pendingWriteMemos(self) -> List[DatagramWriteMemo]:
+        """Get datagrams in flight, then queued ones (a new list)."""
+        memos = list(self._inFlight.values())
+        for queue in self._queues.values():
+            memos.extend(queue)
+        return memos
+
+    @property
+    def currentOutstandingMemo(self) -> Union[DatagramWriteMemo, None]:
+        """Get the oldest datagram awaiting a reply (None if none; See
+        inFlight for all of them).
+        """
+        for memo in self._inFlight.values():
+            return memo
+        return None
+
+    def inFlight(self, destID: NodeID) -> Union[DatagramWriteMemo, None]:
+        """Get the datagram awaiting a reply from destID, if any."""
+        return self._inFlight.get(destID)
+
     def sendDatagram(self, memo: DatagramWriteMemo):
         '''Queue a ``DatagramWriteMemo`` to send a datagram to another node
         on the network.
         '''
-        # Make a record of memo for reply
-        self.pendingWriteMemos.append(memo)
-
-        # can only have one outstanding at a time, so check it there was
-        # already one there.
-        if len(self.pendingWriteMemos) == 1:
+        destID = memo.destID
+        if (destID in self._inFlight) or (destID in self._queues):
+            # can only have one outstanding per destination
+            self._queues.setdefault(destID, deque()).append(memo)
+        elif len(self._inFlight) < self.maxInFlight:
             self.sendDatagramMessage(memo)
+        else:
+            self._queues[destID] = deque([memo])
+            self._waiting.append(destID)
+
+    def send(self, destID: NodeID, data: bytearray,
+             timeout: Union[float, None] = None
+             ) -> concurrent.futures.Future:
+        """Queue a datagram and get a Future for its reply, instead of
+        okReply and rejectedReply callbacks.
+
+        Args:
+            destID (NodeID): Remote node.
+            data (bytearray): Datagram payload.
+            timeout (float, optional): Seconds to wait for the reply
+                (requires scheduler). Defaults to no limit.
+
+        Returns:
+            Future: Result is the DatagramWriteMemo once the remote node
+                accepts it. Raises OperationError if rejected, or
+                TimeoutError. Canceling it (or a timeout) withdraws the
+                datagram if it was not sent yet.
+        """
+        if (timeout is not None) and (self.scheduler is None):
+            raise ValueError("A timeout requires a scheduler.")
+        future = concurrent.futures.Future()
+
+        def rejected(memo: DatagramWriteMemo):
+            if memo.timedOut:
+                settle(future, exception=TimeoutError(memo.error))
+                return
+            settle(future, exception=OperationError(
+                "Datagram rejected (error code 0x{:04X})"
+                .format(memo.errorCode or 0), memo))
+        memo = DatagramWriteMemo(
+            destID, data,
+            okReply=lambda memo: settle(future, memo),
+            rejectedReply=rejected)
+        if self.scheduler is not None:
+            startTimeout(future, self.scheduler, timeout,
+                         lambda: self.withdrawDatagram(memo))
+        self.sendDatagram(memo)
+        return future
+
+    async def sendAsync(self, destID: NodeID, data: bytearray,
+                        timeout: Union[float, None] = None
+                        ) -> DatagramWriteMemo:
+        """Send a datagram and await its reply (See send)."""
+        return await awaitFuture(self.send(destID, data, timeout=timeout))
+
+    def withdrawDatagram(self, memo: DatagramWriteMemo) -> bool:
+        """Drop a queued datagram that was not sent yet (the datagram
+        currently awaiting a reply is left in place, since the reply
+        still has to be matched).
+
+        Returns:
+            bool: True if removed.
+        """
+        queue = self._queues.get(memo.destID)
+        if queue is None:
+            return False
+        for index, pending in enumerate(queue):
+            if pending is memo:
+                del queue[index]
+                if not queue:
+                    del self._queues[memo.destID]
+                    # (stays in _waiting until skipped by _sendWaiting)
+                return True
+        return False
 
     def sendDatagramMessage(self, memo: DatagramWriteMemo):
         '''Send datagram message'''
-        message = Message(MTI.Datagram, self.linkLayer.localNodeID,
+        message = Message(MTI.Datagram, self.localNodeID,
                           memo.destID, memo.data)
+        self._inFlight[memo.destID] = memo
+        self._cancelTimer(memo)
+        if self.scheduler is not None:
+            memo._timer = self.scheduler.callLater(
+                self.replyTimeout, lambda: self._replyTimedOut(memo))
         self.linkLayer.sendMessage(message)
-        self.currentOutstandingMemo = memo
+        if self.metrics is not None:
+            self.metrics.datagramsSent.inc()
+
+    @staticmethod
+    def _cancelTimer(memo: DatagramWriteMemo):
+        if memo._timer is not None:
+            memo._timer.cancel()
+            memo._timer = None
+
+    def backoff(self, retry: int) -> float:
+        """Get a jittered delay before resend number retry (1 for the
+        first resend).
+        """
+        delay = min(self.backoffMax, self.backoffBase * (2 ** (retry - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _retryLater(self, memo: DatagramWriteMemo, reason: str):
+        """Resend memo after backoff, keeping its destination's slot
+        (so later datagrams to that node stay behind it).
+        """
+        memo.retries += 1
+        self._inFlight[memo.destID] = memo
+        if self.metrics is not None:
+            self.metrics.datagramRetries.inc(reason)
+        logger.info("Resending datagram to {} ({}, retry {})"
+                    .format(memo.destID, reason, memo.retries))
+        memo._timer = self.scheduler.callLater(
+            self.backoff(memo.retries), lambda: self._resend(memo))
+
+    def _resend(self, memo: DatagramWriteMemo):
+        memo._timer = None
+        if self._inFlight.get(memo.destID) is not memo:
+            return  # replied late (or withdrawn) meanwhile
+        if self.quiesced:
+            return  # resent by handleLinkRestarted
+        self.sendDatagramMessage(memo)
+
+    def _replyTimedOut(self, memo: DatagramWriteMemo):
+        memo._timer = None
+        if self._inFlight.get(memo.destID) is not memo:
+            return
+        if self.metrics is not None:
+            self.metrics.datagramReplies.inc("timeout")
+        if memo.retries < self.maxRetries:
+            self._retryLater(memo, "timeout")
+            return
+        del self._inFlight[memo.destID]
+        memo.timedOut = True
+        memo.error = ("No reply from {} after {} attempt(s)"
+                      .format(memo.destID, memo.retries + 1))
+        logger.warning(memo.error)
+        memo.rejectedReply(memo)
+        self.sendNextDatagramFromQueue(memo.destID)
 
     def registerDatagramReceivedListener(
             self, listener: Callable[[DatagramReadMemo], bool]):
@@ -219,7 +434,7 @@ class DatagramService:
         '''
         # Check that it's to us or a global (for link layer up)
         if not (message.isGlobal()
-                or self.checkDestID(message, self.linkLayer.localNodeID)):
+                or self.checkDestID(message, self.localNodeID)):
             return False
 
         if message.mti == MTI.Datagram:
@@ -237,6 +452,8 @@ class DatagramService:
     def handleDatagram(self, message: Message):
         '''create a read memo and pass to listeners'''
         memo = DatagramReadMemo(message.source, message.data)
+        if self.metrics is not None:
+            self.metrics.datagramsReceived.inc()
         self.fireDatagramReceived(memo)
         # ^ destination listener calls back to
         #   positiveReplyToDatagram/negativeReplyToDatagram before returning
@@ -253,18 +470,15 @@ class DatagramService:
                 f" {message.source} to {message.destination}")
             return
 
-        # check of tracking logic
-        if self.currentOutstandingMemo != memo:
-            logger.error(
-                "Outstanding and replied-to memos don't match on OK reply"
-            )
-
-        self.currentOutstandingMemo = None
+        if self.metrics is not None:
+            self.metrics.datagramReplies.inc("ok")
+        if len(message.data) > 0:
+            memo.flags = message.data[0]
 
         # fire the callback
         memo.okReply(memo)
 
-        self.sendNextDatagramFromQueue()
+        self.sendNextDatagramFromQueue(memo.destID)
 
     def handleDatagramRejected(self, message: Message):
         '''Not OK reply to write'''
@@ -278,58 +492,84 @@ class DatagramService:
                 f" {message.source} to {message.destination}")
             return
 
-        # check of tracking logic
-        if self.currentOutstandingMemo != memo:
-            logger.error(
-                "Outstanding and replied-to memos don't match on rejected"
-            )
-
-        self.currentOutstandingMemo = None
+        if len(message.data) >= 2:
+            memo.errorCode = (message.data[0] << 8) | message.data[1]
+        if ((memo.errorCode is not None) and (memo.errorCode & 0x2000)
+                and (self.scheduler is not None)
+                and (memo.retries < self.maxRetries)):
+            # temporary error ("resend OK")
+            self._retryLater(memo, "temporary")
+            return
+        if self.metrics is not None:
+            self.metrics.datagramReplies.inc("rejected")
+        memo.error = "Rejected with error code 0x{:04X}".format(
+            memo.errorCode or 0)
 
         # fire the callback
         memo.rejectedReply(memo)
 
-        self.sendNextDatagramFromQueue()
+        self.sendNextDatagramFromQueue(memo.destID)
 
     def handleLinkQuiesce(self, message: Message):
         '''Link quiesced before outage: stop operation'''
         self.quiesced = True
+        for memo in self._inFlight.values():
+            self._cancelTimer(memo)  # (resent by handleLinkRestarted)
 
     def handleLinkRestarted(self, message: Message):
         '''Link restarted after outage:
         if write datagram(s) pending reply, resend them
         '''
         self.quiesced = False
-        if self.currentOutstandingMemo is not None:
-            # there's a current outstanding memo to repeat
-            logger.info("Retrying datagram after restart")
-            self.sendDatagramMessage(self.currentOutstandingMemo)
-            return
-        else:
-            # are there any queued datagrams? If so, send first
-            if len(self.pendingWriteMemos) > 0:
-                self.sendNextDatagramFromQueue()
+        if self._inFlight:
+            # there are outstanding memos to repeat
+            logger.info("Retrying {} datagram(s) after restart"
+                        .format(len(self._inFlight)))
+            for memo in list(self._inFlight.values()):
+                self.sendDatagramMessage(memo)
+        # are there any queued datagrams? If so, send them
+        self._sendWaiting()
 
     def matchToWriteMemo(self, message: Message):
-        for memo in self.pendingWriteMemos:
-            if memo.destID != message.source:
-                continue  # keep looking
-            # remove the found element - might need a try/except on this
-            index = self.pendingWriteMemos.index(memo)
-            del self.pendingWriteMemos[index]
+        """Take the datagram in flight to the message's source (the
+        node replying), if any.
+        """
+        memo = self._inFlight.pop(message.source, None)
+        if memo is None:
+            logger.error("Did not match memo to message {}"
+                         .format(message))
+            return None  # this will prevent further processing
+        self._cancelTimer(memo)
+        return memo
 
-            return memo
+    def sendNextDatagramFromQueue(self,
+                                  destID: Union[NodeID, None] = None):
+        """Send queued datagrams now that a reply freed a slot.
 
-        # did not find one
-        logger.error("Did not match memo to message {}"
-                     .format(message))
-        return None  # this will prevent further processing
+        Args:
+            destID (NodeID, optional): The destination that replied.
+                Its next datagram (if any) waits its turn behind other
+                destinations already waiting for maxInFlight.
+        """
+        if (destID is not None) and (destID in self._queues):
+            self._waiting.append(destID)
+        self._sendWaiting()
 
-    def sendNextDatagramFromQueue(self):
-        # is there a next datagram request?
-        if len(self.pendingWriteMemos) > 0:
-            # yes, get it, process it
-            memo = self.pendingWriteMemos[0]
+    def _sendWaiting(self):
+        """Send the next datagram of waiting destinations, in order,
+        while fewer than maxInFlight are in flight.
+        """
+        waiting = self._waiting
+        while waiting and (len(self._inFlight) < self.maxInFlight):
+            destID = waiting.popleft()
+            if destID in self._inFlight:
+                continue  # (queued again after a reply; sent later)
+            queue = self._queues.get(destID)
+            if queue is None:
+                continue  # withdrawn
+            memo = queue.popleft()
+            if not queue:
+                del self._queues[destID]
             self.sendDatagramMessage(memo)
 
     def positiveReplyToDatagram(self, dg: DatagramReadMemo, flags: int = 0):
@@ -340,7 +580,7 @@ class DatagramService:
             flags (Optional[int]): Flag byte to be returned to sender, see
                 Datagram Standard & Technical Note for meaning. Defaults to 0.
         """
-        message = Message(MTI.Datagram_Received_OK, self.linkLayer.localNodeID,
+        message = Message(MTI.Datagram_Received_OK, self.localNodeID,
                           dg.srcID, bytearray([flags]))
         self.linkLayer.sendMessage(message)
 
@@ -354,6 +594,6 @@ class DatagramService:
         """
         data0 = ((err >> 8) & 0xFF)
         data1 = (err & 0xFF)
-        message = Message(MTI.Datagram_Rejected, self.linkLayer.localNodeID,
+        message = Message(MTI.Datagram_Rejected, self.localNodeID,
                           dg.srcID, bytearray([data0, data1]))
         self.linkLayer.sendMessage(message)
@@ -0,0 +1,243 @@
+'''
+Deferred listeners, so slow handlers never stall the receive loop.
+
+Listeners registered the usual way run inline, on the thread that
+receives frames (keep protocol-critical handlers such as CanLink's and
+DatagramService's inline). Wrap a slow listener (a GUI update, an XML
+parser feed, a database write) using Dispatcher.deferred instead, and
+the receive loop only queues the call. Worker threads then run it.
+
+Calls are sharded by source (the Message's source NodeID, or the
+CanFrame's source alias), so listeners see each source's items in the
+order received, while different sources may run in parallel when there
+is more than one worker.
+
+Usage:
+
+    dispatcher = Dispatcher(workers=2)
+    canLink.registerMessageReceivedListener(printMessage,
+                                            dispatcher=dispatcher)
+    # or: canLink.registerMessageReceivedListener(
+    #     dispatcher.deferred(printMessage, maxDepth=100,
+    #                         policy=DispatchPolicy.DropOldest))
+'''
+import threading
+
+from collections import deque
+from enum import Enum
+from logging import getLogger
+from typing import Any, Callable, Hashable, Union
+
+from openlcb.metrics import stackMetrics
+
+logger = getLogger(__name__)
+
+
+class DispatchPolicy(Enum):
+    """What a deferred listener does when maxDepth calls are pending.
+
+    Block: The receive loop waits for room (backpressure: the port's
+        receive buffer fills instead, so TCP flow control slows the
+        sender).
+    DropNewest: The new call is dropped.
+    DropOldest: The oldest pending call is dropped to make room.
+    """
+    Block = "block"
+    DropNewest = "drop-newest"
+    DropOldest = "drop-oldest"
+
+
+def sourceKey(item: Any) -> Hashable:
+    """Get the ordering key of a Message (source NodeID) or CanFrame
+    (source alias), or None for anything else (one shared order).
+    """
+    source = getattr(item, "source", None)
+    if source is not None:
+        return source
+    header = getattr(item, "header", None)
+    if header is not None:
+        return header & 0xFFF
+    return None
+
+
+class DeferredListener:
+    """A listener that queues each call on its Dispatcher (See
+    Dispatcher.deferred). Register it anywhere a listener is accepted.
+
+    Attributes:
+        name (str): Label for metrics and logs.
+        depth (int): Calls queued or running.
+        maxDepthSeen (int): Highest depth so far.
+        dropped (int): Calls dropped by the policy.
+    """
+    def __init__(self, dispatcher: 'Dispatcher', listener: Callable,
+                 maxDepth: int, policy: DispatchPolicy,
+                 key: Callable[[Any], Hashable], name: str):
+        self.dispatcher = dispatcher
+        self.listener = listener
+        self.maxDepth = maxDepth
+        self.policy = policy
+        self.key = key
+        self.name = name
+        self.depth = 0
+        self.maxDepthSeen = 0
+        self.dropped = 0
+        self._pending = deque()  # entries, oldest first (See DropOldest)
+
+    def __call__(self, item: Any):
+        self.dispatcher._submit(self, item)
+
+
+class Dispatcher:
+    """Run deferred listeners on worker threads (See module docstring).
+
+    Args:
+        workers (int, optional): Number of worker threads. Defaults to
+            1 (all calls in received order).
+        name (str, optional): Prefix of worker thread names.
+    """
+    def __init__(self, workers: int = 1, name: str = "openlcb-dispatch"):
+        if workers < 1:
+            raise ValueError("At least one worker is required.")
+        self._condition = threading.Condition()
+        self._queues = [deque() for _ in range(workers)]
+        self._listeners = []  # type: list[DeferredListener]
+        self._unfinished = 0
+        self._closed = False
+        self.metrics = stackMetrics()  # None unless metrics are enabled
+        if self.metrics is not None:
+            self.metrics.dispatchQueueDepth.addMethodSource(self, "depth")
+        self._threads = []
+        for index, queue in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._work, args=(queue,), daemon=True,
+                name="{}-{}".format(name, index))
+            thread.start()
+            self._threads.append(thread)
+
+    def deferred(self, listener: Callable, maxDepth: int = 1000,
+                 policy: DispatchPolicy = DispatchPolicy.Block,
+                 key: Callable[[Any], Hashable] = sourceKey,
+                 name: Union[str, None] = None) -> DeferredListener:
+        """Wrap listener so calls are queued to a worker.
+
+        Args:
+            listener (Callable): Called with each item (return value is
+                ignored).
+            maxDepth (int, optional): Pending calls before policy
+                applies (0 for no limit). Defaults to 1000.
+            policy (DispatchPolicy, optional): Defaults to Block.
+            key (Callable, optional): Gets the ordering key of an item
+                (items with equal keys run in order). Defaults to
+                sourceKey.
+            name (str, optional): Defaults to the listener's qualified
+                name.
+
+        Returns:
+            DeferredListener: Register this instead of listener.
+        """
+        if name is None:
+            name = getattr(listener, "__qualname__", None) or repr(listener)
+        deferred = DeferredListener(self, listener, maxDepth, policy, key,
+                                    name)
+        with self._condition:
+            self._listeners.append(deferred)
+        return deferred
+
+    def depth(self) -> int:
+        """Get the number of calls queued or running."""
+        return self._unfinished
+
+    def depths(self) -> dict:
+        """Get depth by listener name."""
+        return {deferred.name: deferred.depth for deferred in self._listeners}
+
+    def _submit(self, deferred: DeferredListener, item: Any):
+        queue = self._queues[hash(deferred.key(item)) % len(self._queues)]
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The dispatcher is closed.")
+            if deferred.maxDepth and (deferred.depth >= deferred.maxDepth):
+                if deferred.policy is DispatchPolicy.Block:
+                    self._condition.wait_for(
+                        lambda: (deferred.depth < deferred.maxDepth)
+                        or self._closed)
+                    if self._closed:
+                        raise RuntimeError("The dispatcher is closed.")
+                elif deferred.policy is DispatchPolicy.DropNewest:
+                    self._drop(deferred)
+                    return
+                elif not self._dropOldest(deferred):
+                    self._drop(deferred)  # all pending calls are running
+                    return
+            entry = [deferred, item]
+            pending = deferred._pending
+            while pending and pending[0][0] is None:
+                pending.popleft()  # already taken by a worker
+            pending.append(entry)
+            deferred.depth += 1
+            if deferred.depth > deferred.maxDepthSeen:
+                deferred.maxDepthSeen = deferred.depth
+            self._unfinished += 1
+            queue.append(entry)
+            self._condition.notify_all()
+
+    def _drop(self, deferred: DeferredListener):
+        deferred.dropped += 1
+        if self.metrics is not None:
+            self.metrics.dispatchDropped.inc(deferred.name)
+
+    def _dropOldest(self, deferred: DeferredListener) -> bool:
+        pending = deferred._pending
+        while pending:
+            entry = pending.popleft()
+            if entry[0] is not None:
+                entry[0] = None  # the worker skips it
+                deferred.depth -= 1
+                self._unfinished -= 1
+                self._drop(deferred)
+                return True
+        return False
+
+    def _work(self, queue: deque):
+        condition = self._condition
+        while True:
+            with condition:
+                condition.wait_for(lambda: queue or self._closed)
+                if not queue:
+                    return  # closed and drained
+                entry = queue.popleft()
+                deferred, item = entry
+                if deferred is None:
+                    continue  # dropped
+                entry[0] = None  # taken (DropOldest skips it)
+            try:
+                deferred.listener(item)
+            except Exception as ex:
+                logger.exception("Deferred listener {} failed: {}"
+                                 .format(deferred.name, ex))
+            with condition:
+                deferred.depth -= 1
+                self._unfinished -= 1
+                condition.notify_all()
+
+    def drain(self, timeout: Union[float, None] = None) -> bool:
+        """Wait until every queued call has run.
+
+        Returns:
+            bool: False if timeout passed first.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._unfinished == 0, timeout)
+
+    def close(self, timeout: Union[float, None] = None):
+        """Run the calls already queued, then stop the workers (later
+        calls raise RuntimeError).
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
@@ -8,3 +8,21 @@ class FrameEncoder:
 
     def encodeFrameAsData(self, frame) -> Union[bytearray, bytes]:
         raise NotImplementedError("Implement this in each subclass.")
+
+    def encodeFrameInto(self, frame, buffer: bytearray, offset: int) -> int:
+        """Encode frame into a shared output buffer at offset.
+        This copies the result of encodeFrameAsData (one bytes object
+        per frame). Override it only if the subclass can write the
+        encoding in place faster than that.
+
+        Returns:
+            int: Position after the encoded frame.
+        """
+        data = self.encodeFrameAsData(frame)
+        end = offset + len(data)
+        if end > len(buffer):
+            raise IndexError(
+                "Encoded frame needs {} bytes at {} but buffer length is {}"
+                .format(len(data), offset, len(buffer)))
+        buffer[offset:end] = data
+        return end
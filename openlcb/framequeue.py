@@ -0,0 +1,104 @@
+'''
+Send queue of a PhysicalLayer, ordered by priority.
+
+A FrameQueue keeps one FIFO deque per priority level and pops from the
+most urgent non-empty level, so a long multi-frame transfer (such as a
+CDI download or bulk memory write queued as dozens of datagram frames)
+does not delay an event report or an alias control frame queued after
+it. Frames of one level are never reordered, so as long as every frame
+of one message gets the same level (See
+CanPhysicalLayer.framePriority), a multi-frame message is never
+interleaved with or split by another message of its own level.
+
+The queue has the subset of the deque interface that PhysicalLayer and
+its subclasses use on _send_frames (append, appendleft, popleft,
+extend, clear, len, bool, indexing and iteration), and like a deque it
+may be appended to by one thread while another pops (each level is a
+deque and no counter is shared between levels).
+'''
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator
+
+
+class FrameQueue:
+    """Multi-level FIFO queue.
+
+    Args:
+        levels (int): Number of priority levels.
+        priorityOf (Callable[[Any], int], optional): Returns the level
+            of a frame, 0 (sent first) to levels-1. Defaults to 0 for
+            every frame (a plain FIFO).
+    """
+    def __init__(self, levels: int = 1,
+                 priorityOf: Callable[[Any], int] = None):
+        assert levels > 0
+        self._levels = tuple(deque() for _ in range(levels))
+        self.priorityOf = priorityOf
+
+    @property
+    def levelCount(self) -> int:
+        return len(self._levels)
+
+    def append(self, frame: Any):
+        """Add frame after the queued frames of its priority level."""
+        if self.priorityOf is None:
+            self._levels[0].append(frame)
+        else:
+            self._levels[self.priorityOf(frame)].append(frame)
+
+    def appendleft(self, frame: Any):
+        """Put frame back before the queued frames of its priority
+        level (such as one popped but not sent yet).
+        """
+        if self.priorityOf is None:
+            self._levels[0].appendleft(frame)
+        else:
+            self._levels[self.priorityOf(frame)].appendleft(frame)
+
+    def extend(self, frames: Iterable[Any]):
+        for frame in frames:
+            self.append(frame)
+
+    def popleft(self) -> Any:
+        """Remove and return the oldest frame of the most urgent level.
+
+        Raises:
+            IndexError: If the queue is empty (same as deque.popleft).
+        """
+        for level in self._levels:
+            if level:
+                return level.popleft()
+        raise IndexError("pop from an empty FrameQueue")
+
+    def clear(self):
+        for level in self._levels:
+            level.clear()
+
+    def depth(self, priority: int) -> int:
+        """Get the number of frames queued at one priority level."""
+        return len(self._levels[priority])
+
+    def __getitem__(self, index: int) -> Any:
+        """Get the frame that would be popped after index others."""
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for level in self._levels:
+                if index < len(level):
+                    return level[index]
+                index -= len(level)
+        raise IndexError("FrameQueue index out of range")
+
+    def __len__(self) -> int:
+        return sum(len(level) for level in self._levels)
+
+    def __bool__(self) -> bool:
+        for level in self._levels:
+            if level:
+                return True
+        return False
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate in the order frames would be popped."""
+        for level in self._levels:
+            yield from list(level)
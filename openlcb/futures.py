@@ -0,0 +1,91 @@
+'''
+Future-based results for callback-style services (such as
+DatagramService.send and MemoryService.read).
+
+Each request returns a concurrent.futures.Future, which can be waited
+on from any thread (future.result(timeout)), gathered with
+concurrent.futures.wait, or awaited in asyncio (See awaitFuture).
+Replies arrive on the I/O loop's thread, which settles the future.
+
+Timeouts run on the link layer's Scheduler, so they fire on the I/O
+loop's thread like replies do, and the service can withdraw the request
+safely (See startTimeout).
+'''
+import asyncio
+import concurrent.futures
+
+from typing import Any, Callable, Union
+
+from openlcb.scheduler import Scheduler
+
+
+class OperationError(Exception):
+    """A request was rejected by the remote node.
+
+    Attributes:
+        memo: The request's memo (such as a DatagramWriteMemo or
+            MemoryReadMemo, with error details if the reply had any).
+        errorCode (int): Error code from the reply, or None.
+    """
+    def __init__(self, message: str, memo: Any = None):
+        super(OperationError, self).__init__(message)
+        self.memo = memo
+        self.errorCode = getattr(memo, "errorCode", None)
+
+
+def settle(future: concurrent.futures.Future, result: Any = None,
+           exception: Union[BaseException, None] = None) -> bool:
+    """Set the result (or exception) unless the future is already done
+    (such as canceled by the caller or timed out).
+
+    Returns:
+        bool: True if this call settled the future.
+    """
+    if future.done():
+        return False
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except concurrent.futures.InvalidStateError:
+        return False  # settled by another thread meanwhile
+    return True
+
+
+def startTimeout(future: concurrent.futures.Future, scheduler: Scheduler,
+                 timeout: Union[float, None],
+                 withdraw: Callable[[], None]):
+    """Fail future with TimeoutError after timeout seconds, and call
+    withdraw on the scheduler's thread whenever the future ends early
+    (timed out or canceled) so the service can drop the request.
+
+    Args:
+        future (Future): Pending result of the request.
+        scheduler (Scheduler): Runs the timer (typically the link
+            layer's, run by the I/O loop).
+        timeout (float): Seconds to wait for the reply, or None for no
+            limit (withdraw still runs if canceled).
+        withdraw (Callable): Removes the request from the service's
+            queue if it was not sent yet.
+    """
+    timer = None
+    if timeout is not None:
+        timer = scheduler.callLater(timeout, lambda: settle(
+            future, exception=TimeoutError(
+                "No reply after {} seconds".format(timeout))))
+
+    def onDone(done: concurrent.futures.Future):
+        if timer is not None:
+            timer.cancel()
+        if done.cancelled() or isinstance(done.exception(), TimeoutError):
+            scheduler.callLater(0, withdraw)
+            # ^ on the loop's thread (done may run on the caller's)
+    future.add_done_callback(onDone)
+
+
+async def awaitFuture(future: concurrent.futures.Future) -> Any:
+    """Await a request's future in the running asyncio event loop
+    (canceling the awaiting task cancels the request).
+    """
+    return await asyncio.wrap_future(future)
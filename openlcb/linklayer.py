@@ -22,6 +22,7 @@ from typing import Any, Union
 
 from openlcb import emit_cast
 from openlcb.message import Message
+from openlcb.metrics import stackMetrics
 from openlcb.physicallayer import PhysicalLayer
 
 logger = getLogger(__name__)
@@ -56,6 +57,7 @@ class LinkLayer:
         self._messageReceivedListeners = []
         self._messageSentListeners = []
         self._state = None  # LinkLayer.State.Undefined
+        self.metrics = stackMetrics()  # None unless metrics are enabled
         # region moved from CanLink linkPhysicalLayer
         self.physicalLayer = physicalLayer  # formerly self.link = cpl
         # if physicalLayer is not None:
@@ -156,18 +158,38 @@ class LinkLayer:
         '''This is the basic abstract interface
         '''
 
-    def registerMessageReceivedListener(self, listener):
+    def registerMessageReceivedListener(self, listener, dispatcher=None):
+        """Call listener with each Message received.
+
+        Args:
+            listener (Callable): Called with the Message.
+            dispatcher (Dispatcher, optional): Run listener on the
+                dispatcher's workers instead of on the receive thread
+                (for slow listeners such as GUI or file updates; See
+                Dispatcher.deferred for options). Defaults to inline.
+
+        Returns:
+            Callable: The registered listener (a DeferredListener if
+                dispatcher was given).
+        """
+        if dispatcher is not None:
+            listener = dispatcher.deferred(listener)
         self._messageReceivedListeners.append(listener)
+        return listener
 
     def registerMessageSentListener(self, listener):
         self._messageSentListeners.append(listener)
 
     def fireMessageReceived(self, msg: Message):
         """Fire *Message received* listeners."""
+        if self.metrics is not None:
+            self.metrics.messagesReceived.inc(msg.mti.name)
         for listener in self._messageReceivedListeners:
             listener(msg)
 
     def fireMessageSent(self, msg: Message):
-        """Fire *Message received* listeners."""
+        """Fire *Message sent* listeners."""
+        if self.metrics is not None:
+            self.metrics.messagesSent.inc(msg.mti.name)
         for listener in self._messageSentListeners:
             listener(msg)
@@ -28,10 +28,18 @@ logger = getLogger(__name__)
 class LocalNode(Node, MemoryManager):
     """A Node with its own virtual memory
     (emulate memory spaces such as for creating a virtual
-    signal node with settings)"""
+    signal node with settings)
+
+    Args:
+        registerProcessor (bool, optional): Register localNodeProcessor
+            as a Message listener on linkLayer. Set False if the node
+            is added to a LocalNodeRouter, which calls it instead.
+            Defaults to True.
+    """
     def __init__(self, id: NodeID, linkLayer: CanLink,
                  snip: Union[SNIP, None] = None,
-                 pipSet: Union[set, None] = None):
+                 pipSet: Union[set, None] = None,
+                 registerProcessor: bool = True):
         if not issubclass(type(linkLayer), LinkLayer):
             raise TypeError("Expected LinkLayer/subclass,"
                             f" got a {type(linkLayer).__name__}")
@@ -50,8 +58,9 @@ class LocalNode(Node, MemoryManager):
                 " will not be initialized (functioning as Node, unless"
                 " remote user knows addresses apart from CDI)")
         self.localNodeProcessor = LocalNodeProcessor(linkLayer, self)
-        linkLayer.registerMessageReceivedListener(
-            self.localNodeProcessor.process)
+        if registerProcessor:
+            linkLayer.registerMessageReceivedListener(
+                self.localNodeProcessor.process)
 
     def loadCDIFile(self, path, memo=None):
         """Load a CDI file to generate virtual memory spaces
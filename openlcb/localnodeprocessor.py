@@ -65,6 +65,12 @@ class LocalNodeProcessor(Processor):
             # datagrams and datagram replies are handled in the
             # DatagramService
             pass
+        elif message.mti in (MTI.Stream_Initiate_Request,
+                             MTI.Stream_Initiate_Reply,
+                             MTI.Stream_Data_Send, MTI.Stream_Data_Proceed,
+                             MTI.Stream_Data_Complete):
+            # streams are handled in the StreamService
+            pass
         elif message.mti == MTI.Simple_Node_Ident_Info_Request:
             self._simpleNodeIdentInfoRequest(message, node)
         elif message.mti == MTI.Identify_Events_Addressed:
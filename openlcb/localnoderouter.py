@@ -0,0 +1,134 @@
+'''
+Serve many LocalNodes (such as a farm of virtual signal and turnout
+nodes) on one link layer connection.
+
+Without a router, each node needs its own DatagramService,
+StreamService and MemoryService, and every one of them (and every
+LocalNodeProcessor) is a Message listener on the link layer that checks
+each message for its own destination. LocalNodeRouter is the only
+listener: addressed messages (including datagrams and so memory
+configuration) go to the destination's Route with one dict lookup, and
+only global messages go to every node.
+
+On a CanLink, addNode also reserves an alias for the node (See
+CanLink.addVirtualNode), and the node gets its Link_Layer_Up (which
+sends Initialization Complete) once that alias is reserved.
+'''
+from logging import getLogger
+from typing import Union
+
+from openlcb.datagramservice import DatagramService
+from openlcb.linklayer import LinkLayer
+from openlcb.localnode import LocalNode
+from openlcb.memoryservice import MemoryService
+from openlcb.message import Message
+from openlcb.mti import MTI
+from openlcb.nodeid import NodeID
+from openlcb.streamservice import StreamService
+
+logger = getLogger(__name__)
+
+
+class Route:
+    """Services for one LocalNode behind a LocalNodeRouter.
+
+    Attributes:
+        node (LocalNode): The node (also memoryService.memory).
+        datagramService (DatagramService): Sends from and accepts
+            datagrams for node.id only.
+        streamService (StreamService): Sends from and accepts streams
+            for node.id only.
+        memoryService (MemoryService): Serves node's memory spaces.
+    """
+    def __init__(self, linkLayer: LinkLayer, node: LocalNode):
+        self.node = node
+        self.datagramService = DatagramService(linkLayer,
+                                               localNodeID=node.id)
+        self.streamService = StreamService(linkLayer, localNodeID=node.id)
+        self.memoryService = MemoryService(self.datagramService,
+                                           self.streamService)
+        self.memoryService.memory = node
+
+    def process(self, message: Message):
+        self.node.localNodeProcessor.process(message, self.node)
+        self.datagramService.process(message)
+        self.streamService.process(message)
+
+
+class LocalNodeRouter:
+    """Route Messages from one link layer to many LocalNodes.
+
+    Construct each LocalNode with registerProcessor=False, since the
+    router calls its localNodeProcessor.
+
+    Args:
+        linkLayer (LinkLayer): Typically a CanLink. The router registers
+            itself as a Message listener (and virtual node state
+            listener if available).
+    """
+    def __init__(self, linkLayer: LinkLayer):
+        self.linkLayer = linkLayer
+        self._routes = {}  # type: dict[NodeID, Route]
+        linkLayer.registerMessageReceivedListener(self.process)
+        if hasattr(linkLayer, "registerVirtualNodeStateListener"):
+            linkLayer.registerVirtualNodeStateListener(
+                self.handleVirtualNodeState)
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, nodeID: NodeID) -> bool:
+        return nodeID in self._routes
+
+    def addNode(self, node: LocalNode) -> Route:
+        """Serve node, and on a CanLink, reserve an alias for it.
+
+        Raises:
+            ValueError: If a node with the same id was already added.
+        """
+        if node.id in self._routes:
+            raise ValueError("{} is already routed".format(node.id))
+        route = Route(self.linkLayer, node)
+        self._routes[node.id] = route
+        if hasattr(self.linkLayer, "addVirtualNode"):
+            self.linkLayer.addVirtualNode(node.id)
+        return route
+
+    def removeNode(self, nodeID: NodeID) -> Union[Route, None]:
+        """Stop serving a node (and release its alias on a CanLink)."""
+        route = self._routes.pop(nodeID, None)
+        if route is not None and hasattr(self.linkLayer,
+                                         "removeVirtualNode"):
+            self.linkLayer.removeVirtualNode(nodeID)
+        return route
+
+    def getRoute(self, nodeID: NodeID) -> Union[Route, None]:
+        return self._routes.get(nodeID)
+
+    def process(self, message: Message) -> bool:
+        """Message listener: Deliver message to its destination node,
+        or to every node if it is global.
+
+        Returns:
+            bool: Always False (See Processor).
+        """
+        if message.isGlobal():
+            if message.mti == MTI.Link_Layer_Up:
+                # Each node gets its own when its alias is reserved
+                #   (See handleVirtualNodeState).
+                return False
+            for route in list(self._routes.values()):
+                route.process(message)
+            return False
+        route = self._routes.get(message.destination)
+        if route is not None:
+            route.process(message)
+        return False
+
+    def handleVirtualNodeState(self, nodeID: NodeID, permitted: bool):
+        """Send Link_Layer_Up or Link_Layer_Down to one node only."""
+        route = self._routes.get(nodeID)
+        if route is None:
+            return
+        mti = MTI.Link_Layer_Up if permitted else MTI.Link_Layer_Down
+        route.process(Message(mti, NodeID(0), None, bytearray()))
@@ -3,14 +3,17 @@ based on MemoryService.swift
 
 Created by Bob Jacobsen on 6/1/22.
 
-TODO: Read requests are serialized, but write requests are not yet
+TODO: Read requests are tracked per node (See readWindow), but write
+requests are not yet.
 
 Datagram retry handles the link being quiesced/restarted, so it's not
 explicitly handled here.
 
 Does memory read and write requests.
 
-Reads and writes are limited to 64 bytes at a time.
+Reads and writes are limited to 64 bytes at a time, unless sent as a
+stream (stream=True, which requires a StreamService): then the data
+follows the request in one stream of any size.
 
 To do memory write:
 - Create a ``MemoryWriteMemo`` and submit via ``requestMemoryWrite(_:)``
@@ -19,8 +22,11 @@ To do memory write:
 To do memory read:
 - Create a ``MemoryReadMemo`` and submit via ``requestMemoryRead(_:)``
 - Wait for either dataReply or rejectedReply call back.
+- Or call ``read`` (or await ``readAsync``) to get a Future instead.
 '''
 
+import concurrent.futures
+from collections import OrderedDict, deque
 from enum import Enum
 from logging import getLogger
 import struct
@@ -41,15 +47,32 @@ from openlcb.datagramservice import (
     DatagramService,
 )
 from openlcb.convert import Convert
+from openlcb.futures import (
+    OperationError,
+    awaitFuture,
+    settle,
+    startTimeout,
+)
 # from openlcb.localnode import LocalNode  # circular import
 from openlcb.memoryconfigurationheader import MemoryConfigurationHeader
 from openlcb.memoryspace import MemorySpace
 from openlcb.memoryspaceindex import MemorySpaceIndex
 from openlcb.memorymanager import MemoryManager
+from openlcb.metrics import stackMetrics
 from openlcb.nodeid import NodeID
+from openlcb.rttestimator import RttEstimator
+from openlcb.streamservice import (
+    StreamReadMemo,
+    StreamService,
+    StreamWriteMemo,
+)
 
 logger = getLogger(__name__)
 
+TIMEOUT_ERROR_CODE = 0x2010
+# ^ errorCode of a memory operation that got no reply (the standard's
+#   temporary "time-out" error, since a later attempt may succeed)
+
 
 class MCOp(Enum):
     """Byte 1 values where first 6 bits are unique *or*
@@ -239,6 +262,9 @@ class MemoryReadMemo:
 
     Attributes:
         data(bytearray): The data that was read.
+        error (str): Set if the read failed.
+        errorCode (int): Error code of a failed read (TIMEOUT_ERROR_CODE
+            if no reply arrived, in which case timedOut is True).
     """
     def __init__(self, nodeID: NodeID, size: int, space: int, address: int,
                  rejectedReply: Callable[['MemoryReadMemo'], None],
@@ -257,6 +283,12 @@ class MemoryReadMemo:
         self.address = address
         self.rejectedReply = rejectedReply
         self.dataReply = dataReply
+        self.timedOut = False  # True if failed for lack of a reply
+        self.retries = 0  # resends (See MemoryService.readRetries)
+        self._datagram = None  # request in progress (DatagramWriteMemo)
+        self._timer = None  # reply deadline
+        self._acceptedAt = None  # when the node accepted the request
+        self._streamMemo = None  # StreamReadMemo of a stream read
         # for convenience, data can be added or updated after creation of the
         # memo
         self.data = bytearray()
@@ -281,6 +313,11 @@ class MemoryWriteMemo:
             written.
         data (bytes): The actual data to be written to the specified
             memory address.
+
+    Attributes:
+        error (str): Set if the write failed.
+        errorCode (int): Error code of a failed write (TIMEOUT_ERROR_CODE
+            if no reply arrived, in which case timedOut is True).
     """
 
     def __init__(self, nodeID: NodeID,
@@ -293,10 +330,16 @@ class MemoryWriteMemo:
         self.nodeID = nodeID
         self.okReply = okReply
         self.rejectedReply = rejectedReply
-        self.size = size  # max 64 bytes
+        self.size = size  # max 64 bytes unless written as a stream
         self.space = space
         self.address = address
         self.data = data
+        self.timedOut = False  # True if failed for lack of a reply
+        self._datagram = None  # request in progress (DatagramWriteMemo)
+        self._timer = None  # reply deadline
+        self._acceptedAt = None  # when the node accepted the request
+        self._replyPromised = True  # False if the node said none follows
+        self._streamMemo = None  # StreamWriteMemo of a stream write
         assertMemoOK(self)
 
 
@@ -310,7 +353,6 @@ def assertMemoOK(memo: Union[MemoryReadMemo, MemoryWriteMemo]):
     #     f"Expected <= 64, got size={memo.size}"
     assert isinstance(memo.address, int), \
         f"Expected int, got address={emit_cast(memo.address)}"
-    assert len(memo.data) <= 64
     assert isinstance(memo.data, (bytes, bytearray)), \
         f"Expected bytearray, got data={emit_cast(memo.data)}"
 
@@ -398,10 +440,14 @@ def parseReplyDatagram(memo: Union[MemoryReadMemo, MemoryWriteMemo],
 
 class MemoryService:
     """Manage memory read and write requests
-    (64 bytes at a time).
+    (64 bytes at a time, or any size as a stream).
 
     Args:
         service (DatagramService): See DatagramService.
+        streamService (StreamService, optional): Carries the data of
+            stream reads and writes (requested with stream=True), and
+            of stream commands from other nodes. Defaults to None
+            (then only datagram reads and writes are available).
 
     Attributes:
         memory (Union[MemoryManager, LocalNode]): The storage
@@ -412,11 +458,46 @@ class MemoryService:
             nodes. Though typically a Configuration Tool isn't itself
             configured remotely, that is technically possible, and
             more typical in cases where it generates virtual nodes).
+        readWindow (int): Reads sent to one node before its replies
+            arrive (1 by default, since many nodes handle only one at a
+            time). Reads to different nodes are always concurrent.
+        readRetries (int): Resends of a read whose reply does not arrive
+            in time (reads are idempotent; writes are not resent).
+        initialTimeout (float): Seconds to wait for a node's first reply,
+            before its round-trip time is known.
+        minTimeout (float): Shortest reply timeout for any node.
+        maxTimeout (float): Longest reply timeout for any node.
+
+    With a scheduler (See DatagramService), each read or write has a
+    deadline that starts once the node accepts the request datagram:
+    the node's retransmission timeout (See rttEstimator), or longer if
+    the node's Datagram_Received_OK promises a reply within 2^N seconds.
+    A read that misses it is resent (up to readRetries times), then the
+    read or write fails: rejectedReply is called with timedOut set and
+    errorCode TIMEOUT_ERROR_CODE. A write whose Datagram_Received_OK
+    said no reply follows (Reply Pending clear) is done at its deadline
+    instead (okReply), unless a write reply arrives first.
+
+    The data of a stream read or write has no deadline of its own: the
+    stream fails if it stalls (See StreamService.idleTimeout), and the
+    reply to a stream write is due once all of the data is sent.
     """
 
-    def __init__(self, service: DatagramService):
+    def __init__(self, service: DatagramService,
+                 streamService: Union[StreamService, None] = None):
         self.service: DatagramService = service
-        self.readMemos: List[MemoryReadMemo] = []
+        self.streamService = streamService
+        self.readWindow = 1  # reads in flight per node (See requestMemoryRead)
+        self._readQueues = {}  # type: dict[NodeID, deque]
+        # ^ (memo, stream) of reads waiting for room in the node's window
+        self._readsInFlight = OrderedDict()
+        # ^ MemoryReadMemo by (nodeID, space, address), oldest first
+        self._readCounts = {}  # type: dict[NodeID, int]  # in flight by node
+        self.readRetries = 2
+        self.initialTimeout = 3.0
+        self.minTimeout = .5
+        self.maxTimeout = 30.0
+        self._rtt = {}  # type: dict[NodeID, RttEstimator]
         self.writeMemos: List[MemoryWriteMemo] = []
         self.spaceLengthCallback: Union[Callable[[int], None], None] = None
 
@@ -425,6 +506,19 @@ class MemoryService:
             self.datagramReceivedListener
         )
         self.memory = MemoryManager()  # type: MemoryManager|LocalNode
+        self.metrics = stackMetrics()  # None unless metrics are enabled
+        self._readSentAt = {}  # type: dict[int, float]
+        # ^ send time by id(memo) of read requests (only with metrics)
+
+    @property
+    def readMemos(self) -> List[MemoryReadMemo]:
+        """Reads awaiting their reply (oldest first), then reads waiting
+        to be sent.
+        """
+        memos = list(self._readsInFlight.values())
+        for queue in self._readQueues.values():
+            memos.extend(memo for memo, _ in queue)
+        return memos
 
     def requestMemoryRead(self, memo, stream: bool = False):
         # type: (MemoryReadMemo, Optional[bool]) -> None
@@ -435,15 +529,121 @@ class MemoryService:
 
         - A rejectedReply will not be followed by a dataReply.
 
+        The read is sent right away unless readWindow reads to the same
+        node (or one for the same space and address) await replies, in
+        which case it is sent in order as replies arrive.
+
         Args:
             memo (MemoryReadMemo): Request to enqueue.
+            stream (bool, optional): Have the node send the data in a
+                stream (any size; requires streamService).
         '''
         assert isinstance(stream, bool)
-        # preserve the request
-        self.readMemos.append(memo)
-
-        if len(self.readMemos) == 1:
+        if stream and (self.streamService is None):
+            raise ValueError("A stream read requires a StreamService.")
+        queue = self._readQueues.get(memo.nodeID)
+        if queue is None:
+            queue = self._readQueues[memo.nodeID] = deque()
+        queue.append((memo, stream))
+        self._sendReads(memo.nodeID)
+
+    def _sendReads(self, nodeID: NodeID):
+        """Send the node's queued reads while its window has room."""
+        queue = self._readQueues.get(nodeID)
+        while queue and (self._readCounts.get(nodeID, 0) < self.readWindow):
+            memo, stream = queue[0]
+            if self._readKey(memo) in self._readsInFlight:
+                break  # a reply could not tell the two apart
+            queue.popleft()
             self.requestMemoryReadNext(memo, stream=stream)
+        if not queue:
+            self._readQueues.pop(nodeID, None)
+
+    @staticmethod
+    def _readKey(memo: MemoryReadMemo) -> tuple:
+        space = memo.space
+        if space & 0x03:
+            space |= 0xFC  # as sent (See MemoryConfigurationHeader)
+        return (memo.nodeID, space, memo.address)
+
+    def rttEstimator(self, nodeID: NodeID) -> RttEstimator:
+        """Get the round-trip time estimate (and reply timeout) of a
+        node, from replies to its memory operations.
+        """
+        estimator = self._rtt.get(nodeID)
+        if estimator is None:
+            estimator = self._rtt[nodeID] = RttEstimator(
+                self.initialTimeout, self.minTimeout, self.maxTimeout)
+        return estimator
+
+    def read(self, nodeID: NodeID, space: int, address: int, size: int,
+             timeout: Union[float, None] = None, stream: bool = False
+             ) -> concurrent.futures.Future:
+        """Request a read and get a Future for the data, instead of
+        dataReply and rejectedReply callbacks.
+
+        Args:
+            nodeID (NodeID): Remote node.
+            space (int): Memory space (or MemorySpace).
+            address (int): Start address.
+            size (int): Number of bytes (up to 64 unless stream).
+            timeout (float, optional): Seconds to wait for the data
+                (requires the DatagramService's scheduler). Defaults to
+                no limit other than the node's reply deadline (See
+                MemoryService).
+            stream (bool, optional): Read as a stream (See
+                requestMemoryRead).
+
+        Returns:
+            Future: Result is the data (bytearray). Raises
+                OperationError (with the MemoryReadMemo, including error
+                and errorCode) if the node rejects the read, or
+                TimeoutError. Canceling it (or a timeout) withdraws the
+                read if it was not sent yet.
+        """
+        scheduler = self.service.scheduler
+        if (timeout is not None) and (scheduler is None):
+            raise ValueError("A timeout requires a scheduler.")
+        future = concurrent.futures.Future()
+
+        def rejected(memo: MemoryReadMemo):
+            if memo.timedOut:
+                settle(future, exception=TimeoutError(memo.error))
+                return
+            settle(future, exception=OperationError(
+                "Read rejected: {}".format(memo.error), memo))
+        memo = MemoryReadMemo(nodeID, size, space, address, rejected,
+                              lambda memo: settle(future, memo.data))
+        if scheduler is not None:
+            startTimeout(future, scheduler, timeout,
+                         lambda: self.withdrawMemoryRead(memo))
+        self.requestMemoryRead(memo, stream=stream)
+        return future
+
+    async def readAsync(self, nodeID: NodeID, space: int, address: int,
+                        size: int, timeout: Union[float, None] = None,
+                        stream: bool = False) -> bytearray:
+        """Read memory and await the data (See read)."""
+        return await awaitFuture(self.read(nodeID, space, address, size,
+                                           timeout=timeout, stream=stream))
+
+    def withdrawMemoryRead(self, memo: MemoryReadMemo) -> bool:
+        """Drop a queued read that was not sent yet (reads awaiting
+        their reply are left in place).
+
+        Returns:
+            bool: True if removed.
+        """
+        queue = self._readQueues.get(memo.nodeID)
+        if not queue:
+            return False
+        for index, (queued, _) in enumerate(queue):
+            if queued is memo:
+                del queue[index]
+                if not queue:
+                    del self._readQueues[memo.nodeID]
+                return True
+        return False
 
     def requestMemoryReadNext(self, memo, stream: bool = False):
         # type: (MemoryReadMemo, Optional[bool]) -> None
@@ -468,14 +668,243 @@ class MemoryService:
         if mcHeader.customSpace is not None:
             assert memo.space <= 0xFF, f"Space {memo.space} out of byte range"
             data.extend([(memo.space & 0xFF)])
-        data.extend([memo.size])
+        if stream:
+            streamMemo = StreamReadMemo(
+                memo.nodeID,
+                lambda streamMemo: self._streamReceived(memo, streamMemo),
+                lambda streamMemo: self._streamFailed(memo, streamMemo))
+            memo._streamMemo = streamMemo
+            data.extend([StreamService.UnknownStreamID,
+                         self.streamService.expectStream(streamMemo)])
+            data.extend(struct.pack(">I", memo.size))
+        else:
+            data.extend([memo.size])
         logger.debug(
             "[requestMemoryReadNext] creating DatagramWriteMemo"
             f" to destID={memo.nodeID} with data={list(data)}")
-        dgWriteMemo = DatagramWriteMemo(memo.nodeID, data,
-                                        self.receivedOkReplyToWrite)
+        if self.metrics is not None:
+            self._readSentAt[id(memo)] = self.metrics.clock()
+        self._readsInFlight[self._readKey(memo)] = memo
+        self._readCounts[memo.nodeID] = \
+            self._readCounts.get(memo.nodeID, 0) + 1
+        memo.retries = 0
+        memo.timedOut = False
+        self._sendRequest(memo, data)
+
+    def _sendRequest(self, memo: Union[MemoryReadMemo, MemoryWriteMemo],
+                     data: bytearray):
+        """Send the request datagram of memo (once accepted by the
+        node, its reply deadline starts).
+        """
+        dgWriteMemo = DatagramWriteMemo(
+            memo.nodeID, data,
+            lambda dgMemo: self._requestAccepted(memo, dgMemo),
+            lambda dgMemo: self._requestFailed(memo, dgMemo))
+        memo._datagram = dgWriteMemo
         self.service.sendDatagram(dgWriteMemo)
 
+    def _requestAccepted(self, memo: Union[MemoryReadMemo, MemoryWriteMemo],
+                         dgMemo: DatagramWriteMemo):
+        if memo._datagram is not dgMemo:
+            return  # already answered
+        flags = dgMemo.flags
+        if isinstance(memo, MemoryWriteMemo):
+            if memo._streamMemo is not None:
+                self.streamService.sendStream(memo._streamMemo)
+                return  # the deadline starts once it is sent
+            memo._replyPromised = (
+                (flags is None) or bool(flags & DatagramService.ReplyPending))
+        self._startDeadline(memo, dgMemo, flags)
+
+    def _startDeadline(self, memo: Union[MemoryReadMemo, MemoryWriteMemo],
+                       dgMemo: DatagramWriteMemo, flags: Union[int, None]):
+        scheduler = self.service.scheduler
+        if scheduler is None:
+            return
+        timeout = self.rttEstimator(memo.nodeID).timeout
+        if (flags is not None) and (flags & DatagramService.ReplyPending) \
+                and (flags & 0x0F):
+            timeout = max(timeout, 2 ** (flags & 0x0F))
+            # ^ the node promises a reply within 2^N seconds
+        memo._acceptedAt = scheduler.clock()
+        memo._timer = scheduler.callLater(
+            timeout, lambda: self._replyTimedOut(memo, dgMemo))
+
+    def _requestFailed(self, memo: Union[MemoryReadMemo, MemoryWriteMemo],
+                       dgMemo: DatagramWriteMemo):
+        """The node did not accept the request datagram (after the
+        DatagramService's own retries).
+        """
+        if memo._datagram is not dgMemo:
+            return
+        self._endRequest(memo)
+        memo.timedOut = dgMemo.timedOut
+        memo.errorCode = (TIMEOUT_ERROR_CODE if dgMemo.timedOut
+                          else dgMemo.errorCode)
+        memo.error = dgMemo.error
+        memo.rejectedReply(memo)
+
+    def _replyTimedOut(self, memo: Union[MemoryReadMemo, MemoryWriteMemo],
+                       dgMemo: DatagramWriteMemo):
+        memo._timer = None
+        if memo._datagram is not dgMemo:
+            return  # answered meanwhile
+        isRead = isinstance(memo, MemoryReadMemo)
+        self.rttEstimator(memo.nodeID).backoff()
+        if self.metrics is not None:
+            self.metrics.memoryTimeouts.inc("read" if isRead else "write")
+        if isRead and (memo.retries < self.readRetries):
+            memo.retries += 1
+            logger.info("Resending read of {} @{} (retry {})"
+                        .format(memo.nodeID, memo.address, memo.retries))
+            self._sendRequest(memo, dgMemo.data)
+            return
+        self._endRequest(memo)
+        if not (isRead or memo._replyPromised):
+            memo.okReply(memo)  # no write reply was coming
+            return
+        memo.timedOut = True
+        memo.errorCode = TIMEOUT_ERROR_CODE
+        memo.error = ("No reply from {} after {} attempt(s)"
+                      .format(memo.nodeID,
+                              (memo.retries + 1) if isRead else 1))
+        logger.warning(memo.error)
+        memo.rejectedReply(memo)
+
+    def _endRequest(self, memo: Union[MemoryReadMemo, MemoryWriteMemo]):
+        """Stop tracking a failed request (the next read to its node, if
+        any, is sent).
+        """
+        memo._datagram = None
+        if memo._timer is not None:
+            memo._timer.cancel()
+            memo._timer = None
+        if memo._streamMemo is not None:
+            self.streamService.cancelStream(memo._streamMemo)
+            memo._streamMemo = None
+        if isinstance(memo, MemoryWriteMemo):
+            for index, writeMemo in enumerate(self.writeMemos):
+                if writeMemo is memo:
+                    del self.writeMemos[index]
+                    break
+            return
+        self._readSentAt.pop(id(memo), None)
+        key = self._readKey(memo)
+        if self._readsInFlight.get(key) is memo:
+            del self._readsInFlight[key]
+            self._releaseRead(memo.nodeID)
+        self._sendReads(memo.nodeID)
+
+    def _streamReceived(self, memo: MemoryReadMemo,
+                        streamMemo: StreamReadMemo):
+        """The data of a stream read arrived."""
+        if memo._streamMemo is not streamMemo:
+            return  # the read already failed
+        memo._streamMemo = None
+        self._endRequest(memo)
+        memo.data = streamMemo.data
+        memo.error = None
+        memo.errorCode = None
+        memo.dataReply(memo)
+
+    def _streamSent(self, memo: MemoryWriteMemo,
+                    streamMemo: StreamWriteMemo):
+        """The data of a stream write is sent, so its reply is due."""
+        if memo._streamMemo is not streamMemo:
+            return
+        memo._streamMemo = None
+        self._startDeadline(memo, memo._datagram, None)
+
+    def _streamFailed(self, memo: Union[MemoryReadMemo, MemoryWriteMemo],
+                      streamMemo: Union[StreamReadMemo, StreamWriteMemo]):
+        """The stream of a read or write was refused or stalled."""
+        if memo._streamMemo is not streamMemo:
+            return
+        memo._streamMemo = None
+        self._endRequest(memo)
+        memo.timedOut = streamMemo.timedOut
+        memo.errorCode = (TIMEOUT_ERROR_CODE if streamMemo.timedOut
+                          else streamMemo.errorCode)
+        memo.error = streamMemo.error
+        memo.rejectedReply(memo)
+
+    def _releaseRead(self, nodeID: NodeID):
+        count = self._readCounts.get(nodeID, 1) - 1
+        if count > 0:
+            self._readCounts[nodeID] = count
+        else:
+            self._readCounts.pop(nodeID, None)
+
+    def _replied(self, memo: Union[MemoryReadMemo, MemoryWriteMemo]):
+        """Stop the deadline of an answered request, and time the reply
+        (unless the request was resent; See RttEstimator).
+        """
+        memo._datagram = None
+        if memo._timer is not None:
+            memo._timer.cancel()
+            memo._timer = None
+        scheduler = self.service.scheduler
+        if (scheduler is not None) and (memo._acceptedAt is not None) \
+                and not getattr(memo, "retries", 0):
+            self.rttEstimator(memo.nodeID).observe(
+                scheduler.clock() - memo._acceptedAt)
+        memo._acceptedAt = None
+
+    def _takeReadReplyMemo(self, dmemo: DatagramReadMemo,
+                           remove: bool = True
+                           ) -> Union[MemoryReadMemo, None]:
+        """Remove and return the in-flight read that a read reply (or
+        read failure reply) answers, or None if there is none.
+
+        Args:
+            remove (bool, optional): Set False to leave it in flight
+                (a stream read is done once its stream is).
+        """
+        data = dmemo.data
+        spaceBits = data[1] & 0x03
+        space = (0xFC | spaceBits) if spaceBits else None
+        if space is None and len(data) > 6:
+            space = data[6]  # custom space byte (0x50 or 0x58)
+        if (space is not None) and (len(data) >= 6):
+            key = (dmemo.srcID, space, struct.unpack(">I", data[2:6])[0])
+            memo = self._readsInFlight.get(key)
+            # ^ None if not ours (or a late reply to a read that failed)
+        else:
+            # Truncated: assume the oldest read to the node (as replies
+            # arrive in order).
+            for key, inFlight in self._readsInFlight.items():
+                if inFlight.nodeID == dmemo.srcID:
+                    memo = inFlight
+                    break
+            else:
+                return None
+        if (memo is not None) and remove:
+            del self._readsInFlight[key]
+            self._releaseRead(dmemo.srcID)
+        return memo
+
+    def _takeWriteReplyMemo(self, dmemo: DatagramReadMemo
+                            ) -> Union[MemoryWriteMemo, None]:
+        """Remove and return the write that a write reply (or write
+        failure reply) answers: the node's write to the echoed address,
+        otherwise its oldest write, or None if there is none.
+        """
+        address = None
+        if len(dmemo.data) >= 6:
+            address = struct.unpack(">I", dmemo.data[2:6])[0]
+        found = None
+        for index, writeMemo in enumerate(self.writeMemos):
+            if writeMemo.nodeID != dmemo.srcID:
+                continue
+            if found is None:
+                found = index
+            if writeMemo.address == address:
+                found = index
+                break
+        if found is None:
+            return None
+        return self.writeMemos.pop(found)
+
     def receivedOkReplyToWrite(self, memo: Union[DatagramWriteMemo, None]):
         '''Wait for following response to be returned via listener.
         This is normal.
@@ -513,54 +942,74 @@ class MemoryService:
             # read or read-error reply
 
             # return data to requestor: first find matching memory read
-            # memo, then reply
-            for index in range(0, len(self.readMemos)):
-                if self.readMemos[index].nodeID == dmemo.srcID:
-                    tMemoryMemo = self.readMemos[index]  # type: MemoryReadMemo
-                    del self.readMemos[index]
-                    # decode type of operation, hence offset for start of
-                    # data
-                    offset = 6
-                    if dmemo.data[1] == 0x50 or dmemo.data[1] == 0x58:
-                        offset = 7
-
-                    # are there any additional requests queued to send?
-                    if len(self.readMemos) > 0:
-                        self.requestMemoryReadNext(self.readMemos[0])
-
-                    parseReplyDatagram(tMemoryMemo, dmemo)
-                    # fill data for call-back to requestor
-                    if len(dmemo.data) > offset:
-                        tMemoryMemo.data = dmemo.data[offset:]
-                        logger.debug(
-                            f"[datagramReceivedListener] got read reply"
-                            f" data={list(tMemoryMemo.data)} offset={offset}"
-                            f", requested @{tMemoryMemo.address}")
-
-                    # check for read or read error reply
-                    if (dmemo.data[1] & 0x08 == 0):
-                        tMemoryMemo.dataReply(tMemoryMemo)
-                    else:
-                        tMemoryMemo.rejectedReply(tMemoryMemo)
-                    break
-        elif dmemo.data[1] in (0x10, 0x11, 0x12, 0x13, 0x18, 0x19, 0x1A, 0x1B):
+            # memo (by the space and address echoed in the reply), then
+            # reply
+            tMemoryMemo = self._takeReadReplyMemo(dmemo)
+            if tMemoryMemo is None:
+                logger.warning("Read reply from {} matches no read"
+                               .format(dmemo.srcID))
+                return True
+            self._replied(tMemoryMemo)
+            if self.metrics is not None:
+                sentAt = self._readSentAt.pop(id(tMemoryMemo), None)
+                if sentAt is not None:
+                    self.metrics.memoryReadLatency.observe(
+                        self.metrics.clock() - sentAt)
+            # decode type of operation, hence offset for start of
+            # data
+            offset = 6
+            if dmemo.data[1] == 0x50 or dmemo.data[1] == 0x58:
+                offset = 7
+
+            # are there any additional requests queued to send?
+            self._sendReads(dmemo.srcID)
+
+            parseReplyDatagram(tMemoryMemo, dmemo)
+            # fill data for call-back to requestor
+            if len(dmemo.data) > offset:
+                tMemoryMemo.data = dmemo.data[offset:]
+                logger.debug(
+                    f"[datagramReceivedListener] got read reply"
+                    f" data={list(tMemoryMemo.data)} offset={offset}"
+                    f", requested @{tMemoryMemo.address}")
+
+            # check for read or read error reply
+            if (dmemo.data[1] & 0x08 == 0):
+                tMemoryMemo.dataReply(tMemoryMemo)
+            else:
+                tMemoryMemo.rejectedReply(tMemoryMemo)
+        elif dmemo.data[1] in (0x70, 0x71, 0x72, 0x73, 0x78, 0x79, 0x7A, 0x7B):
+            # read stream reply good, bad
+            tMemoryMemo = self._takeReadReplyMemo(dmemo, remove=False)
+            if (tMemoryMemo is None) or (tMemoryMemo._streamMemo is None):
+                logger.warning("Read stream reply from {} matches no read"
+                               .format(dmemo.srcID))
+                return True
+            self._replied(tMemoryMemo)
+            if dmemo.data[1] & 0x08 == 0:
+                # the data follows in the stream (See _streamReceived)
+                self.streamService.touch(tMemoryMemo._streamMemo)
+                return True
+            self._endRequest(tMemoryMemo)
+            parseReplyDatagram(tMemoryMemo, dmemo)
+            tMemoryMemo.rejectedReply(tMemoryMemo)
+        elif dmemo.data[1] in (0x10, 0x11, 0x12, 0x13, 0x18, 0x19, 0x1A, 0x1B,
+                               0x30, 0x31, 0x32, 0x33, 0x38, 0x39, 0x3A, 0x3B):
             # assert mcOp is MCOp.Write_Reply, \
             #     (f"self-test failed (bad constant(s));"
             #      f" got op {mcOp} for sub-op {hex(dmemo.data[1])}")
-            # write reply good, bad
+            # write (or write stream) reply good, bad
 
             # return data to requestor: first find matching memory write
             # memo, then reply
-            for index in range(0, len(self.writeMemos)):
-                if self.writeMemos[index].nodeID == dmemo.srcID:
-                    writeMemo = self.writeMemos[index]  # type: MemoryWriteMemo
-                    del self.writeMemos[index]
-                    parseReplyDatagram(writeMemo, dmemo)
-                    if dmemo.data[1] & 0x08 == 0 :
-                        writeMemo.okReply(writeMemo)
-                    else:
-                        writeMemo.rejectedReply(writeMemo)
-                    break
+            writeMemo = self._takeWriteReplyMemo(dmemo)
+            if writeMemo is not None:
+                self._replied(writeMemo)
+                parseReplyDatagram(writeMemo, dmemo)
+                if dmemo.data[1] & 0x08 == 0 :
+                    writeMemo.okReply(writeMemo)
+                else:
+                    writeMemo.rejectedReply(writeMemo)
         elif dmemo.data[1] == MCOp.Get_Address_Space_Info_Command.value:
             # 0x84 (A node sent us a command requesting space info)
             # assert mcOp is MCOp.Get_Address_Space_Info_Command, \
@@ -657,6 +1106,9 @@ class MemoryService:
                        + int(dmemo.data[6]))
             self.spaceLengthCallback(address)
             self.spaceLengthCallback = None
+        elif mcOp in (MCOp.Read_Stream_Command, MCOp.Write_Stream_Command):
+            # See OpenLCB Memory Configuration Standard, section 4.5 & 4.9
+            self._serveStreamCommand(dmemo, mcOp)
         elif mcOp in (MCOp.Read_Command, MCOp.Write_Command):
             # See OpenLCB Memory Configuration Standard, section 4.4 & 4.8
             mcHeader = MemoryConfigurationHeader.fromMC2ndByte(dmemo.data[1])
@@ -787,6 +1239,87 @@ class MemoryService:
                          .format(dmemo.data[1]))
         return True
 
+    def _serveStreamCommand(self, dmemo: DatagramReadMemo, mcOp: MCOp):
+        """Answer a Read Stream or Write Stream command from another
+        node, and send (or accept) the stream of data.
+        """
+        data = dmemo.data
+        isRead = mcOp is MCOp.Read_Stream_Command
+        spaceBits = data[1] & 0b00000011
+        index = 6 if spaceBits else 7  # stream IDs follow the space
+        replyByte = (MCOp.Read_Stream_Reply if isRead
+                     else MCOp.Write_Stream_Reply).value | spaceBits
+        echo = bytearray(data[2:index])  # address (and custom space)
+        if len(data) < index + 2:
+            self._streamCommandFailed(dmemo.srcID, replyByte, echo, 0x1080,
+                                      f"{mcOp.name} too short")
+            return
+        if self.streamService is None:
+            self._streamCommandFailed(dmemo.srcID, replyByte, echo, 0x1040,
+                                      "streams not supported")
+            return
+        address = struct.unpack(">I", data[2:6])[0]
+        space = (0xFC | spaceBits) if spaceBits else data[6]
+        segment = self.memory.getSegment(space)
+        if (segment is None) or (address >= segment.size()):
+            self._streamCommandFailed(
+                dmemo.srcID, replyByte, echo, 0x1080,
+                f"address {hex(address)} not valid in space {hex(space)}")
+            return
+        srcStreamID, dstStreamID = data[index], data[index + 1]
+        if isRead:
+            available = segment.size() - address
+            count = available
+            if len(data) >= index + 6:
+                count = struct.unpack(">I", data[index+2:index+6])[0]
+                if (count == 0) or (count > available):
+                    count = available  # 0 means to the end of the space
+            payload = bytearray(self.memory.getSlice(space, address, count,
+                                                     force=True))
+            streamMemo = StreamWriteMemo(dmemo.srcID, payload,
+                                         dstStreamID=dstStreamID)
+            srcStreamID = self.streamService.openStream(streamMemo)
+            replyBytes = (bytearray([0x20, replyByte]) + echo
+                          + bytearray([srcStreamID, dstStreamID])
+                          + struct.pack(">I", len(payload)))
+            self.service.sendDatagram(DatagramWriteMemo(
+                dmemo.srcID, replyBytes,
+                lambda _: self.streamService.sendStream(streamMemo),
+                lambda _: self.streamService.cancelStream(streamMemo)))
+            return
+
+        def received(streamMemo: StreamReadMemo):
+            try:
+                self.memory.setSlice(space, address, streamMemo.data)
+            except (IndexError, KeyError) as ex:
+                self._streamCommandFailed(dmemo.srcID, replyByte, echo,
+                                          0x1080, str(ex))
+                return
+            self.service.sendDatagram(DatagramWriteMemo(
+                dmemo.srcID,
+                bytearray([0x20, replyByte]) + echo
+                + bytearray([srcStreamID, streamMemo.dstStreamID])))
+
+        def failed(streamMemo: StreamReadMemo):
+            self._streamCommandFailed(
+                dmemo.srcID, replyByte, echo,
+                TIMEOUT_ERROR_CODE if streamMemo.timedOut else 0x1000,
+                streamMemo.error or "stream failed")
+
+        streamMemo = StreamReadMemo(dmemo.srcID, received, failed,
+                                    srcStreamID=srcStreamID)
+        self.streamService.expectStream(streamMemo)
+        self.streamService.touch(streamMemo)
+
+    def _streamCommandFailed(self, destID: NodeID, replyByte: int,
+                             echo: bytearray, errorCode: int, message: str):
+        """Send the failure reply to a stream command."""
+        logger.warning(f"Stream command from {destID} failed: {message}")
+        replyBytes = bytearray([0x20, replyByte | MCOpBits.Failure_Bit])
+        replyBytes += echo + struct.pack(">H", errorCode)
+        replyBytes += message.encode("utf-8") + b"\0"
+        self.service.sendDatagram(DatagramWriteMemo(destID, replyBytes))
+
     @staticmethod
     def failedMemo(mcOp: MCOp, srcID: NodeID, address: int, space: int,
                    errorCode: int, message) -> DatagramWriteMemo:
@@ -822,13 +1355,21 @@ class MemoryService:
 
         Args:
             memo (MemoryWriteMemo): information to send
+            stream (bool, optional): Send the data in a stream once the
+                node accepts the command (any size; requires
+                streamService).
         """
         assert isinstance(stream, bool)
+        if stream and (self.streamService is None):
+            raise ValueError("A stream write requires a StreamService.")
+        assert stream or (len(memo.data) <= 64), \
+            f"Expected <= 64 bytes (or stream), got {len(memo.data)}"
         # preserve the request
         self.writeMemos.append(memo)
         # create & send a write datagram
-        hasByte6 = False  # if custom space is defined in byte 6
         header = MemoryConfigurationHeader(memo.space)
+        hasByte6 = header.customSpace is not None
+        # ^ if custom space is defined in byte 6
         spaceFlag = (0x20 if stream else 0) | header.spaceIndex.value
         addr2 = ((memo.address >> 24) & 0xFF)
         addr3 = ((memo.address >> 16) & 0xFF)
@@ -841,9 +1382,18 @@ class MemoryService:
         if hasByte6:
             assert memo.space <= 0xFF, f"Space {memo.space} out of byte range"
             data.extend([(memo.space & 0xFF)])
-        data.extend(memo.data)
-        dgWriteMemo = DatagramWriteMemo(memo.nodeID, data)
-        self.service.sendDatagram(dgWriteMemo)
+        if stream:
+            streamMemo = StreamWriteMemo(
+                memo.nodeID, bytearray(memo.data),
+                lambda streamMemo: self._streamSent(memo, streamMemo),
+                lambda streamMemo: self._streamFailed(memo, streamMemo))
+            memo._streamMemo = streamMemo
+            data.extend([self.streamService.openStream(streamMemo),
+                         StreamService.UnknownStreamID])
+        else:
+            data.extend(memo.data)
+        memo.timedOut = False
+        self._sendRequest(memo, data)
 
     def requestSpaceLength(self, space: int, nodeID: NodeID,
                            callback: Callable[[int], None]):
@@ -0,0 +1,422 @@
+'''
+Counters, gauges and histograms for monitoring the stack in production.
+
+Metrics are off by default. Call enableMetrics before constructing the
+stack (CanLink, TcpLink, the physical layer, DatagramService and
+MemoryService each get the StackMetrics of the enabled registry when
+constructed, in an attribute named metrics). While off, that attribute
+is None, so the cost in each instrumented path is one attribute check.
+
+Read the values with registry.snapshot() (a dict), registry.exportText()
+(Prometheus text exposition format), or serve that text locally with
+registry.serve(port) for a Prometheus server or curl.
+
+Updates are not locked: under the GIL a value may rarely miss an
+increment made from two threads at once, which is acceptable for
+monitoring and keeps the enabled cost low too.
+'''
+import bisect
+import threading
+import weakref
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from timeit import default_timer
+from typing import Callable, Dict, List, Sequence, Union
+
+logger = getLogger(__name__)
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _formatValue(value: float) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _formatBound(bound: float) -> str:
+    if float(bound).is_integer():
+        return str(int(bound))
+    return repr(float(bound))
+
+
+def _escapeLabel(value: str) -> str:
+    return (str(value).replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+class Counter:
+    """A count that only increases, optionally split by one label
+    (such as frames by type).
+
+    Args:
+        name (str): Prometheus metric name (ending in _total).
+        help (str): One line description.
+        labelName (str, optional): Name of the label (None for a
+            single value).
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelName: str = None):
+        self.name = name
+        self.help = help
+        self.labelName = labelName
+        self._values = {}  # type: Dict[Union[str, None], int]
+
+    def inc(self, label: str = None, amount: int = 1):
+        values = self._values
+        values[label] = values.get(label, 0) + amount
+
+    def value(self, label: str = None) -> int:
+        return self._values.get(label, 0)
+
+    def snapshot(self) -> Union[int, Dict[str, int]]:
+        if self.labelName is None:
+            return self._values.get(None, 0)
+        return dict(self._values)
+
+    def _samples(self) -> List[str]:
+        if self.labelName is None:
+            return ["{} {}".format(self.name,
+                                   _formatValue(self._values.get(None, 0)))]
+        return ['{}{{{}="{}"}} {}'.format(self.name, self.labelName,
+                                          _escapeLabel(label),
+                                          _formatValue(value))
+                for label, value in sorted(self._values.items())]
+
+
+class Gauge:
+    """A value that goes up and down. Either set it, or add sources
+    (functions returning a number, such as a queue length) whose sum
+    is read only when a snapshot is taken (nothing is updated in the
+    instrumented path).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._value = 0
+        self._sources = []  # type: List[Callable[[], float]]
+
+    def set(self, value: float):
+        self._value = value
+
+    def addSource(self, source: Callable[[], float]):
+        self._sources.append(source)
+
+    def addMethodSource(self, obj: object, methodName: str):
+        """Add obj.methodName() as a source without keeping obj alive
+        (the source is dropped once obj is garbage collected).
+        """
+        ref = weakref.ref(obj)
+
+        def source():
+            target = ref()
+            if target is None:
+                return None
+            return getattr(target, methodName)()
+        self._sources.append(source)
+
+    def value(self) -> float:
+        if not self._sources:
+            return self._value
+        total = self._value
+        live = []
+        for source in self._sources:
+            value = source()
+            if value is None:
+                continue  # object collected
+            live.append(source)
+            total += value
+        self._sources = live
+        return total
+
+    def snapshot(self) -> float:
+        return self.value()
+
+    def _samples(self) -> List[str]:
+        return ["{} {}".format(self.name, _formatValue(self.value()))]
+
+
+class Histogram:
+    """Distribution of observed values (such as latencies in seconds).
+
+    Args:
+        buckets (Sequence[float]): Upper bounds, in increasing order.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str,
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulativeCounts(self) -> List[int]:
+        """Counts of values <= each bucket (and +Inf last)."""
+        result = []
+        total = 0
+        for count in self._counts:
+            total += count
+            result.append(total)
+        return result
+
+    def snapshot(self) -> dict:
+        bounds = [_formatBound(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(zip(bounds, self.cumulativeCounts())),
+        }
+
+    def _samples(self) -> List[str]:
+        lines = []
+        bounds = [_formatBound(bound) for bound in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, self.cumulativeCounts()):
+            lines.append('{}_bucket{{le="{}"}} {}'.format(
+                self.name, bound, count))
+        lines.append("{}_sum {}".format(self.name, _formatValue(self.sum)))
+        lines.append("{}_count {}".format(self.name, self.count))
+        return lines
+
+
+class MetricsRegistry:
+    """All metrics by name (get or create them with counter, gauge and
+    histogram).
+    """
+    def __init__(self):
+        self._metrics = {}  # type: Dict[str, Union[Counter, Gauge, Histogram]]  # noqa: E501
+        self._lock = threading.Lock()
+        self._stackMetrics = None
+
+    def _getOrCreate(self, cls, name: str, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError("{} is already a {}".format(name,
+                                                             metric.kind))
+            return metric
+
+    def counter(self, name: str, help: str, labelName: str = None
+                ) -> Counter:
+        return self._getOrCreate(Counter, name, help, labelName)
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._getOrCreate(Gauge, name, help)
+
+    def histogram(self, name: str, help: str,
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._getOrCreate(Histogram, name, help, buckets)
+
+    def get(self, name: str) -> Union[Counter, Gauge, Histogram, None]:
+        return self._metrics.get(name)
+
+    def stackMetrics(self) -> "StackMetrics":
+        """Get the StackMetrics of this registry (created once)."""
+        if self._stackMetrics is None:
+            self._stackMetrics = StackMetrics(self)
+        return self._stackMetrics
+
+    def snapshot(self) -> dict:
+        """Get every metric's current value(s) by name."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def exportText(self) -> str:
+        """Format every metric in the Prometheus text exposition format
+        (version 0.0.4).
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(),
+                             key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.help))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend(metric._samples())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1"
+              ) -> ThreadingHTTPServer:
+        """Serve exportText at /metrics over HTTP on a daemon thread.
+
+        Args:
+            port (int, optional): TCP port (0 for any free port, See
+                server.server_address). Defaults to 9464.
+            host (str, optional): Interface to listen on. Defaults to
+                local connections only.
+
+        Returns:
+            ThreadingHTTPServer: Call shutdown() then server_close() to
+                stop it.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.exportText().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics: " + format, *args)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever,
+                                  name="metrics server", daemon=True)
+        thread.start()
+        logger.info("Serving metrics at http://{}:{}/metrics"
+                    .format(*server.server_address[:2]))
+        return server
+
+
+class StackMetrics:
+    """The instruments updated by the stack.
+
+    Attributes:
+        clock (Callable): Time source for latencies.
+        framesReceived (Counter): CAN frames by ControlFrame type
+            (Data, CID, AMD...) received by CanLink.
+        framesSent (Counter): CAN frames by ControlFrame type sent.
+        messagesReceived (Counter): Messages by MTI name fired to
+            Message listeners by a link layer.
+        messagesSent (Counter): Messages by MTI name sent by a link
+            layer.
+        aliasCollisions (Counter): Alias collisions detected by CanLink.
+        parseErrors (Counter): Malformed input by layer (gridconnect,
+            tcp).
+        datagramsSent (Counter): Datagrams sent by DatagramService
+            (including resends).
+        datagramsReceived (Counter): Datagrams received for a local
+            node.
+        datagramReplies (Counter): Outcomes of sent datagrams by result
+            (ok, rejected, timeout).
+        datagramRetries (Counter): Datagrams resent by DatagramService
+            by reason (timeout, temporary).
+        memoryReadLatency (Histogram): Seconds from sending a memory
+            read request to its reply.
+        memoryTimeouts (Counter): Memory operations whose reply did not
+            arrive in time, by operation (read, write).
+        sendQueueDepth (Gauge): Frames waiting in physical layer send
+            queues.
+        accumulatorBytes (Gauge): Bytes held for incomplete multi-frame
+            messages by CanLink.
+        dispatchQueueDepth (Gauge): Deferred listener calls queued or
+            running (See Dispatcher).
+        dispatchDropped (Counter): Deferred listener calls dropped by
+            listener name.
+    """
+    def __init__(self, registry: MetricsRegistry,
+                 clock: Callable[[], float] = default_timer):
+        self.registry = registry
+        self.clock = clock
+        self.framesReceived = registry.counter(
+            "openlcb_can_frames_received_total",
+            "CAN frames received by frame type.", "type")
+        self.framesSent = registry.counter(
+            "openlcb_can_frames_sent_total",
+            "CAN frames sent by frame type.", "type")
+        self.messagesReceived = registry.counter(
+            "openlcb_messages_received_total",
+            "OpenLCB messages received by MTI.", "mti")
+        self.messagesSent = registry.counter(
+            "openlcb_messages_sent_total",
+            "OpenLCB messages sent by MTI.", "mti")
+        self.aliasCollisions = registry.counter(
+            "openlcb_can_alias_collisions_total",
+            "CAN alias collisions detected.")
+        self.parseErrors = registry.counter(
+            "openlcb_parse_errors_total",
+            "Malformed input from the network by layer.", "layer")
+        self.datagramsSent = registry.counter(
+            "openlcb_datagrams_sent_total",
+            "Datagrams sent (including resends).")
+        self.datagramsReceived = registry.counter(
+            "openlcb_datagrams_received_total",
+            "Datagrams received for a local node.")
+        self.datagramReplies = registry.counter(
+            "openlcb_datagram_replies_total",
+            "Outcomes of sent datagrams.", "result")
+        self.datagramRetries = registry.counter(
+            "openlcb_datagram_retries_total",
+            "Datagrams resent by reason.", "reason")
+        self.memoryReadLatency = registry.histogram(
+            "openlcb_memory_read_latency_seconds",
+            "Time from memory read request to reply.")
+        self.memoryTimeouts = registry.counter(
+            "openlcb_memory_timeouts_total",
+            "Memory operations without a reply in time.", "operation")
+        self.sendQueueDepth = registry.gauge(
+            "openlcb_send_queue_depth",
+            "Frames waiting in physical layer send queues.")
+        self.accumulatorBytes = registry.gauge(
+            "openlcb_can_accumulator_bytes",
+            "Bytes held for incomplete multi-frame messages.")
+        self.dispatchQueueDepth = registry.gauge(
+            "openlcb_dispatch_queue_depth",
+            "Deferred listener calls queued or running.")
+        self.dispatchDropped = registry.counter(
+            "openlcb_dispatch_dropped_total",
+            "Deferred listener calls dropped by listener.", "listener")
+
+
+_registry = None  # type: Union[MetricsRegistry, None]
+
+
+def enableMetrics(registry: MetricsRegistry = None) -> MetricsRegistry:
+    """Turn on metrics for stack objects constructed after this call.
+
+    Args:
+        registry (MetricsRegistry, optional): Registry to use. Defaults
+            to the current one, or a new one if none.
+
+    Returns:
+        MetricsRegistry: The enabled registry.
+    """
+    global _registry
+    if registry is None:
+        registry = _registry if _registry is not None else MetricsRegistry()
+    _registry = registry
+    return registry
+
+
+def disableMetrics():
+    """Stop giving metrics to stack objects constructed after this call
+    (existing ones keep updating theirs).
+    """
+    global _registry
+    _registry = None
+
+
+def getRegistry() -> Union[MetricsRegistry, None]:
+    """Get the enabled registry (None if metrics are off)."""
+    return _registry
+
+
+def stackMetrics() -> Union[StackMetrics, None]:
+    """Get the StackMetrics for a new stack object (None if off)."""
+    if _registry is None:
+        return None
+    return _registry.stackMetrics()
@@ -10,6 +10,7 @@ This file is part of the python-openlcb project
 
 Contributors: Poikilos, Bob Jacobsen (code from example_cdi_access)
 """
+import asyncio
 import sys
 import threading
 from timeit import default_timer
@@ -21,6 +22,7 @@ from openlcb import (
     formatted_ex,
     precise_sleep,
 )
+from openlcb.asyncport import AsyncPort
 from openlcb.canbus.canphysicallayergridconnect import (
     CanPhysicalLayerGridConnect,
 )
@@ -36,6 +38,8 @@ from openlcb.xmldataprocessor import XMLDataProcessor
 from openlcb.mti import MTI
 from openlcb.nodeid import NodeID
 from openlcb.portinterface import PortInterface
+from openlcb.streamservice import StreamService
+from openlcb.waker import Waker
 
 if __name__ == "__main__":
     logger = getLogger(__file__)
@@ -50,11 +54,20 @@ class OpenLCBNetwork:
     for reference and practical use. CanLink manages network states, but
     this class manages the network objects themselves including CanLink.
 
+    Drive it either with startListening (a listen thread), or by
+    awaiting run in an asyncio event loop (See run and ready).
+
     Attributes:
+        maxWait (float): Longest the listen loop waits for data, the
+            next CanLink timer, or a frame queued by another thread
+            (seconds). Queued frames wake the loop right away (See
+            _onQueuedFrame), so this is only a safety net.
         _dataProcessor (XMLDataProcessor): The handler for the current
             type of data (type is defined by _dataProcessor.space which
             is a MemorySpace)
     """
+    maxWait = .05
+
     def __init__(self, localNodeID: Union[str, bytearray, int, NodeID]):
         self._onConnect: Union[Callable[[DataProcessorMemo], None], None] = None
         self._port: PortInterface = None
@@ -76,6 +89,7 @@ class OpenLCBNetwork:
 
         # region connect
         self._datagramService: DatagramService = None
+        self._streamService: StreamService = None
         self._memoryService: MemoryService = None
         # endregion connect
 
@@ -91,9 +105,19 @@ class OpenLCBNetwork:
             self._printDatagram
         )
 
+        self._fireStatus("StreamService...")
+        self._streamService = StreamService(self.canLink)
+        self.canLink.registerMessageReceivedListener(
+            self._streamService.process
+        )
+
         self._fireStatus("MemoryService...")
-        self._memoryService = MemoryService(self._datagramService)
+        self._memoryService = MemoryService(self._datagramService,
+                                            self._streamService)
         self._dataProcessor: XMLDataProcessor = None
+        self._readyEvent: Union[asyncio.Event, None] = None  # See ready
+        self._waker: Union[Waker, None] = None  # See _listen
+        self._listenIdent: Union[int, None] = None
 
     @property
     def memoryService(self):
@@ -224,7 +248,21 @@ class OpenLCBNetwork:
         # print("Datagram receive call back: {}".format(memo.data))
         return False
 
+    def _onQueuedFrame(self, frame):
+        """Wake the listen loop so a frame queued by another thread is
+        sent now instead of after the loop's current wait.
+        """
+        waker = self._waker  # (None after the loop stops)
+        if (waker is not None) and (threading.get_ident()
+                                    != self._listenIdent):
+            waker.wakeup()
+        # else the loop sends before it waits again
+
     def _listen(self):
+        self._listenIdent = threading.get_ident()
+        self._waker = Waker()
+        previousOnQueuedFrame = self.physicalLayer.onQueuedFrame
+        self.physicalLayer.onQueuedFrame = self._onQueuedFrame
         self._fireStatus("physicalLayerUp...")
         self.physicalLayer.physicalLayerUp()
         self._connectingStart = default_timer()
@@ -259,7 +297,6 @@ class OpenLCBNetwork:
                     #   was added via registerFrameReceivedListener
                     #   during connect. But now you can use verbose=True
                     #   for receiveAll instead if desired debugging.
-                    precise_sleep(.01)  # let processor sleep before read
                     if default_timer() - self._connectingStart > .21:
                         if self.canLink._state != CanLink.State.Permitted:
                             delta = 0
@@ -282,35 +319,48 @@ class OpenLCBNetwork:
                     # delay = random.uniform(.005,.02)
                     # ^ random delay may help if send is on another thread
                     #   (but avoid that for stability and speed)
-                    precise_sleep(.01)
+                    self._waitForDataOrDeadline()
             # raise RuntimeError("We should never get here")
         except RuntimeError as ex:
             caught_ex = ex
-            # If _port is a TcpSocket:
-            #   May be raised by tcplink.tcpsocket.TCPSocket.receive
-            #   manually.
-            #   - Usually "socket connection broken" due to no more
-            #     bytes to read, but ok if "\0" terminator was reached.
-            if self._dataProcessor is not None:
-                if ((self._dataProcessor._data is not None)
-                        and (not self._dataProcessor._stringTerminated)):
-                    # This boolean is managed by the memoryReadSuccess
-                    # callback.
-                    cm = DataProcessorMemo()
-                    cm.error = formatted_ex(ex)
-                    cm.done = True  # stop progress in gui/other main thread
-                    if self._dataProcessor.onStatusMemo:
-                        self._dataProcessor.onStatusMemo(cm)
-                    raise  # re-raise since incomplete (prevent done OK state)
-            else:
-                logger.warning(
-                    "Listen loop ended, but _dataProcessor not set"
-                    " (DataProcessorMemo will not be used to notify caller).")
+            self._notifyIfIncomplete(ex)
             raise
         finally:
             self.physicalLayer.physicalLayerDown()  # Link_Layer_Down, setState
+            self.physicalLayer.onQueuedFrame = previousOnQueuedFrame
+            self._waker.close()
+            self._waker = None
+            self._listenIdent = None
         self._listenThread: Union[threading.Thread, None] = None
+        return self._listenStopped(caught_ex)
+
+    def _notifyIfIncomplete(self, ex: Exception):
+        """Notify the data processor (if any) that the port closed
+        (RuntimeError ex) before its download completed.
+        """
+        # If _port is a TcpSocket:
+        #   May be raised by tcplink.tcpsocket.TCPSocket.receive
+        #   manually.
+        #   - Usually "socket connection broken" due to no more
+        #     bytes to read, but ok if "\0" terminator was reached.
+        if self._dataProcessor is not None:
+            if ((self._dataProcessor._data is not None)
+                    and (not self._dataProcessor._stringTerminated)):
+                # This boolean is managed by the memoryReadSuccess
+                # callback.
+                cm = DataProcessorMemo()
+                cm.error = formatted_ex(ex)
+                cm.done = True  # stop progress in gui/other main thread
+                if self._dataProcessor.onStatusMemo:
+                    self._dataProcessor.onStatusMemo(cm)
+        else:
+            logger.warning(
+                "Listen loop ended, but _dataProcessor not set"
+                " (DataProcessorMemo will not be used to notify caller).")
 
+    def _listenStopped(self, caught_ex: Union[Exception, None]
+                       ) -> DataProcessorMemo:
+        """Notify the connect handler that the listen loop stopped."""
         # If we got here, the RuntimeError was ok since the
         #   null terminator '\0' was reached (otherwise re-raise occurs above)
         cm = DataProcessorMemo()
@@ -322,6 +372,114 @@ class OpenLCBNetwork:
             logger.error(cm.error)
         return cm  # return it in case running synchronously (no thread)
 
+    def _waitForDataOrDeadline(self):
+        """Block until data arrives, another thread queues a frame, the
+        next CanLink timer is due, the shaper allows the next queued
+        frame, or maxWait passes, whichever is first (instead of a fixed
+        sleep).
+        """
+        timeout = self._timeUntilWork()
+        if timeout == 0:
+            return  # sending is still pending (such as sent by a timer)
+        if (timeout is None) or (timeout > self.maxWait):
+            timeout = self.maxWait
+        self._port.waitReadable(timeout, self._waker)
+        if self._waker is not None:
+            self._waker.clear()
+        self.canLink.scheduler.runDue()
+
+    def _timeUntilWork(self) -> Union[float, None]:
+        """Get seconds until the shaper allows the next queued frame or
+        the next CanLink timer is due, whichever is first (None if
+        neither, 0 if now).
+        """
+        timeout = self.physicalLayer.sendDelay()
+        if timeout == 0:
+            return 0.0
+        deadline = self.canLink.scheduler.timeUntilNext()
+        if (timeout is None) or ((deadline is not None)
+                                 and (deadline < timeout)):
+            timeout = deadline
+        return timeout
+
+    async def run(self, port: Union[PortInterface, None] = None
+                  ) -> DataProcessorMemo:
+        """Run the stack in the running asyncio event loop until the
+        port closes (instead of listen, which polls on a thread).
+
+        Data is received as soon as the port is readable, frames queued
+        by sendFrameAfter (from any thread) are sent right away, and
+        otherwise the loop only wakes for the next CanLink timer or
+        shaper deadline. Listeners are called on the event loop's
+        thread.
+
+        Args:
+            port (PortInterface, optional): A connected port in
+                non-blocking mode (such as TcpSocket, or SerialLink
+                after startReader), or an AsyncPort. Defaults to the
+                port passed to startListening.
+
+        Returns:
+            DataProcessorMemo: Status of the stopped loop (See
+                _listenStopped).
+
+        Raises:
+            RuntimeError: The port closed (such as "socket connection
+                broken") or no port was given.
+        """
+        if port is not None:
+            self._port = port
+        if self._port is None:
+            raise RuntimeError("No port connection. Pass a connected port.")
+        asyncPort = self._port
+        if not isinstance(asyncPort, AsyncPort):
+            asyncPort = AsyncPort(asyncPort)
+        asyncPort.attach()
+        physicalLayer = self.physicalLayer
+        previousOnQueuedFrame = physicalLayer.onQueuedFrame
+        physicalLayer.onQueuedFrame = lambda frame: asyncPort.wakeup()
+        self._fireStatus("physicalLayerUp...")
+        physicalLayer.physicalLayerUp()
+        self._connectingStart = default_timer()
+        self._messageStart = None
+        caught_ex = None
+        try:
+            while True:
+                physicalLayer.receiveAll(asyncPort)
+                physicalLayer.sendAll(asyncPort)
+                timeout = self._timeUntilWork()
+                if timeout == 0:
+                    await asyncio.sleep(0)  # let other tasks run
+                else:
+                    await asyncPort.waitReadableAsync(timeout)
+                self.canLink.scheduler.runDue()
+        except RuntimeError as ex:
+            caught_ex = ex
+            self._notifyIfIncomplete(ex)
+            raise
+        finally:
+            physicalLayer.onQueuedFrame = previousOnQueuedFrame
+            asyncPort.detach()
+            physicalLayer.physicalLayerDown()  # Link_Layer_Down, setState
+        return self._listenStopped(caught_ex)
+
+    async def ready(self, timeout: Union[float, None] = None):
+        """Wait until CanLink has reserved an alias (Permitted state,
+        when Link_Layer_Up is sent), while run is running.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. Defaults
+                to waiting indefinitely.
+
+        Raises:
+            asyncio.TimeoutError: The link was not ready in time.
+        """
+        if self.canLink.getState() == CanLink.State.Permitted:
+            return
+        if self._readyEvent is None:
+            self._readyEvent = asyncio.Event()
+        await asyncio.wait_for(self._readyEvent.wait(), timeout)
+
     def _handleMessage(self, message: Message):
         """Handle a Message from the LCC network.
         The Message Type Indicator (MTI) is checked in case the
@@ -342,6 +500,11 @@ class OpenLCBNetwork:
         logger.debug("[_handleMessage] RM: {} from {}"
                      .format(message, message.source))
         logger.debug("[_handleMessage]   message.mti={}".format(message.mti))
+        if self._readyEvent is not None:  # See ready
+            if message.mti == MTI.Link_Layer_Up:
+                self._readyEvent.set()
+            elif message.mti == MTI.Link_Layer_Down:
+                self._readyEvent.clear()
         if message.mti == MTI.Link_Layer_Down:
             if self._onConnect:
                 cm = DataProcessorMemo()
@@ -410,7 +573,7 @@ class OpenLCBNetwork:
             # done reading
 
     def _memoryReadFail(self, memo: MemoryReadMemo):
-        error = "memory read failed: {}".format(memo.data)
+        error = "memory read failed @{}: {}".format(memo.address, memo.error)
         if self._dataProcessor._onElement:
             if len(self._dataProcessor._tag_stack):
                 cm = self._dataProcessor._tag_stack[-1]
@@ -21,10 +21,10 @@ and predictable use in applications.
 -Poikilos
 '''
 
-from collections import deque
 from logging import getLogger
 from typing import Any, Union
 
+from openlcb.framequeue import FrameQueue
 from openlcb.portinterface import PortInterface
 
 logger = getLogger(__name__)
@@ -57,9 +57,15 @@ class PhysicalLayer:
 
     def __init__(self):
         self._sentFramesCount = 0
-        self._send_frames = deque()
+        self._send_frames = FrameQueue()
+        # ^ one level (FIFO) unless a subclass sets priority levels
+        #   (See CanPhysicalLayer.framePriority)
         # self._send_chunks = deque()
         self.onQueuedFrame = None
+        self.shaper = None
+        # ^ Optional rate limiter with tryConsume(frame) and delay(frame)
+        #   (such as canbus.shaper.TokenBucketShaper) that sendAll
+        #   consults before sending each frame.
         self.linkLayer = None  # type: LinkLayer|None
         # ^ LinkLayer would be circular import,
         #   so can't have non-comment hint...Move it (or LinkLayer's
@@ -78,6 +84,42 @@ class PhysicalLayer:
         """Check if there is a frame queued to send."""
         return bool(self._send_frames)
 
+    def queueDepth(self) -> int:
+        """Get the number of frames queued to send."""
+        return len(self._send_frames)
+
+    def sendDelay(self) -> Union[float, None]:
+        """Get how long until sendAll can send the next queued frame.
+
+        Returns:
+            Union[float, None]: Seconds (0 if now, more if the shaper
+                is limiting the rate), or None if no frame is queued.
+        """
+        try:
+            frame = self._send_frames[0]
+        except IndexError:
+            return None
+        if self.shaper is None:
+            return 0.0
+        return self.shaper.delay(frame)
+
+    def _popSendable(self):
+        """Pop the next frame to send if the shaper (if any) allows
+        sending it now (Used by sendAll implementations).
+
+        Returns:
+            Any: The frame, or None if the queue is empty or the
+                shaper requires waiting (See sendDelay).
+        """
+        try:
+            frame = self._send_frames.popleft()
+        except IndexError:
+            return None
+        if (self.shaper is not None) and not self.shaper.tryConsume(frame):
+            self._send_frames.appendleft(frame)
+            return None
+        return frame
+
     def fireFrameReceived(self, frame: Any):
         raise NotImplementedError("Implement this in the subclass")
 
@@ -117,7 +159,8 @@ class PhysicalLayer:
         returning the return of this superclass method.
 
         Returns:
-            Any: next frame in FIFO buffer (_send_frames). In a
+            Any: next frame in _send_frames (the oldest frame of the
+                most urgent priority level, See FrameQueue). In a
                 CanPhysicalLayer or subclass of that, type is CanFrame.
                 In a raw implementation it is either bytes or bytearray.
         """
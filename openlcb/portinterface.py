@@ -10,9 +10,15 @@ and threads must be used in a typical implementation
   and handleData will run, in a non-blocking manner, before each send
   call in defineAndReserveAlias.
 """
+import io
+import select
+
 from logging import getLogger
 from typing import Any, Union
 
+from openlcb import precise_sleep
+from openlcb.waker import Waker
+
 logger = getLogger(__name__)
 
 
@@ -29,6 +35,10 @@ class PortInterface:
       (in OS-level implementation of serial port or socket).
     """
 
+    pollInterval = .01
+    # ^ seconds waitReadable sleeps for timeout None if the device can't
+    #   be waited on (See _waitReadable)
+
     def __init__(self):
         """This must run for each subclass, such as using super"""
         self._busy_message = None
@@ -36,6 +46,7 @@ class PortInterface:
         self._onReadyToSend = None
         self._onReadyToReceive = None
         self._device = None
+        self._receiveRemainder = None  # See _receiveInto
 
     def busy(self) -> bool:
         return self._busy_message is not None
@@ -149,6 +160,122 @@ class PortInterface:
                 self._onReadyToSend()
         return result
 
+    def _receiveInto(self, buffer: memoryview) -> Union[int, None]:
+        """Receive into a writable buffer instead of allocating bytes.
+        Override this in each subclass that can (such as using
+        socket.recv_into). This default implementation copies the
+        result of _receive (and keeps any bytes that do not fit for the
+        next call).
+
+        Args:
+            buffer (memoryview): Writable bytes-like object (typically
+                a memoryview slice of a preallocated bytearray).
+
+        Returns:
+            Union[int, None]: The number of bytes written at the start
+                of buffer, or None if no data (same cases as _receive).
+        """
+        data = self._receiveRemainder
+        self._receiveRemainder = None
+        if data is None:
+            data = self._receive()
+            if data is None:
+                return None
+        count = min(len(data), len(buffer))
+        buffer[:count] = data[:count]
+        if count < len(data):
+            self._receiveRemainder = data[count:]
+        return count
+
+    def receiveInto(self, buffer: memoryview) -> Union[int, None]:
+        """Receive data directly into buffer (thread-safe like receive).
+
+        Args:
+            buffer (memoryview): Writable bytes-like object. It must
+                not be resized during the call.
+
+        Returns:
+            Union[int, None]: The number of bytes written at the start
+                of buffer, or None if no data (non-blocking mode).
+        """
+        self._setBusy("receive")
+        result = None
+        try:
+            result = self._receiveInto(buffer)
+        finally:
+            self._unsetBusy("receive")
+            if self._onReadyToSend:
+                self._onReadyToSend()
+        return result
+
+    def _waitReadable(self, timeout: Union[float, None],
+                      waker: Union[Waker, None] = None) -> bool:
+        """Wait until data can be received, waker is woken, or timeout.
+        This default implementation uses select on the device (and
+        waker) if it has a fileno (sockets, and serial ports on POSIX).
+        Otherwise it waits on waker or sleeps for timeout (or
+        pollInterval if timeout is None) and returns True so the caller
+        tries to receive.
+        """
+        device = self._device
+        if device is not None and hasattr(device, "fileno"):
+            waitables = [device] if waker is None else [device, waker]
+            try:
+                readable, _, _ = select.select(waitables, [], [], timeout)
+                return bool(readable)
+            except (OSError, ValueError, io.UnsupportedOperation):
+                pass  # no usable file descriptor (fall back to sleep)
+        if timeout is None:
+            timeout = self.pollInterval
+        if waker is not None:
+            waker.wait(timeout)
+        elif timeout > 0:
+            precise_sleep(timeout)
+        return True
+
+    def waitReadable(self, timeout: Union[float, None] = None,
+                     waker: Union[Waker, None] = None) -> bool:
+        """Block until data can be received or timeout seconds pass
+        (such as the scheduler's timeUntilNext), instead of sleeping a
+        fixed interval between non-blocking receive attempts. Call this
+        from the thread that calls receive (it does not receive).
+
+        Args:
+            timeout (Union[float, None]): Maximum seconds to wait (0 to
+                only check). None waits until data arrives if the
+                device supports it (See _waitReadable).
+            waker (Waker, optional): Also return as soon as another
+                thread calls waker.wakeup (such as after queuing a
+                frame to send). The caller must call waker.clear.
+
+        Returns:
+            bool: True if data may be available (or woken), False on
+                timeout.
+        """
+        return self._waitReadable(timeout, waker)
+
+    def _fileno(self) -> Union[int, None]:
+        """Get the file descriptor of the device, or None if it has
+        none or can't be waited on (See fileno).
+        """
+        device = self._device
+        if device is None or not hasattr(device, "fileno"):
+            return None
+        try:
+            return device.fileno()
+        except (OSError, ValueError, io.UnsupportedOperation):
+            return None
+
+    def fileno(self) -> Union[int, None]:
+        """Get the file descriptor that becomes readable when data can
+        be received (for event loops such as asyncio's add_reader).
+
+        Returns:
+            Union[int, None]: The descriptor, or None if readiness can
+                only be checked using waitReadable.
+        """
+        return self._fileno()
+
     def _close(self) -> None:
         """Abstract method. Return: implementation-specific or None"""
         raise NotImplementedError(
@@ -0,0 +1,253 @@
+'''
+Single-threaded I/O loop for many ports (such as a gateway serving
+several CAN segments).
+
+Each port keeps its own physical layer and link layer stack, but one
+Reactor drives them all from one thread using the selectors module,
+waking only when a port is readable, a port with sendable frames is
+writable, a scheduler timer is due (such as CanLink's alias
+reservation delay, when CanLinks share Reactor.scheduler), or another
+thread queued a frame (See wakeup), instead of one polling thread per
+port (as in OpenLCBNetwork.listen).
+
+Usage:
+
+    reactor = Reactor()
+    for host, port in segments:
+        tcpSocket = TcpSocket()
+        tcpSocket.connect(host, port)
+        physicalLayer = CanPhysicalLayerGridConnect()
+        canLink = CanLink(physicalLayer, nodeID,
+                          scheduler=reactor.scheduler)
+        reactor.addPort(tcpSocket, physicalLayer)
+    reactor.run()
+'''
+import selectors
+import threading
+
+from logging import getLogger
+from typing import Union
+
+from openlcb import formatted_ex
+from openlcb.physicallayer import PhysicalLayer
+from openlcb.portinterface import PortInterface
+from openlcb.scheduler import Scheduler
+from openlcb.waker import Waker
+
+logger = getLogger(__name__)
+
+
+class ReactorEntry:
+    """A port and the physical layer that reads and writes it.
+
+    Attributes:
+        fd (int): File descriptor registered with the selector, or None
+            if the port has none (then it is polled, See
+            Reactor.pollInterval).
+        events (int): selectors events currently registered.
+    """
+    def __init__(self, port: PortInterface, physicalLayer: PhysicalLayer):
+        self.port = port
+        self.physicalLayer = physicalLayer
+        self.fd = port.fileno()
+        self.events = 0
+
+
+class Reactor:
+    """Drive many ports from one thread (See module docstring).
+
+    Args:
+        scheduler (Scheduler, optional): Timers run by the loop. Pass
+            it to each CanLink (scheduler=reactor.scheduler) so alias
+            reservation timers of all ports share one heap. Defaults to
+            a new Scheduler.
+
+    Attributes:
+        pollInterval (float): Longest wait (seconds) while any port has
+            no file descriptor (such as SerialLink with its reader
+            thread), since it can't wake the selector.
+        onPortClosed (Callable): Called with (port, error) after a port
+            raised RuntimeError (such as "socket connection broken") and
+            was removed.
+    """
+    pollInterval = .01
+
+    def __init__(self, scheduler: Union[Scheduler, None] = None):
+        if scheduler is None:
+            scheduler = Scheduler()
+        self.scheduler = scheduler
+        self.onPortClosed = None  # (See class docstring)
+        self._selector = selectors.DefaultSelector()
+        self._entries = {}  # type: dict[PortInterface, ReactorEntry]
+        self._polled = []  # type: list[ReactorEntry]
+        self._schedulers = [scheduler]
+        self._waker = Waker()
+        self._selector.register(self._waker, selectors.EVENT_READ)
+        self._running = False
+        self._loopThread = None  # ident of the thread in run/runOnce
+
+    def __len__(self) -> int:
+        """Number of ports."""
+        return len(self._entries)
+
+    def addPort(self, port: PortInterface, physicalLayer: PhysicalLayer,
+                start: bool = True):
+        """Drive port using physicalLayer (receiveAll and sendAll).
+
+        Args:
+            port (PortInterface): A connected port in non-blocking mode.
+            physicalLayer (PhysicalLayer): The port's physical layer,
+                with its link layer already constructed.
+            start (bool, optional): Call physicalLayer.physicalLayerUp
+                (which starts CanLink's alias reservation). Defaults to
+                True.
+        """
+        if port in self._entries:
+            raise ValueError("The port was already added.")
+        entry = ReactorEntry(port, physicalLayer)
+        self._entries[port] = entry
+        if entry.fd is None:
+            self._polled.append(entry)
+        else:
+            entry.events = selectors.EVENT_READ
+            self._selector.register(entry.fd, entry.events, entry)
+        scheduler = getattr(physicalLayer.linkLayer, "scheduler", None)
+        if (scheduler is not None) and not any(
+                scheduler is known for known in self._schedulers):
+            self._schedulers.append(scheduler)
+        physicalLayer.onQueuedFrame = self._onQueuedFrame
+        if start:
+            physicalLayer.physicalLayerUp()
+        self.wakeup()
+
+    def removePort(self, port: PortInterface, stop: bool = True):
+        """Stop driving port (it is not closed).
+
+        Args:
+            stop (bool, optional): Call physicalLayerDown. Defaults to
+                True.
+        """
+        entry = self._entries.pop(port)
+        if entry.fd is None:
+            self._polled.remove(entry)
+        else:
+            self._selector.unregister(entry.fd)
+        if entry.physicalLayer.onQueuedFrame == self._onQueuedFrame:
+            entry.physicalLayer.onQueuedFrame = None
+        if stop:
+            entry.physicalLayer.physicalLayerDown()
+
+    def _onQueuedFrame(self, frame):
+        if threading.get_ident() != self._loopThread:
+            self.wakeup()
+        # else the loop checks send queues before it waits again
+
+    def wakeup(self):
+        """End the current (or next) wait of the loop early. Safe to
+        call from any thread.
+        """
+        self._waker.wakeup()
+
+    def _timeout(self) -> Union[float, None]:
+        """Seconds until the next timer or shaper deadline (None if
+        none).
+        """
+        timeout = None
+        for scheduler in self._schedulers:
+            delay = scheduler.timeUntilNext()
+            if (delay is not None) and ((timeout is None)
+                                        or (delay < timeout)):
+                timeout = delay
+        for entry in self._entries.values():
+            delay = entry.physicalLayer.sendDelay()
+            if delay and ((timeout is None) or (delay < timeout)):
+                timeout = delay  # (0 is handled using EVENT_WRITE)
+        if self._polled and ((timeout is None)
+                             or (timeout > self.pollInterval)):
+            timeout = self.pollInterval
+        return timeout
+
+    def _updateEvents(self):
+        """Register EVENT_WRITE only for ports with sendable frames."""
+        for entry in self._entries.values():
+            if entry.fd is None:
+                continue
+            events = selectors.EVENT_READ
+            if entry.physicalLayer.sendDelay() == 0:
+                events |= selectors.EVENT_WRITE
+            if events != entry.events:
+                entry.events = events
+                self._selector.modify(entry.fd, events, entry)
+
+    def _handle(self, entry: ReactorEntry, readable: bool, writable: bool):
+        try:
+            if readable:
+                entry.physicalLayer.receiveAll(entry.port)
+            if writable:
+                entry.physicalLayer.sendAll(entry.port)
+        except RuntimeError as ex:
+            logger.warning("Removing {}: {}".format(
+                type(entry.port).__name__, formatted_ex(ex)))
+            self.removePort(entry.port)
+            if self.onPortClosed:
+                self.onPortClosed(entry.port, ex)
+
+    def runOnce(self, timeout: Union[float, None] = None) -> int:
+        """Wait for I/O, timers or wakeup, then handle them.
+
+        Args:
+            timeout (float, optional): Longest wait in seconds (may be
+                shortened by timers). Defaults to no limit.
+
+        Returns:
+            int: Number of ports handled.
+        """
+        self._loopThread = threading.get_ident()
+        self._updateEvents()
+        wait = self._timeout()
+        if (timeout is not None) and ((wait is None) or (timeout < wait)):
+            wait = timeout
+        handled = 0
+        for key, mask in self._selector.select(wait):
+            entry = key.data
+            if entry is None:
+                self._waker.clear()
+                continue
+            if entry.port not in self._entries:
+                continue  # removed while handling another port
+            self._handle(entry, bool(mask & selectors.EVENT_READ),
+                         bool(mask & selectors.EVENT_WRITE))
+            handled += 1
+        for entry in list(self._polled):
+            readable = entry.port.waitReadable(0)
+            writable = entry.physicalLayer.sendDelay() == 0
+            if readable or writable:
+                self._handle(entry, readable, writable)
+                handled += 1
+        for scheduler in self._schedulers:
+            scheduler.runDue()
+        return handled
+
+    def run(self):
+        """Run until stop is called or no ports are left."""
+        self._running = True
+        try:
+            while self._running and self._entries:
+                self.runOnce()
+        finally:
+            self._running = False
+            self._loopThread = None
+
+    def stop(self):
+        """Make run return (Safe to call from any thread)."""
+        self._running = False
+        self.wakeup()
+
+    def close(self):
+        """Remove all ports (without closing them) and release the
+        selector.
+        """
+        for port in list(self._entries):
+            self.removePort(port)
+        self._selector.close()
+        self._waker.close()
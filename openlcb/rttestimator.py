@@ -0,0 +1,66 @@
+'''
+Round-trip time estimation for request timeouts, as TCP does it
+(RFC 6298): a smoothed RTT (SRTT) and its mean deviation (RTTVAR) give
+a retransmission timeout of SRTT + 4 * RTTVAR, so a slow node gets a
+long timeout and a fast node a short one.
+
+Only time replies to requests that were sent once (Karn's algorithm: a
+reply to a resent request may answer either attempt), and call backoff
+after a timeout, so that a node that slowed down gets longer timeouts
+until a new sample arrives.
+'''
+
+
+class RttEstimator:
+    """Timeout estimate for one remote node.
+
+    Args:
+        initialTimeout (float, optional): Seconds before the first
+            sample. Defaults to 3.0.
+        minTimeout (float, optional): Lower limit (replies can be
+            delayed by bus traffic even from a fast node). Defaults to
+            .5.
+        maxTimeout (float, optional): Upper limit (also for backoff).
+            Defaults to 30.0.
+
+    Attributes:
+        srtt (float): Smoothed round-trip time in seconds, or None
+            before the first sample.
+        rttvar (float): Mean deviation of round-trip time in seconds,
+            or None before the first sample.
+        timeout (float): Seconds to wait for the next reply.
+        samples (int): Round-trip times observed.
+    """
+    Alpha = 1 / 8  # gain of srtt
+    Beta = 1 / 4  # gain of rttvar
+    K = 4  # deviations of margin
+
+    def __init__(self, initialTimeout: float = 3.0, minTimeout: float = .5,
+                 maxTimeout: float = 30.0):
+        self.minTimeout = minTimeout
+        self.maxTimeout = maxTimeout
+        self.srtt = None  # type: float|None
+        self.rttvar = None  # type: float|None
+        self.timeout = self._clamp(initialTimeout)
+        self.samples = 0
+
+    def _clamp(self, timeout: float) -> float:
+        return min(self.maxTimeout, max(self.minTimeout, timeout))
+
+    def observe(self, rtt: float):
+        """Update the estimate with a measured round-trip time (seconds)
+        of a request that was sent once.
+        """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = ((1 - self.Beta) * self.rttvar
+                           + self.Beta * abs(self.srtt - rtt))
+            self.srtt = (1 - self.Alpha) * self.srtt + self.Alpha * rtt
+        self.samples += 1
+        self.timeout = self._clamp(self.srtt + self.K * self.rttvar)
+
+    def backoff(self):
+        """Double the timeout (up to maxTimeout) after a timeout."""
+        self.timeout = self._clamp(self.timeout * 2)
@@ -0,0 +1,126 @@
+'''
+Timers for protocol delays and timeouts.
+
+The stack does not run its own thread. Instead, a layer that must act
+after a delay (such as CanLink after the 200 ms alias collision window)
+schedules a callback here, and the application's I/O loop (or
+OpenLCBNetwork's) calls runDue and then waits for data on the port only
+until timeUntilNext, instead of waking on a fixed sleep interval to poll.
+'''
+import heapq
+import threading
+
+from itertools import count
+from logging import getLogger
+from timeit import default_timer
+from typing import Callable, Union
+
+logger = getLogger(__name__)
+
+
+class Timer:
+    """A callback scheduled by Scheduler (cancel it with cancel).
+
+    Attributes:
+        deadline (float): Time (in seconds from the scheduler's clock)
+            when callback runs.
+        canceled (bool): True if canceled (callback will not run).
+    """
+    __slots__ = ("deadline", "callback", "canceled")
+
+    def __init__(self, deadline: float, callback: Callable[[], None]):
+        self.deadline = deadline
+        self.callback = callback
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+
+class Scheduler:
+    """Heap of Timers ordered by deadline.
+
+    Scheduling and canceling may be done from any thread, but callbacks
+    run on the thread that calls runDue (typically the I/O loop, the
+    same thread that handles received frames).
+
+    Args:
+        clock (Callable, optional): Returns the current time in seconds.
+            Defaults to timeit.default_timer.
+    """
+    def __init__(self, clock: Callable[[], float] = default_timer):
+        self.clock = clock
+        self._heap = []  # (deadline, sequence, Timer)
+        self._sequence = count()  # FIFO among equal deadlines
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of scheduled timers (including canceled ones not
+        removed yet).
+        """
+        return len(self._heap)
+
+    def callAt(self, deadline: float, callback: Callable[[], None]) -> Timer:
+        """Run callback when the clock reaches deadline."""
+        timer = Timer(deadline, callback)
+        with self._lock:
+            heapq.heappush(self._heap,
+                           (deadline, next(self._sequence), timer))
+        return timer
+
+    def callLater(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """Run callback after delay seconds."""
+        return self.callAt(self.clock() + delay, callback)
+
+    def nextDeadline(self) -> Union[float, None]:
+        """Get the deadline of the next timer (None if none)."""
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][2].canceled:
+                heapq.heappop(heap)
+            if not heap:
+                return None
+            return heap[0][0]
+
+    def timeUntilNext(self, now: Union[float, None] = None
+                      ) -> Union[float, None]:
+        """Get seconds until the next timer is due (0 if overdue, None
+        if no timers), such as for the timeout of a wait for data.
+        """
+        deadline = self.nextDeadline()
+        if deadline is None:
+            return None
+        if now is None:
+            now = self.clock()
+        return max(0.0, deadline - now)
+
+    def runDue(self, now: Union[float, None] = None) -> int:
+        """Run callbacks whose deadline has passed, in deadline order.
+        Timers scheduled by a callback run in the same call if they are
+        already due.
+
+        Returns:
+            int: The number of callbacks run.
+        """
+        if now is None:
+            now = self.clock()
+        ran = 0
+        heap = self._heap
+        while True:
+            with self._lock:
+                if not heap or heap[0][0] > now:
+                    break
+                timer = heapq.heappop(heap)[2]
+            if timer.canceled:
+                continue
+            timer.canceled = True  # done (cancel is a no-op from here)
+            timer.callback()
+            ran += 1
+        return ran
+
+    def clear(self):
+        """Cancel all timers."""
+        with self._lock:
+            for entry in self._heap:
+                entry[2].canceled = True
+            self._heap.clear()
@@ -0,0 +1,397 @@
+'''
+Provide a service interface for sending and receiving Streams (OpenLCB
+Stream Transport), for bulk data such as memory configuration stream
+reads and writes.
+
+The sender proposes a buffer size in Stream_Initiate_Request and the
+receiver accepts that size or less in Stream_Initiate_Reply. The
+sender then sends up to one buffer of data (Stream_Data_Send) and waits
+for Stream_Data_Proceed, which the receiver sends as each buffer is
+consumed, so the buffer size is the flow control window.
+Stream_Data_Complete ends the stream.
+
+Writes to remote node:
+- Create a ``StreamWriteMemo`` and submit via ``sendStream(_:)``
+- Get an OK callback once all data is sent, or a rejected callback
+
+Reads from remote node:
+- Create a ``StreamReadMemo`` and register it via ``expectStream(_:)``
+  (which assigns its dstStreamID) before asking the remote node to open
+  the stream, such as in a memory configuration Read Stream command
+- Get a data callback with all of the data, or a rejected callback
+
+Implements `Processor`: register ``process`` as a Message listener of
+the link layer (as for DatagramService).
+
+With a scheduler (such as CanLink's), a stream that makes no progress
+for idleTimeout seconds fails (rejectedReply, with timedOut set).
+'''
+import struct
+
+from logging import getLogger
+from typing import (
+    Union,  # in case `|` doesn't support 'type' in this Python version
+)
+
+from openlcb.linklayer import LinkLayer
+from openlcb.message import Message
+from openlcb.mti import MTI
+from openlcb.nodeid import NodeID
+
+logger = getLogger(__name__)
+
+
+def defaultIgnoreReply(memo):
+    pass
+
+
+class StreamWriteMemo:
+    '''Memo carrying data to send in a stream, and two reply callbacks
+    (Source is automatically this node).
+
+    Args:
+        destID (NodeID): Receiving node.
+        data (bytearray): Content of the stream.
+        okReply (Callable[[StreamWriteMemo], None]): Called once all
+            data and Stream_Data_Complete are sent.
+        rejectedReply (Callable[[StreamWriteMemo], None]): Called if the
+            receiver refuses the stream (errorCode is set) or it stalls
+            (timedOut is set).
+        dstStreamID (int, optional): The receiver's stream ID if it is
+            known already (such as from a Read Stream command),
+            otherwise the receiver assigns one.
+
+    Attributes:
+        srcStreamID (int): Assigned by openStream or sendStream.
+        bufferSize (int): Window accepted by the receiver.
+        sent (int): Bytes sent so far.
+    '''
+    def __init__(self, destID: NodeID, data: bytearray,
+                 okReply=defaultIgnoreReply,
+                 rejectedReply=defaultIgnoreReply,
+                 dstStreamID: Union[int, None] = None):
+        assert isinstance(destID, NodeID)
+        self.destID = destID
+        self.data = data
+        self.okReply = okReply
+        self.rejectedReply = rejectedReply
+        self.srcStreamID = None  # type: int|None
+        self.dstStreamID = dstStreamID  # type: int|None
+        self.bufferSize = None  # type: int|None
+        self.sent = 0
+        self.errorCode = None  # type: int|None  # set if rejected
+        self.error = None  # type: str|None  # set if failed
+        self.timedOut = False  # True if failed for lack of progress
+        self._timer = None  # idle timeout (See StreamService)
+
+
+class StreamReadMemo:
+    '''Memo for a stream expected from another node, and two reply
+    callbacks (Destination is automatically this node).
+
+    Args:
+        sourceID (NodeID): Sending node.
+        dataReply (Callable[[StreamReadMemo], None]): Called with this
+            memo (data set) once the stream is complete.
+        rejectedReply (Callable[[StreamReadMemo], None]): Called if the
+            stream stalls (timedOut is set) or is incomplete.
+        srcStreamID (int, optional): The sender's stream ID if known
+            (such as from a Write Stream command), so the stream is
+            matched even if the sender does not know dstStreamID.
+
+    Attributes:
+        dstStreamID (int): Assigned by expectStream.
+        bufferSize (int): Window accepted for the sender.
+        data (bytearray): Data received so far.
+    '''
+    def __init__(self, sourceID: NodeID,
+                 dataReply=defaultIgnoreReply,
+                 rejectedReply=defaultIgnoreReply,
+                 srcStreamID: Union[int, None] = None):
+        assert isinstance(sourceID, NodeID)
+        self.sourceID = sourceID
+        self.dataReply = dataReply
+        self.rejectedReply = rejectedReply
+        self.srcStreamID = srcStreamID  # type: int|None
+        self.dstStreamID = None  # type: int|None
+        self.bufferSize = None  # type: int|None
+        self.data = bytearray()
+        self.errorCode = None  # type: int|None
+        self.error = None  # type: str|None  # set if failed
+        self.timedOut = False  # True if failed for lack of progress
+        self._started = False  # initiated by the sender
+        self._unacknowledged = 0  # bytes received since the last proceed
+        self._timer = None  # idle timeout (See StreamService)
+
+
+class StreamService:
+    '''Send and receive streams for one local node.
+
+    Args:
+        linkLayer (LinkLayer): Sends the stream messages.
+        localNodeID (NodeID, optional): The node this service sends
+            from and accepts streams for. Defaults to
+            linkLayer.localNodeID.
+
+    Attributes:
+        bufferSize (int): Largest window (bytes) proposed when sending
+            or accepted when receiving.
+        idleTimeout (float): Seconds a stream may go without progress
+            before it fails (requires scheduler).
+        scheduler (Scheduler): Runs idle timeouts. Defaults to
+            linkLayer.scheduler if the link layer has one (such as
+            CanLink), otherwise None (then streams never time out).
+    '''
+
+    Accept = 0x8000
+    # ^ Stream_Initiate_Reply flags if accepted (otherwise an error code)
+    RejectedError = 0x1000  # permanent error: stream not expected
+    UnknownStreamID = 0xFF
+
+    def __init__(self, linkLayer: LinkLayer,
+                 localNodeID: Union[NodeID, None] = None):
+        self.linkLayer = linkLayer
+        if localNodeID is None:
+            localNodeID = linkLayer.localNodeID
+        self.localNodeID = localNodeID  # type: NodeID
+        self.bufferSize = 4096
+        self.idleTimeout = 5.0
+        self._outgoing = {}  # type: dict[tuple[NodeID, int], StreamWriteMemo]  # noqa: E501
+        # ^ by (destID, srcStreamID)
+        self._incoming = {}  # type: dict[tuple[NodeID, int], StreamReadMemo]  # noqa: E501
+        # ^ by (sourceID, dstStreamID)
+        self._nextStreamID = 0
+        self.scheduler = getattr(linkLayer, "scheduler", None)
+
+    def _allocateStreamID(self) -> int:
+        used = set(key[1] for key in self._outgoing)
+        used.update(key[1] for key in self._incoming)
+        for _ in range(StreamService.UnknownStreamID):
+            streamID = self._nextStreamID
+            self._nextStreamID = \
+                (self._nextStreamID + 1) % StreamService.UnknownStreamID
+            if streamID not in used:
+                return streamID
+        raise RuntimeError("All stream IDs are in use.")
+
+    def openStream(self, memo: StreamWriteMemo) -> int:
+        """Assign memo's srcStreamID (so it can be sent in a request
+        before the stream starts; See sendStream).
+
+        Returns:
+            int: The source stream ID.
+        """
+        if memo.srcStreamID is None:
+            memo.srcStreamID = self._allocateStreamID()
+        self._outgoing[(memo.destID, memo.srcStreamID)] = memo
+        return memo.srcStreamID
+
+    def sendStream(self, memo: StreamWriteMemo):
+        """Initiate the stream (the data follows once accepted)."""
+        if self._outgoing.get((memo.destID, memo.srcStreamID)) is not memo:
+            self.openStream(memo)
+        dstStreamID = memo.dstStreamID
+        if dstStreamID is None:
+            dstStreamID = StreamService.UnknownStreamID
+        self._send(MTI.Stream_Initiate_Request, memo.destID, struct.pack(
+            ">HHBB", self.bufferSize, 0, memo.srcStreamID, dstStreamID))
+        self.touch(memo)
+
+    def expectStream(self, memo: StreamReadMemo) -> int:
+        """Accept a stream from memo.sourceID (call touch to start its
+        idle timeout, such as once the request for it is accepted).
+
+        Returns:
+            int: The destination stream ID (also set in memo).
+        """
+        memo.dstStreamID = self._allocateStreamID()
+        self._incoming[(memo.sourceID, memo.dstStreamID)] = memo
+        return memo.dstStreamID
+
+    def cancelStream(self, memo: Union[StreamReadMemo, StreamWriteMemo]
+                     ) -> bool:
+        """Forget a stream without calling its callbacks.
+
+        Returns:
+            bool: True if it was registered.
+        """
+        self._cancelTimer(memo)
+        if isinstance(memo, StreamWriteMemo):
+            return self._outgoing.pop((memo.destID, memo.srcStreamID),
+                                      None) is not None
+        return self._incoming.pop((memo.sourceID, memo.dstStreamID),
+                                  None) is not None
+
+    def touch(self, memo: Union[StreamReadMemo, StreamWriteMemo]):
+        """Restart memo's idle timeout."""
+        self._cancelTimer(memo)
+        if self.scheduler is not None:
+            memo._timer = self.scheduler.callLater(
+                self.idleTimeout, lambda: self._idleTimedOut(memo))
+
+    @staticmethod
+    def _cancelTimer(memo: Union[StreamReadMemo, StreamWriteMemo]):
+        if memo._timer is not None:
+            memo._timer.cancel()
+            memo._timer = None
+
+    def _idleTimedOut(self, memo: Union[StreamReadMemo, StreamWriteMemo]):
+        memo._timer = None
+        if not self.cancelStream(memo):
+            return
+        memo.timedOut = True
+        memo.error = "Stream stalled for {} seconds".format(self.idleTimeout)
+        logger.warning(memo.error)
+        memo.rejectedReply(memo)
+
+    def _send(self, mti: MTI, destID: NodeID, data: bytes):
+        self.linkLayer.sendMessage(
+            Message(mti, self.localNodeID, destID, bytearray(data)))
+
+    def process(self, message: Message) -> bool:
+        '''Processor entry point.
+
+        Returns:
+            bool: Always False (See DatagramService.process).
+        '''
+        if message.destination != self.localNodeID:
+            return False
+        if message.mti == MTI.Stream_Initiate_Request:
+            self.handleInitiateRequest(message)
+        elif message.mti == MTI.Stream_Initiate_Reply:
+            self.handleInitiateReply(message)
+        elif message.mti == MTI.Stream_Data_Send:
+            self.handleDataSend(message)
+        elif message.mti == MTI.Stream_Data_Proceed:
+            self.handleDataProceed(message)
+        elif message.mti == MTI.Stream_Data_Complete:
+            self.handleDataComplete(message)
+        return False
+
+    def _findIncoming(self, sourceID: NodeID, srcStreamID: int,
+                      dstStreamID: int) -> Union[StreamReadMemo, None]:
+        if dstStreamID != StreamService.UnknownStreamID:
+            return self._incoming.get((sourceID, dstStreamID))
+        for memo in self._incoming.values():
+            if (memo.sourceID == sourceID) and not memo._started \
+                    and (memo.srcStreamID == srcStreamID):
+                return memo
+        return None
+
+    def handleInitiateRequest(self, message: Message):
+        '''Accept the stream if expected (See expectStream).'''
+        data = message.data
+        if len(data) < 5:
+            logger.warning("Stream_Initiate_Request too short: {}"
+                           .format(list(data)))
+            return
+        proposed = (data[0] << 8) | data[1]
+        srcStreamID = data[4]
+        dstStreamID = data[5] if len(data) > 5 \
+            else StreamService.UnknownStreamID
+        memo = self._findIncoming(message.source, srcStreamID, dstStreamID)
+        if (memo is None) or memo._started:
+            logger.warning("Rejecting unexpected stream {} from {}"
+                           .format(srcStreamID, message.source))
+            self._send(MTI.Stream_Initiate_Reply, message.source,
+                       struct.pack(">HHBB", 0, StreamService.RejectedError,
+                                   srcStreamID, dstStreamID))
+            return
+        memo._started = True
+        memo.srcStreamID = srcStreamID
+        memo.bufferSize = min(proposed, self.bufferSize) or self.bufferSize
+        self._send(MTI.Stream_Initiate_Reply, message.source, struct.pack(
+            ">HHBB", memo.bufferSize, StreamService.Accept, srcStreamID,
+            memo.dstStreamID))
+        self.touch(memo)
+
+    def handleInitiateReply(self, message: Message):
+        '''Start sending data if accepted.'''
+        data = message.data
+        if len(data) < 6:
+            logger.warning("Stream_Initiate_Reply too short: {}"
+                           .format(list(data)))
+            return
+        memo = self._outgoing.get((message.source, data[4]))
+        if memo is None:
+            logger.debug("Unrelated Stream_Initiate_Reply from {}"
+                         .format(message.source))
+            return
+        bufferSize = (data[0] << 8) | data[1]
+        flags = (data[2] << 8) | data[3]
+        if not (flags & StreamService.Accept) or (bufferSize == 0):
+            self.cancelStream(memo)
+            memo.errorCode = flags
+            memo.error = ("Stream rejected with error code 0x{:04X}"
+                          .format(flags))
+            memo.rejectedReply(memo)
+            return
+        memo.dstStreamID = data[5]
+        memo.bufferSize = bufferSize
+        self._sendWindow(memo)
+
+    def _sendWindow(self, memo: StreamWriteMemo):
+        """Send the next buffer of data, and complete the stream if
+        that was the last of it.
+        """
+        chunk = memo.data[memo.sent:memo.sent + memo.bufferSize]
+        if chunk:
+            self._send(MTI.Stream_Data_Send, memo.destID,
+                       bytearray([memo.dstStreamID]) + chunk)
+            memo.sent += len(chunk)
+        if memo.sent < len(memo.data):
+            self.touch(memo)  # wait for Stream_Data_Proceed
+            return
+        self.cancelStream(memo)
+        self._send(MTI.Stream_Data_Complete, memo.destID, struct.pack(
+            ">BBHI", memo.srcStreamID, memo.dstStreamID, 0, memo.sent))
+        memo.okReply(memo)
+
+    def handleDataSend(self, message: Message):
+        '''Collect data, and let the sender proceed per buffer.'''
+        if not message.data:
+            return
+        memo = self._incoming.get((message.source, message.data[0]))
+        if (memo is None) or not memo._started:
+            logger.warning("Dropping data of unknown stream {} from {}"
+                           .format(message.data[0], message.source))
+            return
+        payload = message.data[1:]
+        memo.data += payload
+        memo._unacknowledged += len(payload)
+        while memo._unacknowledged >= memo.bufferSize:
+            memo._unacknowledged -= memo.bufferSize
+            self._send(MTI.Stream_Data_Proceed, memo.sourceID, struct.pack(
+                ">BBH", memo.srcStreamID, memo.dstStreamID, 0))
+        self.touch(memo)
+
+    def handleDataProceed(self, message: Message):
+        '''Send the next buffer.'''
+        if len(message.data) < 2:
+            return
+        memo = self._outgoing.get((message.source, message.data[0]))
+        if (memo is None) or (memo.bufferSize is None):
+            logger.debug("Unrelated Stream_Data_Proceed from {}"
+                         .format(message.source))
+            return
+        self._sendWindow(memo)
+
+    def handleDataComplete(self, message: Message):
+        '''Deliver the data of a finished stream.'''
+        if len(message.data) < 2:
+            return
+        memo = self._incoming.get((message.source, message.data[1]))
+        if (memo is None) or not memo._started:
+            logger.debug("Unrelated Stream_Data_Complete from {}"
+                         .format(message.source))
+            return
+        self.cancelStream(memo)
+        if len(message.data) >= 8:
+            total = struct.unpack(">I", message.data[4:8])[0]
+            if total != len(memo.data):
+                memo.error = ("Stream ended after {} of {} bytes"
+                              .format(len(memo.data), total))
+                logger.warning(memo.error)
+                memo.rejectedReply(memo)
+                return
+        memo.dataReply(memo)
@@ -23,6 +23,7 @@ from openlcb.message import Message
 from openlcb.mti import MTI
 from openlcb.nodeid import NodeID
 from openlcb.physicallayer import PhysicalLayer
+from openlcb.portinterface import PortInterface
 
 
 class TcpLink(LinkLayer):
@@ -31,6 +32,7 @@ class TcpLink(LinkLayer):
     Attributes:
         accumulatedData (list): input accumulated until an entire message is
             present.
+        readSize (int): Maximum number of bytes receiveAll reads at once.
 
     Args:
         localNodeID (NodeID): The node ID of the Configuration Tool or other
@@ -49,6 +51,8 @@ class TcpLink(LinkLayer):
         self.accumulatedParts = {}
         self.nextInternallyAssignedNodeID = 1
         self.accumulatedData = bytearray()
+        self.readSize = 16384
+        self._receiveBuffer = bytearray(self.readSize)  # See receiveAll
         self.physicalLayer = physicalLayer  # formerly linkCall
         self.localNodeID = localNodeID  # unused here
 
@@ -68,44 +72,75 @@ class TcpLink(LinkLayer):
         print(f"[TcpLink] _onStateChanged from {oldState} to {newState}"
               " (nothing to do since TcpLink)")
 
-    def handleFrameReceived(self, frame: Union[bytes, bytearray]):
+    def handleFrameReceived(self,
+                            frame: Union[bytes, bytearray, memoryview]):
         """Receives bytes from lower level
         and accumulates them into individual message parts.
 
         Args:
-            inputData ([int]) : next chunk of the input stream
+            inputData ([int]) : next chunk of the input stream (copied,
+                so a memoryview of a reused receive buffer is ok)
         """
-        assert isinstance(frame, (bytes, bytearray))
-        self.accumulatedData.extend(frame)
+        assert isinstance(frame, (bytes, bytearray, memoryview))
+        data = self.accumulatedData
+        data += frame
         # Now check it if has one or more complete message.
-        while len(self.accumulatedData) > 0 :
-            # first, see if entire prefix is present
-            if len(self.accumulatedData) < 17 :  # 2+3+6+6
-                # not yet, wait for more
-                return
-            flags = (self.accumulatedData[0] << 8) | self.accumulatedData[1]
-            length = (self.accumulatedData[2] << 16) | (self.accumulatedData[3] << 8) | self.accumulatedData[4]  # noqa: E501
-            # check if entire message (part) is present
-            if len(self.accumulatedData) < 5+length :
-                # not yet, wait for more
-                return
-
-            # Check for message indicated bit
-            if (self.accumulatedData[0] & 0x80) == 0x80:
-                # we have a message (part)!  Forward for further processing
-                self.receivedPart(self.accumulatedData[:5+length], flags,
-                                  length)
-            else:
-                # We don't have definitions for link control messages
-                # so log and ignore
-                logging.info(
-                    "Found a link control message"
-                    " with flags 0x{:04X} length {}, ignoring"
-                    .format(flags, length)
-                )
-            # drop that message (part)
-            self.accumulatedData = self.accumulatedData[5+length:]
-            # and repeat
+        start = 0  # consumed bytes are deleted once, after the loop
+        try:
+            while len(data) - start > 0 :
+                # first, see if entire prefix is present
+                if len(data) - start < 17 :  # 2+3+6+6
+                    # not yet, wait for more
+                    return
+                flags = (data[start] << 8) | data[start+1]
+                length = (data[start+2] << 16) | (data[start+3] << 8) | data[start+4]  # noqa: E501
+                partEnd = start + 5 + length
+                # check if entire message (part) is present
+                if len(data) < partEnd :
+                    # not yet, wait for more
+                    return
+
+                # Check for message indicated bit
+                if (data[start] & 0x80) == 0x80:
+                    # we have a message (part)!  Forward for further
+                    #   processing
+                    self.receivedPart(data[start:partEnd], flags, length)
+                else:
+                    # We don't have definitions for link control messages
+                    # so log and ignore
+                    logging.info(
+                        "Found a link control message"
+                        " with flags 0x{:04X} length {}, ignoring"
+                        .format(flags, length)
+                    )
+                # drop that message (part)
+                start = partEnd
+                # and repeat
+        finally:
+            del data[:start]
+
+    def receiveAll(self, device: PortInterface) -> int:
+        """Receive available data from device and handle it
+        (using device.receiveInto and a reused buffer of readSize).
+
+        Args:
+            device (PortInterface): Device in non-blocking mode.
+
+        Returns:
+            int: number of bytes received
+        """
+        if len(self._receiveBuffer) != self.readSize:
+            self._receiveBuffer = bytearray(self.readSize)
+        try:
+            with memoryview(self._receiveBuffer) as view:
+                count = device.receiveInto(view)
+                if not count:
+                    return 0
+                with view[:count] as data:
+                    self.handleFrameReceived(data)
+        except BlockingIOError:
+            return 0
+        return count
 
     def receivedPart(self, messagePart: bytearray, flags: int, length: int):
         """Receives message parts from handleFrameReceived
@@ -134,6 +169,8 @@ class TcpLink(LinkLayer):
                 logging.warn("Found a first part from {}"
                              " while already accumulating"
                              "".format(gatewayNodeID))
+                if self.metrics is not None:
+                    self.metrics.parseErrors.inc("tcp")
                 # start over
             # start accumulation
             self.accumulatedParts[key] = bytearray()
@@ -241,3 +278,5 @@ class TcpLink(LinkLayer):
         self.physicalLayer.sendDataAfter(outputBytes, verbose=verbose)
         # ^ The physical layer should be one with "Raw" in the name
         # since takes bytes. See example_tcp_message_interface.
+        if self.metrics is not None:
+            self.metrics.messagesSent.inc(mti.name)
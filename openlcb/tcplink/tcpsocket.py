@@ -21,6 +21,10 @@ class TcpSocket(PortInterface):
     WebAssembly System Interface (WASI):
     <https://docs.python.org/3/library/socket.html>
 
+    Attributes:
+        readSize (int): Maximum number of bytes to read per call to
+            receive (receiveInto reads up to the buffer length).
+
     Args:
         sock (socket.socket, optional): A socket such as from Python's
             builtin socket module. Defaults to a new socket.socket
@@ -28,6 +32,7 @@ class TcpSocket(PortInterface):
     """
     def __init__(self):
         super(TcpSocket, self).__init__()
+        self.readSize = 4096
 
     def _settimeout(self, seconds: float):
         """Set the timeout for connect and transfer.
@@ -69,12 +74,13 @@ class TcpSocket(PortInterface):
         # public send (do not overload) asserts no overlapping call
         # assert isinstance(data, (bytes, bytearray)) # See type hint instead
         total_sent = 0
-        while total_sent < len(data[total_sent:]):
-            sent = self._device.send(data[total_sent:])
-            if sent == 0:
-                self.setOpen(False)
-                raise RuntimeError("socket connection broken")
-            total_sent = total_sent + sent
+        with memoryview(data) as view:  # slice remainder without copying
+            while total_sent < len(view):
+                sent = self._device.send(view[total_sent:])
+                if sent == 0:
+                    self.setOpen(False)
+                    raise RuntimeError("socket connection broken")
+                total_sent = total_sent + sent
 
     def _receive(self) -> Union[bytes, None]:
         '''Receive one or more bytes and return as an [int]
@@ -90,7 +96,7 @@ class TcpSocket(PortInterface):
         #   moved to GridConnectObserver (use ";" not len 35 though).
 
         try:
-            data = self._device.recv(128)
+            data = self._device.recv(self.readSize)
         except BlockingIOError:
             # None is only expected allowed in non-blocking mode
             return None
@@ -103,6 +109,28 @@ class TcpSocket(PortInterface):
             raise RuntimeError("socket connection broken")
         return data
 
+    def _receiveInto(self, buffer: memoryview) -> Union[int, None]:
+        """Receive directly into buffer using recv_into
+        (no bytes object is allocated per read).
+
+        See also public receiveInto method: Do not overload that, since
+        asserts no overlapping _receive call!
+
+        Returns:
+            Union[int, None]: Number of bytes received, or None if
+                no data (non-blocking mode).
+        """
+        if len(buffer) == 0:
+            return 0  # recv_into would return 0 (not a disconnect)
+        try:
+            count = self._device.recv_into(buffer)
+        except BlockingIOError:
+            return None
+        if count == 0:
+            self.setOpen(False)
+            raise RuntimeError("socket connection broken")
+        return count
+
     def _close(self):
         self._device.close()
         return None
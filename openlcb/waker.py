@@ -0,0 +1,81 @@
+'''
+Self-pipe wakeup for I/O loops that block in select.
+
+Another thread calls wakeup (such as from PhysicalLayer.onQueuedFrame
+after sendFrameAfter), which makes the loop's select (See
+PortInterface.waitReadable and Reactor) return right away, so queued
+frames hit the wire without waiting for a poll interval.
+'''
+import select
+import socket
+
+from typing import Union
+
+
+class Waker:
+    """A socketpair whose read end becomes readable on wakeup.
+
+    It can be passed to select (it has fileno), or waited on alone
+    using wait. Wakeups are coalesced until clear is called, so calling
+    wakeup for every queued frame costs one send per wait.
+    """
+    def __init__(self):
+        self._reader, self._writer = socket.socketpair()
+        self._reader.setblocking(False)
+        self._writer.setblocking(False)
+        self._woken = False
+
+    @property
+    def woken(self) -> bool:
+        """True if wakeup was called since the last clear."""
+        return self._woken
+
+    def fileno(self) -> int:
+        """Get the descriptor that is readable after wakeup."""
+        return self._reader.fileno()
+
+    def wakeup(self):
+        """End the current (or next) wait early. Safe to call from any
+        thread.
+        """
+        if self._woken:
+            return
+        self._woken = True
+        try:
+            self._writer.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # already has unread bytes (or closed)
+
+    def wait(self, timeout: Union[float, None] = None) -> bool:
+        """Block until wakeup is called or timeout seconds pass.
+
+        Returns:
+            bool: True if woken, False on timeout.
+        """
+        if self._woken:
+            return True
+        readable, _, _ = select.select([self._reader], [], [], timeout)
+        return bool(readable)
+
+    def clear(self) -> bool:
+        """Consume wakeups (call after each wait, before checking for
+        work, so a wakeup during the check is not lost).
+
+        Returns:
+            bool: True if wakeup was called since the last clear.
+        """
+        woken = self._woken
+        try:
+            while self._reader.recv(256):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        self._woken = False
+        # ^ A wakeup between the drain and this line sees _woken still
+        #   True, sends nothing, and is cleared here. It is not lost only
+        #   because callers check for work after clear (See docstring).
+        return woken
+
+    def close(self):
+        self._reader.close()
+        self._writer.close()
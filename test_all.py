@@ -12,18 +12,32 @@ from tests.test_node import *
 from tests.test_canframe import *
 
 # from tests.test_physicallayer import *  # commented: test was empty file
+from tests.test_framequeue import *
+from tests.test_shaper import *
 from tests.test_canphysicallayer import *
 from tests.test_canphysicallayergridconnect import *
+from tests.test_framebatch import *
+from tests.test_capture import *
 
 from tests.test_tcplink import *
+from tests.test_seriallink import *
+from tests.test_asyncport import *
+from tests.test_reactor import *
+from tests.test_waker import *
+from tests.test_dispatcher import *
 
 from tests.test_mti import *
 from tests.test_message import *
 
 from tests.test_linklayer import *
+from tests.test_messageaccumulator import *
 from tests.test_canlink import *
+from tests.test_scheduler import *
+from tests.test_rttestimator import *
+from tests.test_metrics import *
 
 from tests.test_datagramservice import *
+from tests.test_streamservice import *
 
 from tests.test_memoryservice import *
 
@@ -37,6 +51,7 @@ from tests.test_localeventstore import *
 
 from tests.test_processor import *
 from tests.test_localnodeprocessor import *
+from tests.test_localnoderouter import *
 from tests.test_remotenodeprocessor import *
 
 
@@ -0,0 +1,97 @@
+import asyncio
+import socket
+import threading
+import unittest
+
+from openlcb.asyncport import AsyncPort
+from openlcb.canbus.canlink import CanLink
+from openlcb.message import Message
+from openlcb.mti import MTI
+from openlcb.openlcbnetwork import OpenLCBNetwork
+from openlcb.tcplink.tcpsocket import TcpSocket
+
+
+class ThreadWaitSocket(TcpSocket):
+    """A TcpSocket without a usable file descriptor (like SerialLink
+    with its reader thread), so AsyncPort waits using a thread.
+    """
+    def _fileno(self):
+        return None
+
+
+def makePort(cls=TcpSocket):
+    near, far = socket.socketpair()
+    near.setblocking(False)
+    port = cls()
+    port._device = near
+    port._open = True
+    return port, far
+
+
+class AsyncPortTest(unittest.TestCase):
+
+    def checkWaitReadable(self, cls):
+        port, far = makePort(cls)
+
+        async def main():
+            asyncPort = AsyncPort(port)
+            asyncPort.attach()
+            try:
+                self.assertFalse(await asyncPort.waitReadableAsync(.01))
+                far.sendall(b":X19170365N;")
+                self.assertTrue(await asyncPort.waitReadableAsync(1.0))
+                self.assertEqual(asyncPort.receive(), b":X19170365N;")
+                threading.Timer(.01, asyncPort.wakeup).start()
+                self.assertTrue(await asyncPort.waitReadableAsync(1.0))
+            finally:
+                asyncPort.detach()
+        try:
+            asyncio.run(main())
+        finally:
+            port.close()
+            far.close()
+
+    def testWaitReadable(self):
+        self.checkWaitReadable(TcpSocket)
+
+    def testWaitReadableUsingThread(self):
+        self.checkWaitReadable(ThreadWaitSocket)
+
+
+class OpenLCBNetworkRunTest(unittest.TestCase):
+
+    def testRunUntilClosed(self):
+        port, far = makePort()
+        far.settimeout(2.0)
+        network = OpenLCBNetwork("05.01.01.01.03.01")
+
+        async def main():
+            task = asyncio.ensure_future(network.run(port))
+            await network.ready(2.0)
+            self.assertEqual(network.canLink.getState(),
+                             CanLink.State.Permitted)
+            received = bytearray()
+            while b":X1070" not in received:  # AMD
+                received += await asyncio.get_running_loop().run_in_executor(
+                    None, far.recv, 4096)
+            network.canLink.sendMessage(Message(
+                MTI.Producer_Consumer_Event_Report,
+                network.canLink.localNodeID, None, bytearray(8)))
+            # ^ queued by this thread, sent without waiting for a poll
+            received = bytearray()
+            while b":X195B4" not in received:
+                received += await asyncio.wait_for(
+                    asyncio.get_running_loop().run_in_executor(
+                        None, far.recv, 4096), 1.0)
+            far.close()
+            with self.assertRaises(RuntimeError):
+                await asyncio.wait_for(task, 2.0)
+        try:
+            asyncio.run(main())
+        finally:
+            port.close()
+        self.assertEqual(network.physicalLayer.onQueuedFrame, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
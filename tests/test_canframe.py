@@ -46,6 +46,31 @@ class TestCanFrameClass(unittest.TestCase):
         self.assertEqual(frame0703.data, bytearray())
         # For ControlFrame itself, see test_canlink.py
 
+    def testFastConstructorsMatchOverloads(self):
+        nodeID = NodeID(0x12_34_56_78_9A_BC)
+        for cid in range(4, 8):
+            self.assertEqual(CanFrame.cid(cid, nodeID, 0x123),
+                             CanFrame(cid, nodeID, 0x123))
+        data = bytearray([1, 2, 3])
+        frame = CanFrame.control(0x0701, 0x123, data, reservation=2)
+        self.assertEqual(frame, CanFrame(0x0701, 0x123, data))
+        self.assertEqual(frame.alias, 0x123)
+        self.assertEqual(frame.reservation, 2)
+        self.assertEqual(CanFrame.control(0x0701, 0x123).data, bytearray())
+        frame = CanFrame.fromHeaderData(0x19170365, data)
+        self.assertEqual(frame, CanFrame(0x19170365, data))
+        self.assertIs(frame.data, data)  # not copied
+        self.assertEqual(frame.alias, 0x365)
+        self.assertIsNone(frame.afterSendState)
+        with self.assertRaises(ValueError):
+            CanFrame.control(0x0701, 0x1000)
+
+    def testSlots(self):
+        frame = CanFrame.fromHeaderData(0x19170365, bytearray())
+        self.assertFalse(hasattr(frame, "__dict__"))
+        with self.assertRaises(AttributeError):
+            frame.notAnAttribute = 1
+
 
 if __name__ == '__main__':
     unittest.main()
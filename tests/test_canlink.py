@@ -1,7 +1,7 @@
 from typing import Union
 import unittest
 
-from openlcb import formatted_ex
+from openlcb import formatted_ex, precise_sleep
 from openlcb.canbus.canlink import CanLink
 
 from openlcb.canbus.canframe import CanFrame
@@ -15,6 +15,7 @@ from openlcb.mti import MTI
 from openlcb.nodeid import NodeID
 from openlcb.canbus.controlframe import ControlFrame
 from openlcb.portinterface import PortInterface
+from openlcb.scheduler import Scheduler
 from openlcb.nodeid import generate_node_id
 
 class PhyMockLayer(CanPhysicalLayer):
@@ -92,6 +93,23 @@ class MockPort(PortInterface):
         return None
 
 
+class VirtualTimePort(MockPort):
+    """MockPort whose waits advance a virtual clock instead of
+    sleeping (for a Scheduler with clock=port.clock).
+    """
+    def __init__(self):
+        super(VirtualTimePort, self).__init__()
+        self.now = 0.0
+
+    def clock(self) -> float:
+        return self.now
+
+    def waitReadable(self, timeout=None, waker=None) -> bool:
+        if timeout is not None:
+            self.now += timeout
+        return False
+
+
 def getLocalNodeIDStr():
     return "05.01.01.01.03.01"
 
@@ -311,6 +329,121 @@ class TestCanLinkClass(unittest.TestCase):
         self.assertEqual(canLink._state, CanLink.State.Permitted)
         canPhysicalLayer.physicalLayerDown()
 
+    # MARK: - Test Virtual Nodes (AliasPool)
+    def testVirtualNodesReservedWithLocalNode(self):
+        canPhysicalLayer = CanPhysicalLayerSimulation()
+        port = VirtualTimePort()
+        canLink = CanLinkLayerSimulation(canPhysicalLayer, getLocalNodeID(),
+                                         scheduler=Scheduler(port.clock))
+        virtualIDs = [NodeID(0x05_01_01_01_03_10 + i) for i in range(20)]
+        states = []
+        canLink.registerVirtualNodeStateListener(
+            lambda nodeID, permitted: states.append((nodeID, permitted)))
+        entries = canLink.addVirtualNodes(virtualIDs)
+        aliases = set(entry.alias for entry in entries)
+        self.assertEqual(len(aliases), len(virtualIDs))
+        self.assertNotIn(canLink._localAlias, aliases)
+
+        canPhysicalLayer.physicalLayerUp()
+        canLink.waitForReady(port, verbose=False)
+        # All CIDs went out in the same window as localNodeID's
+        cids = [frame for frame in canPhysicalLayer.sentFrames
+                if (frame.header & 0x0C00_0000) == 0x0400_0000]
+        self.assertEqual(len(cids), 4 * (len(virtualIDs) + 1))
+        self.assertEqual(canPhysicalLayer.sentFrames[:len(cids)], cids)
+        # The virtual nodes' CIDs may have ended a later sendAll than
+        #   localNodeID's, so let their own window end too:
+        deadline = canLink.aliasPool.nextReadyTime(
+            CanLink.ALIAS_RESPONSE_DELAY)
+        if deadline is not None:
+            port.now = max(port.now, deadline)
+        canLink.pollState()
+        canPhysicalLayer.sendAll(None)  # RID and AMD of the virtual nodes
+
+        for nodeID, entry in zip(virtualIDs, entries):
+            self.assertEqual(canLink.nodeIdToAlias[nodeID], entry.alias)
+            self.assertEqual(canLink.aliasToNodeID[entry.alias], nodeID)
+            self.assertIn(
+                CanFrame(ControlFrame.AMD.value, entry.alias,
+                         nodeID.toArray()),
+                canPhysicalLayer.sentFrames)
+        self.assertEqual(states, [(nodeID, True) for nodeID in virtualIDs])
+        self.assertTrue(canLink.isLocalNodeID(virtualIDs[0]))
+        canPhysicalLayer.physicalLayerDown()
+
+    def testVirtualNodeAddedWhilePermitted(self):
+        canPhysicalLayer = CanPhysicalLayerSimulation()
+        canLink = CanLinkLayerSimulation(canPhysicalLayer, getLocalNodeID())
+        canLink._state = CanLink.State.Permitted
+        virtualID = NodeID(0x05_01_01_01_03_20)
+        entry = canLink.addVirtualNode(virtualID)
+        canPhysicalLayer.sendAll(None)
+        self.assertEqual(len(canPhysicalLayer.sentFrames), 4)  # CID 7-4
+        self.assertNotIn(virtualID, canLink.nodeIdToAlias)
+
+        precise_sleep(CanLink.ALIAS_RESPONSE_DELAY + .05)
+        canPhysicalLayer.sendAll(None)
+        self.assertEqual(canPhysicalLayer.sentFrames[4:], [
+            CanFrame(ControlFrame.RID.value, entry.alias),
+            CanFrame(ControlFrame.AMD.value, entry.alias,
+                     virtualID.toArray()),
+        ])
+        self.assertEqual(canLink.nodeIdToAlias[virtualID], entry.alias)
+
+        # A global AME is answered for the virtual node too
+        canPhysicalLayer.sentFrames.clear()
+        canPhysicalLayer.fireFrameReceived(CanFrame(ControlFrame.AME.value, 0))
+        canPhysicalLayer.sendAll(None)
+        self.assertEqual(len(canPhysicalLayer.sentFrames), 2)
+        self.assertEqual(canLink.nodeIdToAlias[virtualID], entry.alias)
+
+        self.assertTrue(canLink.removeVirtualNode(virtualID))
+        self.assertNotIn(virtualID, canLink.nodeIdToAlias)
+        self.assertFalse(canLink.removeVirtualNode(virtualID))
+        canPhysicalLayer.physicalLayerDown()
+
+    def testVirtualAliasCollision(self):
+        canPhysicalLayer = CanPhysicalLayerSimulation()
+        canLink = CanLinkLayerSimulation(canPhysicalLayer, getLocalNodeID())
+        canLink._state = CanLink.State.Permitted
+        virtualID = NodeID(0x05_01_01_01_03_20)
+        otherID = NodeID(0x05_01_01_01_03_21)
+        entry = canLink.addVirtualNode(virtualID)
+        other = canLink.addVirtualNode(otherID)
+        canPhysicalLayer.sendAll(None)  # CIDs
+        precise_sleep(CanLink.ALIAS_RESPONSE_DELAY + .05)
+        canPhysicalLayer.sendAll(None)  # RIDs and AMDs
+        oldAlias = entry.alias
+        otherAlias = other.alias
+        self.assertEqual(canLink.nodeIdToAlias[virtualID], oldAlias)
+
+        # Another node sends a CID with a reserved alias: reply with RID
+        canPhysicalLayer.sentFrames.clear()
+        canPhysicalLayer.fireFrameReceived(
+            CanFrame(7, NodeID(0x09_00_00_00_00_01), oldAlias))
+        canPhysicalLayer.sendAll(None)
+        self.assertEqual(canPhysicalLayer.sentFrames,
+                         [CanFrame(ControlFrame.RID.value, oldAlias)])
+
+        # Another node uses the alias: AMR, then only this node restarts
+        canPhysicalLayer.sentFrames.clear()
+        canPhysicalLayer.fireFrameReceived(
+            CanFrame(ControlFrame.RID.value, oldAlias))
+        canPhysicalLayer.sendAll(None)
+        self.assertEqual(canPhysicalLayer.sentFrames[0],
+                         CanFrame(ControlFrame.AMR.value, oldAlias,
+                                  virtualID.toArray()))
+        self.assertNotEqual(entry.alias, oldAlias)
+        self.assertEqual(len(canPhysicalLayer.sentFrames), 5)  # AMR, CID 7-4
+        self.assertNotIn(virtualID, canLink.nodeIdToAlias)
+        self.assertEqual(canLink.nodeIdToAlias[otherID], otherAlias)
+        self.assertEqual(canLink._state, CanLink.State.Permitted)
+
+        precise_sleep(CanLink.ALIAS_RESPONSE_DELAY + .05)
+        canPhysicalLayer.sendAll(None)
+        self.assertEqual(canLink.nodeIdToAlias[virtualID], entry.alias)
+        canPhysicalLayer.physicalLayerDown()
+
     def testCheckMTIMapping(self):
 
         physicalLayer = PhyMockLayer()
@@ -321,6 +454,41 @@ class TestCanLinkClass(unittest.TestCase):
             MTI.Verify_NodeID_Number_Global
         )
 
+    def testCheckMTIMappingUnknown(self):
+        physicalLayer = PhyMockLayer()
+        canLink = CanLinkLayerSimulation(physicalLayer, getLocalNodeID())
+        for mti in MTI:
+            if mti.value > 0xFFF:
+                continue  # not a CAN MTI
+            self.assertEqual(
+                canLink.canHeaderToFullFormat(
+                    CanFrame(0x19000247 | (mti.value << 12), bytearray())),
+                mti)
+        self.assertEqual(
+            canLink.canHeaderToFullFormat(CanFrame(0x19FFF247, bytearray())),
+            MTI.Unknown)
+        self.assertEqual(
+            canLink.canHeaderToFullFormat(CanFrame(0x1A123247, bytearray())),
+            MTI.Datagram)
+
+    def testControlFrameHandlers(self):
+        physicalLayer = PhyMockLayer()
+        canLink = CanLinkLayerSimulation(physicalLayer, getLocalNodeID())
+        # Each ControlFrame has a handler except the ones recognized by
+        #   header bits and UnknownFormat:
+        self.assertEqual(
+            set(canLink._controlFrameHandlers),
+            set(entry.value for entry in ControlFrame)
+            - set([ControlFrame.Data.value, ControlFrame.CID.value,
+                   ControlFrame.UnknownFormat.value]))
+        count = canLink._frameCount
+        canLink.handleFrameReceived(CanFrame(0x1000, 0x000))  # unknown
+        self.assertEqual(canLink._frameCount, count)
+        canLink.handleFrameReceived(
+            CanFrame(ControlFrame.EIR0.value, 0x123))
+        self.assertEqual(canLink._frameCount, count + 1)
+        self.assertEqual(canLink._errorCount, 1)
+
     def testControlFrameDecode(self):
         physicalLayer = PhyMockLayer()
         canLink = CanLinkLayerSimulation(physicalLayer, getLocalNodeID())
@@ -663,6 +831,78 @@ class TestCanLinkClass(unittest.TestCase):
         self.assertEqual(messageLayer.receivedMessages[1].data[11], 33)
         canPhysicalLayer.physicalLayerDown()
 
+    def testStalePartialDatagramDropped(self):
+        canPhysicalLayer = CanPhysicalLayerSimulation()
+        canLink = CanLinkLayerSimulation(
+            canPhysicalLayer, getLocalNodeID())
+        messageLayer = MessageMockLayer()
+        canLink.registerMessageReceivedListener(messageLayer.receiveMessage)
+        canPhysicalLayer.physicalLayerUp()
+        canLink.waitForReady(self.device)
+        now = [0.0]
+        canLink.accumulator.clock = lambda: now[0]
+
+        frame = CanFrame(0x1B123, 0x247)  # first frame of datagram
+        frame.data = bytearray([10, 11, 12, 13])
+        canPhysicalLayer.fireFrameReceived(frame)
+        self.assertEqual(len(canLink.accumulator), 1)
+        now[0] += canLink.accumulator.timeout  # last frame never arrives
+        frame = CanFrame(0x1D123, 0x247)  # final frame of datagram
+        frame.data = bytearray([30, 31, 32, 33])
+        canPhysicalLayer.fireFrameReceived(frame)
+
+        self.assertEqual(len(canLink.accumulator), 0)
+        self.assertEqual(canLink.accumulatorEvictedCount, 1)
+        self.assertEqual(len(messageLayer.receivedMessages), 1)
+        # ^ startup only (stale datagram not forwarded)
+        canPhysicalLayer.physicalLayerDown()
+
+    def testStreamDataFrame(self):
+        canPhysicalLayer = CanPhysicalLayerSimulation()
+        canLink = CanLinkLayerSimulation(
+            canPhysicalLayer, getLocalNodeID())
+        messageLayer = MessageMockLayer()
+        canLink.registerMessageReceivedListener(messageLayer.receiveMessage)
+        canPhysicalLayer.physicalLayerUp()
+        canLink.waitForReady(self.device)
+        amd = CanFrame(0x0701, 0x247)
+        amd.data = bytearray([1, 2, 3, 4, 5, 6])
+        canPhysicalLayer.fireFrameReceived(amd)
+
+        frame = CanFrame(0x1F123, 0x247)  # stream data, stream ID 4
+        frame.data = bytearray([4, 1, 2, 3, 4, 5, 6, 7])
+        canPhysicalLayer.fireFrameReceived(frame)
+
+        self.assertEqual(len(messageLayer.receivedMessages), 2)
+        # ^ startup plus one message per frame (no accumulation)
+        message = messageLayer.receivedMessages[1]
+        self.assertEqual(message.mti, MTI.Stream_Data_Send)
+        self.assertEqual(message.source, NodeID(0x01_02_03_04_05_06))
+        self.assertEqual(message.data, frame.data)
+        self.assertEqual(len(canLink.accumulator), 0)
+        canPhysicalLayer.physicalLayerDown()
+
+    def testStreamDataSegmented(self):
+        canPhysicalLayer = CanPhysicalLayerSimulation()
+        canLink = CanLinkLayerSimulation(canPhysicalLayer, getLocalNodeID())
+        canPhysicalLayer.physicalLayerUp()
+        canLink.waitForReady(self.device)
+
+        message = Message(MTI.Stream_Data_Send, getLocalNodeID(),
+                          getLocalNodeID(),
+                          bytearray([9]) + bytearray(range(16)))
+        canLink.sendMessage(message)
+
+        alias = canLink.getLocalAlias()
+        header = 0x1F000000 | (alias << 12) | alias
+        self.assertEqual(
+            [(frame.header, frame.data)
+             for frame in canPhysicalLayer._send_frames],
+            [(header, bytearray([9, 0, 1, 2, 3, 4, 5, 6])),
+             (header, bytearray([9, 7, 8, 9, 10, 11, 12, 13])),
+             (header, bytearray([9, 14, 15]))])
+        canPhysicalLayer.physicalLayerDown()
+
     def testZeroLengthDatagram(self):
         # TODO: ?? canPhysicalLayer = PhyMockLayer()
         canPhysicalLayer = CanPhysicalLayerSimulation()
@@ -2,6 +2,7 @@ import unittest
 
 from openlcb.canbus.canphysicallayer import CanPhysicalLayer
 from openlcb.canbus.canframe import CanFrame
+from openlcb.nodeid import NodeID
 
 
 class TestCanPhysicalLayerClass(unittest.TestCase):
@@ -39,6 +40,55 @@ class TestCanPhysicalLayerClass(unittest.TestCase):
 
         self.assertTrue(self.received)
 
+    def testFramePriority(self):
+        priority = CanPhysicalLayer.framePriority
+        self.assertEqual(priority(CanFrame(0x1070_1365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_CONTROL)  # AMD
+        self.assertEqual(priority(CanFrame(0x1070_3365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_CONTROL)  # AMR
+        self.assertEqual(priority(CanFrame(7, NodeID(1), 0x365)),
+                         CanPhysicalLayer.PRIORITY_CONTROL)  # CID 7
+        self.assertEqual(priority(CanFrame(0x1910_0365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_MTI)  # Init Complete
+        self.assertEqual(priority(CanFrame(0x195B_4365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_MTI + 1)  # event report
+        self.assertEqual(priority(CanFrame(0x19A2_8365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_MTI + 2)  # Datagram OK
+        for frameType in (0x1A, 0x1B, 0x1C, 0x1D):
+            self.assertEqual(
+                priority(CanFrame(frameType << 24 | 0x123365, bytearray())),
+                CanPhysicalLayer.PRIORITY_DATAGRAM)
+        self.assertEqual(priority(CanFrame(0x1F12_3365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_BULK)  # stream
+        self.assertEqual(priority(CanFrame(0x1988_8365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_BULK)  # Stream Proceed
+        self.assertEqual(priority(CanFrame(0x198A_8365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_BULK)  # Stream Complete
+        self.assertEqual(priority(CanFrame(0x1986_8365, bytearray())),
+                         CanPhysicalLayer.PRIORITY_MTI + 2)  # Initiate Reply
+
+    def testEventOvertakesDatagram(self):
+        layer = CanPhysicalLayer()
+        datagram = [CanFrame(0x1B12_3365, bytearray(8))]
+        datagram += [CanFrame(0x1C12_3365, bytearray(8)) for _ in range(10)]
+        datagram += [CanFrame(0x1D12_3365, bytearray(8))]
+        for frame in datagram[:6]:
+            layer.sendFrameAfter(frame)
+        event = CanFrame(0x195B_4365, bytearray(8))
+        amd = CanFrame(0x1070_1365, bytearray())
+        layer.sendFrameAfter(event)
+        for frame in datagram[6:]:
+            layer.sendFrameAfter(frame)
+        layer.sendFrameAfter(amd)
+        self.assertEqual(len(layer._send_frames), 14)
+        self.assertIs(layer._send_frames[1], event)
+        sent = []
+        while layer.hasFrame():
+            sent.append(layer.pollFrame())
+        # control frame, then event, then datagram frames in order
+        self.assertEqual(sent, [amd, event] + datagram)
+        self.assertIsNone(layer.pollFrame())
+
 
 if __name__ == '__main__':
     unittest.main()
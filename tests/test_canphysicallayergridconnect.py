@@ -1,12 +1,33 @@
+import socket
 import unittest
 
 from openlcb import emit_cast
 from openlcb.canbus.canphysicallayergridconnect import (
     GC_END_BYTE,
+    GC_FRAME_MAX_LEN,
     CanPhysicalLayerGridConnect,
 )
 from openlcb.canbus.canframe import CanFrame
 from openlcb.nodeid import NodeID
+from openlcb.portinterface import PortInterface
+from openlcb.tcplink.tcpsocket import TcpSocket
+
+
+class PortMock(PortInterface):
+    def __init__(self):
+        PortInterface.__init__(self)
+        self.sent = []
+        self.chunks = []
+
+    def _send(self, data):
+        self.sent.append(bytes(data))
+
+    def _receive(self):
+        # Each call gives the next chunk (None if no data) to exercise
+        #   the default _receiveInto.
+        if not self.chunks:
+            return None
+        return self.chunks.pop(0)
 
 
 class PhysicalLayerMock(CanPhysicalLayerGridConnect):
@@ -207,6 +228,198 @@ class CanPhysicalLayerGridConnectTest(unittest.TestCase):
         self.assertEqual(self.receivedFrames[0],
                          CanFrame(0x19490365, bytearray()))
 
+    def testNoisyHeaderUsesNibbleParser(self):
+        self.gc = PhysicalLayerMock()
+        self.gc.registerFrameReceivedListener(self.receiveListener,
+                                              enable_test=True)
+        self.receivedFrames = []
+        packets = [b":X-1234567N;", b":X1_234567N;", b":X+1234567N;"]
+        for packet in packets:
+            self.gc.handleData(packet)
+        self.assertEqual(
+            [frame.header for frame in self.receivedFrames],
+            [CanPhysicalLayerGridConnect.readInt32(bytearray(packet), 2)
+             for packet in packets])
+
+    def testManyFramesReceivedInOneBuffer(self):
+        self.gc = PhysicalLayerMock()
+        self.gc.registerFrameReceivedListener(self.receiveListener,
+                                              enable_test=True)
+        packet = b":X19170365N020112FE056C;\n"
+        count = CanPhysicalLayerGridConnect.COMPACT_THRESHOLD  # > threshold
+        self.assertEqual(self.gc.handleData(packet * count), count)
+        self.assertEqual(len(self.receivedFrames), count)
+        self.assertEqual(
+            self.receivedFrames[-1],
+            CanFrame(0x19170365,
+                     bytearray([0x02, 0x01, 0x12, 0xFE, 0x05, 0x6C]))
+        )
+        self.assertEqual(self.gc.pendingInbound(), 0)
+        self.assertEqual(len(self.gc.inboundBuffer), 0)
+
+    def testEverySplitMatchesStrict(self):
+        stream = (b":X19490365N;\n"
+                  b":X19170365N020112FE056C;\n"
+                  b"noise:X195B4123N0102030405060708;")
+        for split in range(len(stream) + 1):
+            frames = []
+            strictFrames = []
+            gc = PhysicalLayerMock()
+            gc.registerFrameReceivedListener(frames.append,
+                                             enable_test=True)
+            strict = PhysicalLayerMock()
+            strict.registerFrameReceivedListener(strictFrames.append,
+                                                 enable_test=True)
+            gc.handleData(stream[:split])
+            gc.handleData(stream[split:])
+            strict.handleDataStrict(stream[:split])
+            strict.handleDataStrict(stream[split:])
+            self.assertEqual(len(frames), 3, "split={}".format(split))
+            self.assertEqual(frames, strictFrames, "split={}".format(split))
+            self.assertEqual(frames[2].data,
+                             bytearray([1, 2, 3, 4, 5, 6, 7, 8]))
+            self.assertEqual(gc.pendingInbound(), 0)
+
+    def testPartialPacketKeptAfterCompaction(self):
+        self.gc = PhysicalLayerMock()
+        self.gc.registerFrameReceivedListener(self.receiveListener,
+                                              enable_test=True)
+        packet = b":X19490365N;\n"
+        count = CanPhysicalLayerGridConnect.COMPACT_THRESHOLD // len(packet)
+        self.gc.handleData(packet * (count + 1) + b":X1949")
+        self.assertEqual(len(self.receivedFrames), count + 1)
+        self.assertEqual(self.gc.pendingInbound(), len(b":X1949"))
+        self.gc.handleData(b"0365N;")
+        self.assertEqual(len(self.receivedFrames), count + 2)
+        self.assertEqual(self.receivedFrames[-1],
+                         CanFrame(0x19490365, bytearray()))
+
+    def testSendAllCoalescesFrames(self):
+        self.gc = PhysicalLayerMock()
+        self.gc.onQueuedFrame = None
+        sentFrames = []
+        self.gc.onFrameSent = sentFrames.append
+        frames = [  # same MTI priority, so sent in the order queued
+            CanFrame(0x19490365, bytearray()),
+            CanFrame(0x19490365, bytearray([1, 2])),
+            CanFrame(0x19490365, bytearray(), afterSendState=1),
+            CanFrame(0x19490365, bytearray([3])),
+        ]
+        for frame in frames:
+            self.gc.sendFrameAfter(frame)
+        port = PortMock()
+        self.assertEqual(self.gc.sendAll(port), 4)
+        # The batch ends at the frame with afterSendState:
+        self.assertEqual(port.sent, [
+            b":X19490365N;\n:X19490365N0102;\n:X19490365N;\n",
+            b":X19490365N03;\n",
+        ])
+        self.assertEqual(sentFrames, frames)
+
+    def testSendAllMaxBatch(self):
+        self.gc = PhysicalLayerMock()
+        self.gc.onQueuedFrame = None
+        self.gc.maxSendBatch = 2
+        for _ in range(5):
+            self.gc.sendFrameAfter(CanFrame(0x19490365, bytearray()))
+        port = PortMock()
+        self.assertEqual(self.gc.sendAll(port, mode="text"), 5)
+        self.assertEqual([len(data) // len(b":X19490365N;\n")
+                          for data in port.sent], [2, 2, 1])
+        self.assertFalse(self.gc.hasFrame())
+
+    def testEncodeMatchesLegacyFormat(self):
+        gc = PhysicalLayerMock()
+        for header in (0x0, 0x19490365, 0x1FFFFFFF):
+            for length in range(9):
+                frame = CanFrame(header,
+                                 bytearray(range(0xF8, 0xF8 + length)))
+                legacy = ":X{:08X}N".format(header)
+                for byte in frame.data:
+                    legacy += "{:02X}".format(byte)
+                legacy += ";\n"
+                self.assertEqual(gc.encodeFrameAsString(frame), legacy)
+                self.assertEqual(gc.encodeFrameAsData(frame),
+                                 legacy.encode("utf-8"))
+
+    def testEncodeFrameInto(self):
+        gc = PhysicalLayerMock()
+        buffer = bytearray(GC_FRAME_MAX_LEN * 2)
+        end = gc.encodeFrameInto(CanFrame(0x19490365, bytearray()),
+                                 buffer, 0)
+        end = gc.encodeFrameInto(CanFrame(0x19170365, bytearray([1, 0xAB])),
+                                 buffer, end)
+        self.assertEqual(bytes(buffer[:end]),
+                         b":X19490365N;\n:X19170365N01AB;\n")
+        self.assertEqual(len(buffer), GC_FRAME_MAX_LEN * 2)  # not resized
+        with self.assertRaises(IndexError):
+            gc.encodeFrameInto(
+                CanFrame(0x19170365, bytearray(8)), buffer, len(buffer) - 4)
+
+    def testReceiveAllReadsIntoInboundBuffer(self):
+        self.gc = PhysicalLayerMock()
+        self.gc.registerFrameReceivedListener(self.receiveListener,
+                                              enable_test=True)
+        self.gc.readSize = 16
+        port = PortMock()
+        port.chunks = [b":X19490365N;\n:X19170365N0201",
+                       b"12FE056C;\n"]
+        total = 0
+        while True:
+            count = self.gc.receiveAll(port)
+            if not count:
+                break
+            self.assertLessEqual(count, 16)  # remainder kept by port
+            total += count
+        self.assertEqual(total, sum(len(chunk) for chunk in
+                                    (b":X19490365N;\n:X19170365N0201",
+                                     b"12FE056C;\n")))
+        self.assertEqual(self.receivedFrames, [
+            CanFrame(0x19490365, bytearray()),
+            CanFrame(0x19170365,
+                     bytearray([0x02, 0x01, 0x12, 0xFE, 0x05, 0x6C])),
+        ])
+        self.assertEqual(self.gc.pendingInbound(), 0)
+
+    def testReceiveAllKeepsBufferSize(self):
+        self.gc = PhysicalLayerMock()
+        self.gc.registerFrameReceivedListener(self.receiveListener,
+                                              enable_test=True)
+        self.gc.readSize = 32
+        port = PortMock()
+        # Each chunk completes the previous packet and leaves part of
+        #   the next one unparsed:
+        port.chunks = [b":X19490365N;\n:X1917"]
+        port.chunks += [b"0365N01;\n:X1917"] * 20
+        sizes = []
+        while self.gc.receiveAll(port):
+            sizes.append(len(self.gc.inboundBuffer))
+        self.assertEqual(len(self.receivedFrames), 21)
+        self.assertEqual(self.gc.pendingInbound(), len(b":X1917"))
+        # Grown once to hold the partial packet + readSize, then reused:
+        self.assertEqual(sizes[1:], [len(b":X1917") + 32] * 20)
+
+    def testTcpSocketReceiveInto(self):
+        left, right = socket.socketpair()
+        try:
+            port = TcpSocket()
+            port._device = left
+            left.setblocking(False)
+            self.gc = PhysicalLayerMock()
+            self.gc.registerFrameReceivedListener(self.receiveListener,
+                                                  enable_test=True)
+            self.assertEqual(self.gc.receiveAll(port), 0)  # no data yet
+            right.sendall(b":X19490365N;\n:X1917")
+            self.assertEqual(self.gc.receiveAll(port), 19)
+            self.assertEqual(len(self.receivedFrames), 1)
+            right.sendall(b"0365N01;\n")
+            self.assertEqual(self.gc.receiveAll(port), 9)
+            self.assertEqual(self.receivedFrames[-1],
+                             CanFrame(0x19170365, bytearray([1])))
+        finally:
+            left.close()
+            right.close()
+
 
 if __name__ == '__main__':
     unittest.main()
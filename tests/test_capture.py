@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from openlcb.canbus.canframe import CanFrame
+from openlcb.canbus.canphysicallayergridconnect import (
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.canbus.capture import (
+    RECORD_SENT,
+    CaptureReader,
+    CaptureReplay,
+    CaptureWriter,
+)
+from openlcb.portinterface import PortInterface
+
+
+class PortMock(PortInterface):
+    def _send(self, data):
+        pass
+
+
+class TestCaptureClass(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempDir, "bus.olcbcap")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def writeFrames(self, count, indexInterval=4):
+        with CaptureWriter(self.path, indexInterval=indexInterval,
+                           bufferRecords=3) as writer:
+            for i in range(count):
+                writer.write(CanFrame(0x19170365, bytearray(range(i % 9))),
+                             timestamp=100.0 + i * .01, sent=(i % 2 == 1))
+
+    def testRoundTrip(self):
+        self.writeFrames(10)
+        with CaptureReader(self.path) as reader:
+            self.assertEqual(len(reader), 10)
+            records = list(reader.records())
+            self.assertEqual(records[3][:4], (100.03, 0x19170365, 3,
+                                              RECORD_SENT))
+            self.assertEqual(records[3][4], bytes([0, 1, 2, 0, 0, 0, 0, 0]))
+            frames = [frame for _, frame in reader.frames()]
+            self.assertEqual(frames[8],
+                             CanFrame(0x19170365, bytearray(range(8))))
+            received = list(reader.frames(includeSent=False))
+            self.assertEqual([t for t, _ in received],
+                             [100.0, 100.02, 100.04, 100.06, 100.08])
+            self.assertEqual(len(list(reader.records(4, 6))), 2)
+
+    def testIndexOf(self):
+        self.writeFrames(10)
+        with CaptureReader(self.path) as reader:
+            self.assertEqual(reader.indexOf(0), 0)
+            self.assertEqual(reader.indexOf(100.05), 5)
+            self.assertEqual(reader.indexOf(100.045), 5)
+            self.assertEqual(reader.indexOf(100.08), 8)
+            self.assertEqual(reader.indexOf(200), 10)
+
+    def testNotClosed(self):
+        writer = CaptureWriter(self.path)
+        writer.write(CanFrame(0x19490365, bytearray()), timestamp=1.0)
+        writer.flush()  # (but no index or trailer)
+        with CaptureReader(self.path) as reader:
+            self.assertEqual(len(reader), 1)
+            self.assertEqual(reader.indexOf(1.0), 0)
+        writer.close()
+
+    def testNotCaptureFile(self):
+        with open(self.path, "wb") as stream:
+            stream.write(b":X19490365N;\n" * 4)
+        with self.assertRaises(ValueError):
+            CaptureReader(self.path)
+
+    def testAttach(self):
+        physicalLayer = CanPhysicalLayerGridConnect()
+        received = []
+        sent = []
+        physicalLayer.onFrameReceived = received.append
+        physicalLayer.onFrameSent = sent.append
+        with CaptureWriter(self.path) as writer:
+            writer.attach(physicalLayer)
+            physicalLayer.handleData(b":X19170365N0102;\n")
+            physicalLayer.sendFrameAfter(CanFrame(0x19490123, bytearray()))
+            physicalLayer.sendAll(PortMock())
+        self.assertEqual(len(received), 1)  # still passed along
+        self.assertEqual(len(sent), 1)
+        physicalLayer.handleData(b":X19170365N03;\n")  # detached
+        with CaptureReader(self.path) as reader:
+            records = list(reader.records())
+        self.assertEqual([(r[1], r[3]) for r in records],
+                         [(0x19170365, 0), (0x19490123, RECORD_SENT)])
+
+    def testReplay(self):
+        self.writeFrames(10)
+        physicalLayer = CanPhysicalLayerGridConnect()
+        received = []
+        physicalLayer.onFrameReceived = received.append
+        with CaptureReader(self.path) as reader:
+            replay = CaptureReplay(reader, physicalLayer, speed=0)
+            self.assertEqual(replay.run(), 5)  # received frames only
+            replay.includeSent = True
+            replay.speed = 4  # .09 s of traffic takes about .0225 s
+            start = time.perf_counter()
+            self.assertEqual(replay.run(), 10)
+            self.assertGreaterEqual(time.perf_counter() - start, .02)
+        self.assertEqual(len(received), 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
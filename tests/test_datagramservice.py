@@ -1,3 +1,5 @@
+import asyncio
+import concurrent.futures
 import unittest
 
 from openlcb.datagramservice import (
@@ -5,11 +7,14 @@ from openlcb.datagramservice import (
     DatagramWriteMemo,
     DatagramService,
 )
+from openlcb.futures import OperationError
 from openlcb.linklayer import LinkLayer
+from openlcb.metrics import MetricsRegistry, disableMetrics, enableMetrics
 from openlcb.mti import MTI
 from openlcb.nodeid import NodeID
 from openlcb.message import Message
 from openlcb.physicallayer import PhysicalLayer
+from openlcb.scheduler import Scheduler
 
 
 class MockPhysicalLayer(PhysicalLayer):
@@ -185,6 +190,204 @@ class DatagramServiceTest(unittest.TestCase):
         # check message came through
         self.assertEqual(len(LinkMockLayer.sentMessages), 1)
 
+    def testOneInFlightPerDestination(self):
+        ok = Message(MTI.Datagram_Received_OK, NodeID(22), NodeID(12))
+        for destID, value in ((22, 1), (23, 2), (22, 3), (24, 4)):
+            self.service.sendDatagram(
+                DatagramWriteMemo(NodeID(destID), bytearray([value])))
+        self.assertEqual([message.data[0] for message
+                          in LinkMockLayer.sentMessages], [1, 2, 4])
+        self.assertEqual(self.service.inFlight(NodeID(23)).data,
+                         bytearray([2]))
+        self.service.process(
+            Message(MTI.Datagram_Received_OK, NodeID(23), NodeID(12)))
+        self.assertEqual(len(LinkMockLayer.sentMessages), 3)
+        self.service.process(ok)
+        self.assertEqual(LinkMockLayer.sentMessages[-1].data, bytearray([3]))
+        self.service.process(ok)
+        self.assertEqual(len(self.service.pendingWriteMemos), 1)  # to 24
+
+    def testMaxInFlight(self):
+        self.service.maxInFlight = 2
+        for destID in (22, 23, 24, 25):
+            self.service.sendDatagram(
+                DatagramWriteMemo(NodeID(destID), bytearray([destID])))
+        self.assertEqual(len(LinkMockLayer.sentMessages), 2)
+        self.service.process(
+            Message(MTI.Datagram_Rejected, NodeID(23), NodeID(12)))
+        self.assertEqual(LinkMockLayer.sentMessages[-1].destination,
+                         NodeID(24))  # waiting destinations go in order
+        self.assertIsNone(self.service.inFlight(NodeID(25)))
+        with self.assertLogs("openlcb.datagramservice", "ERROR"):
+            self.service.process(  # not in flight, so not matched
+                Message(MTI.Datagram_Received_OK, NodeID(25), NodeID(12)))
+        self.assertEqual(len(LinkMockLayer.sentMessages), 3)
+
+    def testLinkRestartedResendsAllInFlight(self):
+        for destID in (22, 23):
+            self.service.sendDatagram(
+                DatagramWriteMemo(NodeID(destID), bytearray([destID])))
+        self.service.process(Message(MTI.Link_Layer_Restarted, NodeID(12),
+                                     None))
+        self.assertEqual([message.destination for message
+                          in LinkMockLayer.sentMessages[2:]],
+                         [NodeID(22), NodeID(23)])
+
+    def useClock(self):
+        """Run timers on a fake clock (advance it with self.advance)."""
+        self.now = 0.0
+        self.service.scheduler = Scheduler(clock=lambda: self.now)
+
+    def advance(self, seconds: float):
+        self.now += seconds
+        self.service.scheduler.runDue()
+
+    def testReplyTimeoutResendsThenFails(self):
+        self.useClock()
+        self.service.maxRetries = 2
+        failed = []
+        memo = DatagramWriteMemo(NodeID(22), bytearray([1]),
+                                 rejectedReply=failed.append)
+        self.service.sendDatagram(memo)
+        self.service.sendDatagram(
+            DatagramWriteMemo(NodeID(22), bytearray([2])))
+        for attempt in range(2, 4):
+            self.advance(self.service.replyTimeout)  # no reply
+            self.advance(self.service.backoffMax)  # backoff
+            self.assertEqual(len(LinkMockLayer.sentMessages), attempt)
+            self.assertEqual(LinkMockLayer.sentMessages[-1].data,
+                             bytearray([1]))
+        self.advance(self.service.replyTimeout)
+        self.assertEqual(failed, [memo])
+        self.assertTrue(memo.timedOut)
+        self.assertEqual(memo.retries, 2)
+        self.assertEqual(LinkMockLayer.sentMessages[-1].data,
+                         bytearray([2]))  # the next one is not stalled
+
+    def testTemporaryRejectionIsRetried(self):
+        self.useClock()
+        self.service.sendDatagram(
+            DatagramWriteMemo(NodeID(22), bytearray([1]),
+                              self.writeCallBackCheck))
+        self.service.process(Message(MTI.Datagram_Rejected, NodeID(22),
+                                     NodeID(12), bytearray([0x20, 0x20])))
+        self.assertEqual(len(LinkMockLayer.sentMessages), 1)
+        self.assertEqual(self.service.inFlight(NodeID(22)).retries, 1)
+        self.advance(self.service.backoffBase)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 2)
+        self.service.process(
+            Message(MTI.Datagram_Received_OK, NodeID(22), NodeID(12)))
+        self.assertTrue(self.callback)
+
+    def testPermanentRejectionIsNotRetried(self):
+        self.useClock()
+        rejected = []
+        self.service.sendDatagram(
+            DatagramWriteMemo(NodeID(22), bytearray([1]),
+                              rejectedReply=rejected.append))
+        self.service.process(Message(MTI.Datagram_Rejected, NodeID(22),
+                                     NodeID(12), bytearray([0x10, 0x42])))
+        self.assertEqual(len(rejected), 1)
+        self.assertFalse(rejected[0].timedOut)
+        self.assertEqual(rejected[0].retries, 0)
+
+    def testLateReplyDuringBackoff(self):
+        self.useClock()
+        self.service.sendDatagram(
+            DatagramWriteMemo(NodeID(22), bytearray([1]),
+                              self.writeCallBackCheck))
+        self.advance(self.service.replyTimeout)
+        self.service.process(
+            Message(MTI.Datagram_Received_OK, NodeID(22), NodeID(12)))
+        self.assertTrue(self.callback)
+        self.advance(self.service.backoffMax)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 1)  # no resend
+        self.assertEqual(len(self.service.scheduler), 0)
+
+    def testBackoffIsJitteredExponential(self):
+        self.service.backoffBase = .1
+        self.service.backoffMax = .3
+        for retry, delay in ((1, .1), (2, .2), (3, .3), (8, .3)):
+            for _ in range(20):
+                backoff = self.service.backoff(retry)
+                self.assertGreaterEqual(backoff, delay / 2)
+                self.assertLessEqual(backoff, delay)
+
+    def testRetryMetrics(self):
+        metrics = enableMetrics(MetricsRegistry()).stackMetrics()
+        try:
+            self.service = DatagramService(
+                LinkMockLayer(MockPhysicalLayer(), NodeID(12)))
+        finally:
+            disableMetrics()
+        self.useClock()
+        self.service.sendDatagram(
+            DatagramWriteMemo(NodeID(22), bytearray([1])))
+        self.advance(self.service.replyTimeout)
+        self.service.process(Message(MTI.Datagram_Rejected, NodeID(22),
+                                     NodeID(12), bytearray([0x20, 0x20])))
+        self.assertEqual(metrics.datagramReplies.value("timeout"), 1)
+        self.assertEqual(metrics.datagramRetries.value("timeout"), 1)
+        self.assertEqual(metrics.datagramRetries.value("temporary"), 1)
+        # ^ a late reply (during backoff) still matches the datagram
+        self.assertEqual(self.service.inFlight(NodeID(22)).retries, 2)
+
+    def testSendFuture(self):
+        okFuture = self.service.send(NodeID(22), bytearray([0x20, 0x42]))
+        rejectedFuture = self.service.send(NodeID(22), bytearray([0x20]))
+        self.assertFalse(okFuture.done())
+        self.service.process(
+            Message(MTI.Datagram_Received_OK, NodeID(22), NodeID(12)))
+        self.assertEqual(okFuture.result(0).data, bytearray([0x20, 0x42]))
+        self.service.process(Message(MTI.Datagram_Rejected, NodeID(22),
+                                     NodeID(12), bytearray([0x10, 0x42])))
+        with self.assertRaises(OperationError) as context:
+            rejectedFuture.result(0)
+        self.assertEqual(context.exception.errorCode, 0x1042)
+
+    def testSendFutureTimeoutAndCancel(self):
+        now = [0.0]
+        self.service.scheduler = Scheduler(clock=lambda: now[0])
+        first = self.service.send(NodeID(22), bytearray([1]), timeout=1.0)
+        second = self.service.send(NodeID(22), bytearray([2]), timeout=1.0)
+        third = self.service.send(NodeID(22), bytearray([3]))
+        self.assertTrue(third.cancel())
+        self.service.scheduler.runDue()
+        self.assertEqual(len(self.service.pendingWriteMemos), 2)
+        now[0] = 2.0
+        self.service.scheduler.runDue()  # time out, then withdraw
+        self.service.scheduler.runDue()
+        for future in (first, second):
+            self.assertRaises(TimeoutError, future.result, 0)
+        self.assertEqual(len(self.service.pendingWriteMemos), 1)
+        # ^ the first was sent so it still awaits a reply
+        self.assertEqual(len(LinkMockLayer.sentMessages), 1)
+
+    def testSendTimeoutRequiresScheduler(self):
+        self.assertIsNone(self.service.scheduler)  # LinkMockLayer has none
+        with self.assertRaises(ValueError):
+            self.service.send(NodeID(22), bytearray([1]), timeout=1.0)
+
+    def testSendAsync(self):
+        async def main():
+            task = asyncio.ensure_future(
+                self.service.sendAsync(NodeID(22), bytearray([1])))
+            await asyncio.sleep(0)
+            self.service.process(
+                Message(MTI.Datagram_Received_OK, NodeID(22), NodeID(12)))
+            return await asyncio.wait_for(task, 1.0)
+        self.assertEqual(asyncio.run(main()).destID, NodeID(22))
+
+    def testGatherFutures(self):
+        futures = [self.service.send(NodeID(22), bytearray([index]))
+                   for index in range(3)]
+        message = Message(MTI.Datagram_Received_OK, NodeID(22), NodeID(12))
+        for _ in futures:
+            self.service.process(message)
+        done, notDone = concurrent.futures.wait(futures, timeout=0)
+        self.assertEqual(len(done), 3)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 3)
+
     def testEnum(self):
         usedValues = set()
         # ensure values are unique:
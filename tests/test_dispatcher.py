@@ -0,0 +1,159 @@
+import threading
+import time
+import unittest
+
+from openlcb.canbus.canframe import CanFrame
+from openlcb.canbus.canlink import CanLink
+from openlcb.canbus.canphysicallayergridconnect import (
+    CanPhysicalLayerGridConnect
+)
+from openlcb.dispatcher import DispatchPolicy, Dispatcher, sourceKey
+from openlcb.message import Message
+from openlcb.metrics import MetricsRegistry, disableMetrics, enableMetrics
+from openlcb.mti import MTI
+from openlcb.nodeid import NodeID
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+
+
+def event(source: int, index: int) -> Message:
+    return Message(MTI.Producer_Consumer_Event_Report, NodeID(source), None,
+                   bytearray([index]))
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = Dispatcher(workers=3)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.dispatcher.close(2.0)
+
+    def blockedListener(self, message):
+        self.release.wait(2.0)
+
+    def testSourceKey(self):
+        self.assertEqual(sourceKey(event(5, 0)), NodeID(5))
+        self.assertEqual(sourceKey(CanFrame(0x19170365, bytearray())),
+                         0x365)
+        self.assertIsNone(sourceKey(object()))
+
+    def testOrderPerSource(self):
+        received = {}
+
+        def listener(message):
+            time.sleep(.0005 * (int(message.source.value) % 3))
+            received.setdefault(message.source, []).append(message.data[0])
+        deferred = self.dispatcher.deferred(listener)
+        for index in range(50):
+            for source in range(1, 6):
+                deferred(event(source, index))
+        self.assertTrue(self.dispatcher.drain(5.0))
+        self.assertEqual(len(received), 5)
+        for values in received.values():
+            self.assertEqual(values, list(range(50)))
+        self.assertEqual(deferred.depth, 0)
+
+    def testSlowListenerDoesNotStallReceive(self):
+        physicalLayer = CanPhysicalLayerGridConnect()
+        canLink = CanLink(physicalLayer, LOCAL_NODE_ID)
+        canLink._state = CanLink.State.Permitted
+        inline = []
+        deferred = canLink.registerMessageReceivedListener(
+            self.blockedListener, dispatcher=self.dispatcher)
+        canLink.registerMessageReceivedListener(inline.append)
+        start = time.monotonic()
+        for _ in range(3):
+            physicalLayer.handleData(b":X19170365N0101010103010000;")
+        self.assertLess(time.monotonic() - start, .5)
+        self.assertEqual(len(inline), 3)
+        self.assertEqual(deferred.depth, 3)
+        self.assertEqual(self.dispatcher.depths(),
+                         {"DispatcherTest.blockedListener": 3})
+        self.release.set()
+        self.assertTrue(self.dispatcher.drain(2.0))
+
+    def testDropNewest(self):
+        deferred = self.dispatcher.deferred(
+            self.blockedListener, maxDepth=2,
+            policy=DispatchPolicy.DropNewest)
+        for index in range(5):
+            deferred(event(1, index))
+        self.assertEqual(deferred.depth, 2)
+        self.assertEqual(deferred.dropped, 3)
+
+    def testDropOldest(self):
+        received = []
+        started = threading.Event()
+
+        def listener(message):
+            started.set()
+            self.release.wait(2.0)
+            received.append(message.data[0])
+        deferred = self.dispatcher.deferred(
+            listener, maxDepth=2, policy=DispatchPolicy.DropOldest)
+        deferred(event(1, 0))
+        self.assertTrue(started.wait(2.0))  # 0 is running (not droppable)
+        for index in range(1, 5):
+            deferred(event(1, index))
+        self.assertEqual(deferred.dropped, 3)
+        self.release.set()
+        self.assertTrue(self.dispatcher.drain(2.0))
+        self.assertEqual(received, [0, 4])
+        self.assertEqual(deferred.maxDepthSeen, 2)
+
+    def testBlockAppliesBackpressure(self):
+        deferred = self.dispatcher.deferred(self.blockedListener,
+                                            maxDepth=1)
+        deferred(event(1, 0))
+        threading.Timer(.05, self.release.set).start()
+        start = time.monotonic()
+        deferred(event(1, 1))  # waits for room
+        self.assertGreaterEqual(time.monotonic() - start, .04)
+        self.assertTrue(self.dispatcher.drain(2.0))
+
+    def testListenerErrorIsLogged(self):
+        def failing(message):
+            raise ValueError("failed on purpose")
+        deferred = self.dispatcher.deferred(failing)
+        with self.assertLogs("openlcb.dispatcher", "ERROR"):
+            deferred(event(1, 0))
+            self.assertTrue(self.dispatcher.drain(2.0))
+        self.assertEqual(deferred.depth, 0)
+
+    def testClosed(self):
+        deferred = self.dispatcher.deferred(lambda message: None)
+        self.dispatcher.close(2.0)
+        with self.assertRaises(RuntimeError):
+            deferred(event(1, 0))
+
+
+class DispatcherMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.metrics = enableMetrics(self.registry).stackMetrics()
+
+    def tearDown(self):
+        disableMetrics()
+
+    def testDepthAndDrops(self):
+        release = threading.Event()
+        dispatcher = Dispatcher()
+        try:
+            deferred = dispatcher.deferred(
+                lambda message: release.wait(2.0), maxDepth=1,
+                policy=DispatchPolicy.DropNewest, name="slow")
+            deferred(event(1, 0))
+            deferred(event(1, 1))
+            self.assertEqual(self.metrics.dispatchQueueDepth.value(), 1)
+            self.assertEqual(self.metrics.dispatchDropped.value("slow"), 1)
+        finally:
+            release.set()
+            dispatcher.close(2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from openlcb.canbus.canframe import CanFrame
+from openlcb.canbus.canphysicallayergridconnect import (
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.canbus.framebatch import FrameBatch
+
+
+class TestFrameBatchClass(unittest.TestCase):
+
+    def testAppendAndFrame(self):
+        batch = FrameBatch(timestamps=True)
+        batch.append(0x19490365, b"", timestamp=1.5)
+        batch.append(0x19170365, bytearray([1, 2, 3]), timestamp=2.5)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(list(batch.offsets), [0, 0])
+        self.assertEqual(list(batch.lengths), [0, 3])
+        self.assertEqual(list(batch.timestamps), [1.5, 2.5])
+        self.assertEqual(batch.frame(1),
+                         CanFrame(0x19170365, bytearray([1, 2, 3])))
+        batch.clear()
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(len(batch.payload), 0)
+
+    def testDecodeBatchMatchesHandleData(self):
+        stream = (b":X19490365N;\n"
+                  b":X19170365N020112FE056C;\n"
+                  b":X195B4123N0102030405060708;\n"
+                  b":X1A123")
+        frames = []
+        gc = CanPhysicalLayerGridConnect()
+        gc.onFrameReceived = frames.append
+        gc.handleData(stream)
+
+        decoder = CanPhysicalLayerGridConnect()
+        batch = decoder.decodeBatch(stream, timestamp=10.0)
+        self.assertEqual(list(batch), frames)
+        self.assertEqual(list(batch.timestamps), [10.0] * 3)
+        self.assertEqual(list(batch.offsets), [0, 0, 6])
+
+        # The partial packet is completed by the next call:
+        decoder.decodeBatch(b"456N20;", batch=batch, timestamp=11.0)
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(batch.headers[3], 0x1A123456)
+        self.assertEqual(batch.data(3), bytearray([0x20]))
+        self.assertEqual(batch.offsets[3], 14)
+
+    def testDecodeBatchLowercaseAndInvalidHex(self):
+        gc = CanPhysicalLayerGridConnect()
+        batch = gc.decodeBatch(b":X19170365N0a0b;")
+        self.assertEqual(batch.data(0), bytearray([0x0A, 0x0B]))
+        batch = gc.decodeBatch(b":X19170365N0G;")  # lenient like handleData
+        self.assertEqual(len(batch), 1)
+        self.assertIsNone(batch.timestamps)
+
+    def testFireFrameBatch(self):
+        frames = []
+        gc = CanPhysicalLayerGridConnect()
+        gc.onFrameReceived = frames.append
+        batch = gc.decodeBatch(b":X19490365N;:X19490365N01;")
+        self.assertEqual(gc.fireFrameBatch(batch), 2)
+        self.assertEqual(frames[1], CanFrame(0x19490365, bytearray([1])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import threading
+import unittest
+
+from openlcb.framequeue import FrameQueue
+
+
+class FrameQueueTest(unittest.TestCase):
+
+    def testDefaultIsFIFO(self):
+        queue = FrameQueue()
+        self.assertFalse(queue)
+        queue.extend([3, 1, 2])
+        self.assertEqual(len(queue), 3)
+        self.assertEqual(list(queue), [3, 1, 2])
+        self.assertEqual([queue.popleft() for _ in range(3)], [3, 1, 2])
+        with self.assertRaises(IndexError):
+            queue.popleft()
+
+    def testLevels(self):
+        queue = FrameQueue(3, lambda frame: frame[0])
+        frames = [(2, "a"), (1, "b"), (2, "c"), (0, "d"), (1, "e")]
+        queue.extend(frames)
+        self.assertEqual(queue.levelCount, 3)
+        self.assertEqual(queue.depth(1), 2)
+        self.assertEqual(list(queue),
+                         [(0, "d"), (1, "b"), (1, "e"), (2, "a"), (2, "c")])
+        self.assertEqual(queue.popleft(), (0, "d"))
+        queue.append((0, "f"))
+        self.assertEqual(queue.popleft(), (0, "f"))
+        self.assertEqual(queue.popleft(), (1, "b"))
+        queue.clear()
+        self.assertEqual(len(queue), 0)
+        self.assertFalse(queue)
+
+    def testAppendFromOtherThread(self):
+        queue = FrameQueue(2, lambda frame: frame % 2)
+        count = 10000
+        popped = []
+
+        def produce():
+            for frame in range(count):
+                queue.append(frame)
+        producer = threading.Thread(target=produce)
+        producer.start()
+        while producer.is_alive() or queue:
+            try:
+                popped.append(queue.popleft())
+            except IndexError:
+                pass
+        producer.join()
+        self.assertEqual(sorted(popped), list(range(count)))
+        evens = [frame for frame in popped if frame % 2 == 0]
+        self.assertEqual(evens, sorted(evens))  # FIFO within a level
+
+
+if __name__ == '__main__':
+    unittest.main()
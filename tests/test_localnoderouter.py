@@ -0,0 +1,107 @@
+import unittest
+
+from openlcb import precise_sleep
+from openlcb.canbus.canlink import CanLink
+from openlcb.canbus.canlinklayersimulation import CanLinkLayerSimulation
+from openlcb.canbus.canphysicallayersimulation import (
+    CanPhysicalLayerSimulation
+)
+from openlcb.localnode import LocalNode
+from openlcb.localnoderouter import LocalNodeRouter
+from openlcb.memoryspace import MemorySpace
+from openlcb.message import Message
+from openlcb.mti import MTI
+from openlcb.nodeid import NodeID
+from openlcb.pip import PIP
+
+
+class LocalNodeRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.physicalLayer = CanPhysicalLayerSimulation()
+        self.canLink = CanLinkLayerSimulation(self.physicalLayer,
+                                              NodeID(0x05_01_01_01_03_01))
+        self.canLink._state = CanLink.State.Permitted
+        self.remoteID = NodeID(0x09_00_00_00_00_01)
+        self.canLink.aliasToNodeID[0x123] = self.remoteID
+        self.canLink.nodeIdToAlias[self.remoteID] = 0x123
+        self.sentMessages = []
+        self.canLink.registerMessageSentListener(self.sentMessages.append)
+        self.router = LocalNodeRouter(self.canLink)
+        self.nodes = []
+        for index in range(50):
+            node = LocalNode(
+                NodeID(0x05_01_01_01_04_00 + index), self.canLink,
+                pipSet=set([PIP.DATAGRAM_PROTOCOL,
+                            PIP.MEMORY_CONFIGURATION_PROTOCOL]),
+                registerProcessor=False)
+            node.setSlice(MemorySpace.Configuration, 0,
+                          bytearray([index, 1, 2, 3]))
+            self.router.addNode(node)
+            self.nodes.append(node)
+
+    def tearDown(self):
+        self.physicalLayer.physicalLayerDown()
+
+    def reserveAliases(self):
+        self.physicalLayer.sendAll(None)  # CIDs
+        precise_sleep(CanLink.ALIAS_RESPONSE_DELAY + .05)
+        self.physicalLayer.sendAll(None)  # RIDs and AMDs
+
+    def testInitializationCompleteAfterAlias(self):
+        self.assertEqual(len(self.router), 50)
+        self.assertEqual(self.sentMessages, [])
+        self.reserveAliases()
+        sources = [msg.source for msg in self.sentMessages
+                   if msg.mti == MTI.Initialization_Complete]
+        self.assertEqual(sources, [node.id for node in self.nodes])
+        for node in self.nodes:
+            self.assertIn(node.id, self.canLink.nodeIdToAlias)
+
+    def testDatagramRoutedToDestination(self):
+        self.reserveAliases()
+        self.sentMessages.clear()
+        node = self.nodes[17]
+        route = self.router.getRoute(node.id)
+        self.assertIs(route.memoryService.memory, node)
+        # Read 4 bytes from space 0xFD at address 0
+        read = bytearray([0x20, 0x41, 0, 0, 0, 0, 4])
+        self.canLink.fireMessageReceived(
+            Message(MTI.Datagram, self.remoteID, node.id, read))
+        self.assertEqual(len(self.sentMessages), 2)
+        ok, reply = self.sentMessages
+        self.assertEqual(ok.mti, MTI.Datagram_Received_OK)
+        self.assertEqual(ok.source, node.id)
+        self.assertEqual(reply.mti, MTI.Datagram)
+        self.assertEqual(reply.source, node.id)
+        self.assertEqual(reply.destination, self.remoteID)
+        self.assertEqual(reply.data,
+                         bytearray([0x20, 0x51, 0, 0, 0, 0, 17, 1, 2, 3]))
+
+    def testUnknownDestinationIgnored(self):
+        self.reserveAliases()
+        self.sentMessages.clear()
+        self.canLink.fireMessageReceived(
+            Message(MTI.Datagram, self.remoteID, NodeID(0x05_01_01_01_05_00),
+                    bytearray([0x20, 0x41, 0, 0, 0, 0, 4])))
+        self.assertEqual(self.sentMessages, [])
+
+    def testGlobalMessageToEveryNode(self):
+        self.reserveAliases()
+        self.sentMessages.clear()
+        self.canLink.fireMessageReceived(
+            Message(MTI.Verify_NodeID_Number_Global, self.remoteID, None))
+        self.assertEqual([msg.source for msg in self.sentMessages],
+                         [node.id for node in self.nodes])
+
+    def testRemoveNode(self):
+        self.reserveAliases()
+        node = self.nodes[0]
+        self.assertIsNotNone(self.router.removeNode(node.id))
+        self.assertNotIn(node.id, self.router)
+        self.assertNotIn(node.id, self.canLink.nodeIdToAlias)
+        self.assertIsNone(self.router.removeNode(node.id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import asyncio
 from collections import OrderedDict
 import os
 import struct
@@ -38,12 +39,16 @@ from openlcb.memoryservice import (  # noqa: E402
     MemoryReadMemo,
     MemoryWriteMemo,
     MemoryService,
+    TIMEOUT_ERROR_CODE,
 )
 from openlcb.datagramservice import (  # noqa: E402
     # DatagramWriteMemo,
     # DatagramReadMemo,
     DatagramService,
 )
+from openlcb.futures import OperationError  # noqa: E402
+from openlcb.scheduler import Scheduler  # noqa: E402
+from openlcb.streamservice import StreamService  # noqa: E402
 
 
 class MockPhysicalLayer(PhysicalLayer):
@@ -188,6 +193,129 @@ class TestMemoryServiceClass(unittest.TestCase):
         self.assertEqual(len(LinkMockLayer.sentMessages), 5)  # read reply datagram reply sent and next datagram sent  # noqa: E501
         self.assertEqual(len(self.returnedMemoryReadMemo), 2)  # memory read returned  # noqa: E501
 
+    def testReadFuture(self):
+        first = self.mService.read(NodeID(123), 0xFD, 0, 4)
+        second = self.mService.read(NodeID(123), 0xFD, 64, 4)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 1)
+        self.dService.process(Message(MTI.Datagram_Received_OK, NodeID(123),
+                                      NodeID(12)))
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(123), NodeID(12),
+                    bytearray([0x20, 0x51, 0, 0, 0, 0, 1, 2, 3, 4])))
+        self.assertEqual(first.result(0), bytearray([1, 2, 3, 4]))
+        self.assertFalse(second.done())
+        self.dService.process(Message(MTI.Datagram_Received_OK, NodeID(123),
+                                      NodeID(12)))
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(123), NodeID(12),
+                    bytearray([0x20, 0x59, 0, 0, 0, 64, 0x10, 0x81])))
+        with self.assertRaises(OperationError) as context:
+            second.result(0)
+        self.assertEqual(context.exception.errorCode, 0x1081)
+
+    def testReadFutureCanceledBeforeSend(self):
+        self.dService.scheduler = Scheduler()
+        first = self.mService.read(NodeID(123), 0xFD, 0, 4)
+        second = self.mService.read(NodeID(123), 0xFD, 64, 4)
+        self.assertTrue(second.cancel())
+        self.dService.scheduler.runDue()
+        self.assertEqual(len(self.mService.readMemos), 1)
+        self.dService.process(Message(MTI.Datagram_Received_OK, NodeID(123),
+                                      NodeID(12)))
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(123), NodeID(12),
+                    bytearray([0x20, 0x51, 0, 0, 0, 0, 1, 2, 3, 4])))
+        self.assertTrue(first.done())
+        self.assertEqual(len(LinkMockLayer.sentMessages), 2)
+        # ^ read request and reply acknowledgment (no second request)
+
+    def testReadAsyncTimeout(self):
+        self.dService.scheduler = Scheduler()
+
+        async def main():
+            task = asyncio.ensure_future(
+                self.mService.readAsync(NodeID(123), 0xFD, 0, 4,
+                                        timeout=.01))
+            while not task.done():
+                await asyncio.sleep(.005)
+                self.dService.scheduler.runDue()  # (the I/O loop's job)
+            return await task
+        with self.assertRaises(TimeoutError):
+            asyncio.run(main())
+
+    def testReadsToDifferentNodesAreConcurrent(self):
+        first = self.mService.read(NodeID(123), 0xFD, 0, 4)
+        second = self.mService.read(NodeID(456), 0xFD, 0, 4)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 2)
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(456), NodeID(12),
+                    bytearray([0x20, 0x51, 0, 0, 0, 0, 5, 6])))
+        self.assertFalse(first.done())
+        self.assertEqual(second.result(0), bytearray([5, 6]))
+
+    def testReadWindowMatchesRepliesByAddress(self):
+        self.mService.readWindow = 2
+        first = self.mService.read(NodeID(123), 0xFD, 0, 4)
+        second = self.mService.read(NodeID(123), 0xFD, 64, 4)
+        third = self.mService.read(NodeID(123), 0xFD, 128, 4)
+        self.dService.process(Message(MTI.Datagram_Received_OK, NodeID(123),
+                                      NodeID(12)))
+        self.assertEqual(len(LinkMockLayer.sentMessages), 2)
+        # ^ two requests sent (the window is full)
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(123), NodeID(12),
+                    bytearray([0x20, 0x51, 0, 0, 0, 64, 7, 8])))
+        self.assertEqual(second.result(0), bytearray([7, 8]))
+        self.assertFalse(first.done())
+        self.assertEqual(len(LinkMockLayer.sentMessages), 3)
+        # ^ reply acknowledged (the third request waits for the
+        #   datagram in flight to the node)
+        self.dService.process(Message(MTI.Datagram_Received_OK, NodeID(123),
+                                      NodeID(12)))
+        self.assertEqual(LinkMockLayer.sentMessages[3].data,
+                         bytearray([0x20, 0x41, 0, 0, 0, 128, 4]))
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(123), NodeID(12),
+                    bytearray([0x20, 0x51, 0, 0, 0, 0, 1, 2])))
+        self.assertEqual(first.result(0), bytearray([1, 2]))
+        self.assertFalse(third.done())
+        self.assertEqual(len(self.mService.readMemos), 1)
+
+    def testReadOfSameAddressWaits(self):
+        self.mService.readWindow = 2
+        first = self.mService.read(NodeID(123), 0xFD, 0, 4)
+        second = self.mService.read(NodeID(123), 0xFD, 0, 4)
+        self.dService.process(Message(MTI.Datagram_Received_OK, NodeID(123),
+                                      NodeID(12)))
+        self.assertEqual(len(LinkMockLayer.sentMessages), 1)
+        # ^ a reply could not tell the two apart
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(123), NodeID(12),
+                    bytearray([0x20, 0x51, 0, 0, 0, 0, 1, 2])))
+        self.assertTrue(first.done())
+        self.assertFalse(second.done())
+        self.assertEqual(len(LinkMockLayer.sentMessages), 3)
+
+    def testReadReplyCustomSpace(self):
+        memMemo = MemoryReadMemo(NodeID(123), 4, 0xF8, 0x010203,
+                                 self.callbackR, self.callbackR)
+        self.mService.requestMemoryRead(memMemo)
+        self.assertEqual(LinkMockLayer.sentMessages[0].data,
+                         bytearray([0x20, 0x40, 0, 1, 2, 3, 0xF8, 4]))
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(123), NodeID(12),
+                    bytearray([0x20, 0x50, 0, 1, 2, 3, 0xF8, 9])))
+        self.assertEqual(self.returnedMemoryReadMemo, [memMemo])
+        self.assertEqual(memMemo.data, bytearray([9]))
+
+    def testUnmatchedReadReply(self):
+        with self.assertLogs("openlcb.memoryservice", "WARNING"):
+            self.dService.process(
+                Message(MTI.Datagram, NodeID(123), NodeID(12),
+                        bytearray([0x20, 0x51, 0, 0, 0, 0, 1, 2])))
+        self.assertEqual(len(LinkMockLayer.sentMessages), 1)
+        # ^ still acknowledged
+
     def testProtocolGroupUniqueness(self):
         """Ensure each 6-high-bit field is unique"""
         opCounts = OrderedDict()
@@ -266,5 +394,258 @@ class TestMemoryServiceClass(unittest.TestCase):
                      " so constants aren't systematized")
 
 
+class TestMemoryServiceTimeouts(unittest.TestCase):
+
+    def setUp(self):
+        LinkMockLayer.sentMessages = []
+        self.failed = []
+        self.done = []
+        self.now = 0.0
+        self.dService = DatagramService(
+            LinkMockLayer(MockPhysicalLayer(), NodeID(12)))
+        self.dService.scheduler = Scheduler(clock=lambda: self.now)
+        self.mService = MemoryService(self.dService)
+
+    def advance(self, seconds: float):
+        self.now += seconds
+        self.dService.scheduler.runDue()
+
+    def accept(self, flags: int = 0):
+        self.dService.process(Message(MTI.Datagram_Received_OK, NodeID(123),
+                                      NodeID(12), bytearray([flags])))
+
+    def readReply(self, address: int):
+        self.dService.process(
+            Message(MTI.Datagram, NodeID(123), NodeID(12),
+                    bytearray([0x20, 0x51]) + struct.pack(">I", address)
+                    + bytearray([1, 2])))
+
+    def requestRead(self, address: int) -> MemoryReadMemo:
+        memo = MemoryReadMemo(NodeID(123), 2, 0xFD, address,
+                              self.failed.append, self.done.append)
+        self.mService.requestMemoryRead(memo)
+        return memo
+
+    def requestWrite(self) -> MemoryWriteMemo:
+        memo = MemoryWriteMemo(NodeID(123), self.done.append,
+                               self.failed.append, 1, 0xFD, 0,
+                               bytearray([1]))
+        self.mService.requestMemoryWrite(memo)
+        return memo
+
+    def testReadRetriesThenFails(self):
+        self.mService.readRetries = 1
+        memo = self.requestRead(0)
+        waiting = self.requestRead(64)
+        self.accept()
+        self.advance(3.0)  # initialTimeout
+        self.assertEqual(len(LinkMockLayer.sentMessages), 2)  # resent
+        self.assertEqual(LinkMockLayer.sentMessages[1].data,
+                         LinkMockLayer.sentMessages[0].data)
+        self.accept()
+        self.advance(5.9)  # backed off to 6 seconds
+        self.assertEqual(self.failed, [])
+        self.advance(.1)
+        self.assertEqual(self.failed, [memo])
+        self.assertTrue(memo.timedOut)
+        self.assertEqual(memo.errorCode, TIMEOUT_ERROR_CODE)
+        self.assertEqual(LinkMockLayer.sentMessages[-1].data,
+                         bytearray([0x20, 0x41, 0, 0, 0, 64, 2]))
+        # ^ the next read is no longer blocked
+        self.assertEqual(self.mService.readMemos, [waiting])
+
+    def testReplyIsTimed(self):
+        self.mService.minTimeout = 0
+        self.requestRead(0)
+        self.accept()
+        self.advance(.1)
+        self.readReply(0)
+        estimator = self.mService.rttEstimator(NodeID(123))
+        self.assertEqual(estimator.samples, 1)
+        self.assertAlmostEqual(estimator.timeout, .3)
+        self.requestRead(64)
+        self.accept()
+        self.advance(.31)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 4)
+        # ^ the fast node's read was resent after .3 seconds
+
+    def testResentReadIsNotTimed(self):
+        self.requestRead(0)
+        self.accept()
+        self.advance(3.0)
+        self.accept()
+        self.advance(.1)
+        self.readReply(0)
+        self.assertEqual(len(self.done), 1)
+        self.assertEqual(self.mService.rttEstimator(NodeID(123)).samples, 0)
+
+    def testReplyPendingExtendsTimeout(self):
+        self.requestRead(0)
+        self.accept(0x80 | 3)  # reply within 8 seconds
+        self.advance(7.9)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 1)
+        self.advance(.1)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 2)
+
+    def testLateReplyIsIgnored(self):
+        self.mService.readRetries = 0
+        memo = self.requestRead(0)
+        self.accept()
+        self.advance(3.0)
+        self.assertEqual(self.failed, [memo])
+        with self.assertLogs("openlcb.memoryservice", "WARNING"):
+            self.readReply(0)
+        self.assertEqual(self.done, [])
+
+    def testReadFutureTimesOut(self):
+        self.mService.readRetries = 0
+        future = self.mService.read(NodeID(123), 0xFD, 0, 4)
+        self.accept()
+        self.advance(3.0)
+        with self.assertRaises(TimeoutError):
+            future.result(0)
+
+    def testRejectedRequestFailsRead(self):
+        memo = self.requestRead(0)
+        self.dService.process(Message(MTI.Datagram_Rejected, NodeID(123),
+                                      NodeID(12), bytearray([0x10, 0x42])))
+        self.assertEqual(self.failed, [memo])
+        self.assertEqual(memo.errorCode, 0x1042)
+        self.assertFalse(memo.timedOut)
+        self.assertEqual(self.mService.readMemos, [])
+
+    def testWriteTimesOut(self):
+        memo = self.requestWrite()
+        self.accept(0x80)
+        self.advance(3.0)
+        self.assertEqual(self.failed, [memo])
+        self.assertEqual(memo.errorCode, TIMEOUT_ERROR_CODE)
+        self.assertEqual(len(LinkMockLayer.sentMessages), 1)  # not resent
+        self.assertEqual(self.mService.writeMemos, [])
+
+    def testWriteWithoutReplyPendingSucceeds(self):
+        memo = self.requestWrite()
+        self.accept(0)
+        self.advance(3.0)
+        self.assertEqual(self.done, [memo])
+        self.assertEqual(self.failed, [])
+        self.assertEqual(self.mService.writeMemos, [])
+
+
+class WireLinkLayer(LinkMockLayer):
+    """Queue sent messages on a wire shared by every node."""
+    def __init__(self, localNodeID: NodeID, wire: list):
+        super(WireLinkLayer, self).__init__(MockPhysicalLayer(), localNodeID)
+        self.wire = wire
+
+    def sendMessage(self, msg, verbose=False):
+        self.wire.append(msg)
+
+
+class TestMemoryServiceStreams(unittest.TestCase):
+
+    def setUp(self):
+        self.wire = []
+        self.delivered = []
+        self.lost = lambda message: False  # See pump
+        self.now = 0.0
+        self.scheduler = Scheduler(clock=lambda: self.now)
+        self.client = self.makeStack(NodeID(12))
+        self.server = self.makeStack(NodeID(123))
+        self.server.memory.setSlice(0xFD, 0, bytearray(range(250)) * 2)
+        self.failed = []
+        self.done = []
+
+    def makeStack(self, nodeID: NodeID) -> MemoryService:
+        link = WireLinkLayer(nodeID, self.wire)
+        dService = DatagramService(link)
+        dService.scheduler = self.scheduler
+        sService = StreamService(link)
+        sService.scheduler = self.scheduler
+        sService.bufferSize = 128
+        return MemoryService(dService, sService)
+
+    def pump(self):
+        while self.wire:
+            message = self.wire.pop(0)
+            if self.lost(message):
+                continue
+            self.delivered.append(message)
+            for mService in (self.client, self.server):
+                mService.service.process(message)
+                mService.streamService.process(message)
+
+    def testStreamRead(self):
+        future = self.client.read(NodeID(123), 0xFD, 10, 300, stream=True)
+        self.pump()
+        self.assertEqual(future.result(0), (bytearray(range(250)) * 2)[10:310])
+        commands = [message.data[1] for message in self.delivered
+                    if message.mti == MTI.Datagram]
+        self.assertEqual(commands, [0x61, 0x71])  # one command, one reply
+        self.assertEqual(self.client.readMemos, [])
+        self.assertEqual(self.client.streamService._incoming, {})
+        self.assertEqual(self.server.streamService._outgoing, {})
+
+    def testStreamReadStopsAtEnd(self):
+        future = self.client.read(NodeID(123), 0xFD, 400, 0xFFFF, stream=True)
+        self.pump()
+        self.assertEqual(future.result(0), (bytearray(range(250)) * 2)[400:])
+
+    def testStreamReadRejected(self):
+        future = self.client.read(NodeID(123), 0xFD, 900, 8, stream=True)
+        with self.assertLogs("openlcb.memoryservice", "WARNING"):
+            self.pump()
+        with self.assertRaises(OperationError) as context:
+            future.result(0)
+        self.assertEqual(context.exception.memo.errorCode, 0x1080)
+        self.assertEqual(self.client.streamService._incoming, {})
+
+    def testStreamReadStalls(self):
+        self.lost = lambda message: \
+            message.mti == MTI.Stream_Initiate_Request
+        future = self.client.read(NodeID(123), 0xFD, 0, 64, stream=True)
+        self.pump()
+        self.now += self.client.streamService.idleTimeout
+        with self.assertLogs("openlcb.streamservice", "WARNING"):
+            self.scheduler.runDue()
+        with self.assertRaises(TimeoutError):
+            future.result(0)
+        self.assertEqual(self.client.readMemos, [])
+
+    def testStreamReadRequiresStreamService(self):
+        self.client.streamService = None
+        with self.assertRaises(ValueError):
+            self.client.read(NodeID(123), 0xFD, 0, 64, stream=True)
+
+    def testStreamWrite(self):
+        data = bytearray(range(200))
+        memo = MemoryWriteMemo(NodeID(123), self.done.append,
+                               self.failed.append, len(data), 0xFD, 20, data)
+        self.client.requestMemoryWrite(memo, stream=True)
+        self.pump()
+        self.assertEqual(self.failed, [])
+        self.assertEqual(self.done, [memo])
+        self.assertEqual(self.server.memory.getSlice(0xFD, 20, 200), data)
+        commands = [message.data[1] for message in self.delivered
+                    if message.mti == MTI.Datagram]
+        self.assertEqual(commands, [0x21, 0x31])
+        self.assertEqual(self.client.writeMemos, [])
+
+    def testStreamWriteReplyLost(self):
+        self.lost = lambda message: \
+            (message.mti == MTI.Datagram) and (message.data[1] == 0x31)
+        memo = MemoryWriteMemo(NodeID(123), self.done.append,
+                               self.failed.append, 8, 0xFD, 0, bytearray(8))
+        self.client.requestMemoryWrite(memo, stream=True)
+        self.pump()
+        self.assertEqual(self.server.memory.getSlice(0xFD, 0, 8),
+                         bytearray(8))
+        self.now += self.client.initialTimeout
+        with self.assertLogs("openlcb.memoryservice", "WARNING"):
+            self.scheduler.runDue()
+        self.assertEqual(self.failed, [memo])
+        self.assertTrue(memo.timedOut)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+from openlcb.canbus.messageaccumulator import MessageAccumulator
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class MessageAccumulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def testStartExtendPop(self):
+        acc = MessageAccumulator(clock=self.clock)
+        self.assertFalse(acc.extend("a", b"\x01"))  # never started
+        acc.start("a")
+        self.assertTrue(acc.extend("a", b"\x01\x02"))
+        self.assertTrue(acc.extend("a", bytearray([3])))
+        self.assertIn("a", acc)
+        self.assertEqual(acc.totalBytes, 3)
+        self.assertEqual(acc.pop("a"), bytearray([1, 2, 3]))
+        self.assertNotIn("a", acc)
+        self.assertEqual(acc.totalBytes, 0)
+        with self.assertRaises(KeyError):
+            acc.pop("a")
+
+    def testRestartReplaces(self):
+        acc = MessageAccumulator(clock=self.clock)
+        acc.start("a")
+        acc.extend("a", b"old")
+        acc.start("a")
+        acc.extend("a", b"new")
+        self.assertEqual(acc.totalBytes, 3)
+        self.assertEqual(acc.pop("a"), bytearray(b"new"))
+
+    def testTimeout(self):
+        acc = MessageAccumulator(timeout=3.0, clock=self.clock)
+        acc.start("a")
+        acc.extend("a", b"\x01")
+        self.clock.now = 2.0
+        acc.start("b")
+        self.assertTrue(acc.extend("b", b"\x02"))
+        self.clock.now = 3.5  # "a" is stale, "b" is not
+        self.assertEqual(acc.expire(), 1)
+        self.assertNotIn("a", acc)
+        self.assertFalse(acc.extend("a", b"\x03"))
+        self.assertTrue(acc.extend("b", b"\x03"))  # refreshes "b"
+        self.clock.now = 6.0
+        self.assertTrue(acc.extend("b", b"\x04"))
+        self.assertEqual(acc.expiredCount, 1)
+        self.assertEqual(acc.pop("b"), bytearray([2, 3, 4]))
+
+    def testMaxEntriesEvictsLeastRecentlyUsed(self):
+        acc = MessageAccumulator(maxEntries=2, clock=self.clock)
+        acc.start("a")
+        acc.start("b")
+        acc.extend("a", b"\x01")  # "b" is now least recently used
+        acc.start("c")
+        self.assertEqual(len(acc), 2)
+        self.assertIn("a", acc)
+        self.assertNotIn("b", acc)
+        self.assertEqual(acc.evictedCount, 1)
+
+    def testMaxBytes(self):
+        acc = MessageAccumulator(maxBytes=10, clock=self.clock)
+        acc.start("a")
+        acc.extend("a", bytes(6))
+        acc.start("b")
+        acc.extend("b", bytes(6))  # over maxBytes, so "a" is evicted
+        self.assertNotIn("a", acc)
+        self.assertEqual(acc.totalBytes, 6)
+        self.assertEqual(acc.evictedCount, 1)
+
+    def testMaxMessageBytes(self):
+        acc = MessageAccumulator(maxMessageBytes=8, clock=self.clock)
+        acc.start("a")
+        self.assertTrue(acc.extend("a", bytes(8)))
+        self.assertFalse(acc.extend("a", bytes(1)))
+        self.assertNotIn("a", acc)
+        self.assertEqual(acc.overflowCount, 1)
+        self.assertEqual(acc.totalBytes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import urllib.request
+
+from openlcb.canbus.canlink import CanLink
+from openlcb.canbus.canphysicallayergridconnect import (
+    CanPhysicalLayerGridConnect
+)
+from openlcb.canbus.canphysicallayersimulation import (
+    CanPhysicalLayerSimulation
+)
+from openlcb.datagramservice import DatagramService, DatagramWriteMemo
+from openlcb.memoryservice import MemoryReadMemo, MemoryService
+from openlcb.message import Message
+from openlcb.metrics import (
+    MetricsRegistry,
+    disableMetrics,
+    enableMetrics,
+    getRegistry,
+    stackMetrics,
+)
+from openlcb.mti import MTI
+from openlcb.nodeid import NodeID
+
+LOCAL_NODE_ID = NodeID("05.01.01.01.03.01")
+FAR_NODE_ID = NodeID("09.00.99.03.00.35")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def testCounter(self):
+        counter = self.registry.counter("frames_total", "Frames.", "type")
+        self.assertIs(self.registry.counter("frames_total", "Frames.",
+                                            "type"), counter)
+        counter.inc("AMD")
+        counter.inc("AMD")
+        counter.inc("Data", 3)
+        self.assertEqual(counter.value("AMD"), 2)
+        self.assertEqual(counter.value("CID"), 0)
+        self.assertEqual(self.registry.snapshot(),
+                         {"frames_total": {"AMD": 2, "Data": 3}})
+        with self.assertRaises(ValueError):
+            self.registry.gauge("frames_total", "Not a counter.")
+
+    def testGaugeSources(self):
+        class Queue:
+            def depth(self):
+                return 3
+        gauge = self.registry.gauge("depth", "Depth.")
+        queue = Queue()
+        gauge.addMethodSource(queue, "depth")
+        gauge.addSource(lambda: 2)
+        self.assertEqual(gauge.value(), 5)
+        del queue
+        self.assertEqual(gauge.value(), 2)  # collected source dropped
+
+    def testHistogram(self):
+        histogram = self.registry.histogram("latency_seconds", "Latency.",
+                                            (.1, 1))
+        for value in (.05, .1, .5, 2):
+            histogram.observe(value)
+        self.assertEqual(histogram.snapshot(), {
+            "count": 4,
+            "sum": 2.65,
+            "buckets": {"0.1": 2, "1": 3, "+Inf": 4},
+        })
+
+    def testExportText(self):
+        self.registry.counter("a_total", "A.").inc()
+        self.registry.counter("b_total", "B.", "mti").inc('Say "hi"')
+        self.registry.histogram("c_seconds", "C.", (.5,)).observe(.25)
+        self.assertEqual(self.registry.exportText(), "\n".join([
+            "# HELP a_total A.",
+            "# TYPE a_total counter",
+            "a_total 1",
+            "# HELP b_total B.",
+            "# TYPE b_total counter",
+            'b_total{mti="Say \\"hi\\""} 1',
+            "# HELP c_seconds C.",
+            "# TYPE c_seconds histogram",
+            'c_seconds_bucket{le="0.5"} 1',
+            'c_seconds_bucket{le="+Inf"} 1',
+            "c_seconds_sum 0.25",
+            "c_seconds_count 1",
+        ]) + "\n")
+
+    def testServe(self):
+        self.registry.counter("a_total", "A.").inc()
+        server = self.registry.serve(port=0)
+        try:
+            host, port = server.server_address[:2]
+            with urllib.request.urlopen(
+                    "http://{}:{}/metrics".format(host, port),
+                    timeout=5) as response:
+                body = response.read().decode("utf-8")
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn("a_total 1\n", body)
+
+
+class StackMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = enableMetrics(MetricsRegistry())
+        self.metrics = self.registry.stackMetrics()
+
+    def tearDown(self):
+        disableMetrics()
+
+    def testDisabled(self):
+        disableMetrics()
+        self.assertIsNone(getRegistry())
+        self.assertIsNone(stackMetrics())
+        self.assertIsNone(CanPhysicalLayerGridConnect().metrics)
+
+    def testCanLinkReceive(self):
+        physicalLayer = CanPhysicalLayerGridConnect()
+        canLink = CanLink(physicalLayer, LOCAL_NODE_ID)
+        self.assertIs(canLink.metrics, self.metrics)
+        physicalLayer.handleData(b":X10701365N090099030035;"  # AMD
+                                 b":X107;"  # too short
+                                 b":X1B123365N2041000000;")  # first frame
+        self.assertEqual(self.metrics.framesReceived.value("AMD"), 1)
+        self.assertEqual(self.metrics.framesReceived.value("Data"), 1)
+        self.assertEqual(self.metrics.parseErrors.value("gridconnect"), 1)
+        self.assertEqual(self.metrics.accumulatorBytes.value(), 5)
+        self.assertEqual(self.metrics.sendQueueDepth.value(),
+                         physicalLayer.queueDepth())
+
+    def testCanLinkSend(self):
+        physicalLayer = CanPhysicalLayerSimulation()
+        canLink = CanLink(physicalLayer, LOCAL_NODE_ID)
+        canLink._state = CanLink.State.Permitted  # skip alias reservation
+        canLink.nodeIdToAlias[LOCAL_NODE_ID] = canLink._localAlias
+        canLink.sendMessage(Message(MTI.Producer_Consumer_Event_Report,
+                                    LOCAL_NODE_ID, None, bytearray(8)))
+        physicalLayer.sendAll(None)
+        self.assertEqual(
+            self.metrics.messagesSent.value("Producer_Consumer_Event_Report"),
+            1)
+        self.assertEqual(self.metrics.framesSent.value("Data"), 1)
+
+    def testDatagramAndMemoryRead(self):
+        clock = FakeClock()
+        self.metrics.clock = clock
+        sent = []
+        canLink = CanLink(CanPhysicalLayerSimulation(), LOCAL_NODE_ID)
+        canLink.sendMessage = lambda msg, verbose=False: sent.append(msg)
+        datagramService = DatagramService(canLink)
+        memoryService = MemoryService(datagramService)
+        memoryService.requestMemoryRead(MemoryReadMemo(
+            FAR_NODE_ID, 4, 0xFD, 0, lambda memo: None, lambda memo: None))
+        datagramService.process(Message(MTI.Datagram_Received_OK,
+                                        FAR_NODE_ID, LOCAL_NODE_ID))
+        clock.now = .02
+        datagramService.process(Message(
+            MTI.Datagram, FAR_NODE_ID, LOCAL_NODE_ID,
+            bytearray([0x20, 0x51, 0, 0, 0, 0, 1, 2, 3, 4])))
+        datagramService.sendDatagram(DatagramWriteMemo(FAR_NODE_ID,
+                                                       bytearray([0x20])))
+        datagramService.process(Message(MTI.Datagram_Rejected,
+                                        FAR_NODE_ID, LOCAL_NODE_ID,
+                                        bytearray([0x10, 0x00])))
+        self.assertEqual(self.metrics.datagramsSent.value(), 2)
+        self.assertEqual(self.metrics.datagramsReceived.value(), 1)
+        self.assertEqual(self.metrics.datagramReplies.value("ok"), 1)
+        self.assertEqual(self.metrics.datagramReplies.value("rejected"), 1)
+        latency = self.metrics.memoryReadLatency
+        self.assertEqual(latency.count, 1)
+        self.assertAlmostEqual(latency.sum, .02)
+        self.assertEqual(
+            self.registry.snapshot()["openlcb_memory_read_latency_seconds"]
+            ["buckets"]["0.025"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
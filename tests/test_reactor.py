@@ -0,0 +1,117 @@
+import socket
+import threading
+import time
+import unittest
+
+from openlcb.canbus.canlink import CanLink
+from openlcb.canbus.canphysicallayergridconnect import (
+    CanPhysicalLayerGridConnect
+)
+from openlcb.message import Message
+from openlcb.mti import MTI
+from openlcb.nodeid import NodeID
+from openlcb.reactor import Reactor
+from openlcb.tcplink.tcpsocket import TcpSocket
+
+
+class Segment:
+    """A CanLink on one end of a socketpair (far is the bus side)."""
+    def __init__(self, reactor: Reactor, index: int):
+        near, self.far = socket.socketpair()
+        near.setblocking(False)
+        self.port = TcpSocket()
+        self.port._device = near
+        self.port._open = True
+        self.physicalLayer = CanPhysicalLayerGridConnect()
+        self.canLink = CanLink(self.physicalLayer,
+                               NodeID(0x05_01_01_01_03_00 + index),
+                               scheduler=reactor.scheduler)
+        self.received = bytearray()
+
+    def has(self, token: bytes) -> bool:
+        """Receive what the far end has so far and look for token."""
+        try:
+            self.received += self.far.recv(4096, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            pass
+        return token in self.received
+
+    def close(self):
+        self.port.close()
+        self.far.close()
+
+
+class ReactorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor = Reactor()
+        self.segments = [Segment(self.reactor, index) for index in range(3)]
+
+    def tearDown(self):
+        self.reactor.close()
+        for segment in self.segments:
+            segment.close()
+
+    def runUntil(self, condition, timeout=2.0):
+        start = time.monotonic()
+        while not condition():
+            if time.monotonic() - start > timeout:
+                self.fail("timed out")
+            self.reactor.runOnce(.05)
+
+    def permitted(self):
+        return all(segment.canLink.getState() == CanLink.State.Permitted
+                   for segment in self.segments)
+
+    def testAliasReservationOnAllPorts(self):
+        for segment in self.segments:
+            self.reactor.addPort(segment.port, segment.physicalLayer)
+        self.assertEqual(len(self.reactor), 3)
+        start = time.monotonic()
+        self.runUntil(self.permitted)
+        self.assertLess(time.monotonic() - start, 1.0)  # in parallel
+        for segment in self.segments:
+            self.runUntil(lambda: segment.has(b":X10701"))  # AMD
+            self.assertIn(b":X17", segment.received)  # CID 7
+
+    def testReplyAndCrossThreadSend(self):
+        for segment in self.segments:
+            self.reactor.addPort(segment.port, segment.physicalLayer)
+        self.runUntil(self.permitted)
+        segment = self.segments[1]
+        self.runUntil(lambda: segment.has(b":X10702"))  # AME after AMD
+        segment.received.clear()
+        segment.far.sendall(b":X10702123N;")  # global AME
+        self.runUntil(lambda: segment.has(b":X10701"))  # AMD reply
+
+        thread = threading.Thread(target=self.reactor.run)
+        thread.start()
+        try:
+            time.sleep(.05)  # let the loop block in select
+            segment.received.clear()
+            segment.canLink.sendMessage(Message(
+                MTI.Producer_Consumer_Event_Report,
+                segment.canLink.localNodeID, None, bytearray(8)))
+            start = time.monotonic()
+            while not segment.has(b":X195B4"):
+                self.assertLess(time.monotonic() - start, 2.0)
+                time.sleep(.001)
+        finally:
+            self.reactor.stop()
+            thread.join(2.0)
+        self.assertFalse(thread.is_alive())
+
+    def testClosedPortIsRemoved(self):
+        closed = []
+        self.reactor.onPortClosed = lambda port, error: closed.append(port)
+        segment = self.segments[0]
+        self.reactor.addPort(segment.port, segment.physicalLayer)
+        segment.far.close()
+        self.runUntil(lambda: closed)
+        self.assertEqual(closed, [segment.port])
+        self.assertEqual(len(self.reactor), 0)
+        self.assertIsNone(segment.physicalLayer.onQueuedFrame)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from openlcb.rttestimator import RttEstimator
+
+
+class RttEstimatorTest(unittest.TestCase):
+
+    def testInitialTimeout(self):
+        estimator = RttEstimator(initialTimeout=3.0)
+        self.assertEqual(estimator.timeout, 3.0)
+        self.assertIsNone(estimator.srtt)
+
+    def testFirstSample(self):
+        estimator = RttEstimator(minTimeout=0)
+        estimator.observe(.1)
+        self.assertAlmostEqual(estimator.srtt, .1)
+        self.assertAlmostEqual(estimator.rttvar, .05)
+        self.assertAlmostEqual(estimator.timeout, .3)  # .1 + 4 * .05
+
+    def testSmoothing(self):
+        estimator = RttEstimator(minTimeout=0)
+        estimator.observe(.1)
+        estimator.observe(.2)
+        self.assertAlmostEqual(estimator.rttvar, .75 * .05 + .25 * .1)
+        self.assertAlmostEqual(estimator.srtt, .875 * .1 + .125 * .2)
+        self.assertEqual(estimator.samples, 2)
+
+    def testSlowNodeGetsLongerTimeout(self):
+        fast = RttEstimator(minTimeout=0)
+        slow = RttEstimator(minTimeout=0)
+        for _ in range(20):
+            fast.observe(.02)
+            slow.observe(.8)
+        self.assertLess(fast.timeout, .1)
+        self.assertGreater(slow.timeout, .8)
+
+    def testLimits(self):
+        estimator = RttEstimator(minTimeout=.5, maxTimeout=4.0)
+        estimator.observe(.01)
+        self.assertEqual(estimator.timeout, .5)
+        for _ in range(5):
+            estimator.backoff()
+        self.assertEqual(estimator.timeout, 4.0)
+
+    def testBackoffDoubles(self):
+        estimator = RttEstimator(initialTimeout=1.0)
+        estimator.backoff()
+        self.assertEqual(estimator.timeout, 2.0)
+        estimator.observe(1.0)  # a new sample replaces the backoff
+        self.assertAlmostEqual(estimator.timeout, 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
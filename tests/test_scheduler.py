@@ -0,0 +1,105 @@
+import socket
+import unittest
+
+from openlcb.canbus.canlink import CanLink
+from openlcb.canbus.canphysicallayersimulation import (
+    CanPhysicalLayerSimulation
+)
+from openlcb.nodeid import NodeID
+from openlcb.scheduler import Scheduler
+from openlcb.tcplink.tcpsocket import TcpSocket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = Scheduler(clock=self.clock)
+        self.calls = []
+
+    def testRunDueInDeadlineOrder(self):
+        self.scheduler.callLater(.3, lambda: self.calls.append("c"))
+        self.scheduler.callLater(.1, lambda: self.calls.append("a"))
+        self.scheduler.callLater(.1, lambda: self.calls.append("b"))
+        self.assertEqual(self.scheduler.nextDeadline(), .1)
+        self.assertAlmostEqual(self.scheduler.timeUntilNext(), .1)
+        self.assertEqual(self.scheduler.runDue(), 0)
+        self.clock.now = .2
+        self.assertEqual(self.scheduler.runDue(), 2)
+        self.assertEqual(self.calls, ["a", "b"])  # FIFO at equal deadline
+        self.assertAlmostEqual(self.scheduler.timeUntilNext(), .1)
+        self.clock.now = 1.0
+        self.assertEqual(self.scheduler.timeUntilNext(), 0.0)
+        self.scheduler.runDue()
+        self.assertEqual(self.calls, ["a", "b", "c"])
+        self.assertIsNone(self.scheduler.timeUntilNext())
+
+    def testCancel(self):
+        timer = self.scheduler.callAt(1.0, lambda: self.calls.append("x"))
+        self.scheduler.callAt(2.0, lambda: self.calls.append("y"))
+        timer.cancel()
+        self.assertEqual(self.scheduler.nextDeadline(), 2.0)
+        self.clock.now = 5.0
+        self.assertEqual(self.scheduler.runDue(), 1)
+        self.assertEqual(self.calls, ["y"])
+
+    def testCallbackSchedulesDueTimer(self):
+        def first():
+            self.calls.append(1)
+            self.scheduler.callLater(0, lambda: self.calls.append(2))
+        self.scheduler.callLater(0, first)
+        self.assertEqual(self.scheduler.runDue(), 2)
+        self.assertEqual(self.calls, [1, 2])
+
+    def testClear(self):
+        self.scheduler.callLater(0, lambda: self.calls.append(1))
+        self.scheduler.clear()
+        self.assertEqual(len(self.scheduler), 0)
+        self.assertEqual(self.scheduler.runDue(), 0)
+
+    def testCanLinkAliasWaitIsTimed(self):
+        physicalLayer = CanPhysicalLayerSimulation()
+        canLink = CanLink(physicalLayer, NodeID("05.01.01.01.03.01"),
+                          scheduler=self.scheduler)
+        physicalLayer.physicalLayerUp()
+        physicalLayer.sendAll(None)  # CIDs
+        self.assertEqual(canLink._state, CanLink.State.WaitForAliases)
+        self.assertAlmostEqual(self.scheduler.timeUntilNext(),
+                               CanLink.ALIAS_RESPONSE_DELAY)
+        self.clock.now = CanLink.ALIAS_RESPONSE_DELAY / 2
+        canLink.pollState()
+        self.assertEqual(canLink._state, CanLink.State.WaitForAliases)
+        self.clock.now = CanLink.ALIAS_RESPONSE_DELAY
+        self.scheduler.runDue()  # enqueues RID and AMD
+        physicalLayer.sendAll(None)
+        self.assertEqual(canLink._state, CanLink.State.Permitted)
+        self.assertIsNone(self.scheduler.timeUntilNext())
+
+
+class WaitReadableTest(unittest.TestCase):
+
+    def testSocketWaitReadable(self):
+        near, far = socket.socketpair()
+        try:
+            port = TcpSocket()
+            port._device = near
+            near.setblocking(False)
+            self.assertFalse(port.waitReadable(0))
+            far.sendall(b":X19170365N;")
+            self.assertTrue(port.waitReadable(1.0))
+            self.assertEqual(port.receive(), b":X19170365N;")
+        finally:
+            near.close()
+            far.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
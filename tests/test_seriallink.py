@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+import unittest
+
+try:
+    from openlcb.canbus.seriallink import SerialLink
+except ImportError:  # pyserial is not installed
+    SerialLink = None
+
+from openlcb.canbus.canframe import CanFrame
+from openlcb.canbus.canphysicallayergridconnect import (
+    CanPhysicalLayerGridConnect,
+)
+from openlcb.waker import Waker
+
+FRAMES = b":X19490365N;\n:X19170365N020112FE056C;\n:X19170365N01;\n"
+
+
+@unittest.skipIf(SerialLink is None or not hasattr(os, "openpty"),
+                 "requires pyserial and a pty (Linux/macOS)")
+class SerialLinkPtyTest(unittest.TestCase):
+    def setUp(self):
+        self.master, slave = os.openpty()
+        self.link = SerialLink()
+        self.link.connectLocal(os.ttyname(slave))
+        os.close(slave)  # the port opened its own file descriptor
+        self.receivedFrames = []
+        self.gc = CanPhysicalLayerGridConnect()
+        self.gc.onFrameReceived = self.receivedFrames.append
+
+    def tearDown(self):
+        self.link.close()
+        os.close(self.master)
+
+    def waitForFrames(self, count, receive):
+        deadline = time.monotonic() + 2
+        while ((len(self.receivedFrames) < count)
+               and (time.monotonic() < deadline)):
+            receive()
+            time.sleep(.001)
+
+    def testReceiveGetsAllWaiting(self):
+        os.write(self.master, FRAMES)
+        time.sleep(.05)  # let the pty deliver everything
+        data = self.link.receive()
+        self.assertEqual(bytes(data), FRAMES)  # one read, not one per byte
+
+    def testReceiveAll(self):
+        os.write(self.master, FRAMES)
+        self.waitForFrames(3, lambda: self.gc.receiveAll(self.link))
+        self.assertEqual(self.receivedFrames[1],
+                         CanFrame(0x19170365,
+                                  bytearray([2, 1, 0x12, 0xFE, 5, 0x6C])))
+        self.assertEqual(len(self.receivedFrames), 3)
+
+    def testReaderThread(self):
+        self.link.startReader()
+        self.assertIsNone(self.link.receive())  # non-blocking
+        os.write(self.master, FRAMES)
+        self.waitForFrames(3, lambda: self.gc.receiveAll(self.link))
+        self.assertEqual(len(self.receivedFrames), 3)
+        self.link.stopReader()
+
+    def testReaderThreadWaitWithWaker(self):
+        self.link.startReader()
+        waker = Waker()
+        try:
+            self.assertFalse(self.link.waitReadable(.01, waker))
+            threading.Timer(.01, waker.wakeup).start()
+            self.assertTrue(self.link.waitReadable(1.0, waker))
+            self.assertTrue(waker.clear())
+            os.write(self.master, FRAMES)
+            self.assertTrue(self.link.waitReadable(1.0, waker))
+            self.waitForFrames(3, lambda: self.gc.receiveAll(self.link))
+            self.assertEqual(len(self.receivedFrames), 3)
+        finally:
+            waker.close()
+            self.link.stopReader()
+
+
+if __name__ == '__main__':
+    unittest.main()
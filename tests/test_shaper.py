@@ -0,0 +1,121 @@
+import unittest
+
+from openlcb.canbus.canframe import CanFrame
+from openlcb.canbus.canphysicallayersimulation import (
+    CanPhysicalLayerSimulation
+)
+from openlcb.canbus.controlframe import ControlFrame
+from openlcb.canbus.shaper import (
+    TokenBucketShaper,
+    canFrameBits,
+    isCongestionFrame,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def eventFrame():
+    return CanFrame(0x195B_4365, bytearray(8))
+
+
+def rejectedFrame(code: int):
+    return CanFrame(0x19A4_8123, bytearray([0x03, 0x65, code >> 8,
+                                            code & 0xFF]))
+
+
+class ShaperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def testCanFrameBits(self):
+        self.assertEqual(canFrameBits(0, stuffing=False), 67)
+        self.assertEqual(canFrameBits(8, stuffing=False), 131)
+        self.assertEqual(canFrameBits(8), 160)  # worst case stuffing
+        self.assertEqual(canFrameBits(0), 80)
+
+    def testFramesPerSecond(self):
+        shaper = TokenBucketShaper(100, burst=2, clock=self.clock)
+        self.assertTrue(shaper.tryConsume(eventFrame()))
+        self.assertTrue(shaper.tryConsume(eventFrame()))
+        self.assertFalse(shaper.tryConsume(eventFrame()))
+        self.assertEqual(shaper.deferredCount, 1)
+        self.assertAlmostEqual(shaper.delay(eventFrame()), .01)
+        self.clock.now = .01
+        self.assertEqual(shaper.delay(eventFrame()), 0)
+        self.assertTrue(shaper.tryConsume(eventFrame()))
+        self.clock.now = 10.0
+        self.assertTrue(shaper.tryConsume(eventFrame()))
+        self.assertTrue(shaper.tryConsume(eventFrame()))
+        self.assertFalse(shaper.tryConsume(eventFrame()))  # burst cap
+
+    def testBitsPerSecond(self):
+        shaper = TokenBucketShaper(125000, unit=TokenBucketShaper.BITS,
+                                   burst=0, clock=self.clock)
+        self.assertEqual(shaper.burst, 160)  # at least one 8-byte frame
+        self.assertTrue(shaper.tryConsume(eventFrame()))
+        self.assertAlmostEqual(shaper.delay(eventFrame()), 160 / 125000)
+        with self.assertRaises(ValueError):
+            TokenBucketShaper(100, unit="bytes")
+
+    def testSendAllLeavesFramesQueued(self):
+        physicalLayer = CanPhysicalLayerSimulation()
+        physicalLayer.onFrameSent = lambda frame: None
+        physicalLayer.shaper = TokenBucketShaper(10, burst=3,
+                                                 clock=self.clock)
+        self.assertIsNone(physicalLayer.sendDelay())
+        for _ in range(5):
+            physicalLayer.sendFrameAfter(eventFrame())
+        self.assertEqual(physicalLayer.queueDepth(), 5)
+        self.assertEqual(physicalLayer.sendAll(None), 3)
+        self.assertEqual(physicalLayer.queueDepth(), 2)
+        self.assertAlmostEqual(physicalLayer.sendDelay(), .1)
+        self.clock.now = .2
+        self.assertEqual(physicalLayer.sendDelay(), 0)
+        self.assertEqual(physicalLayer.sendAll(None), 2)
+        self.assertEqual(len(physicalLayer.sentFrames), 5)
+
+    def testCongestionFrames(self):
+        self.assertTrue(isCongestionFrame(
+            CanFrame(ControlFrame.EIR2.value, 0x365, bytearray())))
+        self.assertTrue(isCongestionFrame(
+            CanFrame(ControlFrame.LinkError.value, 0)))
+        self.assertFalse(isCongestionFrame(
+            CanFrame(ControlFrame.AMD.value, 0x365, bytearray())))
+        self.assertFalse(isCongestionFrame(eventFrame()))
+        self.assertTrue(isCongestionFrame(rejectedFrame(0x2040)))
+        self.assertFalse(isCongestionFrame(rejectedFrame(0x1000)))
+
+    def testAdaptiveBackOffAndRecovery(self):
+        physicalLayer = CanPhysicalLayerSimulation()
+        physicalLayer.onFrameReceived = lambda frame: None
+        shaper = TokenBucketShaper(800, adaptive=True, clock=self.clock)
+        physicalLayer.shaper = shaper
+        physicalLayer.fireFrameReceived(rejectedFrame(0x2040))
+        self.assertEqual(shaper.rate, 400)
+        physicalLayer.fireFrameReceived(rejectedFrame(0x2040))
+        self.assertEqual(shaper.rate, 400)  # within holdoff
+        self.assertEqual(shaper.congestionCount, 2)
+        for _ in range(10):
+            self.clock.now += 1.0
+            shaper.backOff()
+        self.assertEqual(shaper.rate, shaper.minRate)
+        self.clock.now += 100.0
+        shaper.tryConsume(eventFrame())
+        self.assertEqual(shaper.rate, shaper.maxRate)
+
+    def testNotAdaptiveOnlyCounts(self):
+        shaper = TokenBucketShaper(800, clock=self.clock)
+        shaper.observeReceived(rejectedFrame(0x2040))
+        self.assertEqual(shaper.congestionCount, 1)
+        self.assertEqual(shaper.rate, 800)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+import struct
+import unittest
+
+from openlcb.canbus.canlink import CanLink
+from openlcb.canbus.canlinklayersimulation import CanLinkLayerSimulation
+from openlcb.canbus.canphysicallayersimulation import (
+    CanPhysicalLayerSimulation,
+)
+from openlcb.linklayer import LinkLayer
+from openlcb.message import Message
+from openlcb.mti import MTI
+from openlcb.nodeid import NodeID
+from openlcb.physicallayer import PhysicalLayer
+from openlcb.scheduler import Scheduler
+from openlcb.streamservice import (
+    StreamReadMemo,
+    StreamService,
+    StreamWriteMemo,
+)
+
+SENDER_ID = NodeID(12)
+RECEIVER_ID = NodeID(123)
+
+
+class MockPhysicalLayer(PhysicalLayer):
+    pass
+
+
+class LoopbackLinkLayer(LinkLayer):
+    """Queue sent messages on a wire shared by every node."""
+
+    class State:
+        Initial = 0
+        Disconnected = 1
+        Permitted = 2
+
+    DisconnectedState = State.Disconnected
+
+    def __init__(self, localNodeID: NodeID, wire: list):
+        super(LoopbackLinkLayer, self).__init__(MockPhysicalLayer(),
+                                                localNodeID)
+        self.wire = wire
+
+    def sendMessage(self, msg, verbose=False):
+        self.wire.append(msg)
+
+    def _onStateChanged(self, oldState, newState):
+        pass
+
+
+class StreamServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.wire = []
+        self.delivered = []
+        self.now = 0.0
+        self.sender = StreamService(LoopbackLinkLayer(SENDER_ID, self.wire))
+        self.receiver = StreamService(
+            LoopbackLinkLayer(RECEIVER_ID, self.wire))
+        self.services = [self.sender, self.receiver]
+        self.done = []
+        self.failed = []
+
+    def pump(self):
+        while self.wire:
+            message = self.wire.pop(0)
+            self.delivered.append(message)
+            for service in self.services:
+                service.process(message)
+
+    def sent(self, mti: MTI) -> list:
+        return [message for message in self.delivered if message.mti == mti]
+
+    def useScheduler(self):
+        scheduler = Scheduler(clock=lambda: self.now)
+        for service in self.services:
+            service.scheduler = scheduler
+        return scheduler
+
+    def testStreamInWindows(self):
+        self.receiver.bufferSize = 16
+        readMemo = StreamReadMemo(SENDER_ID, self.done.append,
+                                  self.failed.append)
+        dstStreamID = self.receiver.expectStream(readMemo)
+        data = bytearray(range(40))
+        writeMemo = StreamWriteMemo(RECEIVER_ID, data, self.done.append,
+                                    self.failed.append,
+                                    dstStreamID=dstStreamID)
+        self.sender.sendStream(writeMemo)
+        self.pump()
+        self.assertEqual(self.failed, [])
+        self.assertEqual(self.done, [writeMemo, readMemo])
+        self.assertEqual(readMemo.data, data)
+        self.assertEqual(writeMemo.bufferSize, 16)
+        self.assertEqual([len(message.data)
+                          for message in self.sent(MTI.Stream_Data_Send)],
+                         [17, 17, 9])  # stream ID + a window of data each
+        self.assertEqual(len(self.sent(MTI.Stream_Data_Proceed)), 2)
+        complete = self.sent(MTI.Stream_Data_Complete)[0]
+        self.assertEqual(struct.unpack(">I", complete.data[4:8])[0], 40)
+        self.assertEqual(self.receiver._incoming, {})
+        self.assertEqual(self.sender._outgoing, {})
+
+    def testMatchedBySourceStreamID(self):
+        writeMemo = StreamWriteMemo(RECEIVER_ID, bytearray(b"config"),
+                                    self.done.append, self.failed.append)
+        srcStreamID = self.sender.openStream(writeMemo)
+        readMemo = StreamReadMemo(SENDER_ID, self.done.append,
+                                  self.failed.append,
+                                  srcStreamID=srcStreamID)
+        self.receiver.expectStream(readMemo)
+        self.sender.sendStream(writeMemo)
+        self.pump()
+        self.assertEqual(self.done, [writeMemo, readMemo])
+        self.assertEqual(writeMemo.dstStreamID, readMemo.dstStreamID)
+        self.assertEqual(readMemo.data, bytearray(b"config"))
+
+    def testUnexpectedStreamRejected(self):
+        writeMemo = StreamWriteMemo(RECEIVER_ID, bytearray(8),
+                                    self.done.append, self.failed.append)
+        with self.assertLogs("openlcb.streamservice", "WARNING"):
+            self.sender.sendStream(writeMemo)
+            self.pump()
+        self.assertEqual(self.failed, [writeMemo])
+        self.assertEqual(writeMemo.errorCode, StreamService.RejectedError)
+        self.assertEqual(self.sent(MTI.Stream_Data_Send), [])
+
+    def testStreamIDsAreUnique(self):
+        first = StreamReadMemo(SENDER_ID)
+        second = StreamReadMemo(SENDER_ID)
+        self.assertNotEqual(self.receiver.expectStream(first),
+                            self.receiver.expectStream(second))
+        self.assertTrue(self.receiver.cancelStream(first))
+        self.assertFalse(self.receiver.cancelStream(first))
+
+    def testStalledStreamTimesOut(self):
+        scheduler = self.useScheduler()
+        self.services.remove(self.receiver)  # never replies
+        writeMemo = StreamWriteMemo(RECEIVER_ID, bytearray(8),
+                                    self.done.append, self.failed.append)
+        self.sender.sendStream(writeMemo)
+        self.pump()
+        self.now += self.sender.idleTimeout - .1
+        scheduler.runDue()
+        self.assertEqual(self.failed, [])
+        self.now += .1
+        with self.assertLogs("openlcb.streamservice", "WARNING"):
+            scheduler.runDue()
+        self.assertEqual(self.failed, [writeMemo])
+        self.assertTrue(writeMemo.timedOut)
+        self.assertEqual(self.sender._outgoing, {})
+
+    def testProgressDefersTimeout(self):
+        scheduler = self.useScheduler()
+        readMemo = StreamReadMemo(SENDER_ID, self.done.append,
+                                  self.failed.append)
+        dstStreamID = self.receiver.expectStream(readMemo)
+        self.receiver.touch(readMemo)
+        self.now += self.receiver.idleTimeout - 1
+        scheduler.runDue()
+        self.sender.sendStream(StreamWriteMemo(
+            RECEIVER_ID, bytearray(8), dstStreamID=dstStreamID))
+        self.pump()
+        self.now += self.receiver.idleTimeout - 1
+        scheduler.runDue()
+        self.assertEqual(self.failed, [])
+        self.assertEqual(self.done, [readMemo])
+
+    def testShortStreamFails(self):
+        readMemo = StreamReadMemo(SENDER_ID, self.done.append,
+                                  self.failed.append)
+        dstStreamID = self.receiver.expectStream(readMemo)
+        self.receiver.process(Message(
+            MTI.Stream_Initiate_Request, SENDER_ID, RECEIVER_ID,
+            bytearray(struct.pack(">HHBB", 64, 0, 7, dstStreamID))))
+        self.receiver.process(Message(
+            MTI.Stream_Data_Send, SENDER_ID, RECEIVER_ID,
+            bytearray([dstStreamID, 1, 2])))
+        with self.assertLogs("openlcb.streamservice", "WARNING"):
+            self.receiver.process(Message(
+                MTI.Stream_Data_Complete, SENDER_ID, RECEIVER_ID,
+                bytearray(struct.pack(">BBHI", 7, dstStreamID, 0, 3))))
+        self.assertEqual(self.failed, [readMemo])
+        self.assertEqual(self.done, [])
+
+    def testOtherDestinationIgnored(self):
+        readMemo = StreamReadMemo(SENDER_ID)
+        dstStreamID = self.receiver.expectStream(readMemo)
+        self.receiver.process(Message(
+            MTI.Stream_Initiate_Request, SENDER_ID, NodeID(99),
+            bytearray(struct.pack(">HHBB", 64, 0, 7, dstStreamID))))
+        self.assertEqual(self.wire, [])
+        self.assertFalse(readMemo._started)
+
+
+class StreamServiceCanTest(unittest.TestCase):
+    """Streams over CanLink, whose send queue orders frames by priority
+    (See CanPhysicalLayer.framePriority).
+    """
+    def setUp(self):
+        self.physicalLayers = {}
+        self.services = {}
+        links = [self.makeLink(nodeID) for nodeID in (SENDER_ID, RECEIVER_ID)]
+        for link in links:
+            for other in links:
+                alias = other.getLocalAlias()
+                link.aliasToNodeID[alias] = other.localNodeID
+                link.nodeIdToAlias[other.localNodeID] = alias
+        self.done = []
+        self.failed = []
+
+    def tearDown(self):
+        for physicalLayer in self.physicalLayers.values():
+            physicalLayer.physicalLayerDown()
+
+    def makeLink(self, nodeID: NodeID) -> CanLink:
+        physicalLayer = CanPhysicalLayerSimulation()
+        link = CanLinkLayerSimulation(physicalLayer, nodeID)
+        link._state = CanLink.State.Permitted
+        service = StreamService(link)
+        link.registerMessageReceivedListener(service.process)
+        self.physicalLayers[nodeID] = physicalLayer
+        self.services[nodeID] = service
+        return link
+
+    def pump(self):
+        """Send queued frames (in the order each queue releases them)
+        to the other node until both queues are empty.
+        """
+        moved = True
+        while moved:
+            moved = False
+            for nodeID, physicalLayer in self.physicalLayers.items():
+                while True:
+                    frame = physicalLayer._popSendable()
+                    if frame is None:
+                        break
+                    moved = True
+                    for otherID, other in self.physicalLayers.items():
+                        if otherID != nodeID:
+                            other.fireFrameReceived(frame)
+
+    def testStreamOverCan(self):
+        receiver = self.services[RECEIVER_ID]
+        receiver.bufferSize = 32
+        readMemo = StreamReadMemo(SENDER_ID, self.done.append,
+                                  self.failed.append)
+        dstStreamID = receiver.expectStream(readMemo)
+        data = bytearray(range(100))
+        writeMemo = StreamWriteMemo(RECEIVER_ID, data, self.done.append,
+                                    self.failed.append,
+                                    dstStreamID=dstStreamID)
+        self.services[SENDER_ID].sendStream(writeMemo)
+        self.pump()
+        self.assertEqual(self.failed, [])
+        self.assertEqual(self.done, [writeMemo, readMemo])
+        self.assertEqual(readMemo.data, data)
+
+
+if __name__ == '__main__':
+    unittest.main()
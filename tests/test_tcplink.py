@@ -6,6 +6,7 @@ from openlcb.tcplink.tcplink import TcpLink
 from openlcb.message import Message
 from openlcb.mti import MTI
 from openlcb.nodeid import NodeID
+from openlcb.portinterface import PortInterface
 
 
 # class MockPhysicalLayer(PhysicalLayer):
@@ -20,6 +21,17 @@ class TcpMockLayer():  # or TcpMockLayer(PortInterface):
         self.receivedText.append(text)
 
 
+class ChunkPortMock(PortInterface):
+    def __init__(self, chunks):
+        PortInterface.__init__(self)
+        self.chunks = chunks
+
+    def _receive(self):
+        if not self.chunks:
+            return None
+        return self.chunks.pop(0)
+
+
 class MessageMockLayer:
     '''Mock Message to record messages requested to be sent'''
     def __init__(self):
@@ -89,6 +101,31 @@ class TestTcpLinkClass(unittest.TestCase):
         self.assertEqual(messageLayer.receivedMessages[0].source,
                          NodeID(0x321))
 
+    def testTwoMessagesReceiveAll(self) :
+        messageLayer = MessageMockLayer()
+        linkLayer = TcpLink(RealtimePhysicalLayer(TcpMockLayer()),
+                            NodeID(100))
+        linkLayer.registerMessageReceivedListener(messageLayer.receiveMessage)
+        linkLayer.readSize = 32  # split the 2nd message between reads
+
+        messageText = bytearray([
+            0x80, 0x00,                          # full message
+            0x00, 0x00, 20,
+            0x00, 0x00, 0x00, 0x00, 0x01, 0x23,  # source node ID
+            0x00, 0x00, 0x11, 0x00, 0x00, 0x00,  # time
+            0x04, 0x90,                          # MTI: VerifyNode
+            0x00, 0x00, 0x00, 0x00, 0x03, 0x21   # source NodeID
+        ])
+        port = ChunkPortMock([bytes(messageText * 2)])
+        self.assertEqual(linkLayer.receiveAll(port), 32)
+        self.assertEqual(len(messageLayer.receivedMessages), 1)
+        self.assertEqual(linkLayer.receiveAll(port), 18)
+        self.assertEqual(linkLayer.receiveAll(port), 0)
+        self.assertEqual(len(messageLayer.receivedMessages), 2)
+        self.assertEqual(messageLayer.receivedMessages[1].source,
+                         NodeID(0x321))
+        self.assertEqual(len(linkLayer.accumulatedData), 0)
+
     def testOneMessageOnePartTwoClumps(self) :
         messageLayer = MessageMockLayer()
         tcpLayer = TcpMockLayer()
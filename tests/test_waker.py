@@ -0,0 +1,100 @@
+import socket
+import threading
+import time
+import unittest
+
+from openlcb.canbus.canlink import CanLink
+from openlcb.message import Message
+from openlcb.mti import MTI
+from openlcb.openlcbnetwork import OpenLCBNetwork
+from openlcb.tcplink.tcpsocket import TcpSocket
+from openlcb.waker import Waker
+
+
+def makePort():
+    near, far = socket.socketpair()
+    near.setblocking(False)
+    port = TcpSocket()
+    port._device = near
+    port._open = True
+    return port, far
+
+
+class WakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.waker = Waker()
+
+    def tearDown(self):
+        self.waker.close()
+
+    def testWakeupIsCoalesced(self):
+        self.assertFalse(self.waker.wait(0))
+        self.waker.wakeup()
+        self.waker.wakeup()
+        self.assertTrue(self.waker.woken)
+        self.assertTrue(self.waker.wait(0))
+        self.assertTrue(self.waker.clear())
+        self.assertFalse(self.waker.wait(0))
+        self.assertFalse(self.waker.clear())
+
+    def testWaitReadableReturnsOnWakeup(self):
+        port, far = makePort()
+        try:
+            self.assertFalse(port.waitReadable(.01, self.waker))
+            threading.Timer(.01, self.waker.wakeup).start()
+            start = time.monotonic()
+            self.assertTrue(port.waitReadable(2.0, self.waker))
+            self.assertLess(time.monotonic() - start, 1.0)
+            self.waker.clear()
+            far.sendall(b":X19170365N;")
+            self.assertTrue(port.waitReadable(1.0, self.waker))
+        finally:
+            port.close()
+            far.close()
+
+
+class ListenWakeupTest(unittest.TestCase):
+
+    def testQueuedFrameIsSentWithoutWaitingForPoll(self):
+        port, far = makePort()
+        far.settimeout(2.0)
+        network = OpenLCBNetwork("05.01.01.01.03.01")
+        network.maxWait = 5.0  # only a wakeup can send in time
+        network._port = port
+        errors = []
+
+        def listen():
+            try:
+                network._listen()
+            except (RuntimeError, OSError) as ex:  # connection broken
+                errors.append(ex)
+        thread = threading.Thread(target=listen, daemon=True)
+        thread.start()
+        try:
+            received = bytearray()
+            while b":X10701" not in received:  # AMD
+                received += far.recv(4096)
+            deadline = time.monotonic() + 2.0
+            while network.canLink.getState() != CanLink.State.Permitted:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(.001)
+            time.sleep(.05)  # let the loop block in waitReadable
+            start = time.monotonic()
+            network.canLink.sendMessage(Message(
+                MTI.Producer_Consumer_Event_Report,
+                network.canLink.localNodeID, None, bytearray(8)))
+            received = bytearray()
+            while b":X195B4" not in received:
+                received += far.recv(4096)
+            self.assertLess(time.monotonic() - start, 1.0)
+        finally:
+            far.close()  # the listen thread stops on the broken socket
+            thread.join(2.0)
+            port.close()
+        self.assertEqual(len(errors), 1)
+        self.assertIsNone(network.physicalLayer.onQueuedFrame)
+
+
+if __name__ == '__main__':
+    unittest.main()